@@ -0,0 +1,319 @@
+"""
+Long-range statistics computed on NumPy arrays.
+
+Task intervals of a user or a team are loaded once as arrays of epoch
+seconds (start, end), user ids, task name ids and rest flags, and every
+statistic is computed with vectorized operations instead of a Python loop
+over Task objects:
+
+* work/rest per local day and per hour of day - the time an interval set
+  covers below x is F(x) = sum(clip(x - start, 0, duration)), which for
+  sorted starts and ends is two searchsorted calls and prefix sums, so
+  the totals of all bins cost O((intervals + bins) log intervals)
+* context switches - consecutive work intervals of a user within a day
+  with a different task
+* focus blocks - runs of consecutive work intervals on the same task with
+  gaps of at most FOCUS_GAP_SECONDS
+* rest ratio - rest / (work + rest)
+
+Days and hours are local to each user; a running task counts until now.
+"""
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, Any, Iterable
+import numpy as np
+import pytz
+import logging
+
+from database import get_read_db, get_backend
+import archive
+import task_names
+from task_events import DEFAULT_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+FOCUS_GAP_SECONDS = 5 * 60
+# How far back a task overlapping the range may have started
+MAX_TASK_DAYS = 7
+MAX_RANGE_DAYS = 366
+DEFAULT_DAYS = 30
+EPOCH = datetime(1970, 1, 1)
+
+
+class Intervals:
+    """Task intervals as parallel arrays, sorted by user and start"""
+
+    def __init__(self, start: np.ndarray, end: np.ndarray, user_id: np.ndarray,
+                 name_id: np.ndarray, is_rest: np.ndarray, local_offset: Optional[np.ndarray] = None,
+                 presorted: bool = False):
+        order = slice(None) if presorted else np.lexsort((start, user_id))
+        self.start = np.asarray(start, dtype=np.int64)[order]
+        self.end = np.asarray(end, dtype=np.int64)[order]
+        self.user_id = np.asarray(user_id, dtype=np.int64)[order]
+        self.name_id = np.asarray(name_id, dtype=np.int64)[order]
+        self.is_rest = np.asarray(is_rest, dtype=bool)[order]
+        # Seconds to add to a UTC epoch to get the user's wall clock
+        self.local_offset = (np.zeros(len(self.start), dtype=np.int64) if local_offset is None
+                             else np.asarray(local_offset, dtype=np.int64)[order])
+        # Names of tasks outside the task_names dictionary, by the negative ids given to them
+        self.inline_names: Dict[int, str] = {}
+
+    def subset(self, mask: np.ndarray) -> 'Intervals':
+        return Intervals(self.start[mask], self.end[mask], self.user_id[mask], self.name_id[mask],
+                         self.is_rest[mask], self.local_offset[mask], presorted=True)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @property
+    def duration(self) -> np.ndarray:
+        return self.end - self.start
+
+    def clip(self, start: int, end: int) -> 'Intervals':
+        """Intervals cut to [start, end) in epoch seconds, empty ones dropped"""
+        clipped_start = np.maximum(self.start, start)
+        clipped_end = np.minimum(self.end, end)
+        keep = clipped_end > clipped_start
+        clipped = Intervals(clipped_start[keep], clipped_end[keep], self.user_id[keep],
+                            self.name_id[keep], self.is_rest[keep], self.local_offset[keep], presorted=True)
+        clipped.inline_names = self.inline_names
+        return clipped
+
+
+# Loading
+
+def to_epoch(dt: datetime) -> int:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(pytz.utc).replace(tzinfo=None)
+    return int((dt - EPOCH).total_seconds())
+
+
+def utc_offsets(timezone: str, epochs: np.ndarray) -> np.ndarray:
+    """UTC offset in seconds of the timezone at each epoch"""
+    tz = pytz.timezone(timezone)
+    transitions = getattr(tz, '_utc_transition_times', None)
+    if not transitions:
+        return np.full(len(epochs), int(tz.utcoffset(datetime.utcnow()).total_seconds()), dtype=np.int64)
+    # pytz keeps the DST history as sorted UTC transition times with the offset that starts at each
+    points = np.array([to_epoch(max(moment, EPOCH)) for moment in transitions], dtype=np.int64)
+    offsets = np.array([int(info[0].total_seconds()) for info in tz._transition_info], dtype=np.int64)
+    index = np.searchsorted(points, epochs, side='right') - 1
+    return offsets[np.clip(index, 0, len(offsets) - 1)]
+
+
+def load_intervals(user_ids: Iterable[int], start_utc: datetime, end_utc: datetime,
+                   now: Optional[datetime] = None, include_running: bool = True) -> Intervals:
+    """
+    Intervals of the users' tasks overlapping [start_utc, end_utc), including
+    archived months. Running tasks end at `now`, or are left out.
+    """
+    user_ids = sorted(set(user_ids))
+    now = now or datetime.utcnow()
+    if not user_ids:
+        empty = np.zeros(0, dtype=np.int64)
+        return Intervals(empty, empty, empty, empty, empty.astype(bool))
+
+    start_utc = archive._naive_utc(start_utc)
+    end_utc = archive._naive_utc(end_utc)
+    seconds = get_backend().interval_seconds
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    with get_read_db(user_ids[0] if len(user_ids) == 1 else None) as conn:
+        cursor = conn.cursor()
+        # Epoch seconds are computed in SQL, so no datetime objects are built per row
+        cursor.execute(f"""
+            SELECT t.id, t.user_id, COALESCE(t.task_name_id, 0) AS name_id, t.task_name, t.is_rest,
+                   {seconds('%s', 't.start_time')} AS start_epoch,
+                   {seconds('%s', 't.end_time')} AS end_epoch
+            FROM tasks t
+            WHERE t.user_id IN ({placeholders})
+              AND t.start_time >= %s AND t.start_time < %s
+              AND (t.end_time IS NULL OR t.end_time > %s)
+        """, (EPOCH, EPOCH, *user_ids, start_utc - timedelta(days=MAX_TASK_DAYS), end_utc, start_utc))
+        rows = cursor.fetchall()
+        if not include_running:
+            rows = [row for row in rows if row['end_epoch'] is not None]
+        cursor.execute(f"SELECT user_id, timezone FROM users WHERE user_id IN ({placeholders})", user_ids)
+        timezones = {row['user_id']: row['timezone'] for row in cursor.fetchall()}
+
+    # Rows not yet moved to the task_names dictionary, and archived months, carry the name inline
+    inline = [(row['user_id'], row['task_name']) for row in rows if not row['name_id']]
+    archived = []
+    if start_utc < archive.archive_cutoff(days=0):
+        # A task restored but not yet removed from its file must not count twice
+        known = {row['id'] for row in rows}
+        for user_id in user_ids:
+            tasks = archive.read_tasks(user_id, start_utc - timedelta(days=MAX_TASK_DAYS), end_utc)
+            archived += [task for task in tasks if task['id'] not in known]
+        inline += [(task['user_id'], task['task_name']) for task in archived]
+    # Statistics only read: names missing from the dictionary get negative ids instead of rows
+    name_ids = task_names.lookup(inline) if inline else {}
+    inline_names = {}
+    for pair in sorted(set(inline) - name_ids.keys()):
+        name_ids[pair] = -(len(inline_names) + 1)
+        inline_names[name_ids[pair]] = pair[1]
+
+    start = np.fromiter((row['start_epoch'] for row in rows), dtype=np.float64, count=len(rows))
+    now_epoch = to_epoch(now)
+    end = np.fromiter((now_epoch if row['end_epoch'] is None else row['end_epoch'] for row in rows),
+                      dtype=np.float64, count=len(rows))
+    users = np.fromiter((row['user_id'] for row in rows), dtype=np.int64, count=len(rows))
+    names = np.fromiter((row['name_id'] or name_ids[(row['user_id'], row['task_name'])] for row in rows),
+                        dtype=np.int64, count=len(rows))
+    rest = np.fromiter((bool(row['is_rest']) for row in rows), dtype=bool, count=len(rows))
+    if archived:
+        start = np.concatenate([start, [to_epoch(task['start_time']) for task in archived]])
+        end = np.concatenate([end, [to_epoch(task['end_time'] or now) for task in archived]])
+        users = np.concatenate([users, [task['user_id'] for task in archived]])
+        names = np.concatenate([names, [name_ids[(task['user_id'], task['task_name'])] for task in archived]])
+        rest = np.concatenate([rest, [bool(task['is_rest']) for task in archived]])
+
+    start = np.rint(start).astype(np.int64)
+    end = np.rint(end).astype(np.int64)
+    offsets = np.zeros(len(start), dtype=np.int64)
+    for user_id in user_ids:
+        mask = users == user_id
+        if mask.any():
+            offsets[mask] = utc_offsets(timezones.get(user_id, DEFAULT_TIMEZONE), start[mask])
+    intervals = Intervals(start, end, users, names, rest, offsets)
+    intervals.inline_names = inline_names
+    return intervals.clip(to_epoch(start_utc), to_epoch(end_utc))
+
+
+# Statistics
+
+def covered_seconds(start: np.ndarray, end: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Seconds the intervals cover within each bin [edges[i], edges[i + 1])"""
+    if len(start) == 0:
+        return np.zeros(len(edges) - 1, dtype=np.int64)
+    starts = np.sort(start)
+    ends = np.sort(end)
+    start_sums = np.concatenate([[0], np.cumsum(starts)])
+    end_sums = np.concatenate([[0], np.cumsum(ends)])
+    started = np.searchsorted(starts, edges, side='left')
+    ended = np.searchsorted(ends, edges, side='left')
+    # F(x): total time covered before x
+    covered = (started * edges - start_sums[started]) - (ended * edges - end_sums[ended])
+    return np.diff(covered)
+
+
+def _switch_mask(intervals: Intervals, day: np.ndarray) -> np.ndarray:
+    """True at each work interval that follows a different task of the same user on the same day"""
+    if len(intervals) < 2:
+        return np.zeros(len(intervals), dtype=bool)
+    mask = np.zeros(len(intervals), dtype=bool)
+    mask[1:] = ((intervals.name_id[1:] != intervals.name_id[:-1])
+                & (intervals.user_id[1:] == intervals.user_id[:-1])
+                & (day[1:] == day[:-1]))
+    return mask
+
+
+def focus_blocks(intervals: Intervals, gap_seconds: int = FOCUS_GAP_SECONDS) -> Dict[str, np.ndarray]:
+    """Runs of work on one task: {'start', 'end', 'seconds', 'user_id', 'name_id'} per block"""
+    if len(intervals) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return {'start': empty, 'end': empty, 'seconds': empty, 'user_id': empty, 'name_id': empty}
+    new_block = np.ones(len(intervals), dtype=bool)
+    new_block[1:] = ((intervals.name_id[1:] != intervals.name_id[:-1])
+                     | (intervals.user_id[1:] != intervals.user_id[:-1])
+                     | (intervals.start[1:] - intervals.end[:-1] > gap_seconds))
+    block = np.cumsum(new_block) - 1
+    first = np.flatnonzero(new_block)
+    return {
+        'start': intervals.start[first],
+        'end': np.maximum.reduceat(intervals.end, first),
+        'seconds': np.bincount(block, weights=intervals.duration).astype(np.int64),
+        'user_id': intervals.user_id[first],
+        'name_id': intervals.name_id[first],
+    }
+
+
+def compute_stats(intervals: Intervals, start_day: date, end_day: date) -> Dict[str, Any]:
+    """
+    Statistics of local days start_day..end_day:
+    {'days': [{'date', 'work', 'rest', 'switches'}], 'hours': [work seconds per hour of day],
+     'work', 'rest', 'rest_ratio', 'switches', 'switches_per_day', 'longest_focus', 'users'}
+    with durations in seconds. longest_focus is {'seconds', 'user_id', 'name_id', 'start'}
+    (local time) or None.
+    """
+    day_count = (end_day - start_day).days + 1
+    first_midnight = to_epoch(datetime.combine(start_day, datetime.min.time()))
+    day_edges = first_midnight + 86400 * np.arange(day_count + 1, dtype=np.int64)
+    hour_edges = first_midnight + 3600 * np.arange(day_count * 24 + 1, dtype=np.int64)
+
+    # Wall-clock seconds, so local midnight is the same edge for users in different timezones
+    local = Intervals(intervals.start + intervals.local_offset, intervals.end + intervals.local_offset,
+                      intervals.user_id, intervals.name_id, intervals.is_rest, presorted=True)
+    local = local.clip(int(day_edges[0]), int(day_edges[-1]))
+
+    rest = local.is_rest
+    work = ~rest
+    work_per_day = covered_seconds(local.start[work], local.end[work], day_edges)
+    rest_per_day = covered_seconds(local.start[rest], local.end[rest], day_edges)
+    work_per_hour = covered_seconds(local.start[work], local.end[work], hour_edges)
+
+    worked = local.subset(work)
+    work_day = (worked.start - first_midnight) // 86400
+    switches = _switch_mask(worked, work_day)
+    switches_per_day = np.bincount(work_day[switches], minlength=day_count)
+
+    blocks = focus_blocks(worked)
+    longest = None
+    if len(blocks['seconds']):
+        best = int(np.argmax(blocks['seconds']))
+        longest = {
+            'seconds': int(blocks['seconds'][best]),
+            'user_id': int(blocks['user_id'][best]),
+            'name_id': int(blocks['name_id'][best]),
+            'start': EPOCH + timedelta(seconds=int(blocks['start'][best])),
+        }
+
+    users = {}
+    if len(local):
+        user_ids, index = np.unique(local.user_id, return_inverse=True)
+        user_work = np.bincount(index, weights=np.where(work, local.duration, 0))
+        user_rest = np.bincount(index, weights=np.where(rest, local.duration, 0))
+        users = {int(user_id): {'work': int(user_work[i]), 'rest': int(user_rest[i])}
+                 for i, user_id in enumerate(user_ids)}
+
+    total_work = int(work_per_day.sum())
+    total_rest = int(rest_per_day.sum())
+    total_switches = int(switches.sum())
+    worked_days = int(np.count_nonzero(work_per_day))
+    return {
+        'days': [{
+            'date': start_day + timedelta(days=i),
+            'work': int(work_per_day[i]),
+            'rest': int(rest_per_day[i]),
+            'switches': int(switches_per_day[i]),
+        } for i in range(day_count)],
+        'hours': [int(seconds) for seconds in work_per_hour.reshape(day_count, 24).sum(axis=0)],
+        'work': total_work,
+        'rest': total_rest,
+        'rest_ratio': round(total_rest / (total_work + total_rest), 3) if total_work + total_rest else 0.0,
+        'switches': total_switches,
+        'switches_per_day': round(total_switches / worked_days, 1) if worked_days else 0.0,
+        'longest_focus': longest,
+        'users': users,
+    }
+
+
+def task_name_of(name_id: int) -> Optional[str]:
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM task_names WHERE id = %s", (name_id,))
+        row = cursor.fetchone()
+        return row['name'] if row else None
+
+
+def interval_stats(user_ids: List[int], start_day: date, end_day: date,
+                   now: Optional[datetime] = None, include_running: bool = True) -> Dict[str, Any]:
+    """compute_stats over local days start_day..end_day, with the focus block's task name filled in"""
+    # Every timezone's local days start_day..end_day lie within a day of the UTC ones
+    start_utc = datetime.combine(start_day - timedelta(days=1), datetime.min.time())
+    end_utc = datetime.combine(end_day + timedelta(days=2), datetime.min.time())
+    intervals = load_intervals(user_ids, start_utc, end_utc, now, include_running)
+    stats = compute_stats(intervals, start_day, end_day)
+    if stats['longest_focus']:
+        name_id = stats['longest_focus']['name_id']
+        stats['longest_focus']['task_name'] = intervals.inline_names[name_id] if name_id < 0 \
+            else task_name_of(name_id)
+    return stats
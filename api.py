@@ -0,0 +1,339 @@
+"""
+Read-only REST API over a user's tasks for dashboards.
+
+    GET /api/users/<id>/tasks?from=YYYY-MM-DD&to=YYYY-MM-DD&limit=&cursor=
+    GET /api/users/<id>/summary?date=YYYY-MM-DD
+    GET /api/users/<id>/stats?from=YYYY-MM-DD&to=YYYY-MM-DD
+
+Requests carry a personal token issued with /api_token in the bot
+(`Authorization: Bearer <token>`); a token only grants access to its own
+user. Days are local days of the user, times in responses are UTC.
+
+Task pages are ordered by (start_time, id) and continue from the last row
+of the previous page (`next_cursor`), so a page costs an index range scan
+however deep the client is.
+
+Every response carries an ETag and Last-Modified taken from the user's
+latest task event. The token check and that version are one indexed query,
+so a client polling with If-None-Match / If-Modified-Since gets a 304
+without the tasks being read again.
+"""
+import base64
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+import pytz
+import logging
+
+from database import get_db, get_read_db
+from models import User, Task, TASK_SELECT, sync_pending_writes
+from task_parser import jira_fields
+import archive
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PREFIX = 'tt_'
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_RANGE_DAYS = 366
+# Part of every ETag, bump it when the response format changes
+FORMAT_VERSION = 1
+
+
+# Tokens
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_token(user_id: int) -> str:
+    """New API token of the user; replaces the previous one"""
+    token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM api_tokens WHERE user_id = %s", (user_id,))
+        cursor.execute("""
+            INSERT INTO api_tokens (token_hash, user_id) VALUES (%s, %s)
+        """, (_hash_token(token), user_id))
+    return token
+
+
+def revoke_tokens(user_id: int) -> bool:
+    """Revoke the user's API token; False if there was none"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM api_tokens WHERE user_id = %s", (user_id,))
+        return cursor.rowcount > 0
+
+
+def authorize(token: str, user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Check the token against the user and fetch the user's change version.
+    Returns {'user_id', 'timezone', 'today', 'version', 'modified_at'}, or None if
+    the token is unknown or belongs to another user.
+    """
+    if not token.startswith(TOKEN_PREFIX):
+        return None
+    # Writes still queued in the write-behind buffer have no event yet
+    sync_pending_writes(user_id)
+    with get_read_db(user_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT a.user_id, u.timezone, e.id AS version, e.recorded_at AS modified_at
+            FROM api_tokens a
+            JOIN users u ON u.user_id = a.user_id
+            LEFT JOIN task_events e
+              ON e.id = (SELECT MAX(id) FROM task_events WHERE user_id = a.user_id)
+            WHERE a.token_hash = %s AND a.user_id = %s
+        """, (_hash_token(token), user_id))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    # Requests without a date are about the local today, which changes without a task event
+    local_now = datetime.now(pytz.timezone(row['timezone']))
+    midnight = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    midnight = midnight.astimezone(pytz.utc).replace(tzinfo=None)
+    return {
+        'user_id': row['user_id'],
+        'timezone': row['timezone'],
+        'today': local_now.date(),
+        'version': row['version'] or 0,
+        'modified_at': max(row['modified_at'], midnight) if row['modified_at'] else midnight,
+    }
+
+
+def make_etag(access: Dict[str, Any]) -> str:
+    """ETag of everything the API derives from the user's tasks"""
+    # Day boundaries depend on the timezone, which changes without a task event
+    key = f"{FORMAT_VERSION}:{access['user_id']}:{access['version']}:{access['timezone']}:{access['today']}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+# Keyset pagination
+
+def encode_cursor(start_time: datetime, task_id: int) -> str:
+    raw = f"{start_time.isoformat()}|{task_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; ValueError if the cursor is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        start_time, task_id = raw.split('|')
+        return datetime.fromisoformat(start_time), int(task_id)
+    except (UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def _sort_key(task: Task) -> Tuple[datetime, int]:
+    return task.start_time, task.id
+
+
+def task_page(user: User, start_utc: datetime, end_utc: datetime, limit: int = PAGE_SIZE,
+              after: Optional[Tuple[datetime, int]] = None) -> Tuple[List[Task], Optional[Tuple[datetime, int]]]:
+    """Tasks started within the UTC range after the keyset position; returns (tasks, next position)"""
+    position = after or (datetime.min, 0)
+    with get_read_db(user.user_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute(TASK_SELECT + """
+            WHERE t.user_id = %s AND t.start_time >= %s AND t.start_time <= %s
+              AND (t.start_time > %s OR (t.start_time = %s AND t.id > %s))
+            ORDER BY t.start_time, t.id
+            LIMIT %s
+        """, (user.user_id, start_utc, end_utc, position[0], position[0], position[1], limit + 1))
+        tasks = [Task.from_row(row) for row in cursor.fetchall()]
+
+    # Archiving never reaches the current month, so recent ranges skip the index
+    if start_utc.replace(tzinfo=None) < archive.archive_cutoff(days=0):
+        known = {task.id for task in tasks}
+        archived = [Task.from_row(row) for row in archive.read_tasks(user.user_id, start_utc, end_utc)]
+        tasks += [task for task in archived if task.id not in known and _sort_key(task) > position]
+        tasks = sorted(tasks, key=_sort_key)[:limit + 1]
+
+    if len(tasks) <= limit:
+        return tasks, None
+    tasks = tasks[:limit]
+    return tasks, _sort_key(tasks[-1])
+
+
+# Serialization
+
+def _utc(dt: Optional[datetime]) -> Optional[str]:
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=None).isoformat() + 'Z'
+
+
+def task_to_json(task: Task) -> Dict[str, Any]:
+    jira_key, _ = jira_fields(task.task_name, task.original_message)
+    return {
+        'id': task.id,
+        'task_name': task.task_name,
+        'comment': task.comment,
+        'jira_key': jira_key,
+        'is_rest': task.is_rest,
+        'start_time': _utc(task.start_time),
+        'end_time': _utc(task.end_time),
+        # A running task has no duration yet: the response must not change while nothing happens
+        'duration_seconds': int((task.end_time - task.start_time).total_seconds()) if task.end_time else None,
+    }
+
+
+def day_summary(user: User, day: datetime) -> Dict[str, Any]:
+    """Closed time per task name of a local day and the task running in it, if any"""
+    totals: Dict[Tuple[str, bool], Dict[str, Any]] = {}
+    running = None
+    bounds = user.get_day_bounds_utc(day)
+    for task in Task.get_tasks_for_date(user.user_id, day):
+        if task.end_time is None:
+            running = task
+            continue
+        item = totals.setdefault((task.task_name, task.is_rest), {
+            'task_name': task.task_name,
+            'is_rest': task.is_rest,
+            'seconds': 0,
+            'count': 0,
+        })
+        # A task crossing midnight counts only its part within the day
+        item['seconds'] += int(task.get_duration_within(*bounds).total_seconds())
+        item['count'] += 1
+
+    items = list(totals.values())
+    return {
+        'date': day.date().isoformat(),
+        'work_seconds': sum(item['seconds'] for item in items if not item['is_rest']),
+        'rest_seconds': sum(item['seconds'] for item in items if item['is_rest']),
+        'tasks': items,
+        'active_task': task_to_json(running) if running else None,
+    }
+
+
+# Views
+
+def _parse_day(value: Optional[str], default: datetime) -> datetime:
+    return datetime.strptime(value, '%Y-%m-%d') if value else default
+
+
+def _conditional(user_id: int):
+    """
+    Authorize the request and answer it from the version alone if possible.
+    Returns (access, None) to go on, or (None, response) to return as is.
+    """
+    from flask import jsonify, request, make_response
+    from werkzeug.http import is_resource_modified
+
+    header = request.headers.get('Authorization', '')
+    access = authorize(header[len('Bearer '):], user_id) if header.startswith('Bearer ') else None
+    if access is None:
+        return None, (jsonify({'error': 'unauthorized'}), 401)
+
+    etag = make_etag(access)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=access['modified_at']):
+        return None, _with_validators(access, make_response('', 304))
+    return access, None
+
+
+def _with_validators(access: Dict[str, Any], response):
+    response.set_etag(make_etag(access), weak=True)
+    response.last_modified = access['modified_at']
+    # Clients may keep the response but must revalidate it; it depends on the token
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Authorization')
+    return response
+
+
+def user_tasks(user_id: int):
+    """Tasks of the user started within local days from..to, one page at a time"""
+    from flask import jsonify, request
+    access, response = _conditional(user_id)
+    if response is not None:
+        return response
+
+    user = User.get_or_create(user_id)
+    today = datetime.combine(user.get_local_time().date(), datetime.min.time())
+    try:
+        start_day = _parse_day(request.args.get('from'), today)
+        end_day = _parse_day(request.args.get('to'), start_day)
+        limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': 'invalid from, to, limit or cursor'}), 400
+    if not timedelta(0) <= end_day - start_day <= timedelta(days=MAX_RANGE_DAYS):
+        return jsonify({'error': f'from..to must be a range of at most {MAX_RANGE_DAYS} days'}), 400
+
+    start_utc, _ = user.get_day_bounds_utc(start_day)
+    _, end_utc = user.get_day_bounds_utc(end_day)
+    tasks, next_position = task_page(user, start_utc, end_utc, limit, after)
+    return _with_validators(access, jsonify({
+        'user_id': user_id,
+        'from': start_day.date().isoformat(),
+        'to': end_day.date().isoformat(),
+        'tasks': [task_to_json(task) for task in tasks],
+        'next_cursor': encode_cursor(*next_position) if next_position else None,
+    }))
+
+
+def user_summary(user_id: int):
+    """Totals of the user for a local day"""
+    from flask import jsonify, request
+    access, response = _conditional(user_id)
+    if response is not None:
+        return response
+
+    user = User.get_or_create(user_id)
+    today = datetime.combine(user.get_local_time().date(), datetime.min.time())
+    try:
+        day = _parse_day(request.args.get('date'), today)
+    except ValueError:
+        return jsonify({'error': 'invalid date'}), 400
+    return _with_validators(access, jsonify(dict(day_summary(user, day), user_id=user_id)))
+
+
+def stats_to_json(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """analytics.compute_stats result with JSON-friendly dates"""
+    longest = stats['longest_focus']
+    return dict(
+        stats,
+        days=[dict(day, date=day['date'].isoformat()) for day in stats['days']],
+        longest_focus=dict(longest, start=longest['start'].isoformat()) if longest else None,
+        users={str(user_id): totals for user_id, totals in stats['users'].items()},
+    )
+
+
+def user_stats(user_id: int):
+    """Long-range statistics of the user over local days from..to (seconds)"""
+    from flask import jsonify, request
+    access, response = _conditional(user_id)
+    if response is not None:
+        return response
+    # NumPy is loaded with the first authorized statistics request, not at startup
+    import analytics
+
+    user = User.get_or_create(user_id)
+    today = datetime.combine(user.get_local_time().date(), datetime.min.time())
+    try:
+        end_day = _parse_day(request.args.get('to'), today)
+        start_day = _parse_day(request.args.get('from'),
+                               end_day - timedelta(days=analytics.DEFAULT_DAYS - 1))
+    except ValueError:
+        return jsonify({'error': 'invalid from or to'}), 400
+    if not timedelta(0) <= end_day - start_day < timedelta(days=analytics.MAX_RANGE_DAYS):
+        return jsonify({'error': f'from..to must be a range of at most {analytics.MAX_RANGE_DAYS} days'}), 400
+
+    # Like the summary, only closed time counts, so the result does not change while nothing happens
+    body = stats_to_json(analytics.interval_stats([user_id], start_day.date(), end_day.date(),
+                                                  include_running=False))
+    del body['users']
+    body.update({'user_id': user_id, 'from': start_day.date().isoformat(), 'to': end_day.date().isoformat()})
+    return _with_validators(access, jsonify(body))
+
+
+def register(web_app):
+    """Add the API routes to the Flask app"""
+    web_app.add_url_rule('/api/users/<int:user_id>/tasks', view_func=user_tasks)
+    web_app.add_url_rule('/api/users/<int:user_id>/summary', view_func=user_summary)
+    web_app.add_url_rule('/api/users/<int:user_id>/stats', view_func=user_stats)
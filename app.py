@@ -1,21 +1,35 @@
+import startup
 import os
+import sys
 import logging
 import threading
-import time as time_module
+import hashlib
+from collections import OrderedDict
 from datetime import datetime, time, timedelta
 
 # Import Telegram bot
 import telebot
-from telebot.types import ReplyKeyboardMarkup, KeyboardButton
-
-# Import Flask web server
-from flask import Flask, jsonify
+from telebot.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
 # Import bot modules
-from database import init_database
+from database import init_database, get_replica_router, close_pools
 from models import User, Task
 from task_parser import parse_task_message, format_task_for_display
 from time_utils import format_duration, format_time_for_user, create_datetime_from_time, parse_time_from_message
+from update_dedup import UpdateDeduplicator, bot_id_from_token
+from summary import get_day_summary, day_summary_key, summary_cache
+from report_pages import paginate, page_cache
+from search import search_tasks
+from jira_report import ticket_report, ticket_rollup, TICKET_PATTERN
+from jira_sync import get_jira_sync, queue_stats as jira_queue_stats
+import teams
+import api
+import live
+import reminders
+import digest
+from i18n import t, user_locale, button_key, button_locale, escape_markdown, locale_for_language_code, LANGUAGE_NAMES, LOCALES
+from jira_settings import get_base_url, set_base_url, normalize_base_url, SCOPE_USER, SCOPE_CHAT
+import shutdown
 import pytz
 
 # Configure logging
@@ -30,15 +44,21 @@ app_status = {
     'bot_running': False,
     'web_server_running': False,
     'start_time': datetime.now(),
-    'last_activity': datetime.now()
+    'last_activity': datetime.now(),
+    'shutting_down': False
 }
 
-# Flask app for health checks
-app = Flask(__name__)
+# Set once the web server accepts connections
+web_ready = threading.Event()
+WEB_READY_TIMEOUT = 5
 
-@app.route('/')
+# Flask is imported on first use, so processes that only handle updates
+# (supervisor shards) do not load it
 def health_check():
     """Root health check endpoint required for deployment"""
+    from flask import jsonify
+    if app_status['shutting_down']:
+        return jsonify({'status': 'draining', 'in_flight': shutdown.in_flight.count}), 503
     return jsonify({
         'status': 'healthy',
         'service': 'telegram-time-tracking-bot',
@@ -48,16 +68,24 @@ def health_check():
         'uptime_seconds': (datetime.now() - app_status['start_time']).total_seconds()
     })
 
-@app.route('/health')
 def health():
     """Additional health endpoint"""
     return health_check()
 
-@app.route('/status')
 def status():
     """Detailed status endpoint"""
+    from flask import jsonify
     return jsonify({
         'app_status': app_status,
+        'update_dedup': update_dedup.stats,
+        'replica_routing': get_replica_router().stats if get_replica_router() else None,
+        'summary_cache': summary_cache.stats,
+        'report_pages': page_cache.stats,
+        'jira_sync': dict(get_jira_sync().stats, queue=jira_queue_stats()) if get_jira_sync() else None,
+        'live_stream': live.live_stats(),
+        'reminders': dict(reminders.get_reminders().stats) if reminders.get_reminders() else None,
+        'digest': dict(digest.get_digest().stats, buckets_recent=digest.get_digest().bucket_stats())
+                  if digest.get_digest() else None,
         'environment': {
             'bot_token_configured': bool(os.environ.get('BOT_TOKEN')),
             'database_url_configured': bool(os.environ.get('DATABASE_URL')),
@@ -65,13 +93,173 @@ def status():
         'timestamp': datetime.now().isoformat()
     })
 
+# Reporting endpoints are disabled unless a token is configured
+REPORTS_TOKEN = os.environ.get('REPORTS_TOKEN')
+
+def tickets_report():
+    """Time per Jira ticket across all users or the members of one team"""
+    from flask import jsonify, request
+    if not REPORTS_TOKEN or request.headers.get('Authorization') != f"Bearer {REPORTS_TOKEN}":
+        return jsonify({'error': 'unauthorized'}), 401
+    
+    try:
+        since = request.args.get('since')
+        since = datetime.strptime(since, '%Y-%m-%d') if since else None
+        limit = min(int(request.args.get('limit', 100)), 1000)
+        team_id = request.args.get('team')
+        team_id = int(team_id) if team_id else None
+    except ValueError:
+        return jsonify({'error': 'invalid since, limit or team'}), 400
+    
+    project = request.args.get('project')
+    user_ids = teams.member_ids(team_id) if team_id is not None else None
+    return jsonify({
+        'project': project,
+        'since': since.date().isoformat() if since else None,
+        'team_id': team_id,
+        'tickets': ticket_rollup(project=project, since=since, user_ids=user_ids, limit=limit),
+    })
+
+def team_report(team_id):
+    """Team totals per member and per task for a day or week"""
+    from flask import jsonify, request
+    if not REPORTS_TOKEN or request.headers.get('Authorization') != f"Bearer {REPORTS_TOKEN}":
+        return jsonify({'error': 'unauthorized'}), 401
+    
+    try:
+        day = request.args.get('day')
+        day = datetime.strptime(day, '%Y-%m-%d').date() if day else datetime.utcnow().date()
+    except ValueError:
+        return jsonify({'error': 'invalid day'}), 400
+    period = request.args.get('period', 'day')
+    if period not in ('day', 'week'):
+        return jsonify({'error': 'invalid period'}), 400
+    
+    start_day, end_day = teams.period_bounds(day, period)
+    summary = teams.team_summary(team_id, start_day, end_day)
+    return jsonify({
+        'team_id': team_id,
+        'start_day': start_day.isoformat(),
+        'end_day': end_day.isoformat(),
+        'refreshed_at': summary['refreshed_at'].isoformat() if summary['refreshed_at'] else None,
+        'work_seconds': int(summary['work'].total_seconds()),
+        'rest_seconds': int(summary['rest'].total_seconds()),
+        'members': [{
+            'user_id': member['user_id'],
+            'display_name': member['display_name'],
+            'work_seconds': int(member['work'].total_seconds()),
+            'rest_seconds': int(member['rest'].total_seconds()),
+        } for member in summary['members']],
+        'tasks': [{
+            'task_name': task['task_name'],
+            'members': task['members'],
+            'work_seconds': int(task['work'].total_seconds()),
+        } for task in summary['tasks']],
+    })
+
+def team_stats_report(team_id):
+    """Long-range statistics of a team over local days from..to (seconds)"""
+    from flask import jsonify, request
+    if not REPORTS_TOKEN or request.headers.get('Authorization') != f"Bearer {REPORTS_TOKEN}":
+        return jsonify({'error': 'unauthorized'}), 401
+    # NumPy is loaded with the first authorized statistics request, not at startup
+    import analytics
+    
+    try:
+        end_day = request.args.get('to')
+        end_day = datetime.strptime(end_day, '%Y-%m-%d').date() if end_day else datetime.utcnow().date()
+        start_day = request.args.get('from')
+        start_day = datetime.strptime(start_day, '%Y-%m-%d').date() if start_day \
+            else end_day - timedelta(days=analytics.DEFAULT_DAYS - 1)
+    except ValueError:
+        return jsonify({'error': 'invalid from or to'}), 400
+    if not timedelta(0) <= end_day - start_day < timedelta(days=analytics.MAX_RANGE_DAYS):
+        return jsonify({'error': f'from..to must be a range of at most {analytics.MAX_RANGE_DAYS} days'}), 400
+    
+    stats = analytics.interval_stats(teams.member_ids(team_id), start_day, end_day)
+    return jsonify(dict(api.stats_to_json(stats), team_id=team_id,
+                        **{'from': start_day.isoformat(), 'to': end_day.isoformat()}))
+
+_web_app = None
+
+def get_web_app():
+    """Flask app with the health and report endpoints, created on first use"""
+    global _web_app
+    if _web_app is None:
+        from flask import Flask
+        web_app = Flask(__name__)
+        web_app.add_url_rule('/', view_func=health_check)
+        web_app.add_url_rule('/health', view_func=health)
+        web_app.add_url_rule('/status', view_func=status)
+        web_app.add_url_rule('/reports/tickets', view_func=tickets_report)
+        web_app.add_url_rule('/reports/teams/<int:team_id>', view_func=team_report)
+        web_app.add_url_rule('/reports/teams/<int:team_id>/stats', view_func=team_stats_report)
+        api.register(web_app)
+        live.register(web_app)
+        _web_app = web_app
+    return _web_app
+
+def __getattr__(name):
+    # `from app import app` keeps working for existing WSGI configurations
+    if name == 'app':
+        return get_web_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # Telegram Bot Setup
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
 if not BOT_TOKEN:
     logger.error("BOT_TOKEN environment variable is not set")
     exit(1)
 
-bot = telebot.TeleBot(BOT_TOKEN)
+update_dedup = UpdateDeduplicator(bot_id_from_token(BOT_TOKEN))
+
+class DedupTeleBot(telebot.TeleBot):
+    """TeleBot that skips updates which were already processed"""
+
+    # Update id of each payload (message, callback query, ...) being dispatched, by object id
+    _dispatching = {}
+
+    def process_new_updates(self, updates):
+        if not updates:
+            return
+        # Advance the polling offset even if every update is a duplicate
+        self.last_update_id = max(self.last_update_id, max(u.update_id for u in updates))
+        fresh = update_dedup.filter_updates(updates)
+        self._dispatching = {id(payload): update.update_id for update in fresh
+                             for key, payload in vars(update).items()
+                             if key != 'update_id' and payload is not None}
+        try:
+            super().process_new_updates(fresh)
+        except Exception:
+            update_dedup.release(u.update_id for u in fresh)
+            raise
+        finally:
+            self._dispatching = {}
+
+    def _exec_task(self, task, *args, **kwargs):
+        # Count handlers from the moment they are queued so shutdown can wait for them
+        shutdown.in_flight.begin()
+        # Handlers may run on the worker pool after process_new_updates returned,
+        # so a failed handler releases its own update for a retry
+        update_id = self._dispatching.get(id(args[0])) if args else None
+
+        def run(*args, **kwargs):
+            try:
+                return task(*args, **kwargs)
+            except Exception:
+                if update_id is not None:
+                    update_dedup.release([update_id])
+                raise
+            finally:
+                shutdown.in_flight.end()
+
+        super()._exec_task(run, *args, **kwargs)
+
+bot = DedupTeleBot(BOT_TOKEN)
+shutdown.register('db_pools', close_pools, shutdown.ORDER_CLOSE)
+
+# Long-polling timeout; bounds how long stopping intake takes on shutdown
+POLL_TIMEOUT = 10
 
 def log_user_request(message, action_type="message"):
     """Log user requests"""
@@ -88,11 +276,11 @@ def log_user_request(message, action_type="message"):
     logger.info(f"📨 {action_type.upper()} от {user_info}: '{message_text}'")
     app_status['last_activity'] = datetime.now()
 
-def get_main_keyboard():
+def get_main_keyboard(locale=None):
     """Get main keyboard with buttons"""
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
-    keyboard.row(KeyboardButton("🏖️ Отдых"), KeyboardButton("📊 Сводка"))
-    keyboard.row(KeyboardButton("❓ Помощь"))
+    keyboard.row(KeyboardButton(t(locale, 'btn_rest')), KeyboardButton(t(locale, 'btn_summary')))
+    keyboard.row(KeyboardButton(t(locale, 'btn_help')))
     return keyboard
 
 @bot.message_handler(commands=['start'])
@@ -104,75 +292,69 @@ def start_command(message):
     # Create or get user
     user = User.get_or_create(user_id)
     
-    welcome_message = f"""
-🎯 *Добро пожаловать в Telegram-бот для трекинга времени!*
-
-Я помогу вам эффективно отслеживать время работы над задачами.
-
-*Основные возможности:*
-• Автоматический учет времени задач
-• Интеграция с Jira (поддержка ссылок и тикетов)
-• Настройка часового пояса и рабочего времени
-• Автоматическое завершение задач
-• Детальная аналитика и отчеты
-
-*Быстрый старт:*
-1. Настройте часовой пояс: `/set_timezone Europe/Moscow`
-2. Установите рабочие часы: `/set_workday 09:00 18:00`
-3. Создайте задачу: просто отправьте название задачи
-
-*Текущие настройки:*
-• Часовой пояс: {user.timezone}
-• Рабочее время: {user.workday_start.strftime('%H:%M')} - {user.workday_end.strftime('%H:%M')}
-
-Используйте кнопки ниже для быстрого доступа к функциям.
-"""
+    # Until the user picks a language, follow their Telegram client
+    if user.locale is None:
+        user.update_locale(locale_for_language_code(message.from_user.language_code))
     
-    bot.send_message(message.chat.id, welcome_message, parse_mode='Markdown', reply_markup=get_main_keyboard())
+    locale = user_locale(user)
+    welcome_message = t(locale, 'welcome',
+                        timezone=user.timezone,
+                        workday_start=user.workday_start.strftime('%H:%M'),
+                        workday_end=user.workday_end.strftime('%H:%M'),
+                        language=LANGUAGE_NAMES[locale])
+    
+    bot.send_message(message.chat.id, welcome_message, parse_mode='Markdown', reply_markup=get_main_keyboard(locale))
+
+def note_settings_changed(user):
+    """Move the user's reminder and digest to the new timezone or workday"""
+    if reminders.get_reminders():
+        reminders.get_reminders().recheck(user.user_id)
+    if digest.get_digest():
+        digest.get_digest().add_bucket(user.timezone, user.workday_end)
 
 @bot.message_handler(commands=['set_timezone'])
 def set_timezone_command(message):
     """Handle /set_timezone command"""
     log_user_request(message, "command")
     user_id = message.from_user.id
+    locale = None
     
     try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        
         # Extract timezone from command
         parts = message.text.split()
         if len(parts) != 2:
-            bot.send_message(message.chat.id, 
-                           "❌ Неверный формат команды. Используйте: `/set_timezone Europe/Moscow`", 
-                           parse_mode='Markdown')
+            bot.send_message(message.chat.id, t(locale, 'timezone_usage'), parse_mode='Markdown')
             return
         
         timezone_str = parts[1]
-        user = User.get_or_create(user_id)
         
         if user.update_timezone(timezone_str):
-            bot.send_message(message.chat.id, 
-                           f"✅ Часовой пояс успешно установлен: {timezone_str}")
+            note_settings_changed(user)
+            bot.send_message(message.chat.id, t(locale, 'timezone_set', timezone=timezone_str))
         else:
-            bot.send_message(message.chat.id, 
-                           f"❌ Неверный часовой пояс: {timezone_str}\n\n" +
-                           "Примеры правильных часовых поясов:\n" +
-                           "• Europe/Moscow\n• Europe/London\n• America/New_York\n• Asia/Tokyo")
+            bot.send_message(message.chat.id, t(locale, 'timezone_invalid', timezone=timezone_str))
     except Exception as e:
         logger.error(f"Error in set_timezone: {e}")
-        bot.send_message(message.chat.id, "❌ Произошла ошибка при установке часового пояса")
+        bot.send_message(message.chat.id, t(locale, 'timezone_error'))
 
 @bot.message_handler(commands=['set_workday'])
 def set_workday_command(message):
     """Handle /set_workday command"""
     log_user_request(message, "command")
     user_id = message.from_user.id
+    locale = None
     
     try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        
         # Extract workday hours from command
         parts = message.text.split()
         if len(parts) != 3:
-            bot.send_message(message.chat.id, 
-                           "❌ Неверный формат команды. Используйте: `/set_workday 09:00 18:00`", 
-                           parse_mode='Markdown')
+            bot.send_message(message.chat.id, t(locale, 'workday_usage'), parse_mode='Markdown')
             return
         
         start_str, end_str = parts[1], parts[2]
@@ -182,27 +364,573 @@ def set_workday_command(message):
             start_time = datetime.strptime(start_str, '%H:%M').time()
             end_time = datetime.strptime(end_str, '%H:%M').time()
         except ValueError:
-            bot.send_message(message.chat.id, 
-                           "❌ Неверный формат времени. Используйте формат HH:MM (например, 09:00)")
+            bot.send_message(message.chat.id, t(locale, 'workday_bad_time'))
             return
         
-        user = User.get_or_create(user_id)
-        
         if user.update_workday(start_time, end_time):
-            bot.send_message(message.chat.id, 
-                           f"✅ Рабочее время успешно установлено: {start_str} - {end_str}")
+            note_settings_changed(user)
+            bot.send_message(message.chat.id, t(locale, 'workday_set', start=start_str, end=end_str))
         else:
-            bot.send_message(message.chat.id, 
-                           "❌ Произошла ошибка при установке рабочего времени")
+            bot.send_message(message.chat.id, t(locale, 'workday_error'))
     except Exception as e:
         logger.error(f"Error in set_workday: {e}")
-        bot.send_message(message.chat.id, "❌ Произошла ошибка при установке рабочего времени")
+        bot.send_message(message.chat.id, t(locale, 'workday_error'))
+
+@bot.message_handler(commands=['language'])
+def language_command(message):
+    """Handle /language ru|en command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        
+        parts = message.text.split()
+        if len(parts) != 2 or parts[1].lower() not in LOCALES:
+            bot.send_message(message.chat.id, t(locale, 'language_usage', language=LANGUAGE_NAMES[locale]),
+                           parse_mode='Markdown')
+            return
+        
+        if not user.update_locale(parts[1].lower()):
+            bot.send_message(message.chat.id, t(locale, 'language_error'))
+            return
+        
+        locale = user.locale
+        bot.send_message(message.chat.id, t(locale, 'language_set', language=LANGUAGE_NAMES[locale]),
+                       reply_markup=get_main_keyboard(locale))
+    except Exception as e:
+        logger.error(f"Error in language: {e}")
+        bot.send_message(message.chat.id, t(locale, 'language_error'))
+
+@bot.message_handler(commands=['set_jira'])
+def set_jira_command(message):
+    """Handle /set_jira command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        locale = user_locale(User.get_or_create(user_id))
+        
+        # In groups the setting applies to the whole chat
+        if message.chat.type == 'private':
+            scope, scope_id, target = SCOPE_USER, user_id, 'user'
+        else:
+            scope, scope_id, target = SCOPE_CHAT, message.chat.id, 'chat'
+        
+        parts = message.text.split()
+        if len(parts) == 1:
+            bot.send_message(message.chat.id, t(locale, 'jira_current', url=get_base_url(user_id, message.chat.id)),
+                           parse_mode='Markdown')
+            return
+        if len(parts) != 2:
+            bot.send_message(message.chat.id, t(locale, 'jira_usage'), parse_mode='Markdown')
+            return
+        
+        if parts[1] == 'reset':
+            set_base_url(scope, scope_id, None)
+            bot.send_message(message.chat.id, t(locale, f'jira_reset_{target}'))
+            return
+        
+        base_url = normalize_base_url(parts[1])
+        if base_url is None:
+            bot.send_message(message.chat.id, t(locale, 'jira_invalid'), parse_mode='Markdown')
+            return
+        
+        set_base_url(scope, scope_id, base_url)
+        bot.send_message(message.chat.id, t(locale, f'jira_set_{target}', url=base_url))
+    except Exception as e:
+        logger.error(f"Error in set_jira: {e}")
+        bot.send_message(message.chat.id, t(locale, 'jira_error'))
+
+@bot.message_handler(commands=['api_token'])
+def api_token_command(message):
+    """Handle /api_token command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        locale = user_locale(User.get_or_create(user_id))
+        if message.chat.type != 'private':
+            bot.send_message(message.chat.id, t(locale, 'api_token_private_only'))
+            return
+        
+        parts = message.text.split()
+        if len(parts) > 1 and parts[1] == 'revoke':
+            if api.revoke_tokens(user_id):
+                bot.send_message(message.chat.id, t(locale, 'api_token_revoked'))
+            else:
+                bot.send_message(message.chat.id, t(locale, 'api_token_none'))
+            return
+        
+        token = api.issue_token(user_id)
+        bot.send_message(message.chat.id, t(locale, 'api_token_issued', token=token, user_id=user_id),
+                       parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Error in api_token: {e}")
+        bot.send_message(message.chat.id, t(locale, 'api_token_error'))
+
+@bot.message_handler(commands=['reminders'])
+def reminders_command(message):
+    """Handle /reminders on|off command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        locale = user_locale(User.get_or_create(user_id))
+        parts = message.text.split()
+        if len(parts) < 2 or parts[1] not in ('on', 'off'):
+            bot.send_message(message.chat.id, t(locale, 'reminders_usage'), parse_mode='Markdown')
+            return
+        
+        reminders.set_enabled(user_id, parts[1] == 'on')
+        bot.send_message(message.chat.id, t(locale, f'reminders_{parts[1]}'))
+    except Exception as e:
+        logger.error(f"Error in reminders: {e}")
+        bot.send_message(message.chat.id, t(locale, 'reminders_error'))
+
+def send_reminder(user_id, text):
+    """Send a reminder to the user's private chat"""
+    # No reply_markup: the user keeps the keyboard in their own language
+    bot.send_message(user_id, text)
+
+@bot.message_handler(commands=['digest'])
+def digest_command(message):
+    """Handle /digest on|off command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        parts = message.text.split()
+        if len(parts) < 2 or parts[1] not in ('on', 'off'):
+            bot.send_message(message.chat.id, t(locale, 'digest_usage'), parse_mode='Markdown')
+            return
+        
+        digest.set_enabled(user_id, parts[1] == 'on')
+        if parts[1] == 'on' and digest.get_digest():
+            digest.get_digest().add_bucket(user.timezone, user.workday_end)
+        bot.send_message(message.chat.id, t(locale, f'digest_{parts[1]}'))
+    except Exception as e:
+        logger.error(f"Error in digest: {e}")
+        bot.send_message(message.chat.id, t(locale, 'digest_error'))
+
+def send_digest(user_id, text):
+    """Send the end-of-day summary to the user's private chat"""
+    # Digests go out from one process, which may not handle the user's callbacks,
+    # so a long digest is sent as consecutive messages rather than paged
+    for page in paginate(text):
+        bot.send_message(user_id, page, parse_mode='Markdown')
+
+def page_keyboard(entry, index):
+    """◀ ▶ buttons under a page of a paged report"""
+    buttons = []
+    if index > 0:
+        buttons.append(InlineKeyboardButton("◀", callback_data=f"page:{entry.entry_id}:{index - 1}"))
+    buttons.append(InlineKeyboardButton(f"{index + 1}/{len(entry.pages)}", callback_data="page:current"))
+    if index < len(entry.pages) - 1:
+        buttons.append(InlineKeyboardButton("▶", callback_data=f"page:{entry.entry_id}:{index + 1}"))
+    keyboard = InlineKeyboardMarkup()
+    keyboard.row(*buttons)
+    return keyboard
+
+def send_report(chat_id, user_id, report, version, text):
+    """Send a report; one too long for a message is paged with its pages cached"""
+    pages = paginate(text)
+    if len(pages) == 1:
+        bot.send_message(chat_id, text, parse_mode='Markdown')
+        return
+    entry = page_cache.put(user_id, report, version, pages)
+    bot.send_message(chat_id, pages[0], parse_mode='Markdown', reply_markup=page_keyboard(entry, 0))
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("page:"))
+def report_page(call):
+    """Show another page of a paged report, from the page cache"""
+    # No user row is read here: the answer follows the Telegram client's language
+    locale = locale_for_language_code(call.from_user.language_code)
+    
+    try:
+        if call.data == "page:current":
+            bot.answer_callback_query(call.id)
+            return
+        
+        entry_id, index = (int(part) for part in call.data[len("page:"):].split(':'))
+        entry = page_cache.get(entry_id, call.from_user.id)
+        if entry is None or not 0 <= index < len(entry.pages):
+            bot.answer_callback_query(call.id, t(locale, 'report_expired'))
+            return
+        
+        bot.edit_message_text(entry.pages[index], call.message.chat.id, call.message.message_id,
+                              parse_mode='Markdown', reply_markup=page_keyboard(entry, index))
+        bot.answer_callback_query(call.id)
+    except Exception as e:
+        logger.error(f"Error in report_page: {e}")
+        bot.answer_callback_query(call.id, t(locale, 'report_page_error'))
+
+# /find queries too long to ride in a "next page" button, by (user, query id)
+find_queries = OrderedDict()
+FIND_QUERIES_MAX = 10000
+# Telegram's limit on callback_data
+CALLBACK_DATA_MAX_BYTES = 64
+
+def find_callback_data(user_id, query, cursor):
+    """
+    "Next page" button data: 'find:<cursor>|q<query>', or 'find:<cursor>|i<query id>'
+    with the query kept in find_queries when it does not fit into callback_data
+    """
+    data = f"find:{cursor}|q{query}"
+    if len(data.encode('utf-8')) <= CALLBACK_DATA_MAX_BYTES:
+        return data
+    query_id = hashlib.blake2b(query.encode('utf-8'), digest_size=6).hexdigest()
+    find_queries[(user_id, query_id)] = query
+    find_queries.move_to_end((user_id, query_id))
+    while len(find_queries) > FIND_QUERIES_MAX:
+        find_queries.popitem(last=False)
+    return f"find:{cursor}|i{query_id}"
+
+def parse_find_callback(user_id, data):
+    """(query, cursor) of a "next page" button; query is None if its id is no longer known"""
+    # The cursor is '<start time>|<task id>', the query may contain anything
+    parts = data[len("find:"):].split('|', 2)
+    if len(parts) != 3 or not parts[2]:
+        return None, None
+    start_time, task_id, ref = parts
+    query = ref[1:] if ref[0] == 'q' else find_queries.get((user_id, ref[1:]))
+    return query, f"{start_time}|{task_id}"
+
+def format_find_page(result, user, query, base_url, continued=False):
+    """Format one page of /find results"""
+    locale = user_locale(user)
+    lines = [t(locale, 'find_title_continued' if continued else 'find_title', query=query), "\n"]
+    if result['total_count'] is not None:
+        lines += [t(locale, 'find_found', count=result['total_count'],
+                    duration=format_duration(result['total_duration'], locale)), "\n"]
+    lines.append("\n")
+    
+    for task in result['tasks']:
+        end_time = format_time_for_user(task.end_time, user) if task.end_time else t(locale, 'not_finished')
+        lines += [t(locale, 'find_task',
+                    day=user.get_local_time(task.start_time).strftime('%d.%m.%Y'),
+                    start=format_time_for_user(task.start_time, user), end=end_time,
+                    duration=format_duration(task.get_duration(), locale),
+                    task=format_task_for_display(task.task_name, original_message=task.original_message,
+                                                 base_url=base_url)), "\n"]
+        if task.comment:
+            lines += [t(locale, 'summary_task_comment', comment=escape_markdown(task.comment)), "\n"]
+    return "".join(lines)
+
+def find_keyboard(result, user_id, query, locale):
+    if not result['next_cursor']:
+        return None
+    keyboard = InlineKeyboardMarkup()
+    keyboard.add(InlineKeyboardButton(t(locale, 'find_next'),
+                                      callback_data=find_callback_data(user_id, query, result['next_cursor'])))
+    return keyboard
+
+@bot.message_handler(commands=['find'])
+def find_command(message):
+    """Handle /find command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        parts = message.text.split(maxsplit=1)
+        query = parts[1].replace('`', '').strip() if len(parts) == 2 else ''
+        if not query:
+            bot.send_message(message.chat.id, t(locale, 'find_usage'), parse_mode='Markdown')
+            return
+        
+        result = search_tasks(user_id, query)
+        if not result['tasks']:
+            bot.send_message(message.chat.id, t(locale, 'find_nothing', query=query), parse_mode='Markdown')
+            return
+        
+        base_url = get_base_url(user_id, message.chat.id)
+        bot.send_message(message.chat.id, format_find_page(result, user, query, base_url),
+                       parse_mode='Markdown', reply_markup=find_keyboard(result, user_id, query, locale))
+    except Exception as e:
+        logger.error(f"Error in find: {e}")
+        bot.send_message(message.chat.id, t(locale, 'find_error'))
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith("find:"))
+def find_next_page(call):
+    """Show the next page of /find results"""
+    user_id = call.from_user.id
+    locale = locale_for_language_code(call.from_user.language_code)
+    
+    try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        # The button carries its own query, so it pages the search it was sent with
+        query, cursor = parse_find_callback(user_id, call.data)
+        if query is None:
+            bot.answer_callback_query(call.id, t(locale, 'find_expired'))
+            return
+        
+        result = search_tasks(user_id, query, after=cursor)
+        bot.answer_callback_query(call.id)
+        base_url = get_base_url(user_id, call.message.chat.id)
+        bot.send_message(call.message.chat.id, format_find_page(result, user, query, base_url, continued=True),
+                       parse_mode='Markdown', reply_markup=find_keyboard(result, user_id, query, locale))
+    except Exception as e:
+        logger.error(f"Error in find_next_page: {e}")
+        bot.answer_callback_query(call.id, t(locale, 'find_error'))
+
+@bot.message_handler(commands=['ticket'])
+def ticket_command(message):
+    """Handle /ticket command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        parts = message.text.split()
+        if len(parts) != 2 or not TICKET_PATTERN.match(parts[1].upper()):
+            bot.send_message(message.chat.id, t(locale, 'ticket_usage'), parse_mode='Markdown')
+            return
+        
+        jira_key = parts[1].upper()
+        report = ticket_report(user_id, jira_key)
+        if not report['task_count']:
+            bot.send_message(message.chat.id, t(locale, 'ticket_not_found', key=jira_key))
+            return
+        
+        lines = [
+            t(locale, 'ticket_title',
+              ticket=format_task_for_display(jira_key, base_url=get_base_url(user_id, message.chat.id))), "\n\n",
+            t(locale, 'ticket_total', duration=format_duration(report['total'], locale),
+              count=report['task_count']), "\n",
+            t(locale, 'ticket_period',
+              first=user.get_local_time(report['first_start']).strftime('%d.%m.%Y'),
+              last=user.get_local_time(report['last_start']).strftime('%d.%m.%Y')), "\n\n",
+            t(locale, 'ticket_days_header'), "\n",
+        ]
+        for day, duration in list(report['days'].items())[:14]:
+            lines += [t(locale, 'ticket_day', day=day.strftime('%d.%m.%Y'),
+                        duration=format_duration(duration, locale)), "\n"]
+        if len(report['days']) > 14:
+            lines += [t(locale, 'ticket_more_days', count=len(report['days']) - 14), "\n"]
+        
+        bot.send_message(message.chat.id, "".join(lines), parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Error in ticket: {e}")
+        bot.send_message(message.chat.id, t(locale, 'ticket_error'))
+
+def member_display_name(from_user):
+    """Name shown for a user in team dashboards"""
+    if from_user.username:
+        return f"@{from_user.username}"
+    return f"{from_user.first_name or ''} {from_user.last_name or ''}".strip() or str(from_user.id)
+
+@bot.message_handler(commands=['team_create'])
+def team_create_command(message):
+    """Handle /team_create command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        locale = user_locale(User.get_or_create(user_id))
+        name = message.text.partition(' ')[2].strip()
+        if not name or len(name) > 100:
+            bot.send_message(message.chat.id, t(locale, 'team_create_usage'), parse_mode='Markdown')
+            return
+        
+        team = teams.create_team(user_id, name, member_display_name(message.from_user))
+        bot.send_message(message.chat.id,
+                       t(locale, 'team_created', name=escape_markdown(team['name']), code=team['invite_code']),
+                       parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Error in team_create: {e}")
+        bot.send_message(message.chat.id, t(locale, 'team_create_error'))
+
+@bot.message_handler(commands=['team_join'])
+def team_join_command(message):
+    """Handle /team_join command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        locale = user_locale(User.get_or_create(user_id))
+        parts = message.text.split()
+        if len(parts) != 2:
+            bot.send_message(message.chat.id, t(locale, 'team_join_usage'), parse_mode='Markdown')
+            return
+        
+        team = teams.join_team(user_id, parts[1], member_display_name(message.from_user))
+        if team is None:
+            bot.send_message(message.chat.id, t(locale, 'team_not_found'))
+            return
+        bot.send_message(message.chat.id, t(locale, 'team_joined', name=escape_markdown(team['name'])),
+                       parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Error in team_join: {e}")
+        bot.send_message(message.chat.id, t(locale, 'team_join_error'))
+
+@bot.message_handler(commands=['team_leave'])
+def team_leave_command(message):
+    """Handle /team_leave command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        locale = user_locale(User.get_or_create(user_id))
+        team = teams.get_user_team(user_id)
+        if team is None or not teams.leave_team(user_id, team['id']):
+            bot.send_message(message.chat.id, t(locale, 'team_not_member'))
+            return
+        bot.send_message(message.chat.id, t(locale, 'team_left', name=escape_markdown(team['name'])),
+                       parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Error in team_leave: {e}")
+        bot.send_message(message.chat.id, t(locale, 'team_leave_error'))
+
+def format_team_summary(team, summary, start_day, end_day):
+    """Format a team dashboard in the viewer's locale"""
+    locale = user_locale(team['viewer'])
+    period = start_day.strftime('%d.%m.%Y')
+    if end_day != start_day:
+        period += f" - {end_day.strftime('%d.%m.%Y')}"
+    lines = [
+        t(locale, 'team_title', name=escape_markdown(team['name']), period=period), "\n\n",
+        t(locale, 'summary_work_time', duration=format_duration(summary['work'], locale)), "\n",
+        t(locale, 'summary_rest_time', duration=format_duration(summary['rest'], locale)), "\n\n",
+        t(locale, 'team_members_header'), "\n",
+    ]
+    for member in summary['members']:
+        lines += [t(locale, 'team_member', name=escape_markdown(member['display_name'] or str(member['user_id'])),
+                    duration=format_duration(member['work'], locale)), "\n"]
+    
+    if summary['tasks']:
+        lines += ["\n", t(locale, 'team_tasks_header'), "\n"]
+        for task in summary['tasks']:
+            values = {'name': escape_markdown(task['task_name']), 'duration': format_duration(task['work'], locale)}
+            if task['members'] > 1:
+                lines.append(t(locale, 'team_task_shared', count=task['members'], **values))
+            else:
+                lines.append(t(locale, 'team_task', **values))
+            lines.append("\n")
+    
+    if summary['refreshed_at']:
+        refreshed = team['viewer'].get_local_time(summary['refreshed_at']).strftime('%H:%M')
+        lines += ["\n", t(locale, 'team_refreshed', time=refreshed)]
+    return "".join(lines)
+
+@bot.message_handler(commands=['team'])
+def team_command(message):
+    """Handle /team command"""
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        team = teams.get_user_team(user_id)
+        if team is None:
+            bot.send_message(message.chat.id, t(locale, 'team_none'), parse_mode='Markdown')
+            return
+        
+        parts = message.text.split()
+        period = 'week' if len(parts) > 1 and parts[1] in ('week', 'неделя') else 'day'
+        start_day, end_day = teams.period_bounds(user.get_local_time().date(), period)
+        summary = teams.team_summary(team['id'], start_day, end_day)
+        
+        bot.send_message(message.chat.id,
+                       format_team_summary(dict(team, viewer=user), summary, start_day, end_day),
+                       parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Error in team: {e}")
+        bot.send_message(message.chat.id, t(locale, 'team_error'))
+
+def format_stats(stats, title, locale):
+    """Format long-range statistics under the rendered title line"""
+    worked_days = sum(1 for day in stats['days'] if day['work'])
+    if not worked_days:
+        return title + "\n\n" + t(locale, 'stats_empty')
+    
+    lines = [
+        title, "\n\n",
+        t(locale, 'stats_work', duration=format_duration(timedelta(seconds=stats['work']), locale),
+          average=format_duration(timedelta(seconds=stats['work'] // worked_days), locale),
+          days=worked_days), "\n",
+        t(locale, 'stats_rest', duration=format_duration(timedelta(seconds=stats['rest']), locale),
+          percent=round(stats['rest_ratio'] * 100)), "\n",
+        t(locale, 'stats_switches', count=stats['switches'], per_day=stats['switches_per_day']), "\n",
+    ]
+    
+    longest = stats['longest_focus']
+    if longest:
+        lines += [t(locale, 'stats_focus', duration=format_duration(timedelta(seconds=longest['seconds']), locale),
+                    task=escape_markdown(longest['task_name'] or ''), date=longest['start'].strftime('%d.%m')), "\n"]
+    
+    busiest = sorted(range(24), key=lambda hour: stats['hours'][hour], reverse=True)[:3]
+    busiest = [hour for hour in sorted(busiest) if stats['hours'][hour]]
+    if busiest:
+        lines.append(t(locale, 'stats_hours',
+                       hours=", ".join(f"{hour:02d}:00-{hour + 1:02d}:00" for hour in busiest)))
+    return "".join(lines)
+
+@bot.message_handler(commands=['stats'])
+def stats_command(message):
+    """Handle /stats command"""
+    import analytics
+    log_user_request(message, "command")
+    user_id = message.from_user.id
+    locale = None
+    
+    try:
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        parts = message.text.split()[1:]
+        team = None
+        if parts and parts[0] in ('team', 'команда'):
+            team = teams.get_user_team(user_id)
+            if team is None:
+                bot.send_message(message.chat.id, t(locale, 'team_not_member'))
+                return
+            parts = parts[1:]
+        
+        days = int(parts[0]) if parts and parts[0].isdigit() else analytics.DEFAULT_DAYS
+        if not 1 <= days <= analytics.MAX_RANGE_DAYS:
+            bot.send_message(message.chat.id, t(locale, 'stats_range', max_days=analytics.MAX_RANGE_DAYS),
+                           parse_mode='Markdown')
+            return
+        
+        end_day = user.get_local_time().date()
+        start_day = end_day - timedelta(days=days - 1)
+        period = {'start': start_day.strftime('%d.%m.%Y'), 'end': end_day.strftime('%d.%m.%Y')}
+        if team:
+            stats = analytics.interval_stats(teams.member_ids(team['id']), start_day, end_day)
+            title = t(locale, 'stats_title_team', team=escape_markdown(team['name']), **period)
+        else:
+            stats = analytics.interval_stats([user_id], start_day, end_day)
+            title = t(locale, 'stats_title', **period)
+        
+        bot.send_message(message.chat.id, format_stats(stats, title, locale), parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Error in stats: {e}")
+        bot.send_message(message.chat.id, t(locale, 'stats_error'))
 
-@bot.message_handler(func=lambda message: message.text == "🏖️ Отдых")
+@bot.message_handler(func=lambda message: button_key(message.text) == 'btn_rest')
 def handle_rest_button(message):
     """Handle 'Отдых' button press"""
     log_user_request(message, "button")
     user_id = message.from_user.id
+    locale = None
     
     try:
         # Check if there's an active task
@@ -214,168 +942,106 @@ def handle_rest_button(message):
         
         # Create rest task
         user = User.get_or_create(user_id)
+        locale = user_locale(user)
         now_utc = datetime.now(pytz.UTC)
         
         rest_task = Task.create(
             user_id=user_id,
-            task_name="Отдых",
-            comment="Перерыв в работе",
+            task_name=t(locale, 'rest_task_name'),
+            comment=t(locale, 'rest_task_comment'),
             start_time=now_utc,
             is_rest=True
         )
         
         bot.send_message(message.chat.id, 
-                       f"🏖️ Отдых начат в {format_time_for_user(now_utc, user)}\n\n" +
-                       "Отправьте любое сообщение с названием задачи, чтобы завершить отдых и начать новую задачу.",
-                       reply_markup=get_main_keyboard())
+                       t(locale, 'rest_started', time=format_time_for_user(now_utc, user)),
+                       reply_markup=get_main_keyboard(locale))
         
     except Exception as e:
         logger.error(f"Error in handle_rest_button: {e}")
-        bot.send_message(message.chat.id, "❌ Произошла ошибка при начале отдыха")
+        bot.send_message(message.chat.id, t(locale, 'rest_error'))
 
-@bot.message_handler(func=lambda message: message.text == "📊 Сводка")
+@bot.message_handler(func=lambda message: button_key(message.text) == 'btn_summary')
 def handle_summary_button(message):
     """Handle 'Сводка' button press"""
     log_user_request(message, "button")
     user_id = message.from_user.id
+    locale = None
     
     try:
         user = User.get_or_create(user_id)
+        locale = user_locale(user)
         
         # Get today's date in user's timezone
         user_now = user.get_local_time()
         today = user_now.date()
         
-        # Get all tasks for today
-        tasks = Task.get_tasks_for_date(user_id, user_now)
+        base_url = get_base_url(user_id, message.chat.id)
+        summary = get_day_summary(user, user_now, base_url)
         
-        if not tasks:
+        if summary is None:
             bot.send_message(message.chat.id, 
-                           f"📊 *Сводка за {today.strftime('%d.%m.%Y')}*\n\n" +
-                           "❌ За сегодня задач не найдено.",
+                           t(locale, 'summary_empty', date=today.strftime('%d.%m.%Y')),
                            parse_mode='Markdown')
             return
         
-        # Calculate statistics
-        total_work_time = timedelta()
-        total_rest_time = timedelta()
-        work_tasks = []
-        rest_tasks = []
-        
-        for task in tasks:
-            task_duration = task.get_duration()
-            if task.is_rest:
-                total_rest_time += task_duration
-                rest_tasks.append(task)
-            else:
-                total_work_time += task_duration
-                work_tasks.append(task)
-        
-        # Format summary
-        summary = f"📊 *Сводка за {today.strftime('%d.%m.%Y')}*\n\n"
-        
-        # Work time summary
-        summary += f"⏰ *Рабочее время:* {format_duration(total_work_time)}\n"
-        summary += f"🏖️ *Время отдыха:* {format_duration(total_rest_time)}\n"
-        summary += f"📈 *Общее время:* {format_duration(total_work_time + total_rest_time)}\n\n"
-        
-        # Work tasks details
-        if work_tasks:
-            summary += "*🔧 Рабочие задачи:*\n"
-            for task in work_tasks:
-                start_time = format_time_for_user(task.start_time, user)
-                end_time = format_time_for_user(task.end_time, user) if task.end_time else "не завершена"
-                duration = format_duration(task.get_duration())
-                
-                task_display = format_task_for_display(task.task_name, original_message=task.original_message)
-                summary += f"• {task_display}\n"
-                summary += f"  ⏰ {start_time} - {end_time} ({duration})\n"
-                if task.comment:
-                    summary += f"  💬 {task.comment}\n"
-                summary += "\n"
-        
-        # Rest periods
-        if rest_tasks:
-            summary += "*🏖️ Периоды отдыха:*\n"
-            for task in rest_tasks:
-                start_time = format_time_for_user(task.start_time, user)
-                end_time = format_time_for_user(task.end_time, user) if task.end_time else "не завершен"
-                duration = format_duration(task.get_duration())
-                summary += f"• {start_time} - {end_time} ({duration})\n"
-        
-        bot.send_message(message.chat.id, summary, parse_mode='Markdown')
+        send_report(message.chat.id, user_id, 'summary', day_summary_key(user, today, base_url), summary)
         
     except Exception as e:
         logger.error(f"Error in handle_summary_button: {e}")
-        bot.send_message(message.chat.id, "❌ Произошла ошибка при создании сводки")
+        bot.send_message(message.chat.id, t(locale, 'summary_error'))
 
-@bot.message_handler(func=lambda message: message.text == "❓ Помощь")
+@bot.message_handler(func=lambda message: button_key(message.text) == 'btn_help')
 def handle_help_button(message):
     """Handle 'Помощь' button press"""
     log_user_request(message, "button")
     
-    help_text = """
-❓ *Справка по использованию бота*
-
-*📋 Основные команды:*
-• `/start` - Запуск бота и показ настроек
-• `/set_timezone Europe/Moscow` - Установка часового пояса
-• `/set_workday 09:00 18:00` - Установка рабочих часов
-
-*🔥 Быстрые действия:*
-• 🏖️ *Отдых* - Начать перерыв
-• 📊 *Сводка* - Показать отчет за день
-• ❓ *Помощь* - Эта справка
-
-*📝 Создание задач:*
-Просто отправьте сообщение с названием задачи:
-• `Разработка нового функционала`
-• `Встреча с командой`
-• `Код-ревью`
+    # The pressed button's language is the user's language
+    locale = button_locale(message.text)
+    bot.send_message(message.chat.id, t(locale, 'help'), parse_mode='Markdown')
 
-*🕐 Указание времени:*
-• `14:30 Важная встреча` - Задача с определенным временем
-• `14_30 Код-ревью` - Альтернативный формат времени
-
-*🔗 Jira интеграция:*
-• `PROJ-123 Исправление бага` - Автоматическая ссылка на тикет
-• `https://jira.company.com/browse/TASK-456` - Прямая ссылка
-
-*💬 Комментарии к задачам:*
-• `Разработка API - добавить новые методы`
-• `Встреча - обсуждение планов на спринт`
-
-*🤖 Автоматические функции:*
-• Автоматическое завершение предыдущей задачи при создании новой
-• Завершение задач по окончании рабочего дня
-• Обновление задачи, если отправлено то же название в то же время
-
-*📊 Аналитика:*
-• Подсчет рабочего времени и времени отдыха
-• Детальная статистика по задачам
-• Сводки за день с разбивкой по времени
-
-Бот поддерживает многопользовательский режим и сохраняет все данные в базе данных.
-"""
+def send_backdated_task(message, user, task_name, comment, is_jira, start_time):
+    """Insert a task into the past, trimming the task it starts in"""
+    locale = user_locale(user)
+    new_task, trimmed = Task.insert_at(user.user_id, task_name, comment, start_time,
+                                       original_message=message.text)
+    if new_task is None:
+        bot.send_message(message.chat.id,
+                         t(locale, 'task_start_taken', time=format_time_for_user(start_time, user)),
+                         reply_markup=get_main_keyboard(locale))
+        return
     
-    bot.send_message(message.chat.id, help_text, parse_mode='Markdown')
+    formatted_task = format_task_for_display(task_name, is_jira, message.text,
+                                             get_base_url(user.user_id, message.chat.id))
+    end_time = format_time_for_user(new_task.end_time, user) if new_task.end_time else t(locale, 'not_finished')
+    lines = [t(locale, 'task_added', task=formatted_task, start=format_time_for_user(start_time, user), end=end_time)]
+    if comment:
+        lines.append(t(locale, 'task_comment', comment=escape_markdown(comment)))
+    if trimmed:
+        lines.append(t(locale, 'task_trimmed', task=escape_markdown(trimmed.task_name),
+                       time=format_time_for_user(start_time, user)))
+    logger.info(f"Backdated task inserted for user {user.user_id}: {task_name}")
+    bot.send_message(message.chat.id, "\n".join(lines), parse_mode='Markdown',
+                     reply_markup=get_main_keyboard(locale))
 
 @bot.message_handler(func=lambda message: True)
 def handle_task_message(message):
     """Handle task messages"""
     log_user_request(message, "task")
     user_id = message.from_user.id
+    locale = None
     
     try:
         # Parse task message
         task_name, comment, is_jira = parse_task_message(message.text)
         
+        user = User.get_or_create(user_id)
+        locale = user_locale(user)
+        
         if not task_name:
-            bot.send_message(message.chat.id, "❌ Не удалось распознать название задачи")
+            bot.send_message(message.chat.id, t(locale, 'task_not_recognized'))
             return
         
-        user = User.get_or_create(user_id)
-        
         # Parse time from message
         parsed_time, remaining_message = parse_time_from_message(message.text)
         
@@ -402,15 +1068,23 @@ def handle_task_message(message):
             if time_diff <= 60:  # Within 1 minute
                 # Update existing task
                 if current_task.update_with_same_time(task_name, comment, message.text):
-                    formatted_task = format_task_for_display(task_name, is_jira, message.text)
-                    bot.send_message(message.chat.id, 
-                                   f"✏️ *Задача обновлена:*\n{formatted_task}\n\n" +
-                                   f"🕐 Время: {format_time_for_user(start_time, user)}" +
-                                   (f"\n💬 {comment}" if comment else ""),
+                    formatted_task = format_task_for_display(task_name, is_jira, message.text,
+                                                             get_base_url(user_id, message.chat.id))
+                    lines = [t(locale, 'task_updated', task=formatted_task,
+                               time=format_time_for_user(start_time, user))]
+                    if comment:
+                        lines.append(t(locale, 'task_comment', comment=escape_markdown(comment)))
+                    bot.send_message(message.chat.id, "\n".join(lines),
                                    parse_mode='Markdown',
-                                   reply_markup=get_main_keyboard())
+                                   reply_markup=get_main_keyboard(locale))
                     return
         
+        # A start before the end of the latest task goes between the existing ones
+        latest_task = current_task or Task.get_latest_task(user_id)
+        if latest_task and latest_task.conflicts_with_start(start_time):
+            send_backdated_task(message, user, task_name, comment, is_jira, start_time)
+            return
+        
         # End current task if exists
         if current_task:
             current_task.end_task(start_time)
@@ -427,56 +1101,98 @@ def handle_task_message(message):
         )
         
         # Send confirmation
-        formatted_task = format_task_for_display(task_name, is_jira, message.text)
-        confirmation_message = f"✅ *Задача создана:*\n{formatted_task}\n\n" + \
-                             f"🕐 Время начала: {format_time_for_user(start_time, user)}"
-        
+        formatted_task = format_task_for_display(task_name, is_jira, message.text,
+                                                 get_base_url(user_id, message.chat.id))
+        lines = [t(locale, 'task_created', task=formatted_task, time=format_time_for_user(start_time, user))]
         if comment:
-            confirmation_message += f"\n💬 {comment}"
+            lines.append(t(locale, 'task_comment', comment=escape_markdown(comment)))
         
-        bot.send_message(message.chat.id, confirmation_message, 
-                       parse_mode='Markdown', reply_markup=get_main_keyboard())
+        bot.send_message(message.chat.id, "\n".join(lines), 
+                       parse_mode='Markdown', reply_markup=get_main_keyboard(locale))
         
     except Exception as e:
         logger.error(f"Error in handle_task_message: {e}")
-        bot.send_message(message.chat.id, "❌ Произошла ошибка при создании задачи")
+        bot.send_message(message.chat.id, t(locale, 'task_error'))
 
 def run_telegram_bot():
     """Run the Telegram bot"""
     try:
         logger.info("Starting Telegram bot...")
         app_status['bot_running'] = True
-        bot.polling(none_stop=True)
+        bot.polling(none_stop=True, long_polling_timeout=POLL_TIMEOUT)
     except Exception as e:
         logger.error(f"Telegram bot error: {e}")
         app_status['bot_running'] = False
 
+def stop_intake():
+    """Stop fetching updates; polling returns after the current long poll"""
+    app_status['shutting_down'] = True
+    bot.stop_polling()
+
 def run_web_server():
     """Run the web server"""
     try:
+        from werkzeug.serving import make_server
         port = int(os.environ.get('PORT', 5000))
         logger.info(f"Starting web server on port {port}")
+        server = make_server('0.0.0.0', port, get_web_app(), threaded=True)
         app_status['web_server_running'] = True
-        app.run(host='0.0.0.0', port=port, debug=False)
+        web_ready.set()
+        server.serve_forever()
     except Exception as e:
         logger.error(f"Web server error: {e}")
         app_status['web_server_running'] = False
+    finally:
+        # Do not keep the bot waiting for a server that failed to start
+        web_ready.set()
+
+def start_background_workers():
+    """Start the workers that run next to a single bot process (app.py, wsgi.py)"""
+    # Push worklogs of closed Jira tasks, if enabled
+    get_jira_sync()
+    
+    # Keep team dashboards fresh
+    if teams.REFRESH_SECONDS > 0:
+        teams.TeamTotalsRefresher().start()
+    
+    # Nudge users without a running task, if enabled
+    reminders.get_reminders(send_reminder, reserved_rate=digest.sending_rate())
+    
+    # Send daily summaries at each user's workday end, if enabled
+    digest.get_digest(send_digest)
 
 def main():
     """Main function"""
-    logger.info("Initializing database...")
-    init_database()
-    logger.info("Database initialized successfully")
+    startup.mark('imports')
     
-    # Start web server in a separate thread
+    # Start web server in a separate thread, so Flask loads while the database initializes
     web_thread = threading.Thread(target=run_web_server, daemon=True)
     web_thread.start()
     
-    # Give web server time to start
-    time_module.sleep(2)
+    logger.info("Initializing database...")
+    with startup.phase('init_database'):
+        init_database()
+    
+    start_background_workers()
+    
+    with startup.phase('web_server_ready'):
+        if not web_ready.wait(WEB_READY_TIMEOUT):
+            logger.warning(f"Web server not ready after {WEB_READY_TIMEOUT} s, starting the bot anyway")
+    startup.mark('ready')
+    
+    if '--startup-profile' in sys.argv[1:]:
+        print(startup.report('app'))
+        return
+    
+    # SIGTERM/SIGINT stop polling; handlers already received are drained below
+    shutdown.install_signal_handlers(stop_intake)
     
     # Start Telegram bot in main thread
     run_telegram_bot()
+    
+    app_status['shutting_down'] = True
+    app_status['bot_running'] = False
+    app_status['last_shutdown'] = shutdown.drain()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
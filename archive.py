@@ -0,0 +1,346 @@
+"""
+Cold-storage archival of old tasks.
+
+Closed tasks from months older than ARCHIVE_AFTER_DAYS are moved out of the
+database into one compressed NDJSON file per user and month
+(ARCHIVE_DIR/<user_id>/<YYYY-MM>.ndjson.zst, or .ndjson.gz when the
+zstandard package is not installed). Each line holds a task row together
+with its task events. The task_archives table indexes the files, so reads
+of archived periods (Task.get_tasks_between, old daily summaries) load them
+transparently. user_day_task_totals is left in place.
+
+    python archive.py run [--days N]
+    python archive.py restore --user 123 --month 2024-01
+    python archive.py list [--user 123]
+"""
+import os
+import gzip
+import json
+import argparse
+from collections import defaultdict
+from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
+import logging
+
+from database import get_db
+import task_names
+from task_parser import jira_fields
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "60"))
+DELETE_BATCH_SIZE = 1000
+
+_TASK_FIELDS = ('id', 'user_id', 'task_name', 'comment', 'original_message',
+                'start_time', 'end_time', 'is_rest')
+_DATETIME_FIELDS = ('start_time', 'end_time', 'occurred_at')
+
+
+def archive_cutoff(now: Optional[datetime] = None, days: int = ARCHIVE_AFTER_DAYS) -> datetime:
+    """Start of the oldest month that stays in the database (naive UTC)"""
+    if now is None:
+        now = datetime.utcnow()
+    boundary = now - timedelta(days=days)
+    return datetime(boundary.year, boundary.month, 1)
+
+
+def _month_start(dt: datetime) -> date:
+    return date(dt.year, dt.month, 1)
+
+
+def _indexed_path(user_id: int, month: date) -> Optional[str]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT path FROM task_archives WHERE user_id = %s AND month = %s
+        """, (user_id, month))
+        row = cursor.fetchone()
+    return row['path'] if row else None
+
+
+def _archive_path(user_id: int, month: date) -> str:
+    extension = 'zst' if zstandard else 'gz'
+    return os.path.join(ARCHIVE_DIR, str(user_id), f"{month:%Y-%m}.ndjson.{extension}")
+
+
+# File format
+
+def _encode(record: Dict[str, Any]) -> str:
+    def default(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(f"Cannot serialize {type(value).__name__}")
+    return json.dumps(record, ensure_ascii=False, default=default)
+
+
+def _decode(line: str) -> Dict[str, Any]:
+    record = json.loads(line)
+    for row in [record] + record.get('events', []):
+        for field in _DATETIME_FIELDS:
+            if row.get(field) is not None:
+                row[field] = datetime.fromisoformat(row[field])
+    return record
+
+
+def _compress(data: bytes, path: str) -> bytes:
+    if path.endswith('.zst'):
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data)
+
+
+def _decompress(data: bytes, path: str) -> bytes:
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def write_archive_file(path: str, records: List[Dict[str, Any]]):
+    """Write records atomically (temp file + rename)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = "".join(_encode(record) + "\n" for record in records).encode('utf-8')
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as archive_file:
+        archive_file.write(_compress(data, path))
+        archive_file.flush()
+        os.fsync(archive_file.fileno())
+    os.replace(tmp_path, path)
+    _load.cache_clear()
+
+
+@lru_cache(maxsize=32)
+def _load(path: str, mtime: float) -> Tuple[Dict[str, Any], ...]:
+    with open(path, 'rb') as archive_file:
+        data = _decompress(archive_file.read(), path).decode('utf-8')
+    return tuple(_decode(line) for line in data.splitlines() if line)
+
+
+def read_archive_file(path: str) -> List[Dict[str, Any]]:
+    """Records of an archive file (recently read files are kept decompressed)"""
+    if not os.path.exists(path):
+        return []
+    return list(_load(path, os.path.getmtime(path)))
+
+
+# Archiving
+
+def _fetch_old_tasks(cursor, user_id: int, cutoff: datetime) -> List[Dict[str, Any]]:
+    cursor.execute("""
+        SELECT t.id, t.user_id, COALESCE(n.name, t.task_name) AS task_name, t.comment,
+               t.original_message, t.start_time, t.end_time, t.is_rest
+        FROM tasks t
+        LEFT JOIN task_names n ON n.id = t.task_name_id
+        WHERE t.user_id = %s AND t.start_time < %s AND t.end_time IS NOT NULL
+        ORDER BY t.start_time
+    """, (user_id, cutoff))
+    tasks = [{field: row[field] for field in _TASK_FIELDS} for row in cursor.fetchall()]
+    if not tasks:
+        return tasks
+
+    events = defaultdict(list)
+    placeholders = ", ".join(["%s"] * len(tasks))
+    cursor.execute(f"""
+        SELECT id, task_id, user_id, event_type, payload, occurred_at
+        FROM task_events WHERE task_id IN ({placeholders}) ORDER BY id
+    """, [task['id'] for task in tasks])
+    for row in cursor.fetchall():
+        payload = row['payload']
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        events[row['task_id']].append(dict(row, payload=payload))
+    for task in tasks:
+        task['is_rest'] = bool(task['is_rest'])
+        task['events'] = events.get(task['id'], [])
+    return tasks
+
+
+def _delete_tasks(cursor, task_ids: List[int]):
+    for i in range(0, len(task_ids), DELETE_BATCH_SIZE):
+        chunk = task_ids[i:i + DELETE_BATCH_SIZE]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"DELETE FROM task_events WHERE task_id IN ({placeholders})", chunk)
+        cursor.execute(f"DELETE FROM tasks WHERE id IN ({placeholders})", chunk)
+
+
+def _index_archive(cursor, user_id: int, month: date, path: str, records: List[Dict[str, Any]]):
+    cursor.execute("""
+        INSERT INTO task_archives (user_id, month, path, task_count, archived_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (user_id, month) DO UPDATE SET
+            path = EXCLUDED.path,
+            task_count = EXCLUDED.task_count,
+            archived_at = EXCLUDED.archived_at
+    """, (user_id, month, path, len(records), datetime.utcnow()))
+
+
+def archive_user(user_id: int, cutoff: datetime) -> int:
+    """Archive a user's closed tasks that started before the cutoff; returns tasks moved"""
+    with get_db() as conn:
+        tasks = _fetch_old_tasks(conn.cursor(), user_id, cutoff)
+    if not tasks:
+        return 0
+
+    by_month = defaultdict(list)
+    for task in tasks:
+        by_month[_month_start(task['start_time'])].append(task)
+
+    moved = 0
+    for month, month_tasks in sorted(by_month.items()):
+        path = _archive_path(user_id, month)
+        # Merge with an existing file (late backdated tasks, an interrupted run)
+        old_path = _indexed_path(user_id, month) or path
+        records = {record['id']: record for record in read_archive_file(old_path)}
+        if old_path != path:
+            records.update((record['id'], record) for record in read_archive_file(path))
+        records.update((task['id'], task) for task in month_tasks)
+        records = sorted(records.values(), key=lambda record: record['start_time'])
+
+        # The file is complete before any row is deleted; a failure below
+        # leaves the rows in place and the next run merges them again
+        write_archive_file(path, records)
+        with get_db() as conn:
+            cursor = conn.cursor()
+            _index_archive(cursor, user_id, month, path, records)
+            _delete_tasks(cursor, [task['id'] for task in month_tasks])
+        if old_path != path and os.path.exists(old_path):
+            # Re-archived with a different codec
+            os.remove(old_path)
+        moved += len(month_tasks)
+        logger.info(f"Archived {len(month_tasks)} tasks of user {user_id} for {month:%Y-%m}")
+    return moved
+
+
+def run(days: int = ARCHIVE_AFTER_DAYS) -> int:
+    """Archive every user's tasks older than the cutoff; returns tasks moved"""
+    cutoff = archive_cutoff(days=days)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT user_id FROM tasks
+            WHERE start_time < %s AND end_time IS NOT NULL
+            ORDER BY user_id
+        """, (cutoff,))
+        user_ids = [row['user_id'] for row in cursor.fetchall()]
+
+    moved = 0
+    for user_id in user_ids:
+        try:
+            moved += archive_user(user_id, cutoff)
+        except Exception as e:
+            logger.error(f"Archiving tasks of user {user_id} failed: {e}")
+    logger.info(f"Archived {moved} tasks older than {cutoff:%Y-%m-%d}")
+    return moved
+
+
+# Reading
+
+def list_archives(user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if user_id is None:
+            cursor.execute("SELECT * FROM task_archives ORDER BY user_id, month")
+        else:
+            cursor.execute("""
+                SELECT * FROM task_archives WHERE user_id = %s ORDER BY month
+            """, (user_id,))
+        return cursor.fetchall()
+
+
+def read_tasks(user_id: int, start_utc: datetime, end_utc: datetime) -> List[Dict[str, Any]]:
+    """Archived task rows of a user that started within [start_utc, end_utc]"""
+    start_utc = _naive_utc(start_utc)
+    end_utc = _naive_utc(end_utc)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT path FROM task_archives
+            WHERE user_id = %s AND month >= %s AND month <= %s
+            ORDER BY month
+        """, (user_id, _month_start(start_utc), _month_start(end_utc)))
+        paths = [row['path'] for row in cursor.fetchall()]
+
+    tasks = []
+    for path in paths:
+        for record in read_archive_file(path):
+            if start_utc <= record['start_time'] <= end_utc:
+                tasks.append({field: record[field] for field in _TASK_FIELDS})
+    return tasks
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# Restore
+
+def restore(user_id: int, month: date) -> int:
+    """Move an archived user-month back into the database; returns tasks restored"""
+    path = _indexed_path(user_id, month)
+    if path is None:
+        return 0
+
+    records = read_archive_file(path)
+    name_ids = task_names.resolve((record['user_id'], record['task_name']) for record in records)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO tasks (id, user_id, task_name_id, comment, original_message,
+                               start_time, end_time, is_rest, jira_key, jira_project)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (id) DO NOTHING
+        """, [(record['id'], record['user_id'],
+               name_ids[(record['user_id'], record['task_name'])], record['comment'],
+               record['original_message'], record['start_time'], record['end_time'],
+               record['is_rest'], *jira_fields(record['task_name'], record['original_message']))
+              for record in records])
+        cursor.executemany("""
+            INSERT INTO task_events (id, task_id, user_id, event_type, payload, occurred_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (id) DO NOTHING
+        """, [(event['id'], event['task_id'], event['user_id'], event['event_type'],
+               json.dumps(event['payload'], ensure_ascii=False), event['occurred_at'])
+              for record in records for event in record['events']])
+        cursor.execute("""
+            DELETE FROM task_archives WHERE user_id = %s AND month = %s
+        """, (user_id, month))
+
+    os.remove(path)
+    _load.cache_clear()
+    logger.info(f"Restored {len(records)} tasks of user {user_id} for {month:%Y-%m}")
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-storage archival of old tasks")
+    parser.add_argument('command', choices=['run', 'restore', 'list'])
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--user', type=int)
+    parser.add_argument('--month', help="YYYY-MM")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'run':
+        run(args.days)
+    elif args.command == 'restore':
+        if args.user is None or args.month is None:
+            parser.error("restore needs --user and --month")
+        restore(args.user, datetime.strptime(args.month, '%Y-%m').date())
+    else:
+        for archive in list_archives(args.user):
+            print(f"{archive['user_id']}\t{archive['month']:%Y-%m}\t"
+                  f"{archive['task_count']}\t{archive['path']}")
+
+
+if __name__ == "__main__":
+    main()
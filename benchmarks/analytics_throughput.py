@@ -0,0 +1,114 @@
+"""
+Long-range statistics: NumPy arrays vs a loop over Task objects.
+
+Generates a year of synthetic intervals for a user (work days with tasks
+of random length, lunch breaks, the odd task across midnight) and times
+analytics.compute_stats against the per-object loop it replaces
+(get_duration() per task, local day per task, switches by comparing
+neighbours). With --db the intervals are also written to a temporary
+SQLite database and loaded back with analytics.load_intervals.
+
+    python benchmarks/analytics_throughput.py --intervals 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+import database  # noqa: E402
+from models import User, Task  # noqa: E402
+
+START_DAY = date(2024, 1, 1)
+
+
+def synthetic(count: int, days: int, seed: int = 1) -> analytics.Intervals:
+    """`count` back-to-back intervals spread over `days` days of one user"""
+    rng = np.random.default_rng(seed)
+    per_day = max(1, count // days)
+    day = np.repeat(np.arange(days), per_day)[:count]
+    # Back-to-back tasks from 09:00, each a share of a ten-hour day
+    length = np.maximum(36000 // per_day * rng.uniform(0.5, 1.0, len(day)), 1).astype(np.int64)
+    offset = np.zeros(len(day), dtype=np.int64)
+    offset[1:] = np.cumsum(length)[:-1]
+    offset -= np.repeat(offset[np.searchsorted(day, np.arange(days))], per_day)[:count]
+    start = analytics.to_epoch(datetime.combine(START_DAY, datetime.min.time())) + day * 86400 + 9 * 3600 + offset
+    name = rng.integers(1, 40, len(day))
+    rest = rng.random(len(day)) < 0.1
+    return analytics.Intervals(start, start + length, np.ones(len(day)), name, rest)
+
+
+def naive_stats(tasks, user):
+    """The loop compute_stats replaces"""
+    work = defaultdict(timedelta)
+    rest = defaultdict(timedelta)
+    switches = 0
+    previous = None
+    for task in tasks:
+        day = user.get_local_time(task.start_time).date()
+        (rest if task.is_rest else work)[day] += task.get_duration()
+        if not task.is_rest:
+            if previous is not None and previous.task_name != task.task_name and previous_day == day:
+                switches += 1
+            previous, previous_day = task, day
+    return sum(work.values(), timedelta()), sum(rest.values(), timedelta()), switches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--intervals', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--db', action='store_true', help="also time loading from SQLite")
+    args = parser.parse_args()
+
+    intervals = synthetic(args.intervals, args.days)
+    end_day = START_DAY + timedelta(days=args.days - 1)
+    print(f"{len(intervals)} intervals over {args.days} days")
+
+    started = time.perf_counter()
+    stats = analytics.compute_stats(intervals, START_DAY, end_day)
+    vectorized = time.perf_counter() - started
+    print(f"numpy:  {vectorized * 1000:8.1f} ms  work {stats['work'] / 3600:.0f} h, "
+          f"rest {stats['rest'] / 3600:.0f} h, {stats['switches']} switches, "
+          f"longest focus {stats['longest_focus']['seconds'] / 60:.0f} min")
+
+    epoch = datetime(1970, 1, 1)
+    tasks = [Task(None, 1, f"task {name}", None, epoch + timedelta(seconds=int(start)),
+                  epoch + timedelta(seconds=int(end)), bool(rest))
+             for start, end, name, rest in zip(intervals.start, intervals.end, intervals.name_id, intervals.is_rest)]
+    started = time.perf_counter()
+    work, rest, switches = naive_stats(tasks, User(1, timezone='UTC'))
+    loop = time.perf_counter() - started
+    print(f"loop:   {loop * 1000:8.1f} ms  work {work.total_seconds() / 3600:.0f} h, "
+          f"rest {rest.total_seconds() / 3600:.0f} h, {switches} switches  ({loop / vectorized:.0f}x slower)")
+
+    if args.db:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.set_backend(database.SQLiteBackend(os.path.join(tmp, 'bench.db')))
+            database.init_database()
+            with database.get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute("INSERT INTO users (user_id, timezone) VALUES (1, 'UTC')")
+                cursor.executemany("""
+                    INSERT INTO task_names (id, user_id, name) VALUES (%s, 1, %s)
+                """, [(name, f"task {name}") for name in range(1, 40)])
+                cursor.executemany("""
+                    INSERT INTO tasks (user_id, task_name_id, start_time, end_time, is_rest)
+                    VALUES (1, %s, %s, %s, %s)
+                """, [(task_name, task.start_time, task.end_time, task.is_rest)
+                      for task, task_name in zip(tasks, intervals.name_id.tolist())])
+            started = time.perf_counter()
+            loaded = analytics.interval_stats([1], START_DAY, end_day)
+            print(f"sqlite: {(time.perf_counter() - started) * 1000:8.1f} ms  load + compute, "
+                  f"work {loaded['work'] / 3600:.0f} h")
+
+
+if __name__ == "__main__":
+    main()
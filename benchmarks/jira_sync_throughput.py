@@ -0,0 +1,63 @@
+"""
+Worklog sync throughput against the local Jira stub.
+
+Fills the outbox of a temporary SQLite database with closed Jira tasks,
+then drains it with JiraSyncWorker and reports worklogs per second and the
+queue lag seen before and after. Stub latency models the round trip to a
+real Jira; concurrency is the number of parallel requests per batch.
+
+    python benchmarks/jira_sync_throughput.py --worklogs 2000 --latency-ms 30 --concurrency 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import jira_sync  # noqa: E402
+from jira_settings import set_base_url, SCOPE_USER  # noqa: E402
+from jira_stub import JiraStub  # noqa: E402
+from models import User, Task  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--worklogs', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    jira_sync.JIRA_SYNC_ENABLED = True
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_backend(database.SQLiteBackend(os.path.join(tmp, 'bench.db')))
+        database.init_database()
+        stub = JiraStub(latency_ms=args.latency_ms).start()
+        User.get_or_create(1)
+        set_base_url(SCOPE_USER, 1, stub.url)
+
+        start = datetime(2025, 1, 1, 9, 0)
+        for i in range(args.worklogs):
+            begin = start + timedelta(hours=i)
+            Task.create(1, f"PROJ-{i % 50 + 1}", start_time=begin).end_task(begin + timedelta(minutes=30))
+        print(f"queued: {jira_sync.queue_stats()}")
+
+        worker = jira_sync.JiraSyncWorker(batch_size=args.batch_size, concurrency=args.concurrency)
+        started = time.perf_counter()
+        while worker.sync_once():
+            pass
+        elapsed = time.perf_counter() - started
+        worker.stop()
+        stub.stop()
+
+        print(f"drained: {jira_sync.queue_stats()}")
+        print(f"{len(stub.worklogs)} worklogs in {elapsed:.2f} s "
+              f"({len(stub.worklogs) / elapsed:.0f}/s, last batch {worker.stats['last_batch_ms']} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Storage and grouping cost of inline task names vs the task_names dictionary.
+
+Generates a synthetic but realistic history (users log a small, skewed set
+of recurring task names, mostly Jira keys with a title) into two SQLite
+files - one with task_name inline, one with task_name_id - then compares
+file sizes and the time of a per-user, per-day "time by task" query.
+
+    python benchmarks/task_name_storage.py --users 200 --days 250
+
+For a production PostgreSQL database compare
+    SELECT pg_size_pretty(pg_total_relation_size('tasks')),
+           pg_size_pretty(pg_total_relation_size('task_names'));
+before and after `python task_names.py migrate` (followed by VACUUM FULL tasks).
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+PROJECTS = ['PROJ', 'DEV', 'BUG', 'OPS', 'DATA']
+TITLES = [
+    'Реализовать выгрузку отчетов', 'Исправить ошибку авторизации', 'Код-ревью',
+    'Планирование спринта', 'Созвон с командой', 'Обновить документацию',
+    'Миграция базы данных', 'Оптимизация запросов', 'Настройка CI', 'Разбор инцидента',
+]
+
+LEGACY_SCHEMA = """
+    CREATE TABLE tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id BIGINT NOT NULL,
+        task_name VARCHAR(500) NOT NULL,
+        comment TEXT,
+        original_message TEXT,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP,
+        is_rest BOOLEAN DEFAULT FALSE
+    );
+    CREATE INDEX idx_tasks_user_start ON tasks(user_id, start_time);
+"""
+
+NORMALIZED_SCHEMA = """
+    CREATE TABLE task_names (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id BIGINT NOT NULL,
+        name VARCHAR(500) NOT NULL,
+        UNIQUE (user_id, name)
+    );
+    CREATE TABLE tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id BIGINT NOT NULL,
+        task_name_id INTEGER REFERENCES task_names(id),
+        task_name VARCHAR(500),
+        comment TEXT,
+        original_message TEXT,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP,
+        is_rest BOOLEAN DEFAULT FALSE
+    );
+    CREATE INDEX idx_tasks_user_start ON tasks(user_id, start_time);
+"""
+
+
+def generate(users: int, days: int, seed: int = 42):
+    """Yield (user_id, task_name, comment, original_message, start, end, is_rest)"""
+    rng = random.Random(seed)
+    first_day = datetime(2024, 1, 1, 6, 0)
+    for user_id in range(1, users + 1):
+        names = [f"{rng.choice(PROJECTS)}-{rng.randint(1, 9999)} {rng.choice(TITLES)}"
+                 for _ in range(30)]
+        # A few tasks take most of a user's time
+        weights = [1.0 / (rank + 1) for rank in range(len(names))]
+        for day in range(days):
+            cursor = first_day + timedelta(days=day)
+            for _ in range(rng.randint(5, 12)):
+                length = timedelta(minutes=rng.randint(10, 120))
+                if rng.random() < 0.15:
+                    name, comment, is_rest = "🏖️ Отдых", None, True
+                else:
+                    name = rng.choices(names, weights)[0]
+                    comment = rng.choice([None, None, "обсудили детали", "продолжение"])
+                    is_rest = False
+                message = f"{name}, {comment}" if comment else name
+                yield user_id, name, comment, message, cursor, cursor + length, is_rest
+                cursor += length
+
+
+def build_legacy(path: str, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("""
+        INSERT INTO tasks (user_id, task_name, comment, original_message, start_time, end_time, is_rest)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.execute("VACUUM")
+    return conn
+
+
+def build_normalized(path: str, rows):
+    conn = sqlite3.connect(path)
+    conn.executescript(NORMALIZED_SCHEMA)
+    ids = {}
+    for user_id, name, *_ in rows:
+        if (user_id, name) not in ids:
+            cursor = conn.execute("INSERT INTO task_names (user_id, name) VALUES (?, ?)",
+                                  (user_id, name))
+            ids[(user_id, name)] = cursor.lastrowid
+    conn.executemany("""
+        INSERT INTO tasks (user_id, task_name_id, comment, original_message, start_time, end_time, is_rest)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [(r[0], ids[(r[0], r[1])], r[2], r[3], r[4], r[5], r[6]) for r in rows])
+    conn.commit()
+    conn.execute("VACUUM")
+    return conn
+
+
+def time_grouping(conn, sql: str, users: int, days: int, samples: int = 500) -> float:
+    """Average milliseconds of a per-user, per-day grouping query"""
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for _ in range(samples):
+        day = datetime(2024, 1, 1) + timedelta(days=rng.randrange(days))
+        conn.execute(sql, (rng.randint(1, users), day, day + timedelta(days=1))).fetchall()
+    return (time.perf_counter() - started) * 1000 / samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--days', type=int, default=250)
+    args = parser.parse_args()
+
+    sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+    rows = list(generate(args.users, args.days))
+    print(f"Dataset: {len(rows)} tasks, {args.users} users, {args.days} days")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        normalized_path = os.path.join(tmp, 'normalized.db')
+        legacy = build_legacy(legacy_path, rows)
+        normalized = build_normalized(normalized_path, rows)
+
+        legacy_size = os.path.getsize(legacy_path)
+        normalized_size = os.path.getsize(normalized_path)
+        print(f"Inline task_name:   {legacy_size / 2**20:8.1f} MiB")
+        print(f"task_names + id:    {normalized_size / 2**20:8.1f} MiB "
+              f"({100 * (1 - normalized_size / legacy_size):.0f}% smaller)")
+
+        by_name = time_grouping(legacy, """
+            SELECT task_name, SUM(julianday(end_time) - julianday(start_time)) FROM tasks
+            WHERE user_id = ? AND start_time >= ? AND start_time < ?
+            GROUP BY task_name, is_rest
+        """, args.users, args.days)
+        by_id = time_grouping(normalized, """
+            SELECT n.name, g.total FROM (
+                SELECT task_name_id, SUM(julianday(end_time) - julianday(start_time)) AS total
+                FROM tasks WHERE user_id = ? AND start_time >= ? AND start_time < ?
+                GROUP BY task_name_id, is_rest
+            ) g JOIN task_names n ON n.id = g.task_name_id
+        """, args.users, args.days)
+        print(f"Group by name:      {by_name:8.3f} ms/query")
+        print(f"Group by id:        {by_id:8.3f} ms/query")
+        legacy.close()
+        normalized.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -364,10 +364,10 @@ async def auto_end_tasks_job(context: ContextTypes.DEFAULT_TYPE):
     """Background job to auto-end tasks that exceed workday"""
     try:
         from models import User, Task
-        from database import get_db
+        from database import get_read_db
         
-        # Get all users with active tasks
-        with get_db() as conn:
+        # Get all users with active tasks (read-only scan, may use the replica)
+        with get_read_db() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT DISTINCT u.user_id, u.timezone, u.workday_start, u.workday_end
@@ -396,7 +396,7 @@ async def auto_end_tasks_job(context: ContextTypes.DEFAULT_TYPE):
                 should_end, end_time = should_auto_end_task(user, start_time)
                 
                 if should_end and end_time:
-                    active_task.end_task(end_time)
+                    active_task.end_task(end_time, auto=True)
                     
                     # Send notification to user
                     duration = active_task.get_duration()
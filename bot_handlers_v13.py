@@ -1,5 +1,5 @@
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, ParseMode
-from telegram.ext import CallbackContext
+from telegram.ext import CallbackContext, DispatcherHandlerStop
 from datetime import datetime, time, timedelta
 import pytz
 import logging
@@ -10,9 +10,21 @@ from time_utils import (
     should_auto_end_task, format_time_for_user,
     create_datetime_from_time
 )
+from update_dedup import UpdateDeduplicator
 
 logger = logging.getLogger(__name__)
 
+update_dedup = None
+
+def drop_duplicate_updates(update: Update, context: CallbackContext):
+    """Stop handling of updates that were already processed"""
+    global update_dedup
+    if update_dedup is None:
+        update_dedup = UpdateDeduplicator(context.bot.id)
+    if not update_dedup.claim(update.update_id):
+        logger.info(f"Skipping duplicate update {update.update_id}")
+        raise DispatcherHandlerStop()
+
 def get_main_keyboard():
     """Get main keyboard with buttons"""
     keyboard = [
@@ -194,30 +206,16 @@ def handle_summary_button(update: Update, context: CallbackContext):
         message_parts.append(f"\n🔄 *Текущая задача:*")
         message_parts.append(f"**{current_display}** (начата в {format_time_for_user(current_task.start_time, user)}, выполняется {format_duration(current_duration)})")
     
-    # Group tasks by name and calculate totals
-    task_groups = {}
-    total_work_time = timedelta()
-    
-    for task in tasks:
-        duration = task.get_duration()
-        
-        if not task.is_rest:
-            total_work_time += duration
-        
-        if task.task_name in task_groups:
-            task_groups[task.task_name]['duration'] += duration
-            task_groups[task.task_name]['tasks'].append(task)
-        else:
-            task_groups[task.task_name] = {
-                'duration': duration,
-                'tasks': [task],
-                'is_rest': task.is_rest
-            }
+    # Time per task name, grouped by task_name_id in SQL
+    task_totals = Task.get_totals_for_date(user_id, today)
+    total_work_time = sum((group['duration'] for group in task_totals if not group['is_rest']),
+                          timedelta())
     
     # Add tasks list
     message_parts.append(f"\n📋 *Задачи за день:*")
     
-    for task_name, group in task_groups.items():
+    for group in task_totals:
+        task_name = group['task_name']
         duration_str = format_duration(group['duration'])
         task_display = format_task_for_display(task_name)
         
@@ -17,4 +17,20 @@ def mock_database():
         mock_conn = MagicMock()
         mock_conn.cursor.return_value = mock_cursor
         mock_get_db.return_value.__enter__.return_value = mock_conn
-        yield mock_cursor
\ No newline at end of file
+        yield mock_cursor
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """Настоящая база SQLite во временном каталоге вместо моков"""
+    import database
+    import task_names
+    import jira_settings
+    backend = database.SQLiteBackend(str(tmp_path / "test.db"))
+    task_names.clear_cache()
+    jira_settings.clear_cache()
+    previous = database._backend
+    database.set_backend(backend)
+    database.init_database()
+    yield backend
+    backend.close()
+    database.set_backend(previous)
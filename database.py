@@ -1,66 +1,314 @@
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import re
+import hashlib
+import sqlite3
+import threading
+import time as time_module
+from datetime import datetime, date, time, timezone
+from functools import lru_cache
 from contextlib import contextmanager
 import logging
 
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost:5432/telegram_bot")
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Reads go to the primary when the replica lags more than this
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "1"))
+# ...or when the user wrote within this window (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
 
-def get_db_connection():
-    """Get database connection"""
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+# Tables shared by all backends. Column types that differ between backends
+# are filled in from the backend's `types` mapping.
+SCHEMA = [
+    # Users table
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        timezone VARCHAR(50) DEFAULT 'Europe/Moscow',
+        workday_start TIME DEFAULT '09:00',
+        workday_end TIME DEFAULT '18:00',
+        reminders_enabled BOOLEAN DEFAULT TRUE,
+        digest_enabled BOOLEAN DEFAULT TRUE,
+        locale VARCHAR(10),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Per-user dictionary of task names
+    """
+    CREATE TABLE IF NOT EXISTS task_names (
+        id {serial_pk},
+        user_id BIGINT NOT NULL,
+        name VARCHAR(500) NOT NULL,
+        UNIQUE (user_id, name)
+    )
+    """,
+    # Tasks table (task_name is only set on rows not yet moved to task_names)
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        id {serial_pk},
+        user_id BIGINT NOT NULL,
+        task_name_id INTEGER REFERENCES task_names(id),
+        task_name VARCHAR(500),
+        comment TEXT,
+        original_message TEXT,
+        start_time TIMESTAMP NOT NULL,
+        end_time TIMESTAMP,
+        is_rest BOOLEAN DEFAULT FALSE,
+        jira_key VARCHAR(50),
+        jira_project VARCHAR(20),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    """,
+    # Index for better performance
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_user_date
+    ON tasks(user_id, DATE(start_time))
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_user_start
+    ON tasks(user_id, start_time)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_active
+    ON tasks(user_id, end_time)
+    WHERE end_time IS NULL
+    """,
+    # Processed Telegram updates (idempotent update handling)
+    """
+    CREATE TABLE IF NOT EXISTS processed_updates (
+        bot_id BIGINT NOT NULL,
+        update_id BIGINT NOT NULL,
+        processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (bot_id, update_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_processed_updates_age
+    ON processed_updates(processed_at)
+    """,
+    # Append-only task event log
+    """
+    CREATE TABLE IF NOT EXISTS task_events (
+        id {bigserial_pk},
+        task_id INTEGER NOT NULL,
+        user_id BIGINT NOT NULL,
+        event_type VARCHAR(20) NOT NULL,
+        payload {json} NOT NULL DEFAULT '{{}}',
+        occurred_at TIMESTAMP NOT NULL,
+        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_task_events_user
+    ON task_events(user_id, id)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_task_events_task
+    ON task_events(task_id, id)
+    """,
+    # Jira instance per user or per chat (see jira_settings.py)
+    """
+    CREATE TABLE IF NOT EXISTS jira_settings (
+        scope VARCHAR(10) NOT NULL,
+        scope_id BIGINT NOT NULL,
+        base_url TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (scope, scope_id)
+    )
+    """,
+    # Worklogs of closed Jira tasks waiting to be sent (see jira_sync.py)
+    """
+    CREATE TABLE IF NOT EXISTS jira_worklog_outbox (
+        id {bigserial_pk},
+        task_id INTEGER NOT NULL UNIQUE,
+        user_id BIGINT NOT NULL,
+        jira_key VARCHAR(50) NOT NULL,
+        started TIMESTAMP NOT NULL,
+        seconds INTEGER NOT NULL,
+        comment TEXT,
+        status VARCHAR(10) NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        sent_at TIMESTAMP,
+        worklog_id VARCHAR(50),
+        last_error TEXT
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_jira_outbox_pending
+    ON jira_worklog_outbox(next_attempt_at)
+    WHERE status = 'pending'
+    """,
+    # Index of per-user monthly archive files (see archive.py)
+    """
+    CREATE TABLE IF NOT EXISTS task_archives (
+        user_id BIGINT NOT NULL,
+        month DATE NOT NULL,
+        path TEXT NOT NULL,
+        task_count INTEGER NOT NULL,
+        archived_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (user_id, month)
+    )
+    """,
+    # Personal tokens of the read-only REST API (see api.py); only the SHA-256 is stored
+    """
+    CREATE TABLE IF NOT EXISTS api_tokens (
+        token_hash CHAR(64) PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_api_tokens_user
+    ON api_tokens(user_id)
+    """,
+    # Teams and their members (see teams.py)
+    """
+    CREATE TABLE IF NOT EXISTS teams (
+        id {serial_pk},
+        name VARCHAR(100) NOT NULL,
+        owner_user_id BIGINT NOT NULL,
+        invite_code VARCHAR(20) NOT NULL UNIQUE,
+        created_at TIMESTAMP NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS team_members (
+        team_id INTEGER NOT NULL REFERENCES teams(id) ON DELETE CASCADE,
+        user_id BIGINT NOT NULL,
+        display_name VARCHAR(100),
+        role VARCHAR(10) NOT NULL DEFAULT 'member',
+        joined_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (team_id, user_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_team_members_user
+    ON team_members(user_id, joined_at)
+    """,
+    # Time per user, local day and task name, refreshed in the background from
+    # the task event log; team dashboards read only this table
+    """
+    CREATE TABLE IF NOT EXISTS user_day_task_totals (
+        user_id BIGINT NOT NULL,
+        day DATE NOT NULL,
+        task_name_id INTEGER NOT NULL,
+        is_rest BOOLEAN NOT NULL,
+        seconds BIGINT NOT NULL,
+        PRIMARY KEY (user_id, day, task_name_id, is_rest)
+    )
+    """,
+    # Last task event folded into a background projection
+    """
+    CREATE TABLE IF NOT EXISTS projection_offsets (
+        name VARCHAR(50) PRIMARY KEY,
+        last_event_id BIGINT NOT NULL,
+        refreshed_at TIMESTAMP
+    )
+    """,
+    # Hash of the schema definition the database was last initialized with
+    """
+    CREATE TABLE IF NOT EXISTS schema_meta (
+        key VARCHAR(50) PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """,
+]
 
-@contextmanager
-def get_db():
-    """Context manager for database connections"""
-    conn = None
-    try:
-        conn = get_db_connection()
-        yield conn
-        conn.commit()
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        logger.error(f"Database error: {e}")
-        raise
-    finally:
-        if conn:
-            conn.close()
+# Columns added after the first release: (table, column, type). Backends add
+# the missing ones to existing databases in migrate().
+ADDED_COLUMNS = [
+    ('tasks', 'task_name_id', 'INTEGER REFERENCES task_names(id)'),
+    ('tasks', 'jira_key', 'VARCHAR(50)'),
+    ('tasks', 'jira_project', 'VARCHAR(20)'),
+    ('users', 'reminders_enabled', 'BOOLEAN DEFAULT TRUE'),
+    ('users', 'digest_enabled', 'BOOLEAN DEFAULT TRUE'),
+    ('users', 'locale', 'VARCHAR(10)'),
+]
 
-def init_database():
-    """Initialize database tables"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                timezone VARCHAR(50) DEFAULT 'Europe/Moscow',
-                workday_start TIME DEFAULT '09:00',
-                workday_end TIME DEFAULT '18:00',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Tasks table
+# Tables of earlier releases that backends drop in migrate()
+DROPPED_TABLES = [
+    # Projection written on every task end but never read; dashboards read user_day_task_totals
+    'daily_task_totals',
+]
+
+# Bump when a backend's migrate() changes without a change to the lists above,
+# so databases initialized by an older version run the migrations again
+SCHEMA_REVISION = 1
+
+# Indexes over added columns, created once migrate() has run
+MIGRATED_INDEXES = [
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_user_jira
+    ON tasks(user_id, jira_key, start_time)
+    WHERE jira_key IS NOT NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_jira_project
+    ON tasks(jira_project, start_time)
+    WHERE jira_key IS NOT NULL
+    """,
+]
+
+
+class PostgresBackend:
+    """PostgreSQL via psycopg2 (production) with a thread-safe connection pool"""
+    name = 'postgres'
+    types = {
+        'serial_pk': 'SERIAL PRIMARY KEY',
+        'bigserial_pk': 'BIGSERIAL PRIMARY KEY',
+        'json': 'JSONB',
+    }
+
+    def __init__(self, url: str, pool_min: int = DB_POOL_MIN, pool_max: int = DB_POOL_MAX):
+        self.url = url
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    from psycopg2.pool import ThreadedConnectionPool
+                    from psycopg2.extras import RealDictCursor
+                    self._pool = ThreadedConnectionPool(self.pool_min, self.pool_max, self.url,
+                                                        cursor_factory=RealDictCursor)
+        return self._pool
+
+    def connect(self):
+        return self._get_pool().getconn()
+
+    def release(self, conn):
+        self._get_pool().putconn(conn, close=bool(conn.closed))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+    def replication_lag(self, cursor) -> float:
+        """Seconds since the last transaction replayed on this (standby) server"""
+        # A replica that has replayed everything it received is not lagging,
+        # however long ago the last transaction was
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                task_name VARCHAR(500) NOT NULL,
-                comment TEXT,
-                original_message TEXT,
-                start_time TIMESTAMP NOT NULL,
-                end_time TIMESTAMP,
-                is_rest BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-            )
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery()
+                  OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END AS lag
         """)
-        
+        return float(cursor.fetchone()['lag'])
+
+    def migrate(self, cursor):
+        """Schema changes for databases created by older versions"""
         # Add column if it doesn't exist (for existing databases)
         try:
             cursor.execute("""
@@ -75,17 +323,395 @@ def init_database():
             except Exception:
                 # Column already exists
                 pass
-        
-        # Index for better performance
+
+        for table, column, column_type in ADDED_COLUMNS:
+            cursor.execute(f"""
+                ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}
+            """)
+        cursor.execute("""
+            ALTER TABLE tasks ALTER COLUMN task_name DROP NOT NULL
+        """)
+        for table in DROPPED_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+        # Full-text search over comments and messages (see search.py)
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tasks_user_date 
-            ON tasks(user_id, DATE(start_time))
+            ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                to_tsvector('simple', coalesce(comment, '') || ' ' || coalesce(original_message, ''))
+            ) STORED
         """)
-        
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tasks_active 
-            ON tasks(user_id, end_time) 
-            WHERE end_time IS NULL
+            CREATE INDEX IF NOT EXISTS idx_tasks_search ON tasks USING GIN (search_vector)
         """)
-        
+        # Substring search over task names; pg_trgm needs a privileged role the
+        # first time, without it ILIKE still works, just without the index
+        cursor.execute("SAVEPOINT trgm")
+        try:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_task_names_trgm
+                ON task_names USING GIN (name gin_trgm_ops)
+            """)
+            cursor.execute("RELEASE SAVEPOINT trgm")
+        except Exception as e:
+            logger.warning(f"pg_trgm unavailable, task name search is not indexed: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT trgm")
+
+    def interval_seconds(self, start: str, end: str) -> str:
+        """SQL expression for the seconds between two timestamp expressions"""
+        return f"EXTRACT(EPOCH FROM ({end} - {start}))"
+
+    def lock_user(self, cursor, user_id: int):
+        """Hold the user's row until the transaction ends, serializing edits of their timeline"""
+        cursor.execute("SELECT user_id FROM users WHERE user_id = %s FOR UPDATE", (user_id,))
+
+    def reserve_ids(self, cursor, table: str, count: int) -> list:
+        """Reserve `count` primary keys of a table from its sequence"""
+        cursor.execute(f"""
+            SELECT nextval('{table}_id_seq') AS id FROM generate_series(1, %s)
+        """, (count,))
+        return [row['id'] for row in cursor.fetchall()]
+
+
+# SQLite stores timestamps as naive UTC ISO strings, the same values
+# psycopg2 returns for TIMESTAMP columns with a UTC session time zone.
+
+def _adapt_datetime(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(time, lambda value: value.isoformat())
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("TIME", lambda value: time.fromisoformat(value.decode()))
+sqlite3.register_converter("BOOLEAN", lambda value: value not in (b'0', b''))
+
+_PLACEHOLDER = re.compile(r'%(s|%)')
+
+
+@lru_cache(maxsize=1024)
+def _to_sqlite_sql(sql: str) -> str:
+    """Translate psycopg2 placeholders; cached so SQLite reuses prepared statements"""
+    return _PLACEHOLDER.sub(lambda m: '?' if m.group(1) == 's' else '%', sql)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """Cursor that accepts psycopg2-style %s placeholders"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(_to_sqlite_sql(sql), tuple(params or ()))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(_to_sqlite_sql(sql), [tuple(p) for p in seq_of_params])
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return SQLiteCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SQLiteBackend:
+    """SQLite for single-node deployments, local runs and tests"""
+    name = 'sqlite'
+    types = {
+        'serial_pk': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'bigserial_pk': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'json': 'TEXT',
+    }
+
+    def __init__(self, path: str):
+        self.path = path
+        # One long-lived connection per thread keeps the statement cache warm
+        self._local = threading.local()
+        self._connections = []
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            raw = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                  check_same_thread=False, cached_statements=512)
+            raw.row_factory = _dict_row
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+            raw.execute("PRAGMA foreign_keys=ON")
+            raw.execute("PRAGMA busy_timeout=5000")
+            # SQLite's own lower() only folds ASCII
+            raw.create_function('unicode_lower', 1,
+                                lambda value: value.lower() if isinstance(value, str) else value,
+                                deterministic=True)
+            conn = SQLiteConnection(raw)
+            self._local.conn = conn
+            self._connections.append(raw)
+        return conn
+
+    def release(self, conn):
+        # Connection stays open for reuse by this thread
+        pass
+
+    def close(self):
+        for raw in self._connections:
+            raw.close()
+        self._connections = []
+        self._local = threading.local()
+
+    def migrate(self, cursor):
+        for table, column, column_type in ADDED_COLUMNS:
+            cursor.execute(f"PRAGMA table_info({table})")
+            if column not in {row['name'] for row in cursor.fetchall()}:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        for table in DROPPED_TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def interval_seconds(self, start: str, end: str) -> str:
+        return f"((julianday({end}) - julianday({start})) * 86400.0)"
+
+    def replication_lag(self, cursor) -> float:
+        return 0.0
+
+    def lock_user(self, cursor, user_id: int):
+        """
+        SQLite has no row locks: take the database write lock before the first read, so
+        a concurrent writer waits (busy_timeout) instead of acting on a stale snapshot
+        """
+        if not cursor.connection.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+
+    def reserve_ids(self, cursor, table: str, count: int) -> list:
+        """Reserve `count` AUTOINCREMENT keys by advancing sqlite_sequence"""
+        cursor.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT %s, 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)
+        """, (table, table))
+        cursor.execute("""
+            UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s RETURNING seq
+        """, (count, table))
+        last = cursor.fetchone()['seq']
+        return list(range(last - count + 1, last + 1))
+
+
+def create_backend(url: str):
+    """Pick a backend from the database URL (sqlite:///path or postgresql://...)"""
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    return PostgresBackend(url)
+
+
+_backend = None
+
+
+def get_backend():
+    """Backend for DATABASE_URL, created on first use"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(DATABASE_URL)
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the active backend (used by tests and tools)"""
+    global _backend
+    _backend = backend
+
+
+class ReplicaRouter:
+    """Decides whether a read-only query may run on the replica"""
+
+    def __init__(self, replica, max_lag: float = REPLICA_MAX_LAG_SECONDS,
+                 lag_check_interval: float = REPLICA_LAG_CHECK_SECONDS,
+                 read_your_writes: float = READ_YOUR_WRITES_SECONDS):
+        self.replica = replica
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.read_your_writes = read_your_writes
+        self._recent_writes = {}
+        self._lag = 0.0
+        self._lag_checked_at = None
+        self._lock = threading.Lock()
+        self.stats = {
+            'replica_reads': 0,
+            'primary_reads': 0,
+            'lag_fallbacks': 0,
+            'read_your_writes_fallbacks': 0,
+            'replica_errors': 0,
+        }
+
+    def note_write(self, user_id: int):
+        now = time_module.monotonic()
+        with self._lock:
+            self._recent_writes[user_id] = now
+            if len(self._recent_writes) > 10000:
+                cutoff = now - self.read_your_writes
+                self._recent_writes = {
+                    uid: ts for uid, ts in self._recent_writes.items() if ts >= cutoff
+                }
+
+    def _wrote_recently(self, user_id: int) -> bool:
+        written_at = self._recent_writes.get(user_id)
+        return written_at is not None and time_module.monotonic() - written_at < self.read_your_writes
+
+    def replica_lag(self) -> float:
+        """Replica lag in seconds, re-measured at most once per check interval"""
+        now = time_module.monotonic()
+        if self._lag_checked_at is None or now - self._lag_checked_at >= self.lag_check_interval:
+            self._lag_checked_at = now
+            conn = self.replica.connect()
+            try:
+                self._lag = self.replica.replication_lag(conn.cursor())
+                conn.commit()
+            finally:
+                self.replica.release(conn)
+        return self._lag
+
+    def choose(self, user_id=None):
+        """Return the replica backend, or None to read from the primary"""
+        if user_id is not None and self._wrote_recently(user_id):
+            self.stats['read_your_writes_fallbacks'] += 1
+            self.stats['primary_reads'] += 1
+            return None
+        try:
+            lag = self.replica_lag()
+        except Exception as e:
+            logger.warning(f"Replica unavailable, reading from primary: {e}")
+            self.stats['replica_errors'] += 1
+            self.stats['primary_reads'] += 1
+            return None
+        if lag > self.max_lag:
+            self.stats['lag_fallbacks'] += 1
+            self.stats['primary_reads'] += 1
+            return None
+        self.stats['replica_reads'] += 1
+        return self.replica
+
+
+_router = None
+
+
+def get_replica_router():
+    """Router for DATABASE_REPLICA_URL, or None when no replica is configured"""
+    global _router
+    if _router is None and DATABASE_REPLICA_URL:
+        _router = ReplicaRouter(create_backend(DATABASE_REPLICA_URL))
+    return _router
+
+
+def note_user_write(user_id: int):
+    """Remember a user's write so their next reads see it (read-your-writes)"""
+    router = get_replica_router()
+    if router:
+        router.note_write(user_id)
+
+
+def get_db_connection():
+    """Get database connection"""
+    return get_backend().connect()
+
+@contextmanager
+def get_db():
+    """Context manager for database connections"""
+    with _session(get_backend()) as conn:
+        yield conn
+
+@contextmanager
+def get_read_db(user_id=None):
+    """
+    Context manager for read-only reporting queries. Uses the replica when
+    one is configured, it is not lagging, and the user has not just written.
+    """
+    router = get_replica_router()
+    backend = router.choose(user_id) if router else None
+    with _session(backend or get_backend()) as conn:
+        yield conn
+
+@contextmanager
+def _session(backend):
+    conn = None
+    try:
+        conn = backend.connect()
+        yield conn
+        conn.commit()
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        if conn:
+            backend.release(conn)
+
+def close_pools():
+    """Close pooled connections of the primary and the replica"""
+    for backend in (_backend, _router.replica if _router else None):
+        if backend is not None and hasattr(backend, 'close'):
+            backend.close()
+
+def schema_hash(backend) -> str:
+    """Fingerprint of the schema this version of the code expects"""
+    definition = repr((backend.name, SCHEMA, ADDED_COLUMNS, DROPPED_TABLES, MIGRATED_INDEXES,
+                       SCHEMA_REVISION))
+    return hashlib.sha1(definition.encode('utf-8')).hexdigest()
+
+def schema_is_current(backend) -> bool:
+    """One primary-key lookup: was the database initialized with this schema?"""
+    conn = backend.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM schema_meta WHERE key = 'schema_hash'")
+        row = cursor.fetchone()
+        return row is not None and row['value'] == schema_hash(backend)
+    except Exception:
+        # No schema_meta yet: a new database or one created by an older version
+        return False
+    finally:
+        conn.rollback()
+        backend.release(conn)
+
+def init_database(force: bool = False):
+    """Initialize database tables (skipped when the schema is already current)"""
+    backend = get_backend()
+    if not force and schema_is_current(backend):
+        logger.info("Database schema is up to date")
+        return
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        for statement in SCHEMA:
+            cursor.execute(statement.format(**backend.types))
+
+        backend.migrate(cursor)
+
+        for statement in MIGRATED_INDEXES:
+            cursor.execute(statement)
+
+        cursor.execute("""
+            INSERT INTO schema_meta (key, value) VALUES ('schema_hash', %s)
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+        """, (schema_hash(backend),))
+
         logger.info("Database initialized successfully")
@@ -0,0 +1,298 @@
+"""
+End-of-day digest: every user gets the day's summary at their workday_end.
+
+    DIGEST=1
+
+Users are grouped into buckets by (timezone, workday_end); all users of a
+bucket have the same local day and the same send time. A timer wheel
+holds the next firing of each bucket. When a bucket fires, the tasks of
+all its users for the local day are read with set-based queries (one per
+QUERY_CHUNK_SIZE users) instead of one query per user, summaries are rendered in a thread pool and queued for a sender that
+keeps to DIGEST_RATE_PER_SECOND. Days without tasks get no digest.
+
+`/status` shows the timing of the last bucket runs: members, query and
+render time, digests queued and how long the bucket took until its last
+digest was sent.
+"""
+import os
+import threading
+import time as time_module
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
+from typing import Optional, List, Dict, Any, Tuple, Callable
+import pytz
+import logging
+
+from database import get_db, note_user_write
+from models import User, Task, TASK_SELECT, MAX_TASK_DAYS
+from summary import prepare_day_summary, render_day_summary
+from task_parser import DEFAULT_JIRA_BASE_URL
+from reminders import TimerWheel, TokenBucket, DEFAULT_RETRY_AFTER_SECONDS
+from jira_settings import SCOPE_USER
+from i18n import t, user_locale
+import shutdown
+
+logger = logging.getLogger(__name__)
+
+DIGEST_ENABLED = os.getenv("DIGEST", "").lower() in ("1", "true", "yes")
+DIGEST_RATE_PER_SECOND = float(os.getenv("DIGEST_RATE_PER_SECOND", "10"))
+DIGEST_RENDER_WORKERS = int(os.getenv("DIGEST_RENDER_WORKERS", "4"))
+# Buckets created by settings changed in other processes are picked up this often
+DIGEST_BUCKET_REFRESH_SECONDS = float(os.getenv("DIGEST_BUCKET_REFRESH_SECONDS", "600"))
+BUCKET_HISTORY = 50
+QUERY_CHUNK_SIZE = 1000
+
+Bucket = Tuple[str, time]
+
+
+def _as_time(value) -> time:
+    # SQLite without declared types returns TIME columns as text
+    return time.fromisoformat(value) if isinstance(value, str) else value
+
+
+def bucket_name(bucket: Bucket) -> str:
+    return f"{bucket[0]} {bucket[1].strftime('%H:%M')}"
+
+
+def next_firing(bucket: Bucket, after: datetime) -> Tuple[datetime, datetime]:
+    """(naive UTC instant, local day) of the bucket's first workday end after `after`"""
+    tz = pytz.timezone(bucket[0])
+    day = pytz.utc.localize(after).astimezone(tz).date()
+    for offset in range(3):
+        current = day + timedelta(days=offset)
+        at = tz.localize(datetime.combine(current, bucket[1])).astimezone(pytz.utc).replace(tzinfo=None)
+        if at > after:
+            return at, datetime.combine(current, time.min)
+    raise ValueError(f"no workday end after {after} for {bucket_name(bucket)}")
+
+
+def list_buckets() -> List[Bucket]:
+    """Distinct (timezone, workday_end) of users receiving digests"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT timezone, workday_end FROM users WHERE digest_enabled = %s
+        """, (True,))
+        return [(row['timezone'], _as_time(row['workday_end'])) for row in cursor.fetchall()]
+
+
+def load_bucket(bucket: Bucket, day: datetime) -> Tuple[List[User], Dict[int, List[Task]], Dict[int, str]]:
+    """Members of the bucket, their tasks overlapping the local day and their Jira base URLs"""
+    timezone, workday_end = bucket
+    members = []
+    base_urls = {}
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # workday_end is compared in Python: SQLite keeps '18:00' and '18:00:00' as different text
+        cursor.execute("""
+            SELECT u.user_id, u.workday_start, u.workday_end, u.locale, j.base_url
+            FROM users u
+            LEFT JOIN jira_settings j ON j.scope = %s AND j.scope_id = u.user_id
+            WHERE u.timezone = %s AND u.digest_enabled = %s
+        """, (SCOPE_USER, timezone, True))
+        for row in cursor.fetchall():
+            if _as_time(row['workday_end']) == workday_end:
+                members.append(User(row['user_id'], timezone, _as_time(row['workday_start']), workday_end,
+                                    row['locale']))
+                base_urls[row['user_id']] = row['base_url'] or DEFAULT_JIRA_BASE_URL
+        if not members:
+            return [], {}, {}
+
+        # Every member has the same local day, so one query per chunk of members covers the bucket
+        start_utc, end_utc = members[0].get_day_bounds_utc(day)
+        tasks = defaultdict(list)
+        for offset in range(0, len(members), QUERY_CHUNK_SIZE):
+            user_ids = [user.user_id for user in members[offset:offset + QUERY_CHUNK_SIZE]]
+            cursor.execute(TASK_SELECT + f"""
+                WHERE t.user_id IN ({', '.join(['%s'] * len(user_ids))})
+                  AND t.start_time <= %s AND (t.end_time IS NULL OR t.end_time > %s)
+                  AND (t.start_time >= %s OR t.end_time IS NULL)
+                ORDER BY t.user_id, t.start_time
+            """, (*user_ids, end_utc, start_utc, start_utc - timedelta(days=MAX_TASK_DAYS)))
+            for row in cursor.fetchall():
+                tasks[row['user_id']].append(Task.from_row(row))
+    return members, tasks, base_urls
+
+
+def render_digest(user: User, tasks: List[Task], day: datetime, base_url: str) -> Optional[str]:
+    """Summary text of the user's day, or None for a day without tasks"""
+    if not tasks:
+        return None
+    summary = prepare_day_summary(user, tasks, day.date(), base_url, user.get_day_bounds_utc(day))
+    text = render_day_summary(summary, user)
+    return text + "\n\n" + t(user_locale(user), 'digest_disable_hint') if text else None
+
+
+def set_enabled(user_id: int, enabled: bool):
+    """Turn the daily digest on or off for the user"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET digest_enabled = %s WHERE user_id = %s", (enabled, user_id))
+    note_user_write(user_id)
+
+
+class DigestScheduler:
+    """Fires buckets at their workday end and sends the rendered digests at a limited rate"""
+
+    def __init__(self, send: Callable[[int, str], None], rate_per_second: float = DIGEST_RATE_PER_SECOND,
+                 render_workers: int = DIGEST_RENDER_WORKERS):
+        self.send = send
+        self._wheel = TimerWheel(time_module.time())
+        self._bucket = TokenBucket(rate_per_second)
+        self._executor = ThreadPoolExecutor(max_workers=render_workers, thread_name_prefix='digest-render')
+        self._new_buckets = deque()
+        # (user_id, text, bucket run)
+        self._outbox = deque()
+        self._send_ready = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._last_refresh = 0.0
+        self.runs = deque(maxlen=BUCKET_HISTORY)
+        self.stats = {'buckets': 0, 'runs': 0, 'queued': 0, 'sent': 0, 'failed': 0, 'throttled': 0}
+
+    # Lifecycle
+
+    def start(self):
+        self.refresh_buckets()
+        for name, target in (('digest', self._run), ('digest-sender', self._run_sender)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"End-of-day digest enabled for {len(self._wheel)} buckets")
+
+    def stop(self):
+        self._stopped.set()
+        self._send_ready.set()
+        for thread in self._threads:
+            thread.join()
+        self._executor.shutdown(wait=True)
+
+    # Buckets
+
+    def add_bucket(self, timezone: str, workday_end: time):
+        """Make sure a bucket exists after a user changed settings (thread-safe)"""
+        self._new_buckets.append((timezone, _as_time(workday_end)))
+
+    def refresh_buckets(self):
+        self._last_refresh = time_module.monotonic()
+        for bucket in list_buckets():
+            self._schedule(bucket, replace=False)
+
+    def _schedule(self, bucket: Bucket, replace: bool = True):
+        if not replace and bucket in self._wheel:
+            return
+        at, day = next_firing(bucket, datetime.utcnow())
+        self._wheel.schedule(bucket, (at - datetime(1970, 1, 1)).total_seconds(), day)
+        self.stats['buckets'] = len(self._wheel)
+
+    def _run(self):
+        while not self._stopped.wait(self._wheel.tick_seconds):
+            try:
+                while self._new_buckets:
+                    self._schedule(self._new_buckets.popleft(), replace=False)
+                if time_module.monotonic() - self._last_refresh > DIGEST_BUCKET_REFRESH_SECONDS:
+                    self.refresh_buckets()
+                for bucket, day in self._wheel.advance(time_module.time()):
+                    # Next firing first: a failed run must not drop the bucket
+                    self._schedule(bucket)
+                    self.fire(bucket, day)
+            except Exception as e:
+                logger.error(f"Digest scheduling failed: {e}")
+
+    def fire(self, bucket: Bucket, day: datetime) -> Dict[str, Any]:
+        """Compute and queue the digests of one bucket; returns its timing record"""
+        started = time_module.perf_counter()
+        members, tasks, base_urls = load_bucket(bucket, day)
+        queried = time_module.perf_counter()
+        texts = list(self._executor.map(
+            lambda user: render_digest(user, tasks.get(user.user_id, []), day, base_urls[user.user_id]),
+            members))
+        rendered = time_module.perf_counter()
+
+        run = {
+            'bucket': bucket_name(bucket),
+            'day': day.date().isoformat(),
+            'members': len(members),
+            'query_ms': round((queried - started) * 1000, 1),
+            'render_ms': round((rendered - queried) * 1000, 1),
+            'queued': 0,
+            'remaining': 0,
+            'delivered_ms': None,
+            '_started': started,
+        }
+        for user, text in zip(members, texts):
+            if text:
+                self._outbox.append((user.user_id, text, run))
+                run['queued'] += 1
+        run['remaining'] = run['queued']
+        if not run['queued']:
+            run['delivered_ms'] = run['query_ms'] + run['render_ms']
+        self.runs.append(run)
+        self.stats['runs'] += 1
+        self.stats['queued'] += run['queued']
+        self._send_ready.set()
+        logger.info(f"Digest bucket {run['bucket']}: {run['queued']} of {run['members']} users, "
+                    f"query {run['query_ms']} ms, render {run['render_ms']} ms")
+        return run
+
+    # Sending
+
+    def _run_sender(self):
+        while not self._stopped.is_set():
+            if not self._outbox:
+                self._send_ready.wait(1)
+                self._send_ready.clear()
+                continue
+            delay = self._bucket.wait_time()
+            if delay:
+                self._stopped.wait(delay)
+                continue
+            user_id, text, run = self._outbox.popleft()
+            try:
+                self.send(user_id, text)
+                self.stats['sent'] += 1
+            except Exception as e:
+                code = getattr(e, 'error_code', None)
+                if code == 429:
+                    retry_after = (getattr(e, 'result_json', None) or {}).get('parameters', {}).get(
+                        'retry_after', DEFAULT_RETRY_AFTER_SECONDS)
+                    self.stats['throttled'] += 1
+                    self._outbox.appendleft((user_id, text, run))
+                    self._stopped.wait(retry_after)
+                    continue
+                if code == 403:
+                    # The user blocked the bot
+                    set_enabled(user_id, False)
+                logger.error(f"Digest for user {user_id} failed: {e}")
+                self.stats['failed'] += 1
+            run['remaining'] -= 1
+            if run['remaining'] == 0:
+                run['delivered_ms'] = round((time_module.perf_counter() - run['_started']) * 1000, 1)
+
+    def bucket_stats(self) -> List[Dict[str, Any]]:
+        """Timing of the most recent bucket runs, newest first"""
+        return [{key: value for key, value in run.items() if not key.startswith('_')}
+                for run in reversed(self.runs)]
+
+
+_scheduler: Optional[DigestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def sending_rate() -> float:
+    """Messages per second the digest sender takes out of the bot's budget; 0 when disabled"""
+    return DIGEST_RATE_PER_SECOND if DIGEST_ENABLED else 0.0
+
+
+def get_digest(send: Optional[Callable[[int, str], None]] = None) -> Optional[DigestScheduler]:
+    """Return the process-wide scheduler, started on the first call with `send`; None when disabled"""
+    global _scheduler
+    if not DIGEST_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None and send is not None:
+            _scheduler = DigestScheduler(send)
+            _scheduler.start()
+            shutdown.register('digest', _scheduler.stop, shutdown.ORDER_STOP_WORKERS)
+    return _scheduler
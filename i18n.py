@@ -0,0 +1,590 @@
+"""
+User-facing message catalog in Russian and English.
+
+Every message is a template with `{name}` fields. The catalog is parsed once
+at import into literal pieces and field slots and checked for consistency:
+each locale must define the same keys with the same fields, so a missing
+translation fails at startup rather than in a handler. Rendering fills the
+slots and joins the pieces, without re-parsing a format string per message.
+
+Values are inserted as is. Text typed by users (comments, team names) must
+go through `escape_markdown()` before it is put into a Markdown message.
+
+A user's locale is kept in users.locale; NULL means the user has not chosen
+one and DEFAULT_LOCALE applies.
+"""
+import os
+import re
+import string
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+LOCALES = ('ru', 'en')
+DEFAULT_LOCALE = os.getenv("DEFAULT_LOCALE", "ru")
+if DEFAULT_LOCALE not in LOCALES:
+    DEFAULT_LOCALE = 'ru'
+
+LANGUAGE_NAMES = {'ru': 'Русский', 'en': 'English'}
+
+# Characters with a meaning in Telegram's (legacy) Markdown parse mode
+_MARKDOWN_SPECIAL = re.compile(r'([_*`\[])')
+
+MESSAGES: Dict[str, Dict[str, str]] = {
+    'ru': {
+        # Keyboard
+        'btn_rest': "🏖️ Отдых",
+        'btn_summary': "📊 Сводка",
+        'btn_help': "❓ Помощь",
+
+        # Durations
+        'duration_hours_minutes': "{hours} ч {minutes} мин",
+        'duration_hours': "{hours} ч",
+        'duration_minutes': "{minutes} мин",
+
+        'welcome': """
+🎯 *Добро пожаловать в Telegram-бот для трекинга времени!*
+
+Я помогу вам эффективно отслеживать время работы над задачами.
+
+*Основные возможности:*
+• Автоматический учет времени задач
+• Интеграция с Jira (поддержка ссылок и тикетов)
+• Настройка часового пояса и рабочего времени
+• Автоматическое завершение задач
+• Детальная аналитика и отчеты
+
+*Быстрый старт:*
+1. Настройте часовой пояс: `/set_timezone Europe/Moscow`
+2. Установите рабочие часы: `/set_workday 09:00 18:00`
+3. Создайте задачу: просто отправьте название задачи
+
+*Текущие настройки:*
+• Часовой пояс: {timezone}
+• Рабочее время: {workday_start} - {workday_end}
+• Язык: {language} (изменить: `/language en`)
+
+Используйте кнопки ниже для быстрого доступа к функциям.
+""",
+        'help': """
+❓ *Справка по использованию бота*
+
+*📋 Основные команды:*
+• `/start` - Запуск бота и показ настроек
+• `/set_timezone Europe/Moscow` - Установка часового пояса
+• `/set_workday 09:00 18:00` - Установка рабочих часов
+• `/language ru` / `/language en` - Язык сообщений
+• `/set_jira https://jira.example.com` - Адрес вашей Jira для ссылок
+• `/api_token` - Токен для доступа к вашим задачам через API
+• `/find PROJ-123` - Поиск по истории задач
+• `/ticket PROJ-123` - Время по тикету Jira
+• `/team` или `/team week` - Сводка команды за день или неделю
+• `/team_create Название` / `/team_join КОД` - Создать команду или вступить в нее
+• `/stats` или `/stats 90` - Статистика за 30 (90) дней, `/stats team` - по команде
+• `/reminders on` / `/reminders off` - Напоминания, если в рабочее время нет активной задачи
+• `/digest on` / `/digest off` - Сводка за день в конце рабочего дня
+
+*🔥 Быстрые действия:*
+• 🏖️ *Отдых* - Начать перерыв
+• 📊 *Сводка* - Показать отчет за день
+• ❓ *Помощь* - Эта справка
+
+*📝 Создание задач:*
+Просто отправьте сообщение с названием задачи:
+• `Разработка нового функционала`
+• `Встреча с командой`
+• `Код-ревью`
+
+*🕐 Указание времени:*
+• `14:30 Важная встреча` - Задача с определенным временем
+• `14_30 Код-ревью` - Альтернативный формат времени
+
+*🔗 Jira интеграция:*
+• `PROJ-123 Исправление бага` - Автоматическая ссылка на тикет
+• `https://jira.company.com/browse/TASK-456` - Прямая ссылка
+
+*💬 Комментарии к задачам:*
+• `Разработка API - добавить новые методы`
+• `Встреча - обсуждение планов на спринт`
+
+*🤖 Автоматические функции:*
+• Автоматическое завершение предыдущей задачи при создании новой
+• Завершение задач по окончании рабочего дня
+• Обновление задачи, если отправлено то же название в то же время
+
+*📊 Аналитика:*
+• Подсчет рабочего времени и времени отдыха
+• Детальная статистика по задачам
+• Сводки за день с разбивкой по времени
+
+Бот поддерживает многопользовательский режим и сохраняет все данные в базе данных.
+""",
+
+        # Settings
+        'timezone_usage': "❌ Неверный формат команды. Используйте: `/set_timezone Europe/Moscow`",
+        'timezone_set': "✅ Часовой пояс успешно установлен: {timezone}",
+        'timezone_invalid': "❌ Неверный часовой пояс: {timezone}\n\n"
+                            "Примеры правильных часовых поясов:\n"
+                            "• Europe/Moscow\n• Europe/London\n• America/New_York\n• Asia/Tokyo",
+        'timezone_error': "❌ Произошла ошибка при установке часового пояса",
+        'workday_usage': "❌ Неверный формат команды. Используйте: `/set_workday 09:00 18:00`",
+        'workday_bad_time': "❌ Неверный формат времени. Используйте формат HH:MM (например, 09:00)",
+        'workday_set': "✅ Рабочее время успешно установлено: {start} - {end}",
+        'workday_error': "❌ Произошла ошибка при установке рабочего времени",
+        'language_usage': "🌐 Язык: {language}\n\nИзменить: `/language ru` или `/language en`",
+        'language_set': "✅ Язык сообщений: {language}",
+        'language_error': "❌ Произошла ошибка при смене языка",
+
+        # Tasks
+        'rest_task_name': "Отдых",
+        'rest_task_comment': "Перерыв в работе",
+        'rest_started': "🏖️ Отдых начат в {time}\n\n"
+                        "Отправьте любое сообщение с названием задачи, чтобы завершить отдых и начать новую задачу.",
+        'rest_error': "❌ Произошла ошибка при начале отдыха",
+        'task_not_recognized': "❌ Не удалось распознать название задачи",
+        'task_created': "✅ *Задача создана:*\n{task}\n\n🕐 Время начала: {time}",
+        'task_updated': "✏️ *Задача обновлена:*\n{task}\n\n🕐 Время: {time}",
+        'task_added': "✅ *Задача добавлена:*\n{task}\n\n🕐 Время: {start} - {end}",
+        'task_trimmed': "✂️ {task} завершена в {time}",
+        'task_start_taken': "❌ В {time} уже начата другая задача",
+        'task_comment': "💬 {comment}",
+        'task_error': "❌ Произошла ошибка при создании задачи",
+        'not_finished': "не завершена",
+
+        # Day summary
+        'summary_title': "📊 *Сводка за {date}*",
+        'summary_work_time': "⏰ *Рабочее время:* {duration}",
+        'summary_rest_time': "🏖️ *Время отдыха:* {duration}",
+        'summary_total_time': "📈 *Общее время:* {duration}",
+        'summary_work_header': "*🔧 Рабочие задачи:*",
+        'summary_rest_header': "*🏖️ Периоды отдыха:*",
+        'summary_task': "• {task}",
+        'summary_task_time': "  ⏰ {start} - {end} ({duration})",
+        'summary_task_comment': "  💬 {comment}",
+        'summary_rest': "• {start} - {end} ({duration})",
+        'summary_rest_not_finished': "не завершен",
+        'summary_day_part': "{day} за день, всего {total}",
+        'summary_empty': "📊 *Сводка за {date}*\n\n❌ За сегодня задач не найдено.",
+        'summary_error': "❌ Произошла ошибка при создании сводки",
+        'digest_disable_hint': "Отключить ежедневную сводку: /digest off",
+
+        # Reminders
+        'reminder_rest': "☕ Отдых длится уже больше {minutes} мин. Отправьте название задачи, чтобы вернуться к работе.",
+        'reminder_idle': "⏰ Уже {minutes} мин нет активной задачи. Над чем вы работаете?",
+        'reminder_start': "⏰ Рабочий день начался, а задача не запущена. Отправьте название задачи, чтобы начать учет.",
+        'reminders_disable_hint': "Отключить напоминания: /reminders off",
+
+        # Paged reports
+        'report_expired': "Отчет устарел, запросите его заново",
+        'report_page_error': "❌ Не удалось показать страницу",
+
+        # Jira address
+        'jira_current': "🔗 Jira: {url}\n\nИзменить: `/set_jira https://jira.example.com`\nСбросить: `/set_jira reset`",
+        'jira_usage': "❌ Неверный формат команды. Используйте: `/set_jira https://jira.example.com`",
+        'jira_invalid': "❌ Неверный адрес. Пример: `https://jira.example.com`",
+        'jira_reset_user': "✅ Адрес Jira для вас сброшен",
+        'jira_reset_chat': "✅ Адрес Jira для этого чата сброшен",
+        'jira_set_user': "✅ Адрес Jira для вас установлен: {url}",
+        'jira_set_chat': "✅ Адрес Jira для этого чата установлен: {url}",
+        'jira_error': "❌ Произошла ошибка при установке адреса Jira",
+
+        # API token
+        'api_token_private_only': "🔒 Токен API выдается только в личном чате с ботом",
+        'api_token_revoked': "✅ Токен API отозван",
+        'api_token_none': "🔒 У вас нет токена API",
+        'api_token_issued': "🔑 Ваш токен API (предыдущий больше не действует):\n`{token}`\n\n"
+                            "Запросы: `GET /api/users/{user_id}/tasks?from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД` и "
+                            "`/api/users/{user_id}/summary?date=ГГГГ-ММ-ДД` с заголовком "
+                            "`Authorization: Bearer <токен>`.\n\n"
+                            "Отозвать: `/api_token revoke`",
+        'api_token_error': "❌ Произошла ошибка при выдаче токена",
+
+        # Reminder and digest settings
+        'reminders_usage': "❌ Неверный формат команды. Используйте: `/reminders on` или `/reminders off`",
+        'reminders_on': "🔔 Напоминания включены: бот напомнит, если в рабочее время нет активной задачи",
+        'reminders_off': "🔕 Напоминания отключены",
+        'reminders_error': "❌ Произошла ошибка при изменении настроек напоминаний",
+        'digest_usage': "❌ Неверный формат команды. Используйте: `/digest on` или `/digest off`",
+        'digest_on': "🔔 Сводка за день будет приходить в конце рабочего дня",
+        'digest_off': "🔕 Ежедневная сводка отключена",
+        'digest_error': "❌ Произошла ошибка при изменении настроек сводки",
+
+        # Search
+        'find_usage': "❌ Укажите, что искать. Например: `/find PROJ-123` или `/find код-ревью`",
+        'find_nothing': "🔎 По запросу `{query}` ничего не найдено.",
+        'find_title': "🔎 *Поиск:* `{query}`",
+        'find_title_continued': "🔎 *Поиск:* `{query}` (продолжение)",
+        'find_found': "Найдено задач: {count}, общее время: {duration}",
+        'find_task': "• {day} {start} - {end} ({duration}) {task}",
+        'find_next': "Далее ▶",
+        'find_expired': "Поиск устарел, повторите /find",
+        'find_error': "❌ Произошла ошибка при поиске",
+
+        # Ticket report
+        'ticket_usage': "❌ Неверный формат команды. Используйте: `/ticket PROJ-123`",
+        'ticket_not_found': "🎫 По тикету {key} время не найдено.",
+        'ticket_title': "🎫 {ticket}",
+        'ticket_total': "⏰ *Всего:* {duration} ({count} записей)",
+        'ticket_period': "📅 *Период:* {first} - {last}",
+        'ticket_days_header': "*По дням:*",
+        'ticket_day': "• {day}: {duration}",
+        'ticket_more_days': "… и еще {count} дн.",
+        'ticket_error': "❌ Произошла ошибка при создании отчета по тикету",
+
+        # Teams
+        'team_create_usage': "❌ Неверный формат команды. Используйте: `/team_create Название команды`",
+        'team_created': "👥 Команда *{name}* создана.\n\n"
+                        "Чтобы присоединиться, участники отправляют:\n`/team_join {code}`",
+        'team_create_error': "❌ Произошла ошибка при создании команды",
+        'team_join_usage': "❌ Неверный формат команды. Используйте: `/team_join КОД`",
+        'team_not_found': "❌ Команда с таким кодом не найдена",
+        'team_joined': "✅ Вы в команде *{name}*",
+        'team_join_error': "❌ Произошла ошибка при вступлении в команду",
+        'team_not_member': "👥 Вы не состоите в команде",
+        'team_left': "✅ Вы вышли из команды *{name}*",
+        'team_leave_error': "❌ Произошла ошибка при выходе из команды",
+        'team_none': "👥 Вы не состоите в команде.\n\n"
+                     "Создать: `/team_create Название`\nПрисоединиться: `/team_join КОД`",
+        'team_title': "👥 *{name}* за {period}",
+        'team_members_header': "*По участникам:*",
+        'team_member': "• {name}: {duration}",
+        'team_tasks_header': "*По задачам:*",
+        'team_task': "• {name}: {duration}",
+        'team_task_shared': "• {name}: {duration} ({count} уч.)",
+        'team_refreshed': "_Обновлено в {time}_",
+        'team_error': "❌ Произошла ошибка при создании сводки команды",
+
+        # Long-range statistics
+        'stats_range': "❌ Период - от 1 до {max_days} дней. Например: `/stats 90`",
+        'stats_title': "📊 *Статистика* за {start} - {end}",
+        'stats_title_team': "📊 *Статистика команды {team}* за {start} - {end}",
+        'stats_empty': "За этот период задач нет.",
+        'stats_work': "⏰ *Работа:* {duration} (в среднем {average} за {days} дн.)",
+        'stats_rest': "🏖️ *Отдых:* {duration} ({percent}% времени)",
+        'stats_switches': "🔀 *Переключений между задачами:* {count} ({per_day} в день)",
+        'stats_focus': "🎯 *Самый долгий фокус:* {duration} - {task} ({date})",
+        'stats_hours': "🕐 *Самые рабочие часы:* {hours}",
+        'stats_error': "❌ Произошла ошибка при подсчете статистики",
+    },
+    'en': {
+        # Keyboard
+        'btn_rest': "🏖️ Rest",
+        'btn_summary': "📊 Summary",
+        'btn_help': "❓ Help",
+
+        # Durations
+        'duration_hours_minutes': "{hours} h {minutes} min",
+        'duration_hours': "{hours} h",
+        'duration_minutes': "{minutes} min",
+
+        'welcome': """
+🎯 *Welcome to the time tracking bot!*
+
+I will help you keep track of the time you spend on your tasks.
+
+*Features:*
+• Automatic task time tracking
+• Jira integration (links and ticket keys)
+• Timezone and working hours settings
+• Automatic task completion
+• Detailed statistics and reports
+
+*Quick start:*
+1. Set your timezone: `/set_timezone Europe/London`
+2. Set your working hours: `/set_workday 09:00 18:00`
+3. Start a task: just send its name
+
+*Current settings:*
+• Timezone: {timezone}
+• Working hours: {workday_start} - {workday_end}
+• Language: {language} (change: `/language ru`)
+
+Use the buttons below for quick access.
+""",
+        'help': """
+❓ *How to use the bot*
+
+*📋 Commands:*
+• `/start` - Start the bot and show your settings
+• `/set_timezone Europe/London` - Set your timezone
+• `/set_workday 09:00 18:00` - Set your working hours
+• `/language ru` / `/language en` - Message language
+• `/set_jira https://jira.example.com` - Your Jira address for links
+• `/api_token` - Token for API access to your tasks
+• `/find PROJ-123` - Search your task history
+• `/ticket PROJ-123` - Time spent on a Jira ticket
+• `/team` or `/team week` - Team summary for the day or week
+• `/team_create Name` / `/team_join CODE` - Create or join a team
+• `/stats` or `/stats 90` - Statistics for 30 (90) days, `/stats team` - for your team
+• `/reminders on` / `/reminders off` - Reminders when no task is running during working hours
+• `/digest on` / `/digest off` - Daily summary at the end of the working day
+
+*🔥 Quick actions:*
+• 🏖️ *Rest* - Take a break
+• 📊 *Summary* - Today's report
+• ❓ *Help* - This help
+
+*📝 Starting tasks:*
+Just send a message with the task name:
+• `New feature development`
+• `Team meeting`
+• `Code review`
+
+*🕐 Start time:*
+• `14:30 Important meeting` - Task started at a given time
+• `14_30 Code review` - Alternative time format
+
+*🔗 Jira integration:*
+• `PROJ-123 Fix the bug` - Automatic ticket link
+• `https://jira.company.com/browse/TASK-456` - Direct link
+
+*💬 Task comments:*
+• `API development - add new methods`
+• `Meeting - sprint planning`
+
+*🤖 Automation:*
+• The previous task ends when a new one starts
+• Tasks end at the end of the working day
+• Sending the same name at the same time updates the task
+
+*📊 Analytics:*
+• Work and rest time totals
+• Detailed per-task statistics
+• Daily summaries with a time breakdown
+
+The bot supports many users and keeps all data in its database.
+""",
+
+        # Settings
+        'timezone_usage': "❌ Invalid command format. Use: `/set_timezone Europe/London`",
+        'timezone_set': "✅ Timezone set: {timezone}",
+        'timezone_invalid': "❌ Unknown timezone: {timezone}\n\n"
+                            "Valid timezones look like:\n"
+                            "• Europe/Moscow\n• Europe/London\n• America/New_York\n• Asia/Tokyo",
+        'timezone_error': "❌ Failed to set the timezone",
+        'workday_usage': "❌ Invalid command format. Use: `/set_workday 09:00 18:00`",
+        'workday_bad_time': "❌ Invalid time format. Use HH:MM (for example, 09:00)",
+        'workday_set': "✅ Working hours set: {start} - {end}",
+        'workday_error': "❌ Failed to set the working hours",
+        'language_usage': "🌐 Language: {language}\n\nChange: `/language ru` or `/language en`",
+        'language_set': "✅ Message language: {language}",
+        'language_error': "❌ Failed to change the language",
+
+        # Tasks
+        'rest_task_name': "Rest",
+        'rest_task_comment': "Break from work",
+        'rest_started': "🏖️ Rest started at {time}\n\n"
+                        "Send a task name to end the rest and start a new task.",
+        'rest_error': "❌ Failed to start the rest",
+        'task_not_recognized': "❌ Could not recognize the task name",
+        'task_created': "✅ *Task started:*\n{task}\n\n🕐 Start time: {time}",
+        'task_updated': "✏️ *Task updated:*\n{task}\n\n🕐 Time: {time}",
+        'task_added': "✅ *Task added:*\n{task}\n\n🕐 Time: {start} - {end}",
+        'task_trimmed': "✂️ {task} ended at {time}",
+        'task_start_taken': "❌ Another task already started at {time}",
+        'task_comment': "💬 {comment}",
+        'task_error': "❌ Failed to create the task",
+        'not_finished': "in progress",
+
+        # Day summary
+        'summary_title': "📊 *Summary for {date}*",
+        'summary_work_time': "⏰ *Work time:* {duration}",
+        'summary_rest_time': "🏖️ *Rest time:* {duration}",
+        'summary_total_time': "📈 *Total time:* {duration}",
+        'summary_work_header': "*🔧 Tasks:*",
+        'summary_rest_header': "*🏖️ Rest periods:*",
+        'summary_task': "• {task}",
+        'summary_task_time': "  ⏰ {start} - {end} ({duration})",
+        'summary_task_comment': "  💬 {comment}",
+        'summary_rest': "• {start} - {end} ({duration})",
+        'summary_rest_not_finished': "in progress",
+        'summary_day_part': "{day} this day, {total} in total",
+        'summary_empty': "📊 *Summary for {date}*\n\n❌ No tasks today.",
+        'summary_error': "❌ Failed to build the summary",
+        'digest_disable_hint': "Turn off the daily summary: /digest off",
+
+        # Reminders
+        'reminder_rest': "☕ You have been resting for over {minutes} min. Send a task name to get back to work.",
+        'reminder_idle': "⏰ No task has been running for {minutes} min. What are you working on?",
+        'reminder_start': "⏰ Your workday has started but no task is running. Send a task name to start tracking.",
+        'reminders_disable_hint': "Turn off reminders: /reminders off",
+
+        # Paged reports
+        'report_expired': "This report is outdated, please request it again",
+        'report_page_error': "❌ Failed to show the page",
+
+        # Jira address
+        'jira_current': "🔗 Jira: {url}\n\nChange: `/set_jira https://jira.example.com`\nReset: `/set_jira reset`",
+        'jira_usage': "❌ Wrong command format. Use: `/set_jira https://jira.example.com`",
+        'jira_invalid': "❌ Invalid address. Example: `https://jira.example.com`",
+        'jira_reset_user': "✅ Your Jira address is reset",
+        'jira_reset_chat': "✅ The Jira address of this chat is reset",
+        'jira_set_user': "✅ Your Jira address is set: {url}",
+        'jira_set_chat': "✅ The Jira address of this chat is set: {url}",
+        'jira_error': "❌ Failed to set the Jira address",
+
+        # API token
+        'api_token_private_only': "🔒 API tokens are only issued in a private chat with the bot",
+        'api_token_revoked': "✅ API token revoked",
+        'api_token_none': "🔒 You have no API token",
+        'api_token_issued': "🔑 Your API token (the previous one no longer works):\n`{token}`\n\n"
+                            "Requests: `GET /api/users/{user_id}/tasks?from=YYYY-MM-DD&to=YYYY-MM-DD` and "
+                            "`/api/users/{user_id}/summary?date=YYYY-MM-DD` with the header "
+                            "`Authorization: Bearer <token>`.\n\n"
+                            "Revoke: `/api_token revoke`",
+        'api_token_error': "❌ Failed to issue the token",
+
+        # Reminder and digest settings
+        'reminders_usage': "❌ Wrong command format. Use: `/reminders on` or `/reminders off`",
+        'reminders_on': "🔔 Reminders are on: the bot reminds you when no task is running during your workday",
+        'reminders_off': "🔕 Reminders are off",
+        'reminders_error': "❌ Failed to change reminder settings",
+        'digest_usage': "❌ Wrong command format. Use: `/digest on` or `/digest off`",
+        'digest_on': "🔔 You will get the day's summary at the end of your workday",
+        'digest_off': "🔕 Daily summary is off",
+        'digest_error': "❌ Failed to change summary settings",
+
+        # Search
+        'find_usage': "❌ Tell me what to look for. For example: `/find PROJ-123` or `/find code review`",
+        'find_nothing': "🔎 Nothing found for `{query}`.",
+        'find_title': "🔎 *Search:* `{query}`",
+        'find_title_continued': "🔎 *Search:* `{query}` (continued)",
+        'find_found': "Tasks found: {count}, total time: {duration}",
+        'find_task': "• {day} {start} - {end} ({duration}) {task}",
+        'find_next': "Next ▶",
+        'find_expired': "This search is outdated, run /find again",
+        'find_error': "❌ Search failed",
+
+        # Ticket report
+        'ticket_usage': "❌ Wrong command format. Use: `/ticket PROJ-123`",
+        'ticket_not_found': "🎫 No time found for {key}.",
+        'ticket_title': "🎫 {ticket}",
+        'ticket_total': "⏰ *Total:* {duration} ({count} entries)",
+        'ticket_period': "📅 *Period:* {first} - {last}",
+        'ticket_days_header': "*By day:*",
+        'ticket_day': "• {day}: {duration}",
+        'ticket_more_days': "… and {count} more days",
+        'ticket_error': "❌ Failed to build the ticket report",
+
+        # Teams
+        'team_create_usage': "❌ Wrong command format. Use: `/team_create Team name`",
+        'team_created': "👥 Team *{name}* created.\n\n"
+                        "To join, members send:\n`/team_join {code}`",
+        'team_create_error': "❌ Failed to create the team",
+        'team_join_usage': "❌ Wrong command format. Use: `/team_join CODE`",
+        'team_not_found': "❌ No team with this code",
+        'team_joined': "✅ You joined *{name}*",
+        'team_join_error': "❌ Failed to join the team",
+        'team_not_member': "👥 You are not in a team",
+        'team_left': "✅ You left *{name}*",
+        'team_leave_error': "❌ Failed to leave the team",
+        'team_none': "👥 You are not in a team.\n\n"
+                     "Create one: `/team_create Name`\nJoin one: `/team_join CODE`",
+        'team_title': "👥 *{name}* for {period}",
+        'team_members_header': "*By member:*",
+        'team_member': "• {name}: {duration}",
+        'team_tasks_header': "*By task:*",
+        'team_task': "• {name}: {duration}",
+        'team_task_shared': "• {name}: {duration} ({count} members)",
+        'team_refreshed': "_Updated at {time}_",
+        'team_error': "❌ Failed to build the team summary",
+
+        # Long-range statistics
+        'stats_range': "❌ The period is 1 to {max_days} days. For example: `/stats 90`",
+        'stats_title': "📊 *Statistics* for {start} - {end}",
+        'stats_title_team': "📊 *Team {team} statistics* for {start} - {end}",
+        'stats_empty': "No tasks in this period.",
+        'stats_work': "⏰ *Work:* {duration} (on average {average} over {days} days)",
+        'stats_rest': "🏖️ *Rest:* {duration} ({percent}% of the time)",
+        'stats_switches': "🔀 *Task switches:* {count} ({per_day} a day)",
+        'stats_focus': "🎯 *Longest focus:* {duration} - {task} ({date})",
+        'stats_hours': "🕐 *Busiest hours:* {hours}",
+        'stats_error': "❌ Failed to compute statistics",
+    },
+}
+
+_FORMATTER = string.Formatter()
+
+
+class Template:
+    """A message split into literal pieces and the slots its fields go into"""
+
+    __slots__ = ('key', 'text', 'fields', '_pieces', '_slots')
+
+    def __init__(self, key: str, text: str):
+        self.key = key
+        self.text = text
+        pieces: List[str] = []
+        slots: List[Tuple[int, str]] = []
+        for literal, field, spec, conversion in _FORMATTER.parse(text):
+            if literal:
+                pieces.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f"Template {key!r}: only plain {{name}} fields are supported, got {{{field}}}")
+            slots.append((len(pieces), field))
+            pieces.append('')
+        self.fields: FrozenSet[str] = frozenset(name for _, name in slots)
+        self._pieces = pieces
+        self._slots = slots
+
+    def render(self, values: Dict[str, object]) -> str:
+        if not self._slots:
+            return self.text
+        pieces = self._pieces.copy()
+        for index, name in self._slots:
+            pieces[index] = str(values[name])
+        return "".join(pieces)
+
+
+def compile_catalog(messages: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, Template]]:
+    """Parse every template; raise ValueError if locales differ in keys or fields"""
+    catalog = {locale: {key: Template(key, text) for key, text in templates.items()}
+               for locale, templates in messages.items()}
+    reference_locale, reference = next(iter(catalog.items()))
+    for locale, templates in catalog.items():
+        if templates.keys() != reference.keys():
+            missing = sorted(reference.keys() ^ templates.keys())
+            raise ValueError(f"Locales {reference_locale} and {locale} differ in keys: {missing}")
+        for key, template in templates.items():
+            if template.fields != reference[key].fields:
+                raise ValueError(f"Template {key!r} has different fields in {reference_locale} and {locale}")
+    return catalog
+
+
+CATALOG = compile_catalog(MESSAGES)
+
+# Button text in any locale -> (button key, locale), for matching pressed buttons
+_BUTTONS = {CATALOG[locale][key].text: (key, locale)
+            for locale in LOCALES for key in ('btn_rest', 'btn_summary', 'btn_help')}
+
+
+def t(locale: Optional[str], key: str, **values) -> str:
+    """Render message `key` in `locale` (DEFAULT_LOCALE for None or an unknown locale)"""
+    templates = CATALOG.get(locale) or CATALOG[DEFAULT_LOCALE]
+    return templates[key].render(values)
+
+
+def button_key(text: Optional[str]) -> Optional[str]:
+    """Key of the keyboard button with this label in any locale"""
+    return _BUTTONS.get(text, (None, None))[0]
+
+
+def button_locale(text: Optional[str]) -> Optional[str]:
+    """Locale of the keyboard the button with this label belongs to"""
+    return _BUTTONS.get(text, (None, None))[1]
+
+
+def user_locale(user) -> str:
+    """Locale to talk to the user in"""
+    return user.locale if user.locale in CATALOG else DEFAULT_LOCALE
+
+
+def locale_for_language_code(language_code: Optional[str]) -> str:
+    """Locale closest to a Telegram client's language_code such as 'en-US'"""
+    language = (language_code or '').split('-')[0].lower()
+    return language if language in CATALOG else DEFAULT_LOCALE
+
+
+def escape_markdown(text: str) -> str:
+    """Escape user text for Telegram's Markdown parse mode"""
+    return _MARKDOWN_SPECIAL.sub(r'\\\1', text)
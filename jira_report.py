@@ -0,0 +1,157 @@
+"""
+Time per Jira ticket.
+
+tasks.jira_key / tasks.jira_project are filled in from the task parser when
+a task is written, so per-ticket reports are index range scans instead of
+regex matches over every row.
+
+`python jira_report.py backfill` fills the columns for rows written before
+they existed.
+"""
+import re
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
+import logging
+
+from database import get_db, get_read_db, get_backend
+from models import User, sync_pending_writes
+from task_parser import jira_fields
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+ROLLUP_LIMIT = 100
+
+TICKET_PATTERN = re.compile(r'^[A-Z]+-\d+$')
+
+
+def backfill(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Set jira_key/jira_project on existing rows; returns rows with a ticket"""
+    last_id = 0
+    updated = 0
+    while True:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # Keyset over the primary key: rows without a ticket stay NULL and are not revisited
+            cursor.execute("""
+                SELECT t.id, COALESCE(n.name, t.task_name) AS task_name, t.original_message
+                FROM tasks t
+                LEFT JOIN task_names n ON n.id = t.task_name_id
+                WHERE t.id > %s AND t.jira_key IS NULL
+                ORDER BY t.id LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+            values = []
+            for row in rows:
+                jira_key, jira_project = jira_fields(row['task_name'], row['original_message'])
+                if jira_key:
+                    values.extend((row['id'], jira_key, jira_project))
+            if values:
+                placeholders = ", ".join(["(%s, %s, %s)"] * (len(values) // 3))
+                cursor.execute(f"""
+                    WITH v (id, jira_key, jira_project) AS (VALUES {placeholders})
+                    UPDATE tasks SET jira_key = v.jira_key, jira_project = v.jira_project
+                    FROM v
+                    WHERE tasks.id = v.id
+                """, values)
+                updated += len(values) // 3
+        logger.info(f"Backfilled Jira keys up to task {last_id} ({updated} with a ticket)")
+    return updated
+
+
+def ticket_report(user_id: int, jira_key: str) -> Dict[str, Any]:
+    """
+    A user's time on one ticket: {'jira_key', 'task_count', 'total',
+    'first_start', 'last_start', 'days': OrderedDict(date -> timedelta)}
+    with days in the user's timezone, newest first.
+    """
+    sync_pending_writes(user_id)
+    user = User.get_or_create(user_id)
+    now = datetime.utcnow()
+    with get_read_db(user_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT start_time, end_time FROM tasks
+            WHERE user_id = %s AND jira_key = %s
+            ORDER BY start_time DESC
+        """, (user_id, jira_key))
+        rows = cursor.fetchall()
+
+    days = OrderedDict()
+    total = timedelta()
+    for row in rows:
+        duration = (row['end_time'] or now) - row['start_time']
+        total += duration
+        day = user.get_local_time(row['start_time']).date()
+        days[day] = days.get(day, timedelta()) + duration
+    return {
+        'jira_key': jira_key,
+        'task_count': len(rows),
+        'total': total,
+        'first_start': rows[-1]['start_time'] if rows else None,
+        'last_start': rows[0]['start_time'] if rows else None,
+        'days': days,
+    }
+
+
+def ticket_rollup(project: Optional[str] = None, since: Optional[datetime] = None,
+                  user_ids: Optional[List[int]] = None,
+                  limit: int = ROLLUP_LIMIT) -> List[Dict[str, Any]]:
+    """Time per ticket across users, largest first"""
+    seconds = get_backend().interval_seconds('start_time', 'COALESCE(end_time, %s)')
+    conditions = ["jira_key IS NOT NULL"]
+    params: List[Any] = [datetime.utcnow()]
+    if project:
+        conditions.append("jira_project = %s")
+        params.append(project)
+    if since:
+        conditions.append("start_time >= %s")
+        params.append(since)
+    if user_ids is not None:
+        if not user_ids:
+            return []
+        conditions.append(f"user_id IN ({', '.join(['%s'] * len(user_ids))})")
+        params.extend(user_ids)
+    params.append(limit)
+
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT jira_key, jira_project, COUNT(*) AS task_count,
+                   COUNT(DISTINCT user_id) AS user_count, SUM({seconds}) AS seconds
+            FROM tasks
+            WHERE {' AND '.join(conditions)}
+            GROUP BY jira_key, jira_project
+            ORDER BY seconds DESC
+            LIMIT %s
+        """, params)
+        return [{
+            'jira_key': row['jira_key'],
+            'jira_project': row['jira_project'],
+            'task_count': row['task_count'],
+            'user_count': row['user_count'],
+            'seconds': int(round(float(row['seconds']))),
+        } for row in cursor.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jira ticket index maintenance")
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from database import init_database
+    init_database()
+    backfill(args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
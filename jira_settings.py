@@ -0,0 +1,86 @@
+"""
+Per-user and per-chat Jira base URL.
+
+A chat setting (set by /set_jira in a group) wins over the user's own
+setting, which wins over JIRA_BASE_URL. Resolved URLs are cached in-process;
+the cache is cleared on every change made by this process and expires after
+JIRA_SETTINGS_CACHE_SECONDS for changes made by other processes.
+"""
+import os
+import re
+import threading
+import time as time_module
+from datetime import datetime
+from typing import Optional, Dict, Tuple
+import logging
+
+from database import get_db
+from task_parser import DEFAULT_JIRA_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+SCOPE_USER = 'user'
+SCOPE_CHAT = 'chat'
+
+CACHE_SECONDS = float(os.getenv("JIRA_SETTINGS_CACHE_SECONDS", "60"))
+CACHE_SIZE = 10000
+
+_BASE_URL_PATTERN = re.compile(r'^(https?://[^\s/]+(?:/[^\s]*?)?)/?(?:browse/?.*)?$')
+
+_cache: Dict[Tuple[int, Optional[int]], Tuple[float, str]] = {}
+_cache_lock = threading.Lock()
+
+
+def normalize_base_url(url: str) -> Optional[str]:
+    """'https://jira.example.com/browse/X-1' -> 'https://jira.example.com'; None if not a URL"""
+    match = _BASE_URL_PATTERN.match(url.strip())
+    return match.group(1).rstrip('/') if match else None
+
+
+def get_base_url(user_id: int, chat_id: Optional[int] = None) -> str:
+    """Jira base URL for links shown to the user in the chat"""
+    key = (user_id, chat_id)
+    now = time_module.monotonic()
+    cached = _cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT scope, base_url FROM jira_settings
+            WHERE (scope = %s AND scope_id = %s) OR (scope = %s AND scope_id = %s)
+        """, (SCOPE_CHAT, chat_id if chat_id is not None else user_id, SCOPE_USER, user_id))
+        settings = {row['scope']: row['base_url'] for row in cursor.fetchall()}
+
+    # In a private chat the chat id equals the user id, the chat scope is only set for groups
+    base_url = (settings.get(SCOPE_CHAT) if chat_id not in (None, user_id) else None) \
+        or settings.get(SCOPE_USER) or DEFAULT_JIRA_BASE_URL
+    with _cache_lock:
+        if len(_cache) >= CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = (now + CACHE_SECONDS, base_url)
+    return base_url
+
+
+def set_base_url(scope: str, scope_id: int, base_url: Optional[str]):
+    """Store (or with None remove) the Jira base URL of a user or chat"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if base_url is None:
+            cursor.execute("""
+                DELETE FROM jira_settings WHERE scope = %s AND scope_id = %s
+            """, (scope, scope_id))
+        else:
+            cursor.execute("""
+                INSERT INTO jira_settings (scope, scope_id, base_url, updated_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (scope, scope_id)
+                DO UPDATE SET base_url = EXCLUDED.base_url, updated_at = EXCLUDED.updated_at
+            """, (scope, scope_id, base_url, datetime.utcnow()))
+    clear_cache()
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
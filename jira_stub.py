@@ -0,0 +1,133 @@
+"""
+Minimal local Jira for developing and testing the worklog sync.
+
+Accepts POST /rest/api/2/issue/<KEY>/worklog, keeps worklogs in memory and
+lists them with GET on the same path. Failures and latency can be injected
+to exercise retries and measure throughput.
+
+    python jira_stub.py --port 8089 --latency-ms 50
+    /set_jira http://localhost:8089
+"""
+import re
+import json
+import argparse
+import threading
+import time as time_module
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORKLOG_PATH = re.compile(r'^/rest/api/2/issue/([A-Z][A-Z0-9]*-\d+)/worklog(?:\?.*)?$')
+
+
+class JiraStub:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.worklogs: List[Dict[str, Any]] = []
+        self.requests = 0
+        self._failures = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'JiraStub':
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05},
+                                        name='jira-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(self, status: int, count: int = 1):
+        """Answer the next `count` worklog requests with an HTTP error"""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _reply(self, status: int, body: Any):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                match = WORKLOG_PATH.match(self.path)
+                if not match:
+                    return self._reply(404, {'errorMessages': ['Not found']})
+                with stub._lock:
+                    worklogs = [w for w in stub.worklogs if w['issue'] == match.group(1)]
+                self._reply(200, {'total': len(worklogs), 'worklogs': worklogs})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                match = WORKLOG_PATH.match(self.path)
+                if stub.latency:
+                    time_module.sleep(stub.latency)
+                with stub._lock:
+                    stub.requests += 1
+                    failure = stub._failures.popleft() if stub._failures else None
+                if not match:
+                    return self._reply(404, {'errorMessages': ['Issue does not exist']})
+                if failure:
+                    return self._reply(failure, {'errorMessages': ['Injected failure']})
+                try:
+                    payload = json.loads(body)
+                    seconds = int(payload['timeSpentSeconds'])
+                except (ValueError, KeyError, TypeError):
+                    return self._reply(400, {'errorMessages': ['Invalid worklog']})
+                with stub._lock:
+                    worklog = {
+                        'id': str(len(stub.worklogs) + 10000),
+                        'issue': match.group(1),
+                        'started': payload.get('started'),
+                        'timeSpentSeconds': seconds,
+                        'comment': payload.get('comment', ''),
+                    }
+                    stub.worklogs.append(worklog)
+                self._reply(201, worklog)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Jira stub for worklog sync")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    stub = JiraStub(args.host, args.port, args.latency_ms).start()
+    logger.info(f"Jira stub listening on {stub.url}")
+    try:
+        while True:
+            time_module.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Push time of closed Jira tasks to Jira as worklogs.
+
+When JIRA_SYNC is enabled, ending a task that carries a jira_key adds a row
+to jira_worklog_outbox in the same transaction (transactional outbox), so a
+worklog is never lost or sent for a task that was not saved. A background
+worker claims pending rows in batches, groups them by the user's Jira
+instance (see jira_settings) and posts them over one pooled keep-alive
+session per instance. Failed rows are retried with exponential backoff.
+
+Jira has no bulk worklog endpoint, so a batch is sent as concurrent requests
+over the instance's session and its results are written back in one
+transaction.
+
+    python jira_stub.py --port 8089     # local Jira for development
+"""
+import os
+import threading
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterable
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from database import get_db, get_backend
+from jira_settings import get_base_url
+import shutdown
+
+logger = logging.getLogger(__name__)
+
+JIRA_SYNC_ENABLED = os.getenv("JIRA_SYNC", "").lower() in ("1", "true", "yes")
+JIRA_SYNC_TOKEN = os.getenv("JIRA_SYNC_TOKEN")
+SYNC_INTERVAL_SECONDS = float(os.getenv("JIRA_SYNC_INTERVAL_SECONDS", "5"))
+BATCH_SIZE = int(os.getenv("JIRA_SYNC_BATCH_SIZE", "100"))
+CONCURRENCY = int(os.getenv("JIRA_SYNC_CONCURRENCY", "4"))
+REQUEST_TIMEOUT_SECONDS = 10
+
+# Jira rejects worklogs shorter than a minute
+MIN_WORKLOG_SECONDS = 60
+MAX_ATTEMPTS = 10
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+# A claimed row is not handed out again until its lease expires
+CLAIM_LEASE_SECONDS = 300
+
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+
+def enqueue_worklogs(cursor, task_ids: Iterable[int]) -> int:
+    """Queue worklogs for the closed Jira tasks among task_ids (caller's transaction)"""
+    task_ids = list(task_ids)
+    if not JIRA_SYNC_ENABLED or not task_ids:
+        return 0
+    now = datetime.utcnow()
+    seconds = get_backend().interval_seconds('t.start_time', 't.end_time')
+    # A worklog already sent is not edited when its task is re-ended
+    cursor.execute(f"""
+        INSERT INTO jira_worklog_outbox (task_id, user_id, jira_key, started, seconds, comment,
+                                         next_attempt_at, created_at)
+        SELECT t.id, t.user_id, t.jira_key, t.start_time, CAST(ROUND({seconds}) AS INTEGER),
+               COALESCE(t.comment, COALESCE(n.name, t.task_name)), %s, %s
+        FROM tasks t
+        LEFT JOIN task_names n ON n.id = t.task_name_id
+        WHERE t.id IN ({', '.join(['%s'] * len(task_ids))})
+          AND t.jira_key IS NOT NULL AND t.end_time IS NOT NULL AND NOT t.is_rest
+          AND {seconds} >= %s
+        ON CONFLICT (task_id) DO UPDATE
+        SET started = EXCLUDED.started, seconds = EXCLUDED.seconds, comment = EXCLUDED.comment
+        WHERE jira_worklog_outbox.status = 'pending'
+    """, [now, now] + task_ids + [MIN_WORKLOG_SECONDS])
+    return cursor.rowcount
+
+
+def backoff_seconds(attempts: int) -> int:
+    return min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+
+
+def make_session(pool_size: int = CONCURRENCY, token: Optional[str] = JIRA_SYNC_TOKEN) -> requests.Session:
+    """Keep-alive session for one Jira instance"""
+    # Retry only what Jira did not process: connection failures, 429 and 503.
+    # Other errors are retried by the outbox, since a POST retried here could duplicate a worklog.
+    retry = Retry(total=3, connect=3, read=0, status=3, backoff_factor=0.5,
+                  status_forcelist=(429, 503), allowed_methods=frozenset(['POST']),
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Content-Type'] = 'application/json'
+    if token:
+        session.headers['Authorization'] = f"Bearer {token}"
+    return session
+
+
+class JiraSyncWorker:
+    def __init__(self, batch_size: int = BATCH_SIZE, interval_seconds: float = SYNC_INTERVAL_SECONDS,
+                 concurrency: int = CONCURRENCY):
+        self.batch_size = batch_size
+        self.interval = interval_seconds
+        self.concurrency = concurrency
+        self._sessions: Dict[str, requests.Session] = {}
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='jira-sync')
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {
+            'batches': 0,
+            'sent': 0,
+            'retried': 0,
+            'failed': 0,
+            'errors': 0,
+            'last_batch_size': 0,
+            'last_batch_ms': 0.0,
+            'last_batch_per_second': 0.0,
+        }
+
+    # Lifecycle
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='jira-sync', daemon=True)
+        self._thread.start()
+        logger.info(f"Jira worklog sync enabled (every {self.interval:g} s, batches of {self.batch_size})")
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        self._executor.shutdown(wait=True)
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                # Keep going while full batches come back, then wait for the next tick
+                while self.sync_once() == self.batch_size and not self._stopped.is_set():
+                    pass
+            except Exception as e:
+                logger.error(f"Jira sync failed: {e}")
+                self.stats['errors'] += 1
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    # Sync
+
+    def _session(self, base_url: str) -> requests.Session:
+        session = self._sessions.get(base_url)
+        if session is None:
+            session = self._sessions[base_url] = make_session(self.concurrency)
+        return session
+
+    def _claim(self, now: datetime) -> List[Dict[str, Any]]:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # The outer status/next_attempt_at check is re-evaluated on a concurrently
+            # updated row, so two workers never claim the same worklog
+            cursor.execute("""
+                UPDATE jira_worklog_outbox
+                SET next_attempt_at = %s, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM jira_worklog_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= %s
+                    ORDER BY next_attempt_at, id
+                    LIMIT %s
+                ) AND status = 'pending' AND next_attempt_at <= %s
+                RETURNING id, task_id, user_id, jira_key, started, seconds, comment, attempts
+            """, (now + timedelta(seconds=CLAIM_LEASE_SECONDS), now, self.batch_size, now))
+            return sorted(cursor.fetchall(), key=lambda row: row['id'])
+
+    def _post(self, base_url: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one worklog; returns {'id', 'worklog_id'} or {'id', 'error', 'permanent'}"""
+        try:
+            response = self._session(base_url).post(
+                f"{base_url}/rest/api/2/issue/{row['jira_key']}/worklog",
+                params={'notifyUsers': 'false'},
+                json={
+                    'started': row['started'].strftime('%Y-%m-%dT%H:%M:%S.000+0000'),
+                    'timeSpentSeconds': row['seconds'],
+                    'comment': row['comment'] or '',
+                },
+                timeout=REQUEST_TIMEOUT_SECONDS,
+            )
+        except requests.RequestException as e:
+            return {'id': row['id'], 'error': str(e)[:500], 'permanent': False}
+        if response.status_code in (200, 201):
+            return {'id': row['id'], 'worklog_id': str(response.json().get('id', ''))}
+        # An unknown issue or a rejected worklog will not succeed on retry
+        permanent = 400 <= response.status_code < 500 and response.status_code not in (401, 408, 429)
+        return {'id': row['id'], 'error': f"HTTP {response.status_code}: {response.text[:200]}",
+                'permanent': permanent}
+
+    def sync_once(self) -> int:
+        """Send one batch of due worklogs; returns the number of worklogs claimed"""
+        started = time_module.perf_counter()
+        now = datetime.utcnow()
+        rows = self._claim(now)
+        if not rows:
+            return 0
+
+        by_instance: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_instance.setdefault(get_base_url(row['user_id']), []).append(row)
+        futures = [self._executor.submit(self._post, base_url, row)
+                   for base_url, instance_rows in by_instance.items() for row in instance_rows]
+        results = [future.result() for future in futures]
+        attempts = {row['id']: row['attempts'] for row in rows}
+
+        values = []
+        done = datetime.utcnow()
+        for result in results:
+            if 'error' not in result:
+                values.extend((result['id'], STATUS_SENT, done, result['worklog_id'], None))
+                self.stats['sent'] += 1
+            elif result['permanent'] or attempts[result['id']] >= MAX_ATTEMPTS:
+                values.extend((result['id'], STATUS_FAILED, done, None, result['error']))
+                self.stats['failed'] += 1
+                logger.warning(f"Giving up on Jira worklog {result['id']}: {result['error']}")
+            else:
+                retry_at = done + timedelta(seconds=backoff_seconds(attempts[result['id']]))
+                values.extend((result['id'], STATUS_PENDING, retry_at, None, result['error']))
+                self.stats['retried'] += 1
+
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(results))
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                WITH v (id, status, next_attempt_at, worklog_id, last_error) AS (VALUES {placeholders})
+                UPDATE jira_worklog_outbox
+                SET status = v.status, next_attempt_at = v.next_attempt_at,
+                    worklog_id = v.worklog_id, last_error = v.last_error,
+                    sent_at = CASE WHEN v.status = 'sent' THEN %s ELSE NULL END
+                FROM v
+                WHERE jira_worklog_outbox.id = v.id
+            """, values + [done])
+
+        elapsed = time_module.perf_counter() - started
+        self.stats['batches'] += 1
+        self.stats['last_batch_size'] = len(rows)
+        self.stats['last_batch_ms'] = round(elapsed * 1000, 1)
+        self.stats['last_batch_per_second'] = round(len(rows) / elapsed, 1) if elapsed else 0.0
+        return len(rows)
+
+
+def queue_stats() -> Dict[str, Any]:
+    """Outbox size per status and the age of the oldest pending worklog"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT status, COUNT(*) AS n, MIN(created_at) AS oldest
+            FROM jira_worklog_outbox
+            GROUP BY status
+        """)
+        rows = {row['status']: row for row in cursor.fetchall()}
+    pending = rows.get(STATUS_PENDING)
+    oldest = pending['oldest'] if pending else None
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+    return {
+        'pending': pending['n'] if pending else 0,
+        'sent': rows[STATUS_SENT]['n'] if STATUS_SENT in rows else 0,
+        'failed': rows[STATUS_FAILED]['n'] if STATUS_FAILED in rows else 0,
+        'lag_seconds': round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+    }
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_jira_sync() -> Optional[JiraSyncWorker]:
+    """Return the process-wide worker, or None when Jira sync is disabled"""
+    global _worker
+    if not JIRA_SYNC_ENABLED:
+        return None
+    with _worker_lock:
+        if _worker is None:
+            _worker = JiraSyncWorker()
+            _worker.start()
+            shutdown.register('jira_sync', _worker.stop, shutdown.ORDER_STOP_WORKERS)
+    return _worker
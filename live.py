@@ -0,0 +1,318 @@
+"""
+Live stream of who is working on what (Server-Sent Events).
+
+    GET /live/tasks[?team=<id>]
+
+One ActiveTaskHub per process tails the task event log and keeps the set
+of running tasks in memory. Every subscriber reads the same in-memory
+history, so the database cost is one indexed query per poll interval per
+process, however many wallboards are connected. Events committed by this
+process wake the hub at once; events of other processes (shards, a
+separate web process) arrive within LIVE_POLL_SECONDS.
+
+A new connection first receives a `snapshot` of the running tasks, then
+`start`, `end` and `rename` events. Event ids are `<hub epoch>-<sequence>`:
+a client that reconnects with Last-Event-ID continues where it stopped if
+the hub still has those events, otherwise it gets a fresh snapshot.
+Comments are sent every LIVE_HEARTBEAT_SECONDS to keep proxies from
+closing idle connections.
+"""
+import os
+import json
+import secrets
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Optional, Dict, Any, Set, Tuple, Iterator
+import logging
+
+from database import get_db
+from models import TASK_SELECT
+import task_events
+import teams
+import shutdown
+
+logger = logging.getLogger(__name__)
+
+LIVE_POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "1"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "1000"))
+HISTORY_SIZE = 1000
+TAIL_BATCH_SIZE = 500
+# Event ids are taken before commit, so a late commit can appear below the last id read
+TAIL_OVERLAP_EVENTS = 200
+RETRY_MILLISECONDS = 3000
+
+LIVE_EVENT_TYPES = {
+    task_events.EVENT_START: 'start',
+    task_events.EVENT_END: 'end',
+    task_events.EVENT_AUTO_END: 'end',
+    task_events.EVENT_RENAME: 'rename',
+}
+
+
+def _iso(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=None).isoformat() + 'Z'
+
+
+def format_sse(event: str, data: str, event_id: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event}", f"data: {data}"]
+    return "\n".join(lines) + "\n\n"
+
+
+class ActiveTaskHub:
+    """Running tasks of all users and a shared history of their changes"""
+
+    def __init__(self, poll_interval: float = LIVE_POLL_SECONDS, history_size: int = HISTORY_SIZE):
+        self.poll_interval = poll_interval
+        self.epoch = secrets.token_hex(4)
+        self._condition = threading.Condition()
+        # (sequence, user_id, event name, JSON data), sequences are consecutive
+        self._history = deque(maxlen=history_size)
+        self._sequence = 0
+        self._active: Dict[int, Dict[str, Any]] = {}
+        self._last_event_id = 0
+        self._seen: Set[int] = set()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._subscribers = 0
+        self.stats = {'subscribers': 0, 'events': 0, 'polls': 0, 'snapshots': 0, 'resumed': 0}
+
+    # Feed
+
+    def start(self):
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) AS id FROM task_events")
+            self._last_event_id = cursor.fetchone()['id']
+            cursor.execute(TASK_SELECT + "WHERE t.end_time IS NULL")
+            for row in cursor.fetchall():
+                self._active[row['id']] = {
+                    'task_id': row['id'],
+                    'user_id': row['user_id'],
+                    'task_name': row['task_name'],
+                    'is_rest': bool(row['is_rest']),
+                    'start_time': _iso(row['start_time']),
+                }
+        # Events just below the last id are already part of the snapshot
+        self._tail(broadcast=False)
+        task_events.subscribe(lambda event: self._wake.set())
+        self._thread = threading.Thread(target=self._run, name='live-hub', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                while self._tail() == TAIL_BATCH_SIZE and not self._stopped.is_set():
+                    pass
+            except Exception as e:
+                logger.error(f"Live task stream poll failed: {e}")
+
+    def _tail(self, broadcast: bool = True) -> int:
+        """Read events after the last one seen; returns the number of new events"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, task_id, user_id, event_type, payload, occurred_at
+                FROM task_events WHERE id > %s ORDER BY id LIMIT %s
+            """, (max(self._last_event_id - TAIL_OVERLAP_EVENTS, 0), TAIL_BATCH_SIZE + TAIL_OVERLAP_EVENTS))
+            rows = cursor.fetchall()
+        self.stats['polls'] += 1
+
+        new = [row for row in rows if row['id'] not in self._seen]
+        for row in new:
+            self._seen.add(row['id'])
+            if broadcast and row['event_type'] in LIVE_EVENT_TYPES:
+                self._apply(row)
+        if rows:
+            self._last_event_id = max(self._last_event_id, rows[-1]['id'])
+            self._seen = {event_id for event_id in self._seen
+                          if event_id > self._last_event_id - TAIL_OVERLAP_EVENTS}
+        return len(new)
+
+    def _apply(self, event: Dict[str, Any]):
+        """Update the running tasks and broadcast the change"""
+        payload = event['payload']
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        name = LIVE_EVENT_TYPES[event['event_type']]
+        task_id = event['task_id']
+
+        # Subscribers take snapshots under the same lock
+        with self._condition:
+            if name == 'start':
+                task = {
+                    'task_id': task_id,
+                    'user_id': event['user_id'],
+                    'task_name': payload.get('task_name'),
+                    'is_rest': bool(payload.get('is_rest', False)),
+                    'start_time': _iso(payload.get('start_time') or event['occurred_at']),
+                }
+                self._active[task_id] = task
+                data = task
+            elif name == 'end':
+                task = self._active.pop(task_id, {})
+                data = {
+                    'task_id': task_id,
+                    'user_id': event['user_id'],
+                    'task_name': task.get('task_name'),
+                    'end_time': _iso(payload.get('end_time') or event['occurred_at']),
+                }
+            else:
+                task = self._active.get(task_id)
+                if task is not None:
+                    task['task_name'] = payload.get('task_name')
+                data = {'task_id': task_id, 'user_id': event['user_id'], 'task_name': payload.get('task_name')}
+
+            self._sequence += 1
+            self._history.append((self._sequence, event['user_id'], name, json.dumps(data, ensure_ascii=False)))
+            self._condition.notify_all()
+        self.stats['events'] += 1
+
+    # Subscribers
+
+    def event_id(self, sequence: int) -> str:
+        return f"{self.epoch}-{sequence}"
+
+    def _resume_position(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Sequence to continue after, or None if the client needs a snapshot"""
+        if not last_event_id:
+            return None
+        epoch, _, sequence = last_event_id.partition('-')
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        with self._condition:
+            oldest = self._history[0][0] if self._history else self._sequence + 1
+            if sequence > self._sequence or sequence < oldest - 1:
+                return None
+        return sequence
+
+    def snapshot(self, user_ids: Optional[Set[int]] = None) -> Tuple[int, str]:
+        """(sequence, JSON of the running tasks) as of that sequence"""
+        with self._condition:
+            tasks = [dict(task) for task in self._active.values()
+                     if user_ids is None or task['user_id'] in user_ids]
+            sequence = self._sequence
+        tasks.sort(key=lambda task: task['start_time'] or '')
+        return sequence, json.dumps({'tasks': tasks}, ensure_ascii=False)
+
+    def _events_after(self, position: int) -> Optional[list]:
+        """History entries after the position; None if some of them were already dropped"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._sequence > position or self._stopped.is_set(),
+                                            LIVE_HEARTBEAT_SECONDS):
+                return []
+            if not self._history or self._history[0][0] > position + 1:
+                return None
+            return list(itertools.islice(self._history, position + 1 - self._history[0][0], None))
+
+    def subscribe(self, user_ids: Optional[Set[int]] = None,
+                  last_event_id: Optional[str] = None) -> Optional[Iterator[str]]:
+        """SSE stream for one client, or None if the subscriber limit is reached"""
+        if self._subscribers >= LIVE_MAX_SUBSCRIBERS:
+            return None
+        return self._stream(user_ids, self._resume_position(last_event_id))
+
+    def _stream(self, user_ids: Optional[Set[int]], position: Optional[int]) -> Iterator[str]:
+        # Counted from the first read: a response dropped before streaming never runs `finally`
+        with self._condition:
+            self._subscribers += 1
+            self.stats['subscribers'] = self._subscribers
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n"
+            if position is None:
+                position, data = self.snapshot(user_ids)
+                self.stats['snapshots'] += 1
+                yield format_sse('snapshot', data, self.event_id(position))
+            else:
+                self.stats['resumed'] += 1
+
+            while not self._stopped.is_set():
+                events = self._events_after(position)
+                if events is None:
+                    # Too slow to keep up with the shared history: start over from the current state
+                    position, data = self.snapshot(user_ids)
+                    self.stats['snapshots'] += 1
+                    yield format_sse('snapshot', data, self.event_id(position))
+                    continue
+                if not events:
+                    yield ": heartbeat\n\n"
+                    continue
+                for sequence, user_id, name, data in events:
+                    position = sequence
+                    if user_ids is None or user_id in user_ids:
+                        yield format_sse(name, data, self.event_id(sequence))
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+                self.stats['subscribers'] = self._subscribers
+
+
+_hub: Optional[ActiveTaskHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_live_hub() -> ActiveTaskHub:
+    """Return the process-wide hub, started on first use"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = ActiveTaskHub()
+            _hub.start()
+            shutdown.register('live_stream', _hub.stop, shutdown.ORDER_STOP_WORKERS)
+    return _hub
+
+
+def live_stats() -> Optional[Dict[str, Any]]:
+    """Hub counters, or None if nobody has subscribed yet"""
+    return dict(_hub.stats) if _hub else None
+
+
+def live_tasks():
+    """SSE stream of task starts and ends, optionally of one team"""
+    from flask import Response, jsonify, request
+    reports_token = os.environ.get('REPORTS_TOKEN')
+    # EventSource cannot send headers, so the token may also come in the query string
+    header = request.headers.get('Authorization', '')
+    token = header[len('Bearer '):] if header.startswith('Bearer ') else request.args.get('token')
+    if not reports_token or token != reports_token:
+        return jsonify({'error': 'unauthorized'}), 401
+
+    user_ids = None
+    if request.args.get('team'):
+        if not request.args['team'].isdigit():
+            return jsonify({'error': 'invalid team'}), 400
+        user_ids = set(teams.member_ids(int(request.args['team'])))
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    stream = get_live_hub().subscribe(user_ids, last_event_id)
+    if stream is None:
+        return jsonify({'error': 'too many subscribers'}), 503
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Keeps nginx from buffering the stream
+        'X-Accel-Buffering': 'no',
+    })
+
+
+def register(web_app):
+    """Add the live stream route to the Flask app"""
+    web_app.add_url_rule('/live/tasks', view_func=live_tasks)
@@ -1,11 +1,12 @@
 import os
 import logging
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, JobQueue
+from telegram import Update
+from telegram.ext import Updater, CommandHandler, MessageHandler, TypeHandler, Filters, JobQueue
 from database import init_database
 from bot_handlers_v13 import (
     start_command, set_timezone_command, set_workday_command,
     handle_rest_button, handle_summary_button, handle_help_button, handle_task_message,
-    auto_end_tasks_job
+    auto_end_tasks_job, drop_duplicate_updates
 )
 
 # Configure logging
@@ -32,6 +33,9 @@ def main():
     updater = Updater(token=BOT_TOKEN, use_context=True)
     dispatcher = updater.dispatcher
     
+    # Skip updates that were already handled (runs before all other handlers)
+    dispatcher.add_handler(TypeHandler(Update, drop_duplicate_updates), group=-1)
+    
     # Add command handlers
     dispatcher.add_handler(CommandHandler("start", start_command))
     dispatcher.add_handler(CommandHandler("set_timezone", set_timezone_command))
@@ -1,18 +1,78 @@
 from datetime import datetime, time, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import pytz
-from database import get_db
+from database import get_db, get_read_db, get_backend, note_user_write
+from write_behind import get_write_behind
+from task_parser import jira_fields
+import task_events
+import task_versions
+import task_names
+import jira_sync
+import archive
+import i18n
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Reads right after a user's own write must not go to a lagging replica
+task_events.subscribe(lambda event: note_user_write(event['user_id']))
+
+def sync_pending_writes(user_id: int):
+    """Flush queued write-behind operations of the user before reading"""
+    buffer = get_write_behind()
+    if buffer:
+        buffer.sync_user(user_id)
+
+# Task rows with the name joined back from the task_names dictionary
+TASK_SELECT = """
+    SELECT t.id, t.user_id, COALESCE(n.name, t.task_name) AS task_name, t.comment,
+           t.original_message, t.start_time, t.end_time, t.is_rest
+    FROM tasks t
+    LEFT JOIN task_names n ON n.id = t.task_name_id
+"""
+
+# Tasks are auto-ended at the end of the workday, so a closed task overlapping a
+# range started at most this long before it
+MAX_TASK_DAYS = 7
+
+# Tasks overlapping [start, end] (params: user, end, start, start - MAX_TASK_DAYS).
+# The start_time bounds keep it a range scan of idx_tasks_user_start; a task still
+# running from before that comes from idx_tasks_active in a second branch.
+TASK_OVERLAP_SELECT = TASK_SELECT + """
+    WHERE t.user_id = %s AND t.start_time <= %s
+      AND (t.end_time IS NULL OR t.end_time > %s) AND t.start_time >= %s
+    UNION ALL
+""" + TASK_SELECT + """
+    WHERE t.user_id = %s AND t.end_time IS NULL AND t.start_time < %s
+    ORDER BY start_time
+"""
+
+
+def overlap_params(user_id: int, start_utc: datetime, end_utc: datetime) -> tuple:
+    lookback = start_utc - timedelta(days=MAX_TASK_DAYS)
+    return (user_id, end_utc, start_utc, lookback, user_id, lookback)
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Handler times are aware, database rows are naive UTC"""
+    return value.astimezone(pytz.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def clip_seconds(start_time: datetime, end_time: datetime, start_utc: datetime, end_utc: datetime) -> float:
+    """Seconds of [start_time, end_time) within [start_utc, end_utc]; naive times are UTC"""
+    start_utc, end_utc = naive_utc(start_utc), naive_utc(end_utc)
+    return max((min(end_time, end_utc) - max(start_time, start_utc)).total_seconds(), 0.0)
+
 class User:
     def __init__(self, user_id: int, timezone: str = 'Europe/Moscow', 
-                 workday_start: time = time(9, 0), workday_end: time = time(18, 0)):
+                 workday_start: time = time(9, 0), workday_end: time = time(18, 0),
+                 locale: Optional[str] = None):
         self.user_id = user_id
         self.timezone = timezone
         self.workday_start = workday_start
         self.workday_end = workday_end
+        # None until the user picks a language (i18n.DEFAULT_LOCALE applies)
+        self.locale = locale
     
     @classmethod
     def get_or_create(cls, user_id: int) -> 'User':
@@ -29,13 +89,14 @@ class User:
                     user_id=user_data['user_id'],
                     timezone=user_data['timezone'],
                     workday_start=user_data['workday_start'],
-                    workday_end=user_data['workday_end']
+                    workday_end=user_data['workday_end'],
+                    locale=user_data.get('locale')
                 )
             else:
                 # Create new user
                 cursor.execute("""
                     INSERT INTO users (user_id) VALUES (%s)
-                    RETURNING user_id, timezone, workday_start, workday_end
+                    RETURNING user_id, timezone, workday_start, workday_end, locale
                 """, (user_id,))
                 user_data = cursor.fetchone()
                 
@@ -43,7 +104,8 @@ class User:
                     user_id=user_data['user_id'],
                     timezone=user_data['timezone'],
                     workday_start=user_data['workday_start'],
-                    workday_end=user_data['workday_end']
+                    workday_end=user_data['workday_end'],
+                    locale=user_data.get('locale')
                 )
     
     def update_timezone(self, timezone: str) -> bool:
@@ -59,6 +121,7 @@ class User:
                 """, (timezone, self.user_id))
                 
                 self.timezone = timezone
+                note_user_write(self.user_id)
                 return True
         except Exception as e:
             logger.error(f"Error updating timezone: {e}")
@@ -76,11 +139,30 @@ class User:
                 
                 self.workday_start = start_time
                 self.workday_end = end_time
+                note_user_write(self.user_id)
                 return True
         except Exception as e:
             logger.error(f"Error updating workday: {e}")
             return False
     
+    def update_locale(self, locale: str) -> bool:
+        """Update user message language"""
+        if locale not in i18n.LOCALES:
+            return False
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE users SET locale = %s WHERE user_id = %s
+                """, (locale, self.user_id))
+                
+                self.locale = locale
+                note_user_write(self.user_id)
+                return True
+        except Exception as e:
+            logger.error(f"Error updating locale: {e}")
+            return False
+    
     def get_local_time(self, utc_time: datetime = None) -> datetime:
         """Convert UTC time to user's local time"""
         if utc_time is None:
@@ -96,6 +178,13 @@ class User:
         if local_time.tzinfo is None:
             local_time = user_tz.localize(local_time)
         return local_time.astimezone(pytz.utc)
+    
+    def get_day_bounds_utc(self, date: datetime) -> Tuple[datetime, datetime]:
+        """UTC start and end of the user's local day containing `date`"""
+        user_tz = pytz.timezone(self.timezone)
+        start_local = user_tz.localize(datetime.combine(date.date(), time.min))
+        end_local = user_tz.localize(datetime.combine(date.date(), time.max))
+        return start_local.astimezone(pytz.utc), end_local.astimezone(pytz.utc)
 
 class Task:
     def __init__(self, id: Optional[int], user_id: int, task_name: str, 
@@ -119,27 +208,46 @@ class Task:
         if start_time is None:
             start_time = datetime.utcnow()
         
+        buffer = get_write_behind()
+        if buffer:
+            task_id = buffer.allocate_task_id()
+            buffer.enqueue_start(task_id, user_id, task_name, comment, original_message,
+                                 start_time, is_rest)
+            task_versions.bump(user_id)
+            return cls(task_id, user_id, task_name, comment, start_time, None, is_rest, original_message)
+        
+        task_name_id = task_names.resolve_one(user_id, task_name)
+        jira_key, jira_project = jira_fields(task_name, original_message)
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO tasks (user_id, task_name, comment, original_message, start_time, is_rest)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                INSERT INTO tasks (user_id, task_name_id, comment, original_message, start_time, is_rest,
+                                   jira_key, jira_project)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id
-            """, (user_id, task_name, comment, original_message, start_time, is_rest))
+            """, (user_id, task_name_id, comment, original_message, start_time, is_rest,
+                  jira_key, jira_project))
             
             task_id = cursor.fetchone()['id']
-            return cls(task_id, user_id, task_name, comment, start_time, None, is_rest, original_message)
+            event = task_events.record_event(
+                cursor, task_id, user_id, task_events.EVENT_START, start_time,
+                task_name=task_name, comment=comment, original_message=original_message,
+                start_time=start_time, is_rest=is_rest
+            )
+        
+        task_versions.bump(user_id)
+        task_events.publish([event])
+        return cls(task_id, user_id, task_name, comment, start_time, None, is_rest, original_message)
     
     @classmethod
     def get_active_task(cls, user_id: int) -> Optional['Task']:
         """Get current active task for user"""
+        sync_pending_writes(user_id)
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, user_id, task_name, comment, original_message, start_time, end_time, is_rest
-                FROM tasks 
-                WHERE user_id = %s AND end_time IS NULL 
-                ORDER BY start_time DESC LIMIT 1
+            cursor.execute(TASK_SELECT + """
+                WHERE t.user_id = %s AND t.end_time IS NULL 
+                ORDER BY t.start_time DESC LIMIT 1
             """, (user_id,))
             
             task_data = cursor.fetchone()
@@ -157,61 +265,214 @@ class Task:
             return None
     
     @classmethod
-    def get_tasks_for_date(cls, user_id: int, date: datetime) -> List['Task']:
-        """Get all tasks for a specific date (local time)"""
+    def get_latest_task(cls, user_id: int) -> Optional['Task']:
+        """The user's task with the latest start, running or not"""
+        sync_pending_writes(user_id)
         with get_db() as conn:
             cursor = conn.cursor()
+            cursor.execute(TASK_SELECT + """
+                WHERE t.user_id = %s ORDER BY t.start_time DESC LIMIT 1
+            """, (user_id,))
+            row = cursor.fetchone()
+            return cls.from_row(row) if row else None
+    
+    def conflicts_with_start(self, at: datetime) -> bool:
+        """True if a task started at `at` would overlap this one instead of simply ending it"""
+        at = naive_utc(at)
+        if self.end_time is None:
+            return self.start_time > at
+        return self.end_time > at
+    
+    @classmethod
+    def insert_at(cls, user_id: int, task_name: str, comment: Optional[str] = None,
+                  start_time: datetime = None, is_rest: bool = False,
+                  original_message: Optional[str] = None) -> Tuple[Optional['Task'], Optional['Task']]:
+        """
+        Insert a task into the user's timeline, e.g. "14:00 Встреча" sent after 15:00.
+        The task running at start_time is trimmed to end there and the new task
+        ends where the next one starts (or where the trimmed one ended), so
+        intervals never overlap. Returns (new task, trimmed task); the new task
+        is None if another task already starts at that time.
+        """
+        sync_pending_writes(user_id)
+        start_time = naive_utc(start_time or datetime.utcnow())
+        task_name_id = task_names.resolve_one(user_id, task_name)
+        jira_key, jira_project = jira_fields(task_name, original_message)
+        
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # Neighbours read here must still be the neighbours when the task goes in
+            get_backend().lock_user(cursor, user_id)
+            # Intervals of a user do not overlap, so the neighbours are two seeks on idx_tasks_user_start
+            cursor.execute(TASK_SELECT + """
+                WHERE t.user_id = %s AND t.start_time <= %s ORDER BY t.start_time DESC LIMIT 1
+            """, (user_id, start_time))
+            row = cursor.fetchone()
+            previous = cls.from_row(row) if row else None
+            cursor.execute(TASK_SELECT + """
+                WHERE t.user_id = %s AND t.start_time > %s ORDER BY t.start_time LIMIT 1
+            """, (user_id, start_time))
+            row = cursor.fetchone()
+            following = cls.from_row(row) if row else None
             
-            # Get user timezone
-            user = User.get_or_create(user_id)
-            user_tz = pytz.timezone(user.timezone)
-            
-            # Convert date to user timezone range
-            start_local = user_tz.localize(datetime.combine(date.date(), time.min))
-            end_local = user_tz.localize(datetime.combine(date.date(), time.max))
+            if previous and previous.start_time == start_time:
+                return None, None
             
-            # Convert to UTC for database query
-            start_utc = start_local.astimezone(pytz.utc)
-            end_utc = end_local.astimezone(pytz.utc)
+            end_time = following.start_time if following else None
+            events = []
+            trimmed = None
+            if previous and (previous.end_time is None or previous.end_time > start_time):
+                if previous.end_time and (end_time is None or previous.end_time < end_time):
+                    end_time = previous.end_time
+                cursor.execute("UPDATE tasks SET end_time = %s WHERE id = %s", (start_time, previous.id))
+                events.append(task_events.record_event(cursor, previous.id, user_id, task_events.EVENT_END,
+                                                        start_time, end_time=start_time))
+                previous.end_time = start_time
+                trimmed = previous
             
             cursor.execute("""
-                SELECT id, user_id, task_name, comment, original_message, start_time, end_time, is_rest
-                FROM tasks 
-                WHERE user_id = %s 
-                AND start_time >= %s 
-                AND start_time <= %s
-                ORDER BY start_time
-            """, (user_id, start_utc, end_utc))
-            
-            tasks = []
-            for task_data in cursor.fetchall():
-                tasks.append(cls(
-                    id=task_data['id'],
-                    user_id=task_data['user_id'],
-                    task_name=task_data['task_name'],
-                    comment=task_data['comment'],
-                    start_time=task_data['start_time'],
-                    end_time=task_data['end_time'],
-                    is_rest=task_data['is_rest'],
-                    original_message=task_data.get('original_message')
-                ))
-            
+                INSERT INTO tasks (user_id, task_name_id, comment, original_message, start_time, end_time,
+                                   is_rest, jira_key, jira_project)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (user_id, task_name_id, comment, original_message, start_time, end_time, is_rest,
+                  jira_key, jira_project))
+            task_id = cursor.fetchone()['id']
+            events.append(task_events.record_event(
+                cursor, task_id, user_id, task_events.EVENT_START, start_time,
+                task_name=task_name, comment=comment, original_message=original_message,
+                start_time=start_time, is_rest=is_rest
+            ))
+            if end_time is not None:
+                events.append(task_events.record_event(cursor, task_id, user_id, task_events.EVENT_END,
+                                                        end_time, end_time=end_time))
+            jira_sync.enqueue_worklogs(cursor, ([trimmed.id] if trimmed else []) + [task_id])
+        
+        task_versions.bump(user_id)
+        task_events.publish(events)
+        task = cls(task_id, user_id, task_name, comment, start_time, end_time, is_rest, original_message)
+        return task, trimmed
+    
+    @classmethod
+    def get_tasks_for_date(cls, user_id: int, date: datetime) -> List['Task']:
+        """Tasks overlapping a local day, including ones started the day before"""
+        user = User.get_or_create(user_id)
+        start_utc, end_utc = user.get_day_bounds_utc(date)
+        return cls.get_tasks_between(user_id, start_utc, end_utc)
+    
+    @classmethod
+    def get_tasks_between(cls, user_id: int, start_utc: datetime, end_utc: datetime) -> List['Task']:
+        """Tasks overlapping a UTC range, including archived months"""
+        sync_pending_writes(user_id)
+        with get_read_db(user_id) as conn:
+            cursor = conn.cursor()
+            cursor.execute(TASK_OVERLAP_SELECT, overlap_params(user_id, start_utc, end_utc))
+            tasks = [cls.from_row(row) for row in cursor.fetchall()]
+        
+        # Archiving never reaches the current month, so today's summary skips the index
+        lookback = start_utc - timedelta(days=MAX_TASK_DAYS)
+        if lookback.replace(tzinfo=None) < archive.archive_cutoff(days=0):
+            tasks = cls._with_archived(tasks, user_id, start_utc, end_utc)
+        return tasks
+    
+    @classmethod
+    def _with_archived(cls, tasks: List['Task'], user_id: int,
+                       start_utc: datetime, end_utc: datetime) -> List['Task']:
+        lookback = start_utc - timedelta(days=MAX_TASK_DAYS)
+        archived = [cls.from_row(row) for row in archive.read_tasks(user_id, lookback, end_utc)]
+        # Archived tasks are closed; keep the ones reaching into the range
+        archived = [task for task in archived if clip_seconds(task.start_time, task.end_time, start_utc, end_utc)]
+        if not archived:
             return tasks
+        # A task restored but not yet removed from its file must not show twice
+        known = {task.id for task in tasks}
+        tasks = tasks + [task for task in archived if task.id not in known]
+        return sorted(tasks, key=lambda task: task.start_time)
+    
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'Task':
+        """Build a task from a TASK_SELECT row"""
+        return cls(
+            id=row['id'],
+            user_id=row['user_id'],
+            task_name=row['task_name'],
+            comment=row['comment'],
+            start_time=row['start_time'],
+            end_time=row['end_time'],
+            is_rest=bool(row['is_rest']),
+            original_message=row.get('original_message')
+        )
+    
+    @classmethod
+    def get_totals_for_date(cls, user_id: int, date: datetime) -> List[Dict[str, Any]]:
+        """
+        Time per task name for a local day, grouped by task_name_id in SQL.
+        Tasks crossing midnight only count their part within the day.
+        Returns dicts with task_name, is_rest and duration in first-start order.
+        """
+        sync_pending_writes(user_id)
+        user = User.get_or_create(user_id)
+        start_utc, end_utc = user.get_day_bounds_utc(date)
+        now = datetime.utcnow()
+        lookback = start_utc - timedelta(days=MAX_TASK_DAYS)
+        # Both backends put the end expression first, so its parameters come first
+        seconds = get_backend().interval_seconds(
+            'CASE WHEN start_time < %s THEN %s ELSE start_time END',
+            'CASE WHEN COALESCE(end_time, %s) > %s THEN %s ELSE COALESCE(end_time, %s) END')
+        
+        with get_read_db(user_id) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT COALESCE(n.name, g.task_name) AS task_name, g.is_rest, g.seconds
+                FROM (
+                    SELECT task_name_id, task_name, is_rest,
+                           SUM({seconds}) AS seconds, MIN(start_time) AS first_start
+                    FROM tasks
+                    WHERE user_id = %s AND start_time <= %s
+                      AND (end_time IS NULL OR end_time > %s)
+                      AND (start_time >= %s OR end_time IS NULL)
+                    GROUP BY task_name_id, task_name, is_rest
+                ) g
+                LEFT JOIN task_names n ON n.id = g.task_name_id
+                ORDER BY g.first_start
+            """, (now, end_utc, end_utc, now, start_utc, start_utc,
+                  user_id, end_utc, start_utc, lookback))
+            
+            return [{
+                'task_name': row['task_name'],
+                'is_rest': bool(row['is_rest']),
+                'duration': timedelta(seconds=round(float(row['seconds']))),
+            } for row in cursor.fetchall()]
     
-    def end_task(self, end_time: datetime = None) -> bool:
-        """End the task"""
+    def end_task(self, end_time: datetime = None, auto: bool = False) -> bool:
+        """End the task (auto=True when ended by the workday auto-end job)"""
         if end_time is None:
             end_time = datetime.utcnow()
+        event_type = task_events.EVENT_AUTO_END if auto else task_events.EVENT_END
         
         try:
+            buffer = get_write_behind()
+            if buffer:
+                buffer.enqueue_end(self.id, self.user_id, end_time,
+                                   self.start_time, self.is_rest, event_type)
+                self.end_time = end_time
+                task_versions.bump(self.user_id)
+                return True
+            
             with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     UPDATE tasks SET end_time = %s WHERE id = %s
                 """, (end_time, self.id))
                 
-                self.end_time = end_time
-                return True
+                event = task_events.record_event(cursor, self.id, self.user_id, event_type,
+                                                 end_time, end_time=end_time)
+                jira_sync.enqueue_worklogs(cursor, [self.id])
+            
+            self.end_time = end_time
+            task_versions.bump(self.user_id)
+            task_events.publish([event])
+            return True
         except Exception as e:
             logger.error(f"Error ending task: {e}")
             return False
@@ -221,22 +482,46 @@ class Task:
         end = self.end_time or datetime.utcnow()
         return end - self.start_time
     
+    def get_duration_within(self, start_utc: datetime, end_utc: datetime) -> timedelta:
+        """Part of the task's duration inside a UTC range, e.g. a local day"""
+        end = self.end_time or datetime.utcnow()
+        return timedelta(seconds=clip_seconds(self.start_time, end, start_utc, end_utc))
+    
     def update_with_same_time(self, task_name: str, comment: Optional[str] = None, 
                             original_message: Optional[str] = None) -> bool:
         """Update task when time is the same (overwrite previous)"""
         try:
+            sync_pending_writes(self.user_id)
+            task_name_id = task_names.resolve_one(self.user_id, task_name)
+            jira_key, jira_project = jira_fields(task_name, original_message)
             with get_db() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     UPDATE tasks 
-                    SET task_name = %s, comment = %s, original_message = %s 
+                    SET task_name_id = %s, task_name = NULL, comment = %s, original_message = %s,
+                        jira_key = %s, jira_project = %s
                     WHERE id = %s
-                """, (task_name, comment, original_message, self.id))
+                """, (task_name_id, comment, original_message, jira_key, jira_project, self.id))
                 
-                self.task_name = task_name
-                self.comment = comment
-                self.original_message = original_message
-                return True
+                now = datetime.utcnow()
+                events = []
+                if task_name != self.task_name or original_message != self.original_message:
+                    events.append(task_events.make_event(
+                        self.id, self.user_id, task_events.EVENT_RENAME, now,
+                        task_name=task_name, original_message=original_message
+                    ))
+                if comment != self.comment:
+                    events.append(task_events.make_event(
+                        self.id, self.user_id, task_events.EVENT_COMMENT, now, comment=comment
+                    ))
+                task_events.record_events(cursor, events)
+            
+            self.task_name = task_name
+            self.comment = comment
+            self.original_message = original_message
+            task_versions.bump(self.user_id)
+            task_events.publish(events)
+            return True
         except Exception as e:
             logger.error(f"Error updating task: {e}")
             return False
@@ -0,0 +1,446 @@
+"""
+Reminders for users who have no running task during their workday.
+
+    REMINDERS=1
+
+Every user has at most one pending reminder, derived from the user's
+timezone and workday and from the task running at the last task event:
+
+* start of day - REMINDER_START_MINUTES after workday_start on a workday;
+* idle - REMINDER_IDLE_MINUTES after the last task ended;
+* long rest - REMINDER_REST_MINUTES after a rest started.
+
+Pending reminders are kept in a hierarchical timer wheel keyed by user id
+at absolute UTC instants, so rescheduling on a task event and firing are
+O(1) and nothing scans the users or tasks tables after startup. Due
+reminders are sent through a token bucket and checked against the database
+right before sending, so a task started in another process suppresses a
+stale reminder. REMINDER_RATE_PER_SECOND is the rate of all shards
+together: each shard gets its share, and the digest sender's rate is taken
+out of TELEGRAM_RATE_PER_SECOND first, so the bot as a whole stays below
+Telegram's limit of about 30 messages per second.
+
+Users turn reminders off with `/reminders off`.
+"""
+import os
+import threading
+import time as time_module
+from collections import deque
+from datetime import datetime, time, timedelta
+from typing import Optional, List, Dict, Any, Tuple, Callable, Hashable
+import pytz
+import logging
+
+from database import get_db, note_user_write
+from i18n import t
+import task_events
+import shutdown
+
+logger = logging.getLogger(__name__)
+
+REMINDERS_ENABLED = os.getenv("REMINDERS", "").lower() in ("1", "true", "yes")
+REMINDER_START_MINUTES = int(os.getenv("REMINDER_START_MINUTES", "30"))
+REMINDER_IDLE_MINUTES = int(os.getenv("REMINDER_IDLE_MINUTES", "30"))
+REMINDER_REST_MINUTES = int(os.getenv("REMINDER_REST_MINUTES", "60"))
+REMINDER_RATE_PER_SECOND = float(os.getenv("REMINDER_RATE_PER_SECOND", "20"))
+# Messages per second the bot's background senders share across all processes
+TELEGRAM_RATE_PER_SECOND = float(os.getenv("TELEGRAM_RATE_PER_SECOND", "28"))
+# Reminders are never starved completely by a digest rate above the budget
+MIN_REMINDER_RATE_PER_SECOND = 1.0
+# ISO weekdays with a workday, Monday is 1
+REMINDER_WEEKDAYS = {int(day) for day in os.getenv("REMINDER_WEEKDAYS", "1,2,3,4,5").split(",") if day}
+
+WHEEL_TICK_SECONDS = 1.0
+# 64 slots per level and 4 levels cover 64**4 seconds, about 194 days
+WHEEL_SLOTS = 64
+WHEEL_LEVELS = 4
+# Telegram asks to wait this long when it does not say how long
+DEFAULT_RETRY_AFTER_SECONDS = 5
+
+KIND_START = 'start'
+KIND_IDLE = 'idle'
+KIND_REST = 'rest'
+
+
+def shard_rate(shards: int = 1, reserved: float = 0.0) -> float:
+    """
+    Reminders per second for one of `shards` processes: REMINDER_RATE_PER_SECOND
+    split evenly, within what `reserved` (the digest sender) leaves of the budget.
+    """
+    total = min(REMINDER_RATE_PER_SECOND, TELEGRAM_RATE_PER_SECOND - reserved)
+    return max(total, MIN_REMINDER_RATE_PER_SECOND) / shards
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel of keyed timers.
+    schedule() and cancel() are O(1); advance() costs O(1) per tick plus
+    the timers it fires or moves down a level.
+    """
+
+    def __init__(self, now: float, tick_seconds: float = WHEEL_TICK_SECONDS,
+                 slots: int = WHEEL_SLOTS, levels: int = WHEEL_LEVELS):
+        self.tick_seconds = tick_seconds
+        self.slots = slots
+        self.levels = levels
+        self._tick = int(now // tick_seconds)
+        # level -> slot -> {key: (deadline tick, payload)}
+        self._wheel: List[List[Dict[Hashable, Tuple[int, Any]]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)]
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def _place(self, key: Hashable, deadline: int, payload: Any):
+        delta = deadline - self._tick
+        level = 0
+        span = self.slots
+        while delta >= span and level < self.levels - 1:
+            level += 1
+            span *= self.slots
+        # Beyond the top level the timer waits in the farthest slot and is placed again from there
+        placed = min(deadline, self._tick + span - 1)
+        slot = (placed // self.slots ** level) % self.slots
+        self._wheel[level][slot][key] = (deadline, payload)
+        self._where[key] = (level, slot)
+
+    def schedule(self, key: Hashable, at: float, payload: Any = None):
+        """Fire `key` at the epoch time `at`, replacing its pending timer"""
+        self.cancel(key)
+        self._place(key, max(int(-(-at // self.tick_seconds)), self._tick + 1), payload)
+
+    def cancel(self, key: Hashable) -> bool:
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self._wheel[level][slot][key]
+        return True
+
+    def advance(self, now: float) -> List[Tuple[Hashable, Any]]:
+        """Move the wheel to `now`; returns (key, payload) of the timers that fired"""
+        fired = []
+        target = int(now // self.tick_seconds)
+        while self._tick < target:
+            self._tick += 1
+            # Bring the next slot of each higher level down once the level below wrapped around
+            for level in range(1, self.levels):
+                if self._tick % self.slots ** level:
+                    break
+                slot = (self._tick // self.slots ** level) % self.slots
+                timers, self._wheel[level][slot] = self._wheel[level][slot], {}
+                for key, (deadline, payload) in timers.items():
+                    self._place(key, deadline, payload)
+            slot = self._tick % self.slots
+            timers, self._wheel[0][slot] = self._wheel[0][slot], {}
+            for key, (deadline, payload) in timers.items():
+                if deadline > self._tick:
+                    self._place(key, deadline, payload)
+                    continue
+                del self._where[key]
+                fired.append((key, payload))
+        return fired
+
+
+class TokenBucket:
+    """Allows `rate` operations per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time_module.monotonic()
+
+    def wait_time(self) -> float:
+        """Take a token if one is available; otherwise seconds until there is one"""
+        now = time_module.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+# Reminder instants
+
+def _epoch(value: datetime) -> float:
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def _local(settings: Dict[str, Any], value: datetime) -> datetime:
+    return pytz.utc.localize(value).astimezone(pytz.timezone(settings['timezone']))
+
+
+def _as_time(value) -> time:
+    # SQLite without declared types returns TIME columns as text
+    return time.fromisoformat(value) if isinstance(value, str) else value
+
+
+def in_workday(settings: Dict[str, Any], at: datetime) -> bool:
+    """True if the naive UTC instant falls within the user's workday"""
+    local = _local(settings, at)
+    return (local.isoweekday() in REMINDER_WEEKDAYS
+            and _as_time(settings['workday_start']) <= local.time() < _as_time(settings['workday_end']))
+
+
+def next_start_of_day(settings: Dict[str, Any], after: datetime) -> datetime:
+    """First start-of-day reminder after the naive UTC instant"""
+    tz = pytz.timezone(settings['timezone'])
+    day = _local(settings, after).date()
+    for offset in range(8):
+        current = day + timedelta(days=offset)
+        if current.isoweekday() not in REMINDER_WEEKDAYS:
+            continue
+        start = tz.localize(datetime.combine(current, _as_time(settings['workday_start'])))
+        at = start.astimezone(pytz.utc).replace(tzinfo=None) + timedelta(minutes=REMINDER_START_MINUTES)
+        if at > after:
+            return at
+    return after + timedelta(days=1)
+
+
+def next_reminder(settings: Dict[str, Any], running: Optional[Dict[str, Any]],
+                  since: datetime, now: datetime) -> Optional[Tuple[datetime, str]]:
+    """
+    (instant, kind) of the next reminder for a user whose running task is
+    `running` (a row with start_time and is_rest, or None since `since`).
+    """
+    if running is not None and not running['is_rest']:
+        return None
+    if running is not None:
+        at, kind = running['start_time'] + timedelta(minutes=REMINDER_REST_MINUTES), KIND_REST
+    else:
+        at, kind = since + timedelta(minutes=REMINDER_IDLE_MINUTES), KIND_IDLE
+    at = max(at, now)
+    if in_workday(settings, at):
+        return at, kind
+    return next_start_of_day(settings, max(since, now)), KIND_START
+
+
+def reminder_text(kind: str, locale: Optional[str] = None) -> str:
+    if kind == KIND_REST:
+        text = t(locale, 'reminder_rest', minutes=REMINDER_REST_MINUTES)
+    elif kind == KIND_IDLE:
+        text = t(locale, 'reminder_idle', minutes=REMINDER_IDLE_MINUTES)
+    else:
+        text = t(locale, 'reminder_start')
+    return text + "\n\n" + t(locale, 'reminders_disable_hint')
+
+
+# User state
+
+USER_STATE_SELECT = """
+    SELECT u.user_id, u.timezone, u.workday_start, u.workday_end, u.reminders_enabled, u.locale,
+           t.start_time, t.is_rest
+    FROM users u
+    LEFT JOIN tasks t ON t.user_id = u.user_id AND t.end_time IS NULL
+"""
+
+
+def _split_state(row: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    running = {'start_time': row['start_time'], 'is_rest': bool(row['is_rest'])} \
+        if row['start_time'] is not None else None
+    return row, running
+
+
+def load_user_state(user_id: int) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """(settings, running task) of one user; uses the primary key and idx_tasks_active"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(USER_STATE_SELECT + """
+            WHERE u.user_id = %s ORDER BY t.start_time DESC LIMIT 1
+        """, (user_id,))
+        row = cursor.fetchone()
+    return _split_state(row) if row else None
+
+
+def set_enabled(user_id: int, enabled: bool):
+    """Turn reminders on or off for the user"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET reminders_enabled = %s WHERE user_id = %s", (enabled, user_id))
+    note_user_write(user_id)
+    if _scheduler:
+        _scheduler.recheck(user_id)
+
+
+class ReminderScheduler:
+    """Timer wheel of pending reminders fed by task events, plus a rate-limited sender"""
+
+    def __init__(self, send: Callable[[int, str], None], shard: Optional[Tuple[int, int]] = None,
+                 rate_per_second: float = REMINDER_RATE_PER_SECOND):
+        self.send = send
+        self.shard = shard
+        self._wheel = TimerWheel(time_module.time())
+        self._bucket = TokenBucket(rate_per_second)
+        # Only the scheduler thread touches the wheel; others hand users over through the inbox
+        self._inbox = deque()
+        self._due = deque()
+        self._wake = threading.Event()
+        self._send_ready = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self.stats = {'pending': 0, 'rescheduled': 0, 'sent': 0, 'skipped': 0, 'failed': 0, 'throttled': 0}
+
+    # Lifecycle
+
+    def start(self):
+        self.load()
+        task_events.subscribe(self._on_event)
+        for name, target in (('reminders', self._run), ('reminder-sender', self._run_sender)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Reminders enabled for {len(self._wheel)} users")
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self._send_ready.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _owns(self, user_id: int) -> bool:
+        return self.shard is None or user_id % self.shard[1] == self.shard[0]
+
+    def load(self):
+        """Schedule every user from one query over users and their running tasks"""
+        now = datetime.utcnow()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(USER_STATE_SELECT + "WHERE u.reminders_enabled = %s", (True,))
+            rows = cursor.fetchall()
+        for row in rows:
+            if self._owns(row['user_id']):
+                # The last end of an idle user is unknown here: wait for the next workday
+                # rather than nudging everyone right after a restart
+                settings, running = _split_state(row)
+                self._schedule(row['user_id'], settings, running, now, next_day=running is None)
+
+    # Scheduling
+
+    def _on_event(self, event: Dict[str, Any]):
+        if event['event_type'] in (task_events.EVENT_START,) + task_events.END_EVENTS \
+                and self._owns(event['user_id']):
+            self.recheck(event['user_id'])
+
+    def recheck(self, user_id: int, reminded: bool = False):
+        """
+        Recompute the user's reminder from the database (thread-safe).
+        A user just reminded is not reminded again before the next workday.
+        """
+        self._inbox.append((user_id, reminded))
+        self._wake.set()
+
+    def _schedule(self, user_id: int, settings: Dict[str, Any], running: Optional[Dict[str, Any]],
+                  now: datetime, next_day: bool = False):
+        if not settings['reminders_enabled']:
+            self._wheel.cancel(user_id)
+            return
+        if next_day:
+            reminder = next_start_of_day(settings, now), KIND_START
+        else:
+            reminder = next_reminder(settings, running, now, now)
+        if reminder is None:
+            self._wheel.cancel(user_id)
+        else:
+            self._wheel.schedule(user_id, _epoch(reminder[0]), reminder[1])
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(WHEEL_TICK_SECONDS)
+            self._wake.clear()
+            try:
+                now = datetime.utcnow()
+                while self._inbox:
+                    user_id, reminded = self._inbox.popleft()
+                    state = load_user_state(user_id)
+                    if state is not None:
+                        settings, running = state
+                        self._schedule(user_id, settings, running, now,
+                                       next_day=reminded and (running is None or running['is_rest']))
+                        self.stats['rescheduled'] += 1
+                fired = self._wheel.advance(time_module.time())
+                if fired:
+                    self._due.extend(fired)
+                    self._send_ready.set()
+                self.stats['pending'] = len(self._wheel)
+            except Exception as e:
+                logger.error(f"Reminder scheduling failed: {e}")
+
+    # Sending
+
+    def _run_sender(self):
+        while not self._stopped.is_set():
+            if not self._due:
+                self._send_ready.wait(WHEEL_TICK_SECONDS)
+                self._send_ready.clear()
+                continue
+            delay = self._bucket.wait_time()
+            if delay:
+                self._stopped.wait(delay)
+                continue
+            user_id, kind = self._due.popleft()
+            sent = False
+            try:
+                sent = self.deliver(user_id, kind)
+            except Exception as e:
+                logger.error(f"Reminder for user {user_id} failed: {e}")
+                self.stats['failed'] += 1
+            self.recheck(user_id, reminded=sent)
+
+    def deliver(self, user_id: int, kind: str) -> bool:
+        """Send the reminder if it still applies; returns True if it was sent"""
+        state = load_user_state(user_id)
+        if state is None or not state[0]['reminders_enabled']:
+            self.stats['skipped'] += 1
+            return False
+        settings, running = state
+        still_due = (running is not None and running['is_rest']) if kind == KIND_REST else running is None
+        if not still_due or not in_workday(settings, datetime.utcnow()):
+            self.stats['skipped'] += 1
+            return False
+        try:
+            self.send(user_id, reminder_text(kind, settings['locale']))
+        except Exception as e:
+            code = getattr(e, 'error_code', None)
+            if code == 429:
+                retry_after = (getattr(e, 'result_json', None) or {}).get('parameters', {}).get(
+                    'retry_after', DEFAULT_RETRY_AFTER_SECONDS)
+                self.stats['throttled'] += 1
+                self._stopped.wait(retry_after)
+                self._due.appendleft((user_id, kind))
+                return False
+            if code == 403:
+                # The user blocked the bot
+                set_enabled(user_id, False)
+            raise
+        self.stats['sent'] += 1
+        return True
+
+
+_scheduler: Optional[ReminderScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_reminders(send: Optional[Callable[[int, str], None]] = None,
+                  shard: Optional[Tuple[int, int]] = None,
+                  reserved_rate: float = 0.0) -> Optional[ReminderScheduler]:
+    """
+    Return the process-wide scheduler, started on the first call with `send`; None when disabled.
+    `reserved_rate` is the send rate other background senders (the digest) take out of the budget.
+    """
+    global _scheduler
+    if not REMINDERS_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None and send is not None:
+            rate = shard_rate(shard[1] if shard else 1, reserved_rate)
+            _scheduler = ReminderScheduler(send, shard, rate_per_second=rate)
+            _scheduler.start()
+            shutdown.register('reminders', _scheduler.stop, shutdown.ORDER_STOP_WORKERS)
+    return _scheduler
@@ -0,0 +1,172 @@
+"""
+Long reports split into pages that fit a Telegram message.
+
+Telegram rejects messages longer than 4096 characters (counted in UTF-16
+code units), which a busy day's summary easily exceeds. `paginate()` cuts a
+report at blank lines between task blocks, or at line ends if a block is
+too long itself. Markdown entities in reports do not span lines, so pages
+stay valid; only a single line longer than a page is cut within the line.
+
+The rendered pages are kept in `page_cache` under (user, report, version)
+for REPORT_PAGE_TTL_SECONDS. The ◀ ▶ buttons under a page only carry the
+entry's id and the page number, so turning a page edits the message from
+the cache without querying the database. The cache is per process; with
+supervisor.py a user's callbacks reach the shard that rendered the report.
+An entry that expired or was lost in a restart is answered with "request
+the report again".
+"""
+import os
+import threading
+import itertools
+import time as time_module
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple, Hashable
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Below Telegram's limit, with room for what the caller adds to a page
+PAGE_CHARS = min(int(os.getenv("REPORT_PAGE_CHARS", "4000")), TELEGRAM_MESSAGE_LIMIT)
+PAGE_TTL_SECONDS = float(os.getenv("REPORT_PAGE_TTL_SECONDS", "1800"))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_PAGE_CACHE_MAX_ENTRIES", "10000"))
+
+
+def message_length(text: str) -> int:
+    """Length as Telegram counts it: emoji outside the BMP take two units"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _split_long_line(line: str, limit: int) -> List[str]:
+    pieces = []
+    while message_length(line) > limit:
+        cut = limit
+        while message_length(line[:cut]) > limit:
+            cut -= 1
+        pieces.append(line[:cut])
+        line = line[cut:]
+    return pieces + [line] if line else pieces
+
+
+def paginate(text: str, limit: int = PAGE_CHARS) -> List[str]:
+    """Split the report into pages of at most `limit` characters"""
+    if message_length(text) <= limit:
+        return [text]
+
+    # Blocks end with a blank line: a task with its time and comment lines
+    blocks = []
+    block = []
+    for line in text.splitlines(keepends=True):
+        block.append(line)
+        if not line.strip():
+            blocks.append(block)
+            block = []
+    if block:
+        blocks.append(block)
+
+    pages = []
+    page = []
+    size = 0
+    for block in blocks:
+        block_size = sum(message_length(line) for line in block)
+        units = [block] if block_size <= limit else \
+            [[piece] for line in block for piece in _split_long_line(line, limit)]
+        for unit in units:
+            unit_size = sum(message_length(line) for line in unit)
+            if page and size + unit_size > limit:
+                pages.append("".join(page))
+                page = []
+                size = 0
+            page.extend(unit)
+            size += unit_size
+    if page:
+        pages.append("".join(page))
+    # Blank lines between blocks are not worth a message of their own
+    return [page.strip("\n") for page in pages if page.strip()]
+
+
+class PagedReport:
+    """Rendered pages of one report"""
+
+    def __init__(self, entry_id: int, user_id: int, report: str, version: Hashable,
+                 pages: List[str], expires_at: float):
+        self.entry_id = entry_id
+        self.user_id = user_id
+        self.report = report
+        self.version = version
+        self.pages = pages
+        self.expires_at = expires_at
+
+
+class ReportPageCache:
+    """Pages of recent reports by entry id, bounded by count and age"""
+
+    def __init__(self, max_entries: int = PAGE_CACHE_MAX_ENTRIES, ttl: float = PAGE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, PagedReport]" = OrderedDict()
+        self._by_key: Dict[Tuple[int, str, Hashable], int] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def put(self, user_id: int, report: str, version: Hashable, pages: List[str]) -> PagedReport:
+        """
+        Keep the pages. A report with the same key keeps its entry id and gets the new
+        pages, so buttons under an earlier message of the same version stay usable.
+        """
+        key = (user_id, report, version)
+        now = time_module.monotonic()
+        with self._lock:
+            entry = self._entries.get(self._by_key.get(key))
+            if entry is not None:
+                entry.pages = pages
+                entry.expires_at = now + self.ttl
+                self._entries.move_to_end(entry.entry_id)
+                return entry
+            entry = PagedReport(next(self._ids), user_id, report, version, pages, now + self.ttl)
+            self._entries[entry.entry_id] = entry
+            self._by_key[key] = entry.entry_id
+            # Entries are ordered by last put with the same TTL: expired ones are at the front
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if len(self._entries) <= self.max_entries and oldest.expires_at > now:
+                    break
+                self._drop(oldest)
+                self._evictions += 1
+        return entry
+
+    def get(self, entry_id: int, user_id: int) -> Optional[PagedReport]:
+        """The user's report with this id, None if it expired or belongs to someone else"""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is not None and entry.expires_at <= time_module.monotonic():
+                self._drop(entry)
+                entry = None
+            if entry is None or entry.user_id != user_id:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return entry
+
+    def _drop(self, entry: PagedReport):
+        self._entries.pop(entry.entry_id, None)
+        key = (entry.user_id, entry.report, entry.version)
+        if self._by_key.get(key) == entry.entry_id:
+            del self._by_key[key]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'hit_rate': round(self._hits / lookups, 3) if lookups else None,
+        }
+
+
+page_cache = ReportPageCache()
@@ -15,12 +15,16 @@ def main():
     """Run the application with Gunicorn"""
     port = os.environ.get('PORT', '5000')
     workers = os.environ.get('WEB_CONCURRENCY', '2')
+    # Each open /live/tasks stream holds a worker thread; use e.g. WEB_WORKER_CLASS=gthread WEB_THREADS=100
+    worker_class = os.environ.get('WEB_WORKER_CLASS', 'sync')
+    threads = os.environ.get('WEB_THREADS', '1')
     
     cmd = [
         sys.executable, '-m', 'gunicorn',
         '--bind', f'0.0.0.0:{port}',
         '--workers', str(workers),
-        '--worker-class', 'sync',
+        '--worker-class', worker_class,
+        '--threads', str(threads),
         '--timeout', '60',
         '--access-logfile', '-',
         '--error-logfile', '-',
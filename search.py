@@ -0,0 +1,105 @@
+"""
+Search over a user's task history (/find).
+
+On PostgreSQL task names are matched with ILIKE backed by a pg_trgm GIN
+index on task_names, and comments/messages through the tasks.search_vector
+full-text index. SQLite falls back to LIKE over the user's rows, which the
+(user_id, start_time) index keeps to a single user's history.
+
+Results are returned newest first in pages; the cursor of the next page is
+the (start_time, id) of the last task shown (keyset pagination), so deep
+pages cost the same as the first one.
+"""
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+import logging
+
+from database import get_read_db, get_backend
+from models import Task, TASK_SELECT, sync_pending_writes
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 10
+MAX_QUERY_LENGTH = 100
+
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def _match_condition(query: str) -> Tuple[str, List[Any]]:
+    """WHERE fragment (over TASK_SELECT aliases) matching the query"""
+    pattern = _like_pattern(query)
+    if get_backend().name == 'postgres':
+        return """(
+            t.task_name_id IN (
+                SELECT id FROM task_names
+                WHERE user_id = t.user_id AND name ILIKE %s ESCAPE '\\'
+            )
+            OR t.search_vector @@ plainto_tsquery('simple', %s)
+            OR t.task_name ILIKE %s ESCAPE '\\'
+        )""", [pattern, query, pattern]
+    pattern = pattern.lower()
+    return """(
+        unicode_lower(COALESCE(n.name, t.task_name)) LIKE %s ESCAPE '\\'
+        OR unicode_lower(t.comment) LIKE %s ESCAPE '\\'
+        OR unicode_lower(t.original_message) LIKE %s ESCAPE '\\'
+    )""", [pattern, pattern, pattern]
+
+
+def encode_cursor(task: Task) -> str:
+    return f"{task.start_time.isoformat()}|{task.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    start_time, task_id = cursor.rsplit('|', 1)
+    return datetime.fromisoformat(start_time), int(task_id)
+
+
+def search_tasks(user_id: int, query: str, page_size: int = PAGE_SIZE,
+                 after: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One page of the user's tasks matching the query, plus totals over all
+    matches: {'tasks', 'total_count', 'total_duration', 'next_cursor'}.
+    """
+    query = query.strip()[:MAX_QUERY_LENGTH]
+    condition, params = _match_condition(query)
+    seconds = get_backend().interval_seconds('t.start_time', 'COALESCE(t.end_time, %s)')
+
+    sync_pending_writes(user_id)
+    with get_read_db(user_id) as conn:
+        cursor = conn.cursor()
+
+        # Totals only on the first page; later pages reuse what the user saw
+        totals = None
+        if after is None:
+            cursor.execute(f"""
+                SELECT COUNT(*) AS total_count, COALESCE(SUM({seconds}), 0) AS total_seconds
+                FROM tasks t
+                LEFT JOIN task_names n ON n.id = t.task_name_id
+                WHERE t.user_id = %s AND {condition}
+            """, [datetime.utcnow(), user_id] + params)
+            totals = cursor.fetchone()
+
+        page_condition = ""
+        page_params = []
+        if after is not None:
+            start_time, task_id = decode_cursor(after)
+            page_condition = "AND (t.start_time, t.id) < (%s, %s)"
+            page_params = [start_time, task_id]
+        cursor.execute(TASK_SELECT + f"""
+            WHERE t.user_id = %s AND {condition} {page_condition}
+            ORDER BY t.start_time DESC, t.id DESC
+            LIMIT %s
+        """, [user_id] + params + page_params + [page_size + 1])
+        rows = cursor.fetchall()
+
+    tasks = [Task.from_row(row) for row in rows[:page_size]]
+    return {
+        'tasks': tasks,
+        'total_count': totals['total_count'] if totals else None,
+        'total_duration': (timedelta(seconds=round(float(totals['total_seconds'])))
+                           if totals else None),
+        'next_cursor': encode_cursor(tasks[-1]) if len(rows) > page_size else None,
+    }
@@ -0,0 +1,132 @@
+"""
+Graceful shutdown: stop intake, drain in-flight work, run cleanup hooks.
+
+Components with buffered state register a hook (write-behind flush, Jira
+sync, connection pools) and the entry point calls drain() and run_hooks()
+once intake has stopped. Handlers are counted through `in_flight` from the
+moment an update is queued until its handler returns, so a task switch
+(end the current task, create the next one) is either completed or never
+started.
+"""
+import os
+import signal
+import threading
+import time as time_module
+from typing import Callable, Dict, Any, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "25"))
+
+# Hooks run in ascending order: flush buffers first, close connections last
+ORDER_FLUSH = 100
+ORDER_STOP_WORKERS = 200
+ORDER_CLOSE = 900
+
+
+class InFlight:
+    """Count of queued or running handlers"""
+
+    def __init__(self):
+        self._count = 0
+        self._total = 0
+        self._condition = threading.Condition()
+
+    def begin(self):
+        with self._condition:
+            self._count += 1
+            self._total += 1
+
+    def end(self):
+        with self._condition:
+            self._count -= 1
+            if self._count == 0:
+                self._condition.notify_all()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Wait until nothing is in flight; False if the timeout ran out first"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._count == 0, timeout)
+
+
+in_flight = InFlight()
+
+_hooks: List[Tuple[int, str, Callable[[], Any]]] = []
+_hooks_lock = threading.Lock()
+_stop_requested = threading.Event()
+
+
+def register(name: str, callback: Callable[[], Any], order: int = ORDER_FLUSH):
+    """Run callback on shutdown; hooks with the same name are registered once"""
+    with _hooks_lock:
+        if any(hook_name == name for _, hook_name, _ in _hooks):
+            return
+        _hooks.append((order, name, callback))
+        _hooks.sort(key=lambda hook: hook[0])
+
+
+def install_signal_handlers(on_stop: Callable[[], Any]):
+    """Call on_stop (once) on SIGTERM or SIGINT; must be called from the main thread"""
+    def handler(signum, frame):
+        if _stop_requested.is_set():
+            logger.warning("Shutdown already in progress")
+            return
+        _stop_requested.set()
+        logger.info(f"Received {signal.Signals(signum).name}, stopping intake")
+        on_stop()
+
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+
+def stop_requested() -> bool:
+    return _stop_requested.is_set()
+
+
+def run_hooks() -> Dict[str, float]:
+    """Run all hooks in order; returns milliseconds per hook"""
+    with _hooks_lock:
+        hooks = list(_hooks)
+    timings = {}
+    for _, name, callback in hooks:
+        started = time_module.perf_counter()
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Shutdown hook {name} failed: {e}")
+        timings[name] = round((time_module.perf_counter() - started) * 1000, 1)
+    return timings
+
+
+def drain(timeout: float = SHUTDOWN_TIMEOUT) -> Dict[str, Any]:
+    """
+    Wait for in-flight handlers, then run the hooks. Returns a report:
+    {'drained', 'abandoned', 'drain_ms', 'hooks_ms', 'total_ms'}.
+    """
+    started = time_module.perf_counter()
+    pending = in_flight.count
+    idle = in_flight.wait_idle(timeout)
+    drain_ms = (time_module.perf_counter() - started) * 1000
+    abandoned = in_flight.count
+    if not idle:
+        logger.error(f"Shutdown deadline of {timeout:g} s reached with {abandoned} handlers still running")
+
+    hooks_ms = run_hooks()
+    report = {
+        'drained': pending - abandoned,
+        'abandoned': abandoned,
+        'drain_ms': round(drain_ms, 1),
+        'hooks_ms': hooks_ms,
+        'total_ms': round((time_module.perf_counter() - started) * 1000, 1),
+    }
+    logger.info(f"Shutdown complete: {report}")
+    return report
@@ -6,6 +6,8 @@ from database import init_database
 from models import User, Task
 from task_parser import parse_task_message, format_task_for_display
 from time_utils import format_duration, format_time_for_user, create_datetime_from_time, parse_time_from_message
+from summary import get_day_summary
+from i18n import t, user_locale, button_key, button_locale, locale_for_language_code, LANGUAGE_NAMES
 from datetime import datetime, time, timedelta
 import pytz
 
@@ -38,11 +40,11 @@ if not BOT_TOKEN:
 
 bot = telebot.TeleBot(BOT_TOKEN)
 
-def get_main_keyboard():
+def get_main_keyboard(locale=None):
     """Get main keyboard with buttons"""
     keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
-    keyboard.row(KeyboardButton("🏖️ Отдых"), KeyboardButton("📊 Сводка"))
-    keyboard.row(KeyboardButton("❓ Помощь"))
+    keyboard.row(KeyboardButton(t(locale, 'btn_rest')), KeyboardButton(t(locale, 'btn_summary')))
+    keyboard.row(KeyboardButton(t(locale, 'btn_help')))
     return keyboard
 
 @bot.message_handler(commands=['start'])
@@ -53,32 +55,17 @@ def start_command(message):
     
     # Create or get user
     user = User.get_or_create(user_id)
+    if user.locale is None:
+        user.update_locale(locale_for_language_code(message.from_user.language_code))
     
-    text = f"""
-🎯 *Добро пожаловать в Telegram-бот для трекинга времени!*
-
-Я помогу вам эффективно отслеживать время работы над задачами.
-
-*Основные возможности:*
-• Автоматический учет времени задач
-• Интеграция с Jira (поддержка ссылок и тикетов)
-• Настройка часового пояса и рабочего времени
-• Автоматическое завершение задач
-• Детальная аналитика и отчеты
-
-*Быстрый старт:*
-1. Настройте часовой пояс: `/set_timezone Europe/Moscow`
-2. Установите рабочие часы: `/set_workday 09:00 18:00`
-3. Создайте задачу: просто отправьте название
-
-*Текущие настройки:*
-• Часовой пояс: `{user.timezone}`
-• Рабочее время: `{user.workday_start.strftime('%H:%M')} - {user.workday_end.strftime('%H:%M')}`
-
-Используйте кнопки ниже для быстрого доступа к функциям.
-    """
+    locale = user_locale(user)
+    text = t(locale, 'welcome',
+             timezone=user.timezone,
+             workday_start=user.workday_start.strftime('%H:%M'),
+             workday_end=user.workday_end.strftime('%H:%M'),
+             language=LANGUAGE_NAMES[locale])
     
-    bot.reply_to(message, text, parse_mode='Markdown', reply_markup=get_main_keyboard())
+    bot.reply_to(message, text, parse_mode='Markdown', reply_markup=get_main_keyboard(locale))
 
 @bot.message_handler(commands=['set_timezone'])
 def set_timezone_command(message):
@@ -160,12 +147,13 @@ def set_workday_command(message):
     
     bot.reply_to(message, text, parse_mode='Markdown')
 
-@bot.message_handler(func=lambda message: message.text == "🏖️ Отдых")
+@bot.message_handler(func=lambda message: button_key(message.text) == 'btn_rest')
 def handle_rest_button(message):
     """Handle 'Отдых' button press"""
     log_user_request(message, "кнопка Отдых")
     user_id = message.from_user.id
     user = User.get_or_create(user_id)
+    locale = user_locale(user)
     
     # End current task
     current_task = Task.get_active_task(user_id)
@@ -173,7 +161,8 @@ def handle_rest_button(message):
         current_task.end_task()
     
     # Start rest task
-    rest_task = Task.create(user_id, "🏖️ Отдых", is_rest=True)
+    rest_task = Task.create(user_id, t(locale, 'rest_task_name'), comment=t(locale, 'rest_task_comment'),
+                            is_rest=True)
     
     if current_task:
         duration = current_task.get_duration()
@@ -191,129 +180,32 @@ def handle_rest_button(message):
 Для продолжения работы отправьте название новой задачи или нажмите кнопку "Сводка" для просмотра статистики.
     """
     
-    bot.reply_to(message, text, parse_mode='Markdown', reply_markup=get_main_keyboard())
+    bot.reply_to(message, text, parse_mode='Markdown', reply_markup=get_main_keyboard(locale))
 
-@bot.message_handler(func=lambda message: message.text == "📊 Сводка")
+@bot.message_handler(func=lambda message: button_key(message.text) == 'btn_summary')
 def handle_summary_button(message):
     """Handle 'Сводка' button press"""
     log_user_request(message, "кнопка Сводка")
     user_id = message.from_user.id
     user = User.get_or_create(user_id)
+    locale = user_locale(user)
     
     # Get today's date in user's timezone
-    today = user.get_local_time().replace(hour=0, minute=0, second=0, microsecond=0)
+    user_now = user.get_local_time()
     
-    # Get all tasks for today
-    tasks = Task.get_tasks_for_date(user_id, today)
+    text = get_day_summary(user, user_now)
+    if text is None:
+        text = t(locale, 'summary_empty', date=user_now.strftime('%d.%m.%Y'))
     
-    if not tasks:
-        text = f"""
-📊 *Сводка за {today.strftime('%d %B %Y')}*
-
-Задач за сегодня не найдено.
+    bot.reply_to(message, text, parse_mode='Markdown', reply_markup=get_main_keyboard(locale))
 
-Начните отслеживание времени, отправив название задачи!
-        """
-        bot.reply_to(message, text, parse_mode='Markdown', reply_markup=get_main_keyboard())
-        return
-    
-    # Get current task
-    current_task = Task.get_active_task(user_id)
-    
-    # Build summary
-    message_parts = [f"📊 *Сводка за {today.strftime('%d %B %Y')}*"]
-    
-    if current_task:
-        current_duration = current_task.get_duration()
-        current_display = format_task_for_display(current_task.task_name, original_message=current_task.original_message)
-        message_parts.append(f"\n🔄 *Текущая задача:*")
-        message_parts.append(f"**{current_display}** (начата в {format_time_for_user(current_task.start_time, user)}, выполняется {format_duration(current_duration)})")
-    
-    # Group tasks by name and calculate totals
-    task_groups = {}
-    total_work_time = timedelta()
-    
-    for task in tasks:
-        duration = task.get_duration()
-        
-        if not task.is_rest:
-            total_work_time += duration
-        
-        if task.task_name in task_groups:
-            task_groups[task.task_name]['duration'] += duration
-            task_groups[task.task_name]['tasks'].append(task)
-        else:
-            task_groups[task.task_name] = {
-                'duration': duration,
-                'tasks': [task],
-                'is_rest': task.is_rest,
-                'original_message': task.original_message
-            }
-    
-    # Add tasks list
-    message_parts.append(f"\n📋 *Задачи за день:*")
-    
-    for task_name, group in task_groups.items():
-        duration_str = format_duration(group['duration'])
-        task_display = format_task_for_display(task_name, original_message=group.get('original_message'))
-        
-        if group['is_rest']:
-            message_parts.append(f"• **{task_display}** — {duration_str}")
-        else:
-            if task_name == current_task.task_name if current_task else False:
-                message_parts.append(f"• **{task_display}** — {duration_str} (текущая)")
-            else:
-                message_parts.append(f"• **{task_display}** — {duration_str}")
-    
-    # Add total work time
-    if total_work_time.total_seconds() > 0:
-        message_parts.append(f"\n⏱️ *Общее рабочее время:* {format_duration(total_work_time)}")
-    
-    text = "\n".join(message_parts)
-    
-    bot.reply_to(message, text, parse_mode='Markdown', reply_markup=get_main_keyboard())
-
-@bot.message_handler(func=lambda message: message.text == "❓ Помощь")
+@bot.message_handler(func=lambda message: button_key(message.text) == 'btn_help')
 def handle_help_button(message):
     """Handle 'Помощь' button press"""
     log_user_request(message, "кнопка Помощь")
-    text = """
-❓ *Справка по использованию бота*
-
-*🎯 Основные команды:*
-• `/start` — начать работу с ботом
-• `/set_timezone <timezone>` — установить часовой пояс
-• `/set_workday <start> <end>` — настроить рабочее время
-
-*📝 Создание задач:*
-• `Разработка функции` — простая задача
-• `14:30 Планерка` — задача с указанием времени
-• `Код-ревью - проверка PR` — задача с комментарием
-
-*🔗 Поддержка Jira:*
-• `https://jira.company.com/PROJ-123`
-• `TASK-456 - исправление бага`
-• Автоматическое распознавание тикетов
-
-*🎛️ Кнопки управления:*
-• **🏖️ Отдых** — завершить задачу и начать перерыв
-• **📊 Сводка** — отчет за текущий день
-• **❓ Помощь** — эта справка
-
-*⚙️ Автоматические функции:*
-• Завершение задач в конце рабочего дня
-• Группировка одинаковых задач в отчетах
-• Поддержка часовых поясов
-• Сохранение истории работы
-
-*💡 Советы:*
-• Указывайте время в формате `14:30` или `14_30`
-• Используйте тире для отделения комментариев
-• Задачи автоматически завершаются при создании новой
-• Вся статистика сохраняется и доступна в сводках
-    """
+    locale = button_locale(message.text)
     
-    bot.reply_to(message, text, parse_mode='Markdown', reply_markup=get_main_keyboard())
+    bot.reply_to(message, t(locale, 'help'), parse_mode='Markdown', reply_markup=get_main_keyboard(locale))
 
 @bot.message_handler(func=lambda message: True)
 def handle_task_message(message):
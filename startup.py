@@ -0,0 +1,69 @@
+"""
+Startup timing.
+
+Entry points wrap their initialization steps in `phase()`. With
+`--startup-profile` they print `report()`: those phases plus the import
+cost of each module the entry point imports directly, measured in a fresh
+interpreter with `python -X importtime` so already-loaded modules do not
+hide their cost.
+"""
+import os
+import sys
+import subprocess
+import time as time_module
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# Imported first by entry points, so this approximates the start of their imports
+STARTED = time_module.perf_counter()
+
+_phases: List[Tuple[str, float]] = []
+
+
+@contextmanager
+def phase(name: str):
+    """Record how long the enclosed block takes"""
+    started = time_module.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, (time_module.perf_counter() - started) * 1000))
+
+
+def mark(name: str):
+    """Record the time elapsed since this module was imported"""
+    _phases.append((name, (time_module.perf_counter() - STARTED) * 1000))
+
+
+def import_breakdown(module: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """Total import time of `module` and the cumulative time of each of its direct imports (ms)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, env=os.environ.copy(),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    # Children are printed before their parent, so collect depth-1 lines until the module's own line
+    total = 0.0
+    direct = []
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative) / 1000))
+        elif depth == 0:
+            if name.strip() == module:
+                total = int(cumulative) / 1000
+                direct = children
+            children = []
+    return total, sorted(direct, key=lambda item: item[1], reverse=True)
+
+
+def report(module: str, top: int = 15) -> str:
+    """Text breakdown of import and initialization time"""
+    total, direct = import_breakdown(module)
+    lines = [f"Startup profile of {module}", "", f"import {module}: {total:.1f} ms"]
+    lines += [f"  {name:<30} {ms:8.1f} ms" for name, ms in direct[:top]]
+    lines += ["", "initialization:"]
+    lines += [f"  {name:<30} {ms:8.1f} ms" for name, ms in _phases]
+    return "\n".join(lines)
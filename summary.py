@@ -0,0 +1,241 @@
+"""
+Daily summary rendering with a per-user cache.
+
+Repeated taps of "📊 Сводка" mostly ask for the same data: closed tasks do
+not change until the user creates, ends or edits a task, and every such
+write bumps the user's task version (see task_versions). The cache keeps
+the rendered lines of closed tasks together with their totals under that
+version, so a repeat tap only recomputes the running task's duration and
+skips the database entirely.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple, Union
+import logging
+
+from models import Task
+from task_parser import format_task_for_display
+from time_utils import format_duration, format_time_for_user
+from i18n import t, user_locale, escape_markdown
+import task_versions
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Rough per-entry bookkeeping cost on top of the rendered text
+_ENTRY_OVERHEAD_BYTES = 512
+
+
+class DaySummary:
+    """Closed-task part of a day summary plus the tasks still running"""
+
+    def __init__(self, day, work_items: List[Union[str, Task]], rest_items: List[Union[str, Task]],
+                 closed_work: timedelta, closed_rest: timedelta, base_url: Optional[str] = None,
+                 bounds: Optional[Tuple[datetime, datetime]] = None):
+        self.day = day
+        self.base_url = base_url
+        self.bounds = bounds
+        self.work_items = work_items
+        self.rest_items = rest_items
+        self.closed_work = closed_work
+        self.closed_rest = closed_rest
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.work_items and not self.rest_items
+
+    @property
+    def size(self) -> int:
+        text = sum(sys.getsizeof(item) for item in self.work_items + self.rest_items
+                   if isinstance(item, str))
+        return text + _ENTRY_OVERHEAD_BYTES
+
+
+def _crosses(task: Task, bounds: Optional[Tuple[datetime, datetime]]) -> bool:
+    if bounds is None:
+        return False
+    start_utc, end_utc = (bound.replace(tzinfo=None) for bound in bounds)
+    return task.start_time < start_utc or (task.end_time or datetime.utcnow()) > end_utc
+
+
+def _day_duration(task: Task, bounds: Optional[Tuple[datetime, datetime]]) -> timedelta:
+    """Duration counted for the day: a task crossing midnight only counts its part"""
+    if _crosses(task, bounds):
+        return task.get_duration_within(*bounds)
+    return task.get_duration()
+
+
+def _duration_text(task: Task, bounds: Optional[Tuple[datetime, datetime]], locale: str) -> str:
+    if _crosses(task, bounds):
+        return t(locale, 'summary_day_part', day=format_duration(task.get_duration_within(*bounds), locale),
+                 total=format_duration(task.get_duration(), locale))
+    return format_duration(task.get_duration(), locale)
+
+
+def _work_lines(task: Task, user, base_url: Optional[str] = None,
+                bounds: Optional[Tuple[datetime, datetime]] = None) -> str:
+    locale = user_locale(user)
+    start_time = format_time_for_user(task.start_time, user)
+    end_time = format_time_for_user(task.end_time, user) if task.end_time else t(locale, 'not_finished')
+    task_display = format_task_for_display(task.task_name, original_message=task.original_message,
+                                           base_url=base_url)
+    lines = [
+        t(locale, 'summary_task', task=task_display),
+        t(locale, 'summary_task_time', start=start_time, end=end_time,
+          duration=_duration_text(task, bounds, locale)),
+    ]
+    if task.comment:
+        lines.append(t(locale, 'summary_task_comment', comment=escape_markdown(task.comment)))
+    lines.append("\n")
+    return "\n".join(lines)
+
+
+def _rest_line(task: Task, user, bounds: Optional[Tuple[datetime, datetime]] = None) -> str:
+    locale = user_locale(user)
+    start_time = format_time_for_user(task.start_time, user)
+    end_time = format_time_for_user(task.end_time, user) if task.end_time else t(locale, 'summary_rest_not_finished')
+    return t(locale, 'summary_rest', start=start_time, end=end_time,
+             duration=_duration_text(task, bounds, locale)) + "\n"
+
+
+def prepare_day_summary(user, tasks: List[Task], day, base_url: Optional[str] = None,
+                        bounds: Optional[Tuple[datetime, datetime]] = None) -> DaySummary:
+    """
+    Pre-render closed tasks; running tasks are kept to be rendered on demand.
+    With the day's UTC bounds, tasks crossing midnight count only their part within the day.
+    """
+    work_items = []
+    rest_items = []
+    closed_work = timedelta()
+    closed_rest = timedelta()
+
+    for task in tasks:
+        if task.is_rest:
+            if task.end_time:
+                closed_rest += _day_duration(task, bounds)
+                rest_items.append(_rest_line(task, user, bounds))
+            else:
+                rest_items.append(task)
+        else:
+            if task.end_time:
+                closed_work += _day_duration(task, bounds)
+                work_items.append(_work_lines(task, user, base_url, bounds))
+            else:
+                work_items.append(task)
+
+    return DaySummary(day, work_items, rest_items, closed_work, closed_rest, base_url, bounds)
+
+
+def render_day_summary(summary: DaySummary, user) -> Optional[str]:
+    """Markdown text of the summary in the user's locale; None when the day has no tasks"""
+    if summary.is_empty:
+        return None
+
+    locale = user_locale(user)
+    total_work_time = summary.closed_work
+    total_rest_time = summary.closed_rest
+    work_lines = []
+    rest_lines = []
+    for item in summary.work_items:
+        if isinstance(item, Task):
+            total_work_time += _day_duration(item, summary.bounds)
+            item = _work_lines(item, user, summary.base_url, summary.bounds)
+        work_lines.append(item)
+    for item in summary.rest_items:
+        if isinstance(item, Task):
+            total_rest_time += _day_duration(item, summary.bounds)
+            item = _rest_line(item, user, summary.bounds)
+        rest_lines.append(item)
+
+    # One join over all pieces instead of growing the text line by line
+    parts = [
+        t(locale, 'summary_title', date=summary.day.strftime('%d.%m.%Y')), "\n\n",
+        t(locale, 'summary_work_time', duration=format_duration(total_work_time, locale)), "\n",
+        t(locale, 'summary_rest_time', duration=format_duration(total_rest_time, locale)), "\n",
+        t(locale, 'summary_total_time', duration=format_duration(total_work_time + total_rest_time, locale)),
+        "\n\n",
+    ]
+    if work_lines:
+        parts.append(t(locale, 'summary_work_header') + "\n")
+        parts.extend(work_lines)
+    if rest_lines:
+        parts.append(t(locale, 'summary_rest_header') + "\n")
+        parts.extend(rest_lines)
+    return "".join(parts)
+
+
+class SummaryCache:
+    """LRU of prepared day summaries bounded by approximate memory use"""
+
+    def __init__(self, max_bytes: int = SUMMARY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, Tuple[Tuple, DaySummary]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, user_id: int, key: Tuple) -> Optional[DaySummary]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != key:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, key: Tuple, summary: DaySummary):
+        size = summary.size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(user_id, None)
+            if old is not None:
+                self._bytes -= old[1].size
+            self._entries[user_id] = (key, summary)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._evictions += 1
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'hit_rate': round(self._hits / lookups, 3) if lookups else None,
+        }
+
+
+summary_cache = SummaryCache()
+
+
+def day_summary_key(user, day, base_url: Optional[str] = None) -> Tuple:
+    """Everything a rendered day summary depends on, apart from the running task's clock"""
+    return (task_versions.get(user.user_id), day, user.timezone, base_url, user_locale(user))
+
+
+def get_day_summary(user, user_now: datetime, base_url: Optional[str] = None) -> Optional[str]:
+    """Rendered summary of the user's current local day, served from cache when possible"""
+    day = user_now.date()
+    # Read the version before the query: a write racing with it leaves a stale key behind
+    key = day_summary_key(user, day, base_url)
+
+    summary = summary_cache.get(user.user_id, key)
+    if summary is None:
+        tasks = Task.get_tasks_for_date(user.user_id, user_now)
+        summary = prepare_day_summary(user, tasks, day, base_url, user.get_day_bounds_utc(user_now))
+        summary_cache.put(user.user_id, key, summary)
+    return render_day_summary(summary, user)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Multi-process bot: one ingest process and N handler shards.
+
+The supervisor (this process) long-polls Telegram and routes every update
+to a shard by the user's id, so all updates of a user are handled in order
+by the same process while different users are handled in parallel without
+sharing a GIL. Each shard imports app.py and runs its handlers on a single
+thread. Shard 0 also runs the background workers that must run once (digest,
+Jira sync, team refresher); the web endpoints run in a process of their own.
+The connection pool budget (DB_POOL_MAX_TOTAL) is split between the shards
+and the web process.
+
+Shards that die are restarted with backoff. SIGHUP restarts the shards one
+by one: a shard finishes what is already queued for it before its
+replacement starts, so no update is handled twice or out of order.
+SIGTERM/SIGINT drain all shards and exit.
+
+    SHARDS=4 python supervisor.py
+"""
+import os
+import sys
+import queue
+import signal
+import logging
+import multiprocessing
+import time as time_module
+from typing import Optional, List, Dict, Any
+
+LOG_FORMAT = '%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+logger = logging.getLogger(__name__)
+
+SHARDS = int(os.getenv("SHARDS", str(os.cpu_count() or 2)))
+DB_POOL_MAX_TOTAL = int(os.getenv("DB_POOL_MAX_TOTAL", os.getenv("DB_POOL_MAX", "10")))
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+SHARD_STOP_TIMEOUT = float(os.getenv("SHARD_STOP_TIMEOUT", "30"))
+POLL_TIMEOUT = 10
+MAX_RESTART_DELAY = 60
+
+# Update kinds whose payload carries the acting user in 'from'
+USER_UPDATE_KINDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'my_chat_member', 'chat_member', 'chat_join_request',
+)
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Id of the user an update belongs to, if any"""
+    for kind in USER_UPDATE_KINDS:
+        payload = update.get(kind)
+        if payload and payload.get('from'):
+            return payload['from']['id']
+    return None
+
+
+def shard_for(update: Dict[str, Any], shards: int) -> int:
+    """Shard handling the update; updates without a user are spread by update id"""
+    user_id = update_user_id(update)
+    return (user_id if user_id is not None else update['update_id']) % shards
+
+
+def shard_pool_max(total: int, shards: int) -> int:
+    """Connections per shard; a shard needs at least one for handlers and one for background work"""
+    return max(2, total // shards)
+
+
+def run_shard(index: int, updates: multiprocessing.Queue, env: Dict[str, str]):
+    """Handler process: feed routed updates to app.bot one at a time"""
+    # The supervisor decides when shards stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    os.environ.update(env)
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+
+    import telebot
+    import app
+    import reminders
+    import digest
+    import shutdown
+    import teams
+    from jira_sync import get_jira_sync
+    app.bot.threaded = False
+    # Each shard reminds the users whose updates it handles, at its share of what
+    # shard 0's digest sender leaves of the bot's send rate
+    reminders.get_reminders(app.send_reminder, shard=(index, int(env['SHARDS'])),
+                            reserved_rate=digest.sending_rate())
+    # Digests are grouped by timezone rather than by user, and the Jira queue and team
+    # totals are global, so one shard runs these workers
+    if index == 0:
+        digest.get_digest(app.send_digest)
+        get_jira_sync()
+        if teams.REFRESH_SECONDS > 0:
+            teams.TeamTotalsRefresher().start()
+    parent = os.getppid()
+    logger.info(f"Shard {index} started (pid {os.getpid()}, DB pool {env['DB_POOL_MAX']})")
+
+    while True:
+        try:
+            raw = updates.get(timeout=1)
+        except queue.Empty:
+            if os.getppid() != parent:
+                logger.warning(f"Shard {index}: supervisor is gone, exiting")
+                break
+            continue
+        if raw is None:
+            break
+        try:
+            app.bot.process_new_updates([telebot.types.Update.de_json(raw)])
+        except Exception as e:
+            logger.error(f"Shard {index} failed to handle update {raw.get('update_id')}: {e}")
+
+    # Updates are handled inline, so nothing is in flight; flush buffers and close the pool
+    logger.info(f"Shard {index} stopped: {shutdown.run_hooks()}")
+
+
+def run_web(env: Dict[str, str]):
+    """Web process: health, status, reports and API endpoints"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ.update(env)
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+
+    import app
+    app.run_web_server()
+
+
+class Supervisor:
+    def __init__(self, token: str, shards: int = SHARDS, pool_total: int = DB_POOL_MAX_TOTAL):
+        self.token = token
+        self.shards = shards
+        # The web process gets a share like a shard
+        self.pool_max = shard_pool_max(pool_total, shards + 1)
+        self._context = multiprocessing.get_context('spawn')
+        self.queues = [self._context.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(shards)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * shards
+        self.web: Optional[multiprocessing.Process] = None
+        self._restarts = [0] * shards
+        self._next_start = [0.0] * shards
+        self._offset = None
+        self._stopping = False
+        self._rolling_restart = False
+        self.stats = {'updates': 0, 'shard_restarts': 0, 'rolling_restarts': 0}
+
+    # Shards
+
+    def start_shard(self, index: int):
+        env = {'DB_POOL_MIN': '1', 'DB_POOL_MAX': str(self.pool_max), 'SHARD_INDEX': str(index),
+               'SHARDS': str(self.shards)}
+        process = self._context.Process(target=run_shard, args=(index, self.queues[index], env),
+                                        name=f'shard-{index}', daemon=False)
+        process.start()
+        self.processes[index] = process
+
+    def stop_shard(self, index: int):
+        """Let the shard finish its queue, then stop it"""
+        process = self.processes[index]
+        if process is None or not process.is_alive():
+            return
+        self.queues[index].put(None)
+        process.join(SHARD_STOP_TIMEOUT)
+        if process.is_alive():
+            logger.warning(f"Shard {index} did not stop in {SHARD_STOP_TIMEOUT:g} s, terminating")
+            process.terminate()
+            process.join()
+
+    def restart_shard(self, index: int):
+        self.stop_shard(index)
+        self.start_shard(index)
+        self.stats['shard_restarts'] += 1
+
+    def check_shards(self):
+        """Restart crashed shards, backing off if one keeps crashing"""
+        now = time_module.monotonic()
+        for index, process in enumerate(self.processes):
+            if process is None or process.is_alive() or now < self._next_start[index]:
+                continue
+            self._restarts[index] += 1
+            delay = min(2 ** self._restarts[index], MAX_RESTART_DELAY)
+            logger.error(f"Shard {index} exited with code {process.exitcode}, restarting "
+                         f"(next crash restart in {delay} s)")
+            self._next_start[index] = now + delay
+            self.start_shard(index)
+            self.stats['shard_restarts'] += 1
+
+    def rolling_restart(self):
+        logger.info("Restarting shards one by one")
+        for index in range(self.shards):
+            self.restart_shard(index)
+        self._restarts = [0] * self.shards
+        self.stats['rolling_restarts'] += 1
+
+    # Web
+
+    def start_web(self):
+        env = {'DB_POOL_MIN': '1', 'DB_POOL_MAX': str(self.pool_max)}
+        # Daemonic: it holds no state, so it is terminated when the supervisor exits
+        self.web = self._context.Process(target=run_web, args=(env,), name='web', daemon=True)
+        self.web.start()
+
+    def check_web(self):
+        if self.web is not None and not self.web.is_alive():
+            logger.error(f"Web process exited with code {self.web.exitcode}, restarting")
+            self.start_web()
+
+    def stop_web(self):
+        if self.web is not None and self.web.is_alive():
+            self.web.terminate()
+            self.web.join()
+
+    # Ingest
+
+    def route(self, updates: List[Dict[str, Any]]):
+        for update in updates:
+            # Blocks when a shard is behind, which slows polling instead of growing memory
+            self.queues[shard_for(update, self.shards)].put(update)
+            self._offset = update['update_id'] + 1
+        self.stats['updates'] += len(updates)
+
+    def poll(self):
+        from telebot import apihelper
+        try:
+            updates = apihelper.get_updates(self.token, offset=self._offset, timeout=POLL_TIMEOUT,
+                                            long_polling_timeout=POLL_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Polling failed: {e}")
+            time_module.sleep(1)
+            return
+        self.route(updates)
+
+    # Lifecycle
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_hup(self, signum, frame):
+        self._rolling_restart = True
+
+    def run(self):
+        from database import init_database
+        init_database()
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._on_hup)
+
+        self.start_web()
+        for index in range(self.shards):
+            self.start_shard(index)
+        logger.info(f"Supervisor started {self.shards} shards and the web process "
+                    f"(DB pool {self.pool_max} each)")
+
+        while not self._stopping:
+            if self._rolling_restart:
+                self._rolling_restart = False
+                self.rolling_restart()
+            self.check_shards()
+            self.check_web()
+            self.poll()
+
+        logger.info("Stopping shards...")
+        for index in range(self.shards):
+            self.stop_shard(index)
+        self.stop_web()
+
+
+def main():
+    logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
+    token = os.environ.get('BOT_TOKEN')
+    if not token:
+        logger.error("BOT_TOKEN environment variable is not set")
+        sys.exit(1)
+    Supervisor(token).run()
+
+
+if __name__ == "__main__":
+    main()
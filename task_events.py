@@ -0,0 +1,274 @@
+"""
+Append-only task event log and the projections derived from it.
+
+The model layer records one event per state change (start, end, rename,
+comment, auto_end) in the same transaction as the change itself. The tasks
+table is the projection of those events: the current state of every task,
+updated in place by the models. Day totals for team dashboards are folded
+from the log by teams.py into user_day_task_totals.
+
+`python task_events.py replay` rebuilds the tasks table from the log.
+"""
+import json
+import argparse
+from datetime import datetime, time, timedelta
+from typing import Optional, List, Dict, Any, Callable, Iterable, Tuple
+import pytz
+import logging
+
+from database import get_db
+import task_names
+from task_parser import jira_fields
+
+logger = logging.getLogger(__name__)
+
+EVENT_START = 'start'
+EVENT_END = 'end'
+EVENT_AUTO_END = 'auto_end'
+EVENT_RENAME = 'rename'
+EVENT_COMMENT = 'comment'
+
+END_EVENTS = (EVENT_END, EVENT_AUTO_END)
+
+DEFAULT_TIMEZONE = 'Europe/Moscow'
+REPLAY_BATCH_SIZE = 10000
+
+_subscribers: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def make_event(task_id: int, user_id: int, event_type: str, occurred_at: datetime,
+               **payload) -> Dict[str, Any]:
+    return {
+        'id': None,
+        'task_id': task_id,
+        'user_id': user_id,
+        'event_type': event_type,
+        'occurred_at': occurred_at,
+        'payload': payload,
+    }
+
+
+def record_events(cursor, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Append events to the log with one multi-row INSERT; fills in event ids"""
+    if not events:
+        return events
+
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(events))
+    params = []
+    for event in events:
+        payload = {key: _to_json(value) for key, value in event['payload'].items()}
+        params.extend((event['task_id'], event['user_id'], event['event_type'],
+                       json.dumps(payload, ensure_ascii=False), event['occurred_at']))
+    cursor.execute(f"""
+        INSERT INTO task_events (task_id, user_id, event_type, payload, occurred_at)
+        VALUES {placeholders}
+        RETURNING id
+    """, params)
+
+    # Rows come back in VALUES order
+    for event, row in zip(events, cursor.fetchall()):
+        event['id'] = row['id']
+    return events
+
+
+def record_event(cursor, task_id: int, user_id: int, event_type: str,
+                 occurred_at: datetime, **payload) -> Dict[str, Any]:
+    """Append a single event to the log"""
+    event = make_event(task_id, user_id, event_type, occurred_at, **payload)
+    return record_events(cursor, [event])[0]
+
+
+def _as_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return pytz.utc.localize(dt)
+    return dt.astimezone(pytz.utc)
+
+
+def split_by_local_day(start_time: datetime, end_time: datetime,
+                       timezone: str) -> List[Tuple[Any, float]]:
+    """Split an interval into (local date, seconds) pieces at local midnights"""
+    user_tz = pytz.timezone(timezone)
+    start_utc = _as_utc(start_time)
+    end_utc = _as_utc(end_time)
+
+    pieces = []
+    cursor_utc = start_utc
+    while cursor_utc < end_utc:
+        local_day = cursor_utc.astimezone(user_tz).date()
+        next_midnight = user_tz.localize(
+            datetime.combine(local_day + timedelta(days=1), time.min)
+        ).astimezone(pytz.utc)
+        piece_end = min(end_utc, next_midnight)
+        pieces.append((local_day, (piece_end - cursor_utc).total_seconds()))
+        cursor_utc = piece_end
+    return pieces
+
+
+def subscribe(callback: Callable[[Dict[str, Any]], None]):
+    """Register a callback invoked with every event after it is committed"""
+    _subscribers.append(callback)
+
+
+def publish(events: Iterable[Dict[str, Any]]):
+    """Notify subscribers about committed events"""
+    for event in events:
+        for callback in _subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Task event subscriber failed: {e}")
+
+
+# Replay
+
+def _parse_time(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def fold_events(events: Iterable[Dict[str, Any]], state: Dict[int, Dict[str, Any]]):
+    """Apply events to an in-memory {task_id: task row} state"""
+    for event in events:
+        payload = event['payload']
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        task_id = event['task_id']
+
+        if event['event_type'] == EVENT_START:
+            state[task_id] = {
+                'id': task_id,
+                'user_id': event['user_id'],
+                'task_name': payload.get('task_name'),
+                'comment': payload.get('comment'),
+                'original_message': payload.get('original_message'),
+                'start_time': _parse_time(payload.get('start_time')) or event['occurred_at'],
+                'end_time': None,
+                'is_rest': bool(payload.get('is_rest', False)),
+            }
+            continue
+
+        task = state.get(task_id)
+        if task is None:
+            logger.warning(f"Event {event['id']} references unknown task {task_id}")
+            continue
+        if event['event_type'] in END_EVENTS:
+            task['end_time'] = _parse_time(payload.get('end_time')) or event['occurred_at']
+        elif event['event_type'] == EVENT_RENAME:
+            task['task_name'] = payload.get('task_name')
+            task['original_message'] = payload.get('original_message', task['original_message'])
+        elif event['event_type'] == EVENT_COMMENT:
+            task['comment'] = payload.get('comment')
+
+
+def _chunks(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def replay(batch_size: int = REPLAY_BATCH_SIZE) -> int:
+    """Rebuild tasks from the event log; returns events read"""
+    state: Dict[int, Dict[str, Any]] = {}
+    last_id = 0
+    event_count = 0
+
+    # Keyset pagination over the primary key keeps every read an index range scan
+    with get_db() as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("""
+                SELECT id, task_id, user_id, event_type, payload, occurred_at
+                FROM task_events WHERE id > %s ORDER BY id LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            fold_events(rows, state)
+            event_count += len(rows)
+            last_id = rows[-1]['id']
+
+    tasks = list(state.values())
+    name_ids = task_names.resolve((task['user_id'], task['task_name']) for task in tasks)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for chunk in _chunks(tasks, batch_size):
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(chunk))
+            params = []
+            for task in chunk:
+                params.extend((task['id'], task['user_id'],
+                               name_ids[(task['user_id'], task['task_name'])], task['comment'],
+                               task['original_message'], task['start_time'], task['end_time'],
+                               task['is_rest'],
+                               *jira_fields(task['task_name'], task['original_message'])))
+            cursor.execute(f"""
+                INSERT INTO tasks (id, user_id, task_name_id, comment, original_message,
+                                   start_time, end_time, is_rest, jira_key, jira_project)
+                VALUES {placeholders}
+                ON CONFLICT (id) DO UPDATE SET
+                    task_name_id = EXCLUDED.task_name_id,
+                    task_name = NULL,
+                    jira_key = EXCLUDED.jira_key,
+                    jira_project = EXCLUDED.jira_project,
+                    comment = EXCLUDED.comment,
+                    original_message = EXCLUDED.original_message,
+                    start_time = EXCLUDED.start_time,
+                    end_time = EXCLUDED.end_time,
+                    is_rest = EXCLUDED.is_rest
+            """, params)
+
+    logger.info(f"Replayed {event_count} events into {len(tasks)} tasks")
+    return event_count
+
+
+def bootstrap() -> int:
+    """Create start/end events for tasks that predate the event log"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.id, t.user_id, COALESCE(n.name, t.task_name) AS task_name, t.comment,
+                   t.original_message, t.start_time, t.end_time, t.is_rest
+            FROM tasks t
+            LEFT JOIN task_names n ON n.id = t.task_name_id
+            WHERE NOT EXISTS (SELECT 1 FROM task_events e WHERE e.task_id = t.id)
+            ORDER BY t.id
+        """)
+        rows = cursor.fetchall()
+
+        events = []
+        for row in rows:
+            events.append(make_event(row['id'], row['user_id'], EVENT_START, row['start_time'],
+                                     task_name=row['task_name'], comment=row['comment'],
+                                     original_message=row['original_message'],
+                                     start_time=row['start_time'], is_rest=row['is_rest']))
+            if row['end_time'] is not None:
+                events.append(make_event(row['id'], row['user_id'], EVENT_END, row['end_time'],
+                                         end_time=row['end_time']))
+        for chunk in _chunks(events, REPLAY_BATCH_SIZE):
+            record_events(cursor, chunk)
+
+    logger.info(f"Bootstrapped events for {len(rows)} tasks")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Task event log maintenance")
+    parser.add_argument('command', choices=['replay', 'bootstrap'])
+    parser.add_argument('--batch-size', type=int, default=REPLAY_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'bootstrap':
+        bootstrap()
+    else:
+        replay(args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Per-user dictionary of task names.
+
+Users log the same few task names over and over, so tasks reference an
+interned row in task_names (tasks.task_name_id) instead of repeating the
+string. Reads join the name back; per-task aggregation groups by the
+integer id in SQL.
+
+`python task_names.py migrate` backfills task_name_id for rows written
+before the dictionary existed and clears their inline task_name.
+"""
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+import logging
+
+from database import get_db, get_read_db
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = 50000
+BACKFILL_BATCH_SIZE = 5000
+
+_cache: "OrderedDict[Tuple[int, str], int]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _remember(ids: Dict[Tuple[int, str], int]):
+    with _cache_lock:
+        for key, name_id in ids.items():
+            _cache[key] = name_id
+            _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def intern_names(cursor, pairs: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+    """Ids for (user_id, name) pairs, inserting missing names in the caller's transaction"""
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+
+    placeholders = ", ".join(["(%s, %s)"] * len(pairs))
+    params = [value for pair in pairs for value in pair]
+    cursor.execute(f"""
+        INSERT INTO task_names (user_id, name)
+        VALUES {placeholders}
+        ON CONFLICT (user_id, name) DO NOTHING
+    """, params)
+    cursor.execute(f"""
+        SELECT id, user_id, name FROM task_names
+        WHERE (user_id, name) IN (VALUES {placeholders})
+    """, params)
+    return {(row['user_id'], row['name']): row['id'] for row in cursor.fetchall()}
+
+
+def resolve(pairs: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+    """
+    Ids for (user_id, name) pairs, served from the cache when possible.
+    Misses are interned in a transaction of their own, so only committed
+    ids are ever cached; call this before opening the write transaction.
+    """
+    pairs = set(pairs)
+    with _cache_lock:
+        ids = {pair: _cache[pair] for pair in pairs if pair in _cache}
+    missing = pairs - ids.keys()
+    if missing:
+        with get_db() as conn:
+            found = intern_names(conn.cursor(), missing)
+        _remember(found)
+        ids.update(found)
+    return ids
+
+
+def lookup(pairs: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+    """Ids of the (user_id, name) pairs already in the dictionary; never inserts, for read paths"""
+    pairs = set(pairs)
+    with _cache_lock:
+        ids = {pair: _cache[pair] for pair in pairs if pair in _cache}
+    missing = sorted(pairs - ids.keys())
+    if missing:
+        placeholders = ", ".join(["(%s, %s)"] * len(missing))
+        with get_read_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, user_id, name FROM task_names
+                WHERE (user_id, name) IN (VALUES {placeholders})
+            """, [value for pair in missing for value in pair])
+            found = {(row['user_id'], row['name']): row['id'] for row in cursor.fetchall()}
+        _remember(found)
+        ids.update(found)
+    return ids
+
+
+def resolve_one(user_id: int, name: str) -> int:
+    return resolve([(user_id, name)])[(user_id, name)]
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def backfill(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Move inline task names into the dictionary; returns rows migrated"""
+    migrated = 0
+    while True:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, user_id, task_name FROM tasks
+                WHERE task_name_id IS NULL AND task_name IS NOT NULL
+                ORDER BY id LIMIT %s
+            """, (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            ids = intern_names(cursor, ((row['user_id'], row['task_name']) for row in rows))
+            placeholders = ", ".join(["(%s, %s)"] * len(rows))
+            params = []
+            for row in rows:
+                params.extend((row['id'], ids[(row['user_id'], row['task_name'])]))
+            cursor.execute(f"""
+                WITH v (id, task_name_id) AS (VALUES {placeholders})
+                UPDATE tasks SET task_name_id = v.task_name_id, task_name = NULL
+                FROM v
+                WHERE tasks.id = v.id
+            """, params)
+        migrated += len(rows)
+        logger.info(f"Migrated {migrated} task names")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Task name dictionary maintenance")
+    parser.add_argument('command', choices=['migrate'])
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from database import init_database
+    init_database()
+    backfill(args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
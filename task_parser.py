@@ -1,38 +1,52 @@
+import os
 import re
+from functools import lru_cache
 from typing import Tuple, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Used when neither the chat nor the user configured a Jira instance (/set_jira)
+DEFAULT_JIRA_BASE_URL = os.getenv("JIRA_BASE_URL", "https://jira.company.com").rstrip('/')
+
+# Pattern for Jira URLs: https://domain.com/browse/TICKET-123
+JIRA_URL_PATTERN = re.compile(r'(https?://[^/]+/browse/([A-Z]+-\d+))')
+# Pattern for standalone ticket: TICKET-123
+JIRA_TICKET_PATTERN = re.compile(r'\b([A-Z]+-\d+)\b')
+
 def extract_jira_ticket(text: str) -> Optional[str]:
     """Extract Jira ticket number from URL or text"""
-    # Pattern for Jira URLs: https://domain.com/browse/TICKET-123
-    jira_url_pattern = r'https?://[^/]+/browse/([A-Z]+-\d+)'
-    match = re.search(jira_url_pattern, text)
+    match = JIRA_URL_PATTERN.search(text)
     
     if match:
-        return match.group(1)
+        return match.group(2)
     
-    # Pattern for standalone ticket: TICKET-123
-    ticket_pattern = r'\b([A-Z]+-\d+)\b'
-    match = re.search(ticket_pattern, text)
+    match = JIRA_TICKET_PATTERN.search(text)
     
     if match:
         return match.group(1)
     
     return None
 
+def jira_fields(task_name: str, original_message: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Jira ticket key and project key stored with a task, e.g. ('PROJ-123', 'PROJ')"""
+    ticket = extract_jira_ticket(task_name or '') or extract_jira_ticket(original_message or '')
+    if ticket is None:
+        return None, None
+    return ticket, ticket.split('-', 1)[0]
+
 def extract_jira_url(text: str) -> Optional[str]:
     """Extract full Jira URL from text"""
-    jira_url_pattern = r'(https?://[^/]+/browse/[A-Z]+-\d+)'
-    match = re.search(jira_url_pattern, text)
+    match = JIRA_URL_PATTERN.search(text)
     
     if match:
         return match.group(1)
     
     return None
 
-def create_jira_link(ticket: str, original_text: Optional[str] = None) -> str:
+@lru_cache(maxsize=4096)
+def create_jira_link(ticket: str, original_text: Optional[str] = None,
+                     base_url: Optional[str] = None) -> str:
     """Create clickable Jira link from ticket number"""
     # If we have the original URL, use it
     if original_text:
@@ -40,10 +54,8 @@ def create_jira_link(ticket: str, original_text: Optional[str] = None) -> str:
         if url:
             return f"[{ticket}]({url})"
     
-    # Default Jira URL format (can be configured later)
-    # Using a generic format that works for most Jira installations
-    default_url = f"https://jira.company.com/browse/{ticket}"
-    return f"[{ticket}]({default_url})"
+    # Otherwise link to the configured Jira instance
+    return f"[{ticket}]({base_url or DEFAULT_JIRA_BASE_URL}/browse/{ticket})"
 
 def parse_task_message(message: str) -> Tuple[str, Optional[str], bool]:
     """
@@ -70,7 +82,7 @@ def parse_task_message(message: str) -> Tuple[str, Optional[str], bool]:
                 comment = parts[1].strip() if len(parts) > 1 else None
             else:
                 # Find position of ticket and get everything after it as comment
-                ticket_match = re.search(r'\b([A-Z]+-\d+)\b', message)
+                ticket_match = JIRA_TICKET_PATTERN.search(message)
                 if ticket_match:
                     start_pos = ticket_match.end()
                     remaining = message[start_pos:].strip()
@@ -90,8 +102,10 @@ def parse_task_message(message: str) -> Tuple[str, Optional[str], bool]:
     
     return task_name, comment, False
 
-def format_task_for_display(task_name: str, is_jira: Optional[bool] = None, original_message: Optional[str] = None) -> str:
-    """Format task name for display in messages with clickable Jira links"""
+@lru_cache(maxsize=4096)
+def format_task_for_display(task_name: str, is_jira: Optional[bool] = None, original_message: Optional[str] = None,
+                            base_url: Optional[str] = None) -> str:
+    """Format task name for display in messages with clickable Jira links (memoized)"""
     if is_jira is None:
         is_jira = extract_jira_ticket(task_name) is not None
     
@@ -99,7 +113,7 @@ def format_task_for_display(task_name: str, is_jira: Optional[bool] = None, orig
         ticket = extract_jira_ticket(task_name)
         if ticket:
             # Create clickable link for Jira ticket
-            jira_link = create_jira_link(ticket, original_message)
+            jira_link = create_jira_link(ticket, original_message, base_url)
             return f"**{jira_link}**"
     
     # Regular task without Jira link
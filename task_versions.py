@@ -0,0 +1,24 @@
+"""
+Per-user task-state version counters.
+
+The model layer bumps a user's version on every task create/end/update, so
+anything derived from the user's tasks (rendered summaries, report pages)
+can be cached under the version it was built from.
+"""
+import threading
+from collections import defaultdict
+
+_versions = defaultdict(int)
+_lock = threading.Lock()
+
+
+def bump(user_id: int) -> int:
+    """Mark the user's tasks as changed; returns the new version"""
+    with _lock:
+        _versions[user_id] += 1
+        return _versions[user_id]
+
+
+def get(user_id: int) -> int:
+    """Current task-state version of the user"""
+    return _versions.get(user_id, 0)
@@ -0,0 +1,402 @@
+"""
+Teams and team dashboards.
+
+A team is a set of users who joined with the team's invite code. The team
+summary (/team, GET /reports/teams/<id>) shows time per member and per task
+for a day or a week, read from user_day_task_totals, so a request for a
+large team is a range scan over pre-aggregated rows instead of a pass over
+every member's tasks.
+
+user_day_task_totals is refreshed incrementally in the background: the
+refresher reads task events after its last offset, recomputes the
+(user, local day) pairs those tasks touch, plus days with a running task
+of a team member, and replaces their rows in one transaction, so readers see either the old
+or the new totals of a day. `python teams.py refresh --full` rebuilds it
+from all tasks.
+"""
+import os
+import secrets
+import argparse
+import threading
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from typing import Optional, List, Dict, Any, Set, Tuple
+import logging
+
+from database import get_db, get_read_db
+import task_names
+from task_events import split_by_local_day, DEFAULT_TIMEZONE
+import shutdown
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = float(os.getenv("TEAM_REFRESH_SECONDS", "60"))
+REFRESH_BATCH_SIZE = 5000
+# Event ids are assigned before commit, so an event may become visible after a
+# higher one was already folded; re-reading a few recent events catches it
+REFRESH_OVERLAP_EVENTS = 200
+PROJECTION = 'user_day_task_totals'
+# Closed tasks longer than this are not looked up when recomputing a day
+MAX_TASK_DAYS = 7
+TOP_TASKS = 20
+
+ROLE_OWNER = 'owner'
+ROLE_MEMBER = 'member'
+
+
+# Membership
+
+def create_team(owner_user_id: int, name: str, display_name: Optional[str] = None) -> Dict[str, Any]:
+    """Create a team owned by the user; returns {'id', 'name', 'invite_code'}"""
+    invite_code = secrets.token_urlsafe(6)
+    now = datetime.utcnow()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO teams (name, owner_user_id, invite_code, created_at)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+        """, (name, owner_user_id, invite_code, now))
+        team_id = cursor.fetchone()['id']
+        cursor.execute("""
+            INSERT INTO team_members (team_id, user_id, display_name, role, joined_at)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (team_id, owner_user_id, display_name, ROLE_OWNER, now))
+    return {'id': team_id, 'name': name, 'invite_code': invite_code}
+
+
+def join_team(user_id: int, invite_code: str, display_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Add the user to the team with this invite code; None if the code is unknown"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, name FROM teams WHERE invite_code = %s
+        """, (invite_code,))
+        team = cursor.fetchone()
+        if team is None:
+            return None
+        cursor.execute("""
+            INSERT INTO team_members (team_id, user_id, display_name, role, joined_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (team_id, user_id) DO UPDATE SET display_name = EXCLUDED.display_name
+        """, (team['id'], user_id, display_name, ROLE_MEMBER, datetime.utcnow()))
+    return {'id': team['id'], 'name': team['name']}
+
+
+def leave_team(user_id: int, team_id: int) -> bool:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM team_members WHERE team_id = %s AND user_id = %s
+        """, (team_id, user_id))
+        return cursor.rowcount > 0
+
+
+def get_user_team(user_id: int) -> Optional[Dict[str, Any]]:
+    """The team the user joined last: {'id', 'name', 'invite_code', 'role'}"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.id, t.name, t.invite_code, m.role
+            FROM team_members m
+            JOIN teams t ON t.id = m.team_id
+            WHERE m.user_id = %s
+            ORDER BY m.joined_at DESC
+            LIMIT 1
+        """, (user_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+
+def member_ids(team_id: int) -> List[int]:
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id FROM team_members WHERE team_id = %s ORDER BY user_id", (team_id,))
+        return [row['user_id'] for row in cursor.fetchall()]
+
+
+# Dashboard
+
+def period_bounds(day: date, period: str) -> Tuple[date, date]:
+    """First and last day of the day or ISO week containing `day`"""
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    return day, day
+
+
+def team_summary(team_id: int, start_day: date, end_day: date) -> Dict[str, Any]:
+    """
+    Totals of a team over local days start_day..end_day:
+    {'members': [{'user_id', 'display_name', 'work', 'rest'}],
+     'tasks': [{'task_name', 'work', 'members'}], 'work', 'rest', 'refreshed_at'}
+    with durations as timedelta, largest first.
+    """
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT m.user_id, m.display_name,
+                   COALESCE(SUM(CASE WHEN NOT d.is_rest THEN d.seconds END), 0) AS work,
+                   COALESCE(SUM(CASE WHEN d.is_rest THEN d.seconds END), 0) AS rest
+            FROM team_members m
+            LEFT JOIN user_day_task_totals d
+              ON d.user_id = m.user_id AND d.day BETWEEN %s AND %s
+            WHERE m.team_id = %s
+            GROUP BY m.user_id, m.display_name
+            ORDER BY work DESC, m.user_id
+        """, (start_day, end_day, team_id))
+        members = [{
+            'user_id': row['user_id'],
+            'display_name': row['display_name'],
+            'work': timedelta(seconds=int(row['work'])),
+            'rest': timedelta(seconds=int(row['rest'])),
+        } for row in cursor.fetchall()]
+
+        # Members name their tasks independently; the same name is one task
+        cursor.execute("""
+            SELECT n.name AS task_name, SUM(d.seconds) AS work, COUNT(DISTINCT d.user_id) AS members
+            FROM team_members m
+            JOIN user_day_task_totals d
+              ON d.user_id = m.user_id AND d.day BETWEEN %s AND %s AND NOT d.is_rest
+            JOIN task_names n ON n.id = d.task_name_id
+            WHERE m.team_id = %s
+            GROUP BY n.name
+            ORDER BY work DESC
+            LIMIT %s
+        """, (start_day, end_day, team_id, TOP_TASKS))
+        tasks = [{
+            'task_name': row['task_name'],
+            'work': timedelta(seconds=int(row['work'])),
+            'members': row['members'],
+        } for row in cursor.fetchall()]
+
+        cursor.execute("""
+            SELECT refreshed_at FROM projection_offsets WHERE name = %s
+        """, (PROJECTION,))
+        offset = cursor.fetchone()
+
+    return {
+        'members': members,
+        'tasks': tasks,
+        'work': sum((m['work'] for m in members), timedelta()),
+        'rest': sum((m['rest'] for m in members), timedelta()),
+        'refreshed_at': offset['refreshed_at'] if offset else None,
+    }
+
+
+# Refresh
+
+def _timezones(cursor, user_ids: Set[int]) -> Dict[int, str]:
+    if not user_ids:
+        return {}
+    cursor.execute(f"""
+        SELECT user_id, timezone FROM users WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})
+    """, list(user_ids))
+    return {row['user_id']: row['timezone'] for row in cursor.fetchall()}
+
+
+def _touched_days(rows: List[Dict[str, Any]], timezones: Dict[int, str],
+                  now: datetime) -> Dict[int, Set[date]]:
+    days = defaultdict(set)
+    for row in rows:
+        timezone = timezones.get(row['user_id'], DEFAULT_TIMEZONE)
+        end_time = row['end_time'] or now
+        if end_time <= row['start_time']:
+            end_time = row['start_time'] + timedelta(seconds=1)
+        for day, _ in split_by_local_day(row['start_time'], end_time, timezone):
+            days[row['user_id']].add(day)
+    return days
+
+
+def _day_totals(cursor, user_id: int, days: Set[date], timezone: str,
+                now: datetime) -> Dict[Tuple[date, Any, bool], float]:
+    """Seconds per (day, task name, is_rest) of the user's tasks on the given local days"""
+    low = datetime.combine(min(days), datetime.min.time()) - timedelta(days=1)
+    high = datetime.combine(max(days), datetime.min.time()) + timedelta(days=2)
+    cursor.execute("""
+        SELECT task_name_id, task_name, start_time, end_time, is_rest FROM tasks
+        WHERE user_id = %s AND start_time < %s
+          AND (end_time IS NULL OR (end_time > %s AND start_time >= %s))
+    """, (user_id, high, low, low - timedelta(days=MAX_TASK_DAYS)))
+    totals = defaultdict(float)
+    for row in cursor.fetchall():
+        end_time = row['end_time'] or now
+        if end_time <= row['start_time']:
+            continue
+        name = row['task_name_id'] if row['task_name_id'] is not None else row['task_name']
+        for day, seconds in split_by_local_day(row['start_time'], end_time, timezone):
+            if day in days:
+                totals[(day, name, bool(row['is_rest']))] += seconds
+    return totals
+
+
+def refresh_days(days_by_user: Dict[int, Set[date]], now: Optional[datetime] = None) -> int:
+    """Recompute user_day_task_totals for the given user days; returns rows written"""
+    if not days_by_user:
+        return 0
+    now = now or datetime.utcnow()
+    # Read from the primary: totals must not be recomputed from a lagging replica
+    with get_db() as conn:
+        cursor = conn.cursor()
+        timezones = _timezones(cursor, set(days_by_user))
+        totals = {user_id: _day_totals(cursor, user_id, days, timezones.get(user_id, DEFAULT_TIMEZONE), now)
+                  for user_id, days in days_by_user.items()}
+
+    # Rows written before task_names existed carry the name inline; intern them first
+    legacy = {(user_id, name) for user_id, user_totals in totals.items()
+              for (_, name, _) in user_totals if isinstance(name, str)}
+    name_ids = task_names.resolve(legacy) if legacy else {}
+
+    rows = []
+    for user_id, user_totals in totals.items():
+        merged = defaultdict(float)
+        for (day, name, is_rest), seconds in user_totals.items():
+            name_id = name_ids[(user_id, name)] if isinstance(name, str) else name
+            merged[(day, name_id, is_rest)] += seconds
+        rows.extend((user_id, day, name_id, is_rest, int(round(seconds)))
+                    for (day, name_id, is_rest), seconds in merged.items() if round(seconds) > 0)
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for user_id, days in days_by_user.items():
+            cursor.execute(f"""
+                DELETE FROM user_day_task_totals
+                WHERE user_id = %s AND day IN ({', '.join(['%s'] * len(days))})
+            """, [user_id] + sorted(days))
+        for i in range(0, len(rows), 1000):
+            chunk = rows[i:i + 1000]
+            cursor.execute(f"""
+                INSERT INTO user_day_task_totals (user_id, day, task_name_id, is_rest, seconds)
+                VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))}
+            """, [value for row in chunk for value in row])
+    return len(rows)
+
+
+def _get_offset(cursor) -> int:
+    cursor.execute("""
+        SELECT last_event_id FROM projection_offsets WHERE name = %s
+    """, (PROJECTION,))
+    row = cursor.fetchone()
+    return row['last_event_id'] if row else 0
+
+
+def _set_offset(cursor, last_event_id: int):
+    cursor.execute("""
+        INSERT INTO projection_offsets (name, last_event_id, refreshed_at)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (name) DO UPDATE
+        SET last_event_id = EXCLUDED.last_event_id, refreshed_at = EXCLUDED.refreshed_at
+    """, (PROJECTION, last_event_id, datetime.utcnow()))
+
+
+def refresh(batch_size: int = REFRESH_BATCH_SIZE) -> int:
+    """Fold task events since the last refresh into user_day_task_totals; returns events read"""
+    now = datetime.utcnow()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        last_id = _get_offset(cursor)
+        cursor.execute("""
+            SELECT id, task_id FROM task_events WHERE id > %s ORDER BY id LIMIT %s
+        """, (max(last_id - REFRESH_OVERLAP_EVENTS, 0), batch_size + REFRESH_OVERLAP_EVENTS))
+        events = cursor.fetchall()
+        task_ids = sorted({event['task_id'] for event in events})
+
+        rows = []
+        if task_ids:
+            cursor.execute(f"""
+                SELECT user_id, start_time, end_time FROM tasks
+                WHERE id IN ({', '.join(['%s'] * len(task_ids))})
+            """, task_ids)
+            rows = cursor.fetchall()
+        # Running tasks grow without new events; only team members' ones show on a dashboard,
+        # a user who joins later is picked up by the next cycle
+        cursor.execute("""
+            SELECT t.user_id, t.start_time, t.end_time FROM tasks t
+            WHERE t.end_time IS NULL
+              AND t.user_id IN (SELECT DISTINCT user_id FROM team_members)
+        """)
+        rows += cursor.fetchall()
+        days = _touched_days(rows, _timezones(cursor, {row['user_id'] for row in rows}), now)
+
+    refresh_days(days, now)
+    new_last_id = max(events[-1]['id'], last_id) if events else last_id
+    with get_db() as conn:
+        _set_offset(conn.cursor(), new_last_id)
+    return new_last_id - last_id
+
+
+def rebuild() -> int:
+    """Recompute user_day_task_totals from all tasks; returns user days written"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) AS id FROM task_events")
+        last_event_id = cursor.fetchone()['id']
+        cursor.execute("SELECT DISTINCT user_id FROM tasks")
+        user_ids = [row['user_id'] for row in cursor.fetchall()]
+
+    now = datetime.utcnow()
+    day_count = 0
+    for user_id in user_ids:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT user_id, start_time, end_time FROM tasks WHERE user_id = %s
+            """, (user_id,))
+            rows = cursor.fetchall()
+            days = _touched_days(rows, _timezones(cursor, {user_id}), now)
+            cursor.execute("DELETE FROM user_day_task_totals WHERE user_id = %s", (user_id,))
+        refresh_days(days, now)
+        day_count += sum(len(user_days) for user_days in days.values())
+
+    with get_db() as conn:
+        _set_offset(conn.cursor(), last_event_id)
+    logger.info(f"Rebuilt team totals for {len(user_ids)} users ({day_count} user days)")
+    return day_count
+
+
+class TeamTotalsRefresher:
+    """Background thread running refresh() every REFRESH_SECONDS"""
+
+    def __init__(self, interval_seconds: float = REFRESH_SECONDS):
+        self.interval = interval_seconds
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='team-refresh', daemon=True)
+        self._thread.start()
+        shutdown.register('team_refresh', self.stop, shutdown.ORDER_STOP_WORKERS)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                while refresh() == REFRESH_BATCH_SIZE and not self._stopped.is_set():
+                    pass
+            except Exception as e:
+                logger.error(f"Team totals refresh failed: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Team dashboard maintenance")
+    parser.add_argument('command', choices=['refresh'])
+    parser.add_argument('--full', action='store_true', help="rebuild from all tasks")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    from database import init_database
+    init_database()
+    if args.full:
+        rebuild()
+    else:
+        while refresh() == REFRESH_BATCH_SIZE:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from datetime import datetime, date, timedelta
+
+import analytics
+from analytics import Intervals, covered_seconds, compute_stats, to_epoch
+from models import User, Task
+from database import get_db
+import task_names
+
+
+DAY = date(2025, 6, 2)
+MIDNIGHT = to_epoch(datetime(2025, 6, 2))
+HOUR = 3600
+
+
+def intervals(*items):
+    """Интервалы из кортежей (начало в часах от полуночи, конец, задача, отдых)"""
+    start, end, name, rest = zip(*items)
+    return Intervals(MIDNIGHT + np.array(start) * HOUR, MIDNIGHT + np.array(end) * HOUR,
+                     np.ones(len(items)), np.array(name), np.array(rest))
+
+
+class TestCoveredSeconds:
+    """Тесты подсчета покрытия интервалами"""
+
+    def test_matches_naive_loop(self):
+        """Тест: векторный расчет совпадает с поэлементным"""
+        rng = np.random.default_rng(1)
+        start = rng.integers(0, 10000, 500)
+        end = start + rng.integers(1, 3000, 500)
+        edges = np.arange(0, 14001, 700)
+
+        expected = [sum(max(0, min(e, hi) - max(s, lo)) for s, e in zip(start, end))
+                    for lo, hi in zip(edges[:-1], edges[1:])]
+        assert covered_seconds(start, end, edges).tolist() == expected
+
+
+class TestComputeStats:
+    """Тесты статистики по интервалам"""
+
+    def test_totals_switches_and_focus(self):
+        """Тест: итоги, переключения, самый долгий фокус и доля отдыха"""
+        stats = compute_stats(intervals(
+            (9, 10, 1, False),
+            (10, 11, 1, False),     # продолжение той же задачи - один блок фокуса
+            (11, 12, 2, False),     # переключение
+            (12, 13, 3, True),      # обед
+            (13, 14, 1, False),     # переключение
+        ), DAY, DAY)
+
+        assert stats['work'] == 4 * HOUR
+        assert stats['rest'] == HOUR
+        assert stats['rest_ratio'] == 0.2
+        assert stats['switches'] == 2
+        assert stats['longest_focus']['seconds'] == 2 * HOUR
+        assert stats['longest_focus']['start'] == datetime(2025, 6, 2, 9)
+        assert stats['hours'][9] == HOUR and stats['hours'][12] == 0
+
+    def test_intervals_split_at_midnight(self):
+        """Тест: задача через полночь делится между днями, вне периода не считается"""
+        stats = compute_stats(intervals((23, 25, 1, False), (47, 49, 1, False)), DAY, DAY + timedelta(days=1))
+
+        assert [day['work'] for day in stats['days']] == [HOUR, 2 * HOUR]
+        assert stats['work'] == 3 * HOUR
+
+    def test_empty(self):
+        """Тест: пустой период"""
+        empty = np.zeros(0, dtype=np.int64)
+        stats = compute_stats(Intervals(empty, empty, empty, empty, empty.astype(bool)), DAY, DAY)
+        assert stats['work'] == 0 and stats['longest_focus'] is None and stats['switches_per_day'] == 0.0
+
+
+class TestIntervalStats:
+    """Тесты загрузки интервалов из настоящей SQLite"""
+
+    def test_local_days_of_users(self, sqlite_db):
+        """Тест: дни считаются по часовому поясу каждого пользователя"""
+        User.get_or_create(1)                              # Europe/Moscow, UTC+3
+        User.get_or_create(2).update_timezone('UTC')
+        for user_id in (1, 2):
+            start = datetime(2025, 6, 2, 22, 0)            # 01:00 3 июня по Москве
+            Task.create(user_id, "Ночной релиз", None, start_time=start).end_task(start + timedelta(hours=1))
+
+        stats = analytics.interval_stats([1, 2], DAY, DAY + timedelta(days=1))
+        assert [day['work'] for day in stats['days']] == [HOUR, HOUR]
+        assert stats['users'] == {1: {'work': HOUR, 'rest': 0}, 2: {'work': HOUR, 'rest': 0}}
+        assert stats['longest_focus']['task_name'] == "Ночной релиз"
+
+    def test_running_task(self, sqlite_db):
+        """Тест: текущая задача считается до now или не учитывается"""
+        User.get_or_create(1).update_timezone('UTC')
+        Task.create(1, "Текущая", None, start_time=datetime(2025, 6, 2, 9, 0))
+        now = datetime(2025, 6, 2, 11, 0)
+
+        assert analytics.interval_stats([1], DAY, DAY, now=now)['work'] == 2 * HOUR
+        assert analytics.interval_stats([1], DAY, DAY, now=now, include_running=False)['work'] == 0
+
+    def test_inline_names_are_not_interned(self, sqlite_db):
+        """Тест: статистика не пишет в словарь названия задач, не перенесенные в него"""
+        User.get_or_create(1).update_timezone('UTC')
+        start = datetime(2025, 6, 2, 9, 0)
+        Task.create(1, "Старая", None, start_time=start).end_task(start + timedelta(hours=1))
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE tasks SET task_name = 'Старая', task_name_id = NULL")
+            cursor.execute("DELETE FROM task_names")
+        task_names.clear_cache()
+
+        stats = analytics.interval_stats([1], DAY, DAY)
+        assert stats['longest_focus']['task_name'] == "Старая"
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) AS n FROM task_names")
+            assert cursor.fetchone()['n'] == 0
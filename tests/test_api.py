@@ -0,0 +1,157 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from flask import Flask
+
+import api
+from models import User, Task
+
+
+@pytest.fixture
+def client(sqlite_db):
+    """Flask-клиент с API и токен пользователя 1"""
+    web_app = Flask(__name__)
+    api.register(web_app)
+    User.get_or_create(1)
+    User.get_or_create(2)
+    client = web_app.test_client()
+    client.token = api.issue_token(1)
+    return client
+
+
+def get(client, url, token=None, **headers):
+    headers['Authorization'] = f"Bearer {token or client.token}"
+    return client.get(url, headers=headers)
+
+
+# 2025-06-02 по Москве - с 2025-06-01 21:00 по 2025-06-02 21:00 UTC
+START = datetime(2025, 6, 2, 6, 0)
+
+
+def add_tasks(count, start=START):
+    tasks = []
+    for i in range(count):
+        task = Task.create(1, f"Задача {i}", None, start_time=start + timedelta(minutes=10 * i))
+        task.end_task(task.start_time + timedelta(minutes=10))
+        tasks.append(task)
+    return tasks
+
+
+class TestAuth:
+    """Тесты проверки токена"""
+
+    def test_requires_own_token(self, client):
+        """Тест: без токена, с чужим или отозванным токеном доступа нет"""
+        assert client.get("/api/users/1/tasks").status_code == 401
+        assert get(client, "/api/users/1/tasks", token="tt_неверный").status_code == 401
+        assert get(client, "/api/users/2/tasks").status_code == 401
+        assert get(client, "/api/users/1/tasks").status_code == 200
+
+        api.revoke_tokens(1)
+        assert get(client, "/api/users/1/tasks").status_code == 401
+
+    def test_new_token_replaces_old(self, client):
+        """Тест: новый токен отменяет предыдущий"""
+        new_token = api.issue_token(1)
+        assert get(client, "/api/users/1/tasks").status_code == 401
+        assert get(client, "/api/users/1/tasks", token=new_token).status_code == 200
+
+
+class TestTasks:
+    """Тесты списка задач с постраничной выдачей"""
+
+    def test_keyset_pages(self, client):
+        """Тест: страницы идут по порядку без пропусков и повторов"""
+        tasks = add_tasks(5)
+        url = "/api/users/1/tasks?from=2025-06-02&to=2025-06-02&limit=2"
+
+        ids = []
+        while url:
+            body = get(client, url).get_json()
+            ids += [task['id'] for task in body['tasks']]
+            url = body['next_cursor'] and \
+                f"/api/users/1/tasks?from=2025-06-02&to=2025-06-02&limit=2&cursor={body['next_cursor']}"
+
+        assert ids == [task.id for task in tasks]
+
+    def test_task_fields(self, client):
+        """Тест: время в UTC, у незавершенной задачи нет длительности"""
+        add_tasks(1)
+        Task.create(1, "PROJ-7 Текущая", None, start_time=START + timedelta(hours=1))
+        body = get(client, "/api/users/1/tasks?from=2025-06-02").get_json()
+
+        assert body['tasks'][0]['start_time'] == "2025-06-02T06:00:00Z"
+        assert body['tasks'][0]['duration_seconds'] == 600
+        assert body['tasks'][1]['jira_key'] == "PROJ-7"
+        assert body['tasks'][1]['end_time'] is None
+        assert body['tasks'][1]['duration_seconds'] is None
+
+    def test_invalid_params(self, client):
+        """Тест: неверные параметры отклоняются"""
+        assert get(client, "/api/users/1/tasks?from=02.06.2025").status_code == 400
+        assert get(client, "/api/users/1/tasks?from=2025-06-02&to=2025-06-01").status_code == 400
+        assert get(client, "/api/users/1/tasks?cursor=мусор").status_code == 400
+
+
+class TestSummary:
+    """Тесты сводки за день"""
+
+    def test_totals(self, client):
+        """Тест: сводка считает только завершенное время и показывает текущую задачу"""
+        add_tasks(3)
+        Task.create(1, "Задача 0", None, start_time=START + timedelta(hours=1))
+        body = get(client, "/api/users/1/summary?date=2025-06-02").get_json()
+
+        assert body['work_seconds'] == 1800
+        assert body['tasks'][0] == {'task_name': "Задача 0", 'is_rest': False, 'seconds': 600, 'count': 1}
+        assert body['active_task']['task_name'] == "Задача 0"
+
+
+class TestConditionalGet:
+    """Тесты ETag / Last-Modified"""
+
+    def test_not_modified_until_change(self, client):
+        """Тест: повторный запрос с ETag получает 304 без чтения задач, изменение дает 200"""
+        add_tasks(2)
+        url = "/api/users/1/summary?date=2025-06-02"
+        first = get(client, url)
+        assert first.status_code == 200
+        assert first.headers['ETag'] and first.headers['Last-Modified']
+
+        with patch.object(Task, 'get_tasks_for_date') as get_tasks:
+            second = get(client, url, **{'If-None-Match': first.headers['ETag']})
+            assert second.status_code == 304
+            get_tasks.assert_not_called()
+        assert second.headers['ETag'] == first.headers['ETag']
+
+        add_tasks(1, start=START + timedelta(hours=2))
+        third = get(client, url, **{'If-None-Match': first.headers['ETag']})
+        assert third.status_code == 200
+        assert third.headers['ETag'] != first.headers['ETag']
+        assert third.get_json()['work_seconds'] == 1800
+
+    def test_timezone_change_changes_etag(self, client):
+        """Тест: смена часового пояса меняет границы дней, а значит и ETag"""
+        add_tasks(1)
+        etag = get(client, "/api/users/1/tasks").headers['ETag']
+        User.get_or_create(1).update_timezone('Asia/Tokyo')
+        response = get(client, "/api/users/1/tasks", **{'If-None-Match': etag})
+        assert response.status_code == 200
+
+
+class TestStats:
+    """Тесты статистики за период"""
+
+    def test_stats_closed_time(self, client):
+        """Тест: статистика за период по завершенным задачам, с ETag"""
+        add_tasks(3)
+        Task.create(1, "Текущая", None, start_time=START + timedelta(hours=1))
+        response = get(client, "/api/users/1/stats?from=2025-06-01&to=2025-06-02")
+        body = response.get_json()
+
+        assert response.status_code == 200 and response.headers['ETag']
+        assert body['work'] == 1800
+        assert [day['date'] for day in body['days']] == ["2025-06-01", "2025-06-02"]
+        assert body['switches'] == 2
+        assert 'users' not in body
+        assert get(client, "/api/users/1/stats?from=2025-06-02&to=2025-06-01").status_code == 400
@@ -0,0 +1,88 @@
+import pytest
+from datetime import datetime, date, timedelta
+
+import archive
+from database import get_db
+from models import User, Task
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    """Каталог архива во временной папке"""
+    path = tmp_path / "archive"
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', str(path))
+    return path
+
+
+def count_tasks():
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS n FROM tasks")
+        return cursor.fetchone()['n']
+
+
+class TestArchiveCutoff:
+    """Тесты границы архивации"""
+
+    def test_cutoff_is_month_start(self):
+        """Тест: архивируются только целые месяцы"""
+        assert archive.archive_cutoff(datetime(2025, 6, 27, 12, 0), days=60) == datetime(2025, 4, 1)
+
+    def test_zero_days_is_current_month(self):
+        """Тест: текущий месяц не архивируется никогда"""
+        assert archive.archive_cutoff(datetime(2025, 6, 27), days=0) == datetime(2025, 6, 1)
+
+
+class TestArchive:
+    """Тесты архивации на настоящей SQLite"""
+
+    def test_archive_and_transparent_read(self, sqlite_db, archive_dir):
+        """Тест: старые задачи уходят в файл и читаются оттуда прозрачно"""
+        User.get_or_create(1)
+        old = datetime(2024, 3, 5, 9, 0)
+        Task.create(1, "Старая", start_time=old).end_task(old + timedelta(hours=2))
+        Task.create(1, "Старая", start_time=old + timedelta(days=30)).end_task(old + timedelta(days=30, hours=1))
+        Task.create(1, "Текущая", start_time=datetime.utcnow() - timedelta(hours=1))
+
+        assert archive.run(days=60) == 2
+
+        assert count_tasks() == 1
+        assert len(archive.list_archives(1)) == 2
+        assert (archive_dir / "1" / "2024-03.ndjson.gz").exists()
+
+        tasks = Task.get_tasks_for_date(1, datetime(2024, 3, 5, 12, 0))
+        assert [(t.task_name, t.get_duration()) for t in tasks] == [("Старая", timedelta(hours=2))]
+        between = Task.get_tasks_between(1, datetime(2024, 1, 1), datetime(2024, 12, 31))
+        assert len(between) == 2
+
+    def test_rerun_merges_into_existing_file(self, sqlite_db, archive_dir):
+        """Тест: задача, добавленная задним числом, дописывается в тот же файл"""
+        User.get_or_create(1)
+        old = datetime(2024, 3, 5, 9, 0)
+        Task.create(1, "A", start_time=old).end_task(old + timedelta(hours=1))
+        archive.run(days=60)
+        Task.create(1, "B", start_time=old + timedelta(days=1)).end_task(old + timedelta(days=1, hours=1))
+
+        assert archive.run(days=60) == 1
+
+        assert archive.list_archives(1)[0]['task_count'] == 2
+        assert count_tasks() == 0
+
+    def test_restore(self, sqlite_db, archive_dir):
+        """Тест: восстановление возвращает задачи и события в БД"""
+        User.get_or_create(1)
+        old = datetime(2024, 3, 5, 9, 0)
+        Task.create(1, "A", "комментарий", start_time=old).end_task(old + timedelta(hours=1))
+        archive.run(days=60)
+
+        assert archive.restore(1, date(2024, 3, 1)) == 1
+
+        assert count_tasks() == 1
+        assert archive.list_archives(1) == []
+        assert not (archive_dir / "1" / "2024-03.ndjson.gz").exists()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) AS n FROM task_events")
+            assert cursor.fetchone()['n'] == 2
+        restored = Task.get_tasks_for_date(1, datetime(2024, 3, 5, 12, 0))[0]
+        assert restored.comment == "комментарий"
@@ -0,0 +1,304 @@
+import threading
+import pytest
+import pytz
+from datetime import datetime, date, time, timedelta
+
+import database
+from database import (
+    create_backend, SQLiteBackend, PostgresBackend, ReplicaRouter, get_db, _to_sqlite_sql
+)
+from unittest.mock import MagicMock
+from models import User, Task
+from task_events import replay
+from update_dedup import UpdateDeduplicator
+from write_behind import WriteBehindBuffer
+
+
+class TestBackendSelection:
+    """Тесты выбора бэкенда по DATABASE_URL"""
+
+    def test_sqlite_url(self):
+        """Тест: sqlite:/// выбирает SQLite"""
+        backend = create_backend("sqlite:///data/bot.db")
+
+        assert isinstance(backend, SQLiteBackend)
+        assert backend.path == "data/bot.db"
+
+    def test_postgres_url(self):
+        """Тест: остальные URL обслуживает PostgreSQL"""
+        assert isinstance(create_backend("postgresql://localhost/db"), PostgresBackend)
+
+    def test_placeholder_translation(self):
+        """Тест перевода плейсхолдеров psycopg2 в формат SQLite"""
+        assert _to_sqlite_sql("SELECT * FROM t WHERE a = %s AND b LIKE '%%x'") == \
+            "SELECT * FROM t WHERE a = ? AND b LIKE '%x'"
+
+
+class TestReplicaRouter:
+    """Тесты маршрутизации чтений на реплику"""
+
+    def make_router(self, lag=0.0, **kwargs):
+        replica = MagicMock()
+        replica.replication_lag.return_value = lag
+        return ReplicaRouter(replica, max_lag=5, lag_check_interval=0, **kwargs), replica
+
+    def test_reads_go_to_replica(self):
+        """Тест: без отставания чтение идет на реплику"""
+        router, replica = self.make_router(lag=0.5)
+
+        assert router.choose(1) is replica
+        assert router.stats['replica_reads'] == 1
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        """Тест: при большом отставании чтение идет на основную БД"""
+        router, _ = self.make_router(lag=30)
+
+        assert router.choose(1) is None
+        assert router.stats['lag_fallbacks'] == 1
+
+    def test_read_your_writes(self):
+        """Тест: сразу после своей записи пользователь читает с основной БД"""
+        router, replica = self.make_router(read_your_writes=60)
+        router.note_write(1)
+
+        assert router.choose(1) is None
+        assert router.choose(2) is replica
+        assert router.stats['read_your_writes_fallbacks'] == 1
+
+    def test_replica_error_falls_back(self):
+        """Тест: недоступная реплика не ломает чтение"""
+        router, replica = self.make_router()
+        replica.connect.side_effect = Exception("connection refused")
+
+        assert router.choose(1) is None
+        assert router.stats['replica_errors'] == 1
+
+    def test_lag_is_cached(self):
+        """Тест: отставание измеряется не чаще интервала проверки"""
+        replica = MagicMock()
+        replica.replication_lag.return_value = 0
+        router = ReplicaRouter(replica, max_lag=5, lag_check_interval=60)
+
+        router.choose(1)
+        router.choose(2)
+
+        replica.replication_lag.assert_called_once()
+
+    def test_get_read_db_uses_replica(self, sqlite_db, tmp_path, monkeypatch):
+        """Тест: отчетный запрос выполняется на реплике"""
+        replica = SQLiteBackend(str(tmp_path / "replica.db"))
+        monkeypatch.setattr(database, '_router', ReplicaRouter(replica, lag_check_interval=0))
+        database.set_backend(replica)
+        database.init_database()
+        database.set_backend(sqlite_db)
+        User.get_or_create(1)
+        Task.create(1, "Только на основной", start_time=datetime(2025, 6, 27, 9, 0))
+        database._router._recent_writes.clear()
+
+        assert Task.get_tasks_for_date(1, datetime(2025, 6, 27)) == []
+        replica.close()
+
+
+class TestSQLiteBackend:
+    """Сквозные тесты моделей на SQLite"""
+
+    def test_wal_mode_enabled(self, sqlite_db):
+        """Тест: база работает в режиме WAL"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA journal_mode")
+            assert cursor.fetchone()['journal_mode'] == 'wal'
+
+    def test_init_database_is_idempotent(self, sqlite_db):
+        """Тест: повторная инициализация схемы не падает"""
+        database.init_database()
+
+    def test_current_schema_is_not_migrated_again(self, sqlite_db, monkeypatch):
+        """Тест: при актуальной схеме миграции не запускаются"""
+        migrate = MagicMock()
+        monkeypatch.setattr(sqlite_db, 'migrate', migrate)
+        database.init_database()
+        migrate.assert_not_called()
+
+        monkeypatch.setattr(database, 'SCHEMA_REVISION', database.SCHEMA_REVISION + 1)
+        database.init_database()
+        migrate.assert_called_once()
+
+    def test_dropped_tables_removed_by_migration(self, sqlite_db):
+        """Тест: таблицы прежних версий удаляются миграцией"""
+        with database.get_db() as conn:
+            conn.cursor().execute("CREATE TABLE daily_task_totals (user_id INTEGER)")
+
+        database.init_database(force=True)
+
+        with database.get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE name = 'daily_task_totals'")
+            assert cursor.fetchone() is None
+
+    def test_user_defaults(self, sqlite_db):
+        """Тест: значения по умолчанию читаются как time"""
+        user = User.get_or_create(1)
+
+        assert user.timezone == 'Europe/Moscow'
+        assert user.workday_start == time(9, 0)
+        assert user.workday_end == time(18, 0)
+
+    def test_task_lifecycle(self, sqlite_db):
+        """Тест: создание, завершение и выборка задач за день"""
+        User.get_or_create(1)
+        User(1).update_timezone('UTC')
+        start = pytz.utc.localize(datetime(2025, 6, 27, 9, 0))
+
+        task = Task.create(1, "Разработка", "API", start_time=start, original_message="Разработка - API")
+        assert Task.get_active_task(1).id == task.id
+
+        task.end_task(start + timedelta(hours=2))
+        rest = Task.create(1, "Отдых", start_time=start + timedelta(hours=2), is_rest=True)
+
+        tasks = Task.get_tasks_for_date(1, datetime(2025, 6, 27))
+        assert [t.task_name for t in tasks] == ["Разработка", "Отдых"]
+        assert tasks[0].get_duration() == timedelta(hours=2)
+        assert tasks[1].is_rest is True
+        assert Task.get_active_task(1).id == rest.id
+
+    def test_task_across_midnight_counts_on_both_days(self, sqlite_db):
+        """Тест: задача 22:00-02:00 попадает в оба дня и делится по полуночи"""
+        User.get_or_create(1)
+        User(1).update_timezone('UTC')
+        Task.create(1, "Релиз", start_time=datetime(2025, 6, 27, 22, 0)).end_task(datetime(2025, 6, 28, 2, 0))
+
+        assert [t.task_name for t in Task.get_tasks_for_date(1, datetime(2025, 6, 27))] == ["Релиз"]
+        assert [t.task_name for t in Task.get_tasks_for_date(1, datetime(2025, 6, 28))] == ["Релиз"]
+        first = Task.get_totals_for_date(1, datetime(2025, 6, 27))
+        second = Task.get_totals_for_date(1, datetime(2025, 6, 28))
+        assert round(first[0]['duration'].total_seconds()) == 2 * 3600
+        assert round(second[0]['duration'].total_seconds()) == 2 * 3600
+
+    def test_old_running_task_overlaps_day(self, sqlite_db):
+        """Тест: незавершенная задача старше окна поиска все равно попадает в день"""
+        User.get_or_create(1)
+        User(1).update_timezone('UTC')
+        Task.create(1, "Забытая", start_time=datetime(2025, 6, 1, 9, 0))
+
+        tasks = Task.get_tasks_for_date(1, datetime(2025, 6, 27))
+
+        assert [t.task_name for t in tasks] == ["Забытая"]
+        assert tasks[0].get_duration_within(*User(1, timezone='UTC').get_day_bounds_utc(
+            datetime(2025, 6, 27))) > timedelta(hours=23)
+
+    def test_backdated_task_trims_running_task_it_starts_in(self, sqlite_db):
+        """Тест: "14:00 Встреча" при задаче с 15:00 встает между задачами без наложений"""
+        User.get_or_create(1)
+        User(1).update_timezone('UTC')
+        day = datetime(2025, 6, 27)
+        Task.create(1, "Утро", start_time=day.replace(hour=13)).end_task(day.replace(hour=15))
+        current = Task.create(1, "Код", start_time=day.replace(hour=15))
+
+        assert Task.get_active_task(1).conflicts_with_start(day.replace(hour=14))
+        meeting, trimmed = Task.insert_at(1, "Встреча", start_time=day.replace(hour=14))
+
+        assert trimmed.task_name == "Утро"
+        assert (meeting.start_time, meeting.end_time) == (day.replace(hour=14), day.replace(hour=15))
+        tasks = Task.get_tasks_for_date(1, day)
+        assert [(t.task_name, t.start_time.hour, t.end_time and t.end_time.hour) for t in tasks] == [
+            ("Утро", 13, 14), ("Встреча", 14, 15), ("Код", 15, None)]
+        assert Task.get_active_task(1).id == current.id
+        assert sum((t.get_duration() for t in tasks if t.end_time), timedelta()) == timedelta(hours=2)
+
+    def test_backdated_task_takes_rest_of_closed_task(self, sqlite_db):
+        """Тест: вставка внутрь закрытой задачи делит ее, а совпадающее начало отклоняется"""
+        User.get_or_create(1)
+        User(1).update_timezone('UTC')
+        day = datetime(2025, 6, 27)
+        Task.create(1, "Код", start_time=day.replace(hour=9)).end_task(day.replace(hour=12))
+
+        review, _ = Task.insert_at(1, "Ревью", start_time=day.replace(hour=11))
+
+        assert review.end_time == day.replace(hour=12)
+        assert Task.get_active_task(1) is None
+        assert Task.insert_at(1, "Другое", start_time=day.replace(hour=11)) == (None, None)
+        tasks = Task.get_tasks_for_date(1, day)
+        assert [(t.task_name, t.start_time.hour, t.end_time.hour) for t in tasks] == [("Код", 9, 11), ("Ревью", 11, 12)]
+
+    def test_concurrent_backdated_tasks_at_same_time(self, sqlite_db, monkeypatch):
+        """Тест: две одновременные вставки на одно время - вторая видит первую и отклоняется"""
+        import jira_sync
+        User.get_or_create(1)
+        at = datetime(2025, 6, 27, 11, 0)
+        inside = threading.Event()
+        release = threading.Event()
+        enqueue = jira_sync.enqueue_worklogs
+
+        def slow_enqueue(cursor, task_ids):
+            # Первая вставка держит транзакцию открытой, пока вторая пытается начаться
+            if threading.current_thread().name == 'first':
+                inside.set()
+                release.wait(5)
+            return enqueue(cursor, task_ids)
+
+        monkeypatch.setattr(jira_sync, 'enqueue_worklogs', slow_enqueue)
+        results = {}
+
+        def insert(name):
+            # Одно название: его id уже в кэше, и вторая вставка ничего не пишет до чтения соседей
+            results[name] = Task.insert_at(1, "Встреча", name, start_time=at)
+
+        first = threading.Thread(target=insert, args=("first",), name='first')
+        first.start()
+        assert inside.wait(5)
+        second = threading.Thread(target=insert, args=("second",), name='second')
+        second.start()
+        second.join(0.3)
+        assert second.is_alive()
+        release.set()
+        first.join()
+        second.join()
+
+        assert results["first"][0] is not None
+        assert results["second"] == (None, None)
+        assert [t.comment for t in Task.get_tasks_between(1, at, at + timedelta(hours=1))] == ["first"]
+
+    def test_replay_rebuilds_projections(self, sqlite_db):
+        """Тест: replay восстанавливает задачи из журнала"""
+        User.get_or_create(1)
+        start = datetime(2025, 6, 27, 9, 0)
+        task = Task.create(1, "A", start_time=start)
+        task.update_with_same_time("B", "комментарий")
+        task.end_task(start + timedelta(hours=1))
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE tasks SET task_name_id = NULL, task_name = 'испорчено'")
+
+        assert replay() == 4
+
+        restored = Task.get_tasks_for_date(1, datetime(2025, 6, 27))[0]
+        assert restored.task_name == "B"
+        assert restored.comment == "комментарий"
+
+    def test_update_dedup(self, sqlite_db):
+        """Тест: повторный update_id отбрасывается через таблицу"""
+        assert UpdateDeduplicator(bot_id=1).claim_many([1, 2]) == {1, 2}
+        # Новый экземпляр без LRU, как после перезапуска процесса
+        assert UpdateDeduplicator(bot_id=1).claim_many([2, 3]) == {3}
+
+    def test_write_behind_flush(self, sqlite_db, tmp_path):
+        """Тест: групповая запись через буфер на SQLite"""
+        User.get_or_create(1)
+        buffer = WriteBehindBuffer(str(tmp_path / "wb.wal"), flush_interval_ms=60000, fsync=False)
+        buffer._wal = open(buffer.wal_path, 'a', encoding='utf-8')
+        start = datetime(2025, 6, 27, 9, 0)
+
+        first, second = buffer.allocate_task_id(), buffer.allocate_task_id()
+        buffer.enqueue_start(first, 1, "A", None, None, start, False)
+        buffer.flush()
+        buffer.enqueue_end(first, 1, start + timedelta(hours=1), start, False)
+        buffer.enqueue_start(second, 1, "B", None, None, start + timedelta(hours=1), False)
+        buffer.flush()
+        buffer._wal.close()
+
+        tasks = Task.get_tasks_for_date(1, datetime(2025, 6, 27))
+        assert [(t.id, t.task_name) for t in tasks] == [(first, "A"), (second, "B")]
+        assert tasks[0].end_time == start + timedelta(hours=1)
+        # Обычная вставка не конфликтует с зарезервированными id
+        assert Task.create(1, "C", start_time=start).id > second
@@ -0,0 +1,63 @@
+import pytest
+from datetime import datetime, time, timedelta
+from unittest.mock import MagicMock
+
+import digest
+from digest import DigestScheduler, next_firing, list_buckets, load_bucket
+from models import User, Task
+
+BUCKET = ('Europe/Moscow', time(18, 0))
+DAY = datetime(2025, 6, 4)
+
+
+@pytest.fixture
+def users(sqlite_db):
+    """Два пользователя в одной корзине и один с другим концом дня"""
+    for user_id in (1, 2, 3):
+        User.get_or_create(user_id)
+    User(3).update_workday(time(9, 0), time(17, 0))
+    Task.create(1, "Код", start_time=datetime(2025, 6, 4, 7, 0)).end_task(datetime(2025, 6, 4, 9, 0))
+    Task.create(3, "Ревью", start_time=datetime(2025, 6, 4, 7, 0)).end_task(datetime(2025, 6, 4, 8, 0))
+
+
+class TestNextFiring:
+    """Тесты расчета времени срабатывания корзины"""
+
+    def test_today_then_tomorrow(self):
+        """Тест: до конца дня - сегодня, после - завтра"""
+        assert next_firing(BUCKET, datetime(2025, 6, 4, 10, 0)) == (datetime(2025, 6, 4, 15, 0), DAY)
+        assert next_firing(BUCKET, datetime(2025, 6, 4, 15, 0)) == (
+            datetime(2025, 6, 5, 15, 0), DAY + timedelta(days=1))
+
+
+class TestBuckets:
+    """Тесты корзин на настоящей SQLite"""
+
+    def test_buckets_group_by_timezone_and_workday_end(self, users):
+        """Тест: пользователи разбиты по (часовой пояс, конец дня)"""
+        assert sorted(set(list_buckets())) == [('Europe/Moscow', time(17, 0)), BUCKET]
+
+        members, tasks, base_urls = load_bucket(BUCKET, DAY)
+
+        assert sorted(user.user_id for user in members) == [1, 2]
+        assert [task.task_name for task in tasks[1]] == ["Код"]
+        assert 2 not in tasks
+
+    def test_fire_queues_digests_of_users_with_tasks(self, users):
+        """Тест: сводка ставится в очередь только тем, у кого были задачи"""
+        scheduler = DigestScheduler(MagicMock())
+
+        run = scheduler.fire(BUCKET, DAY)
+
+        assert (run['members'], run['queued']) == (2, 1)
+        user_id, text, _ = scheduler._outbox[0]
+        assert user_id == 1
+        assert text.startswith("📊 *Сводка за 04.06.2025*")
+        assert "/digest off" in text
+        assert scheduler.bucket_stats()[0]['bucket'] == "Europe/Moscow 18:00"
+
+    def test_disabled_user_is_skipped(self, users):
+        """Тест: отключившие сводку не попадают в корзину"""
+        digest.set_enabled(1, False)
+        members, _, _ = load_bucket(BUCKET, DAY)
+        assert [user.user_id for user in members] == [2]
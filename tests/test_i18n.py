@@ -0,0 +1,94 @@
+import re
+import pytest
+from datetime import datetime, date, timedelta
+
+import i18n
+from i18n import Template, compile_catalog, t, escape_markdown, button_key, button_locale, locale_for_language_code
+from models import User, Task
+from summary import prepare_day_summary, render_day_summary
+from time_utils import format_duration
+
+
+class TestTemplate:
+    """Тесты разбора и заполнения шаблонов"""
+
+    def test_render_fills_fields(self):
+        """Тест: поля заполняются значениями, литералы сохраняются"""
+        template = Template('greeting', "Привет, {name}! У вас {count} задач")
+
+        assert template.fields == {'name', 'count'}
+        assert template.render({'name': 'Анна', 'count': 3}) == "Привет, Анна! У вас 3 задач"
+
+    def test_format_specs_are_rejected(self):
+        """Тест: форматные спецификации в шаблонах запрещены"""
+        with pytest.raises(ValueError):
+            Template('bad', "{value:>10}")
+
+
+class TestCatalog:
+    """Тесты каталога сообщений"""
+
+    def test_locales_must_match(self):
+        """Тест: расхождение ключей или полей между языками - ошибка при сборке"""
+        with pytest.raises(ValueError):
+            compile_catalog({'ru': {'a': "{x}", 'b': ""}, 'en': {'a': "{x}"}})
+        with pytest.raises(ValueError):
+            compile_catalog({'ru': {'a': "{x}"}, 'en': {'a': "{y}"}})
+
+    def test_english_has_no_russian(self):
+        """Тест: в английских сообщениях не осталось русского текста"""
+        assert not [key for key, text in i18n.MESSAGES['en'].items() if re.search('[А-Яа-яЁё]', text)]
+
+    def test_unknown_locale_falls_back_to_default(self):
+        """Тест: неизвестный язык и None дают язык по умолчанию"""
+        assert t('de', 'btn_help') == t(None, 'btn_help') == t(i18n.DEFAULT_LOCALE, 'btn_help')
+
+    def test_buttons_are_recognized_in_any_locale(self):
+        """Тест: кнопка узнается на любом языке"""
+        assert button_key("📊 Сводка") == button_key("📊 Summary") == 'btn_summary'
+        assert button_locale("❓ Help") == 'en'
+        assert button_key("Сводка") is None
+
+    def test_language_code(self):
+        """Тест: язык клиента Telegram сопоставляется с локалью"""
+        assert locale_for_language_code('en-US') == 'en'
+        assert locale_for_language_code('ru') == 'ru'
+        assert locale_for_language_code(None) == i18n.DEFAULT_LOCALE
+
+    def test_escape_markdown(self):
+        """Тест: экранируются только символы разметки Markdown"""
+        assert escape_markdown("fix_bug *now* [PR] `x`") == "fix\\_bug \\*now\\* \\[PR] \\`x\\`"
+
+    def test_duration_in_english(self):
+        """Тест: длительность на английском"""
+        assert format_duration(timedelta(hours=2, minutes=5), 'en') == "2 h 5 min"
+        assert format_duration(timedelta(hours=2, minutes=5), 'ru') == "2 ч 5 мин"
+
+
+class TestLocalizedSummary:
+    """Тесты сводки на разных языках"""
+
+    def test_english_summary_escapes_comments(self):
+        """Тест: сводка на английском, комментарий экранирован"""
+        user = User(100, timezone='UTC', locale='en')
+        now = datetime.utcnow()
+        tasks = [Task(1, 100, "Код", "fix_login", now - timedelta(hours=2), now - timedelta(hours=1))]
+
+        text = render_day_summary(prepare_day_summary(user, tasks, date(2025, 6, 27)), user)
+
+        assert text.startswith("📊 *Summary for 27.06.2025*")
+        assert "⏰ *Work time:* 1 h" in text
+        assert "💬 fix\\_login" in text
+
+
+class TestUserLocale:
+    """Тесты хранения языка пользователя на настоящей SQLite"""
+
+    def test_locale_is_stored(self, sqlite_db):
+        """Тест: язык не выбран, пока пользователь его не установит"""
+        user = User.get_or_create(1)
+        assert user.locale is None
+
+        assert user.update_locale('en')
+        assert not user.update_locale('de')
+        assert User.get_or_create(1).locale == 'en'
@@ -0,0 +1,95 @@
+import pytest
+from datetime import datetime, date, timedelta
+
+from database import get_db
+from jira_report import backfill, ticket_report, ticket_rollup
+from models import User, Task
+
+
+class TestJiraReport:
+    """Тесты отчетов по тикетам Jira на настоящей SQLite"""
+
+    def test_jira_key_stored_at_write_time(self, sqlite_db):
+        """Тест: ключ тикета и проекта сохраняются при создании и переименовании"""
+        User.get_or_create(1)
+        task = Task.create(1, "PROJ-123", original_message="PROJ-123 - правки",
+                           start_time=datetime(2025, 6, 27, 9, 0))
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT jira_key, jira_project FROM tasks")
+            assert cursor.fetchone() == {'jira_key': 'PROJ-123', 'jira_project': 'PROJ'}
+
+        task.update_with_same_time("DEV-5", original_message="DEV-5")
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT jira_key, jira_project FROM tasks")
+            assert cursor.fetchone() == {'jira_key': 'DEV-5', 'jira_project': 'DEV'}
+
+    def test_ticket_report_by_day(self, sqlite_db):
+        """Тест: отчет по тикету суммирует время по дням"""
+        User.get_or_create(1)
+        start = datetime(2025, 6, 2, 6, 0)
+        for day in (0, 0, 3):
+            begin = start + timedelta(days=day, hours=day)
+            Task.create(1, "PROJ-1", start_time=begin).end_task(begin + timedelta(hours=1))
+        Task.create(1, "Другое", start_time=start).end_task(start + timedelta(hours=5))
+
+        report = ticket_report(1, "PROJ-1")
+
+        assert report['task_count'] == 3
+        assert report['total'] == timedelta(hours=3)
+        assert list(report['days'].items()) == [
+            (date(2025, 6, 5), timedelta(hours=1)),
+            (date(2025, 6, 2), timedelta(hours=2)),
+        ]
+
+    def test_rollup_across_users(self, sqlite_db):
+        """Тест: сводка по тикетам по всем пользователям с фильтром проекта"""
+        start = datetime(2025, 6, 2, 9, 0)
+        for user_id, ticket, hours in ((1, "PROJ-1", 2), (2, "PROJ-1", 1), (2, "PROJ-2", 4), (1, "DEV-1", 8)):
+            User.get_or_create(user_id)
+            Task.create(user_id, ticket, start_time=start).end_task(start + timedelta(hours=hours))
+
+        rollup = ticket_rollup(project="PROJ")
+
+        assert [(r['jira_key'], r['user_count'], r['seconds']) for r in rollup] == [
+            ("PROJ-2", 1, 4 * 3600),
+            ("PROJ-1", 2, 3 * 3600),
+        ]
+
+    def test_rollup_of_team(self, sqlite_db):
+        """Тест: сводка по тикетам только по участникам команды"""
+        import teams
+        start = datetime(2025, 6, 2, 9, 0)
+        for user_id, ticket, hours in ((1, "PROJ-1", 2), (2, "PROJ-1", 1), (3, "PROJ-2", 4)):
+            User.get_or_create(user_id)
+            Task.create(user_id, ticket, start_time=start).end_task(start + timedelta(hours=hours))
+        team = teams.create_team(1, "Команда")
+        teams.join_team(3, team['invite_code'])
+        empty = teams.create_team(4, "Пустая")
+        teams.leave_team(4, empty['id'])
+
+        rollup = ticket_rollup(user_ids=teams.member_ids(team['id']))
+
+        assert [(r['jira_key'], r['user_count'], r['seconds']) for r in rollup] == [
+            ("PROJ-2", 1, 4 * 3600),
+            ("PROJ-1", 1, 2 * 3600),
+        ]
+        assert ticket_rollup(user_ids=teams.member_ids(empty['id'])) == []
+
+    def test_backfill(self, sqlite_db):
+        """Тест: пакетное заполнение ключей для старых строк"""
+        User.get_or_create(1)
+        with get_db() as conn:
+            cursor = conn.cursor()
+            for name in ("PROJ-1", "Без тикета", "https://jira.example.com/browse/DEV-2"):
+                cursor.execute("""
+                    INSERT INTO tasks (user_id, task_name, start_time) VALUES (%s, %s, %s)
+                """, (1, name, datetime(2025, 6, 2, 9, 0)))
+
+        assert backfill(batch_size=2) == 2
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT jira_key FROM tasks ORDER BY id")
+            assert [row['jira_key'] for row in cursor.fetchall()] == ["PROJ-1", None, "DEV-2"]
@@ -0,0 +1,50 @@
+import pytest
+from unittest.mock import patch
+
+from jira_settings import get_base_url, set_base_url, normalize_base_url, SCOPE_USER, SCOPE_CHAT
+from task_parser import DEFAULT_JIRA_BASE_URL
+
+
+class TestNormalizeBaseUrl:
+    """Тесты нормализации адреса Jira"""
+
+    def test_strips_browse_path(self):
+        """Тест: ссылка на тикет превращается в адрес Jira"""
+        assert normalize_base_url("https://jira.example.com/browse/PROJ-1") == "https://jira.example.com"
+        assert normalize_base_url("https://example.com/jira/") == "https://example.com/jira"
+
+    def test_rejects_non_url(self):
+        """Тест: не-URL отклоняется"""
+        assert normalize_base_url("jira.example.com") is None
+        assert normalize_base_url("ftp://jira.example.com") is None
+
+
+class TestGetBaseUrl:
+    """Тесты выбора адреса Jira на настоящей SQLite"""
+
+    def test_default(self, sqlite_db):
+        """Тест: без настроек используется адрес по умолчанию"""
+        assert get_base_url(1, 1) == DEFAULT_JIRA_BASE_URL
+
+    def test_chat_wins_over_user(self, sqlite_db):
+        """Тест: настройка группы важнее личной, личная - важнее умолчания"""
+        set_base_url(SCOPE_USER, 1, "https://user.example.com")
+        set_base_url(SCOPE_CHAT, -100, "https://chat.example.com")
+
+        assert get_base_url(1, -100) == "https://chat.example.com"
+        assert get_base_url(1, -200) == "https://user.example.com"
+        assert get_base_url(1, 1) == "https://user.example.com"
+        assert get_base_url(2, 2) == DEFAULT_JIRA_BASE_URL
+
+    def test_cached_until_changed(self, sqlite_db):
+        """Тест: повторный запрос берется из кэша, изменение сбрасывает кэш"""
+        get_base_url(1, 1)
+        with patch('jira_settings.get_db') as mock_get_db:
+            get_base_url(1, 1)
+            mock_get_db.assert_not_called()
+
+        set_base_url(SCOPE_USER, 1, "https://new.example.com")
+        assert get_base_url(1, 1) == "https://new.example.com"
+
+        set_base_url(SCOPE_USER, 1, None)
+        assert get_base_url(1, 1) == DEFAULT_JIRA_BASE_URL
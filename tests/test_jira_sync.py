@@ -0,0 +1,110 @@
+import pytest
+from datetime import datetime, timedelta
+
+import jira_sync
+from database import get_db
+from jira_settings import set_base_url, SCOPE_USER
+from jira_stub import JiraStub
+from models import User, Task
+
+
+@pytest.fixture
+def stub(sqlite_db, monkeypatch):
+    """Включенная синхронизация и локальная Jira для пользователя 1"""
+    monkeypatch.setattr(jira_sync, 'JIRA_SYNC_ENABLED', True)
+    stub = JiraStub().start()
+    User.get_or_create(1)
+    set_base_url(SCOPE_USER, 1, stub.url)
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def worker():
+    worker = jira_sync.JiraSyncWorker(batch_size=10, concurrency=2)
+    yield worker
+    worker.stop()
+
+
+def outbox_rows():
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM jira_worklog_outbox ORDER BY id")
+        return cursor.fetchall()
+
+
+def end_jira_task(name="PROJ-1 Исправление", hours=1, is_rest=False):
+    start = datetime(2025, 6, 2, 9, 0)
+    task = Task.create(1, name, "комментарий", start_time=start, is_rest=is_rest)
+    task.end_task(start + timedelta(hours=hours))
+    return task
+
+
+class TestOutbox:
+    """Тесты заполнения очереди ворклогов"""
+
+    def test_only_closed_jira_tasks(self, stub):
+        """Тест: в очередь попадают только завершенные рабочие задачи с тикетом"""
+        end_jira_task()
+        end_jira_task("Код-ревью")
+        end_jira_task("PROJ-2", is_rest=True)
+        Task.create(1, "PROJ-3", start_time=datetime(2025, 6, 2, 12, 0))
+
+        rows = outbox_rows()
+        assert [(r['jira_key'], r['seconds'], r['comment']) for r in rows] == [("PROJ-1", 3600, "комментарий")]
+
+    def test_disabled(self, stub, monkeypatch):
+        """Тест: без JIRA_SYNC очередь не заполняется"""
+        monkeypatch.setattr(jira_sync, 'JIRA_SYNC_ENABLED', False)
+        end_jira_task()
+        assert outbox_rows() == []
+
+    def test_reending_updates_pending(self, stub):
+        """Тест: повторное завершение меняет длительность неотправленного ворклога"""
+        task = end_jira_task()
+        task.end_task(task.start_time + timedelta(hours=2))
+
+        rows = outbox_rows()
+        assert len(rows) == 1
+        assert rows[0]['seconds'] == 7200
+
+
+class TestSyncWorker:
+    """Тесты отправки ворклогов в локальную Jira"""
+
+    def test_sends_batch(self, stub, worker):
+        """Тест: ворклоги отправляются и помечаются отправленными"""
+        end_jira_task("PROJ-1")
+        end_jira_task("PROJ-2", hours=2)
+
+        assert worker.sync_once() == 2
+
+        assert sorted((w['issue'], w['timeSpentSeconds']) for w in stub.worklogs) == [
+            ("PROJ-1", 3600), ("PROJ-2", 7200)]
+        assert all(r['status'] == 'sent' and r['worklog_id'] for r in outbox_rows())
+        assert jira_sync.queue_stats()['pending'] == 0
+        assert worker.sync_once() == 0
+
+    def test_server_error_is_retried_later(self, stub, worker):
+        """Тест: после ошибки сервера ворклог ждет повтора с задержкой"""
+        end_jira_task()
+        stub.fail_next(500)
+
+        worker.sync_once()
+
+        row = outbox_rows()[0]
+        assert row['status'] == 'pending'
+        assert row['attempts'] == 1
+        assert row['next_attempt_at'] > datetime.utcnow() + timedelta(seconds=20)
+        assert stub.worklogs == []
+        assert jira_sync.queue_stats()['pending'] == 1
+
+    def test_unknown_issue_fails_permanently(self, stub, worker):
+        """Тест: ошибка 404 не повторяется"""
+        end_jira_task()
+        stub.fail_next(404)
+
+        worker.sync_once()
+
+        assert outbox_rows()[0]['status'] == 'failed'
+        assert worker.stats['failed'] == 1
@@ -0,0 +1,118 @@
+import json
+import time
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from flask import Flask
+
+import live
+from models import User, Task
+
+
+@pytest.fixture
+def hub(sqlite_db):
+    """Хаб с быстрым опросом журнала событий"""
+    User.get_or_create(1)
+    User.get_or_create(2)
+    hub = live.ActiveTaskHub(poll_interval=0.05)
+    yield hub
+    hub.stop()
+
+
+def read_event(stream):
+    """Следующее событие потока без комментариев-пульса"""
+    while True:
+        chunk = next(stream)
+        if not chunk.startswith(':') and not chunk.startswith('retry:'):
+            fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+            return fields['event'], json.loads(fields['data']), fields['id']
+
+
+class TestActiveTaskHub:
+    """Тесты потока текущих задач на настоящей SQLite"""
+
+    def test_snapshot_then_changes(self, hub):
+        """Тест: сначала снимок текущих задач, затем начало и конец задач"""
+        running = Task.create(1, "Релиз", None)
+        hub.start()
+        stream = hub.subscribe()
+
+        name, data, _ = read_event(stream)
+        assert name == 'snapshot'
+        assert [task['task_name'] for task in data['tasks']] == ["Релиз"]
+
+        Task.create(2, "Код-ревью", None)
+        name, data, _ = read_event(stream)
+        assert (name, data['user_id'], data['task_name']) == ('start', 2, "Код-ревью")
+
+        running.end_task()
+        name, data, _ = read_event(stream)
+        assert (name, data['task_id'], data['task_name']) == ('end', running.id, "Релиз")
+        assert [task['user_id'] for task in json.loads(hub.snapshot()[1])['tasks']] == [2]
+        stream.close()
+        assert hub.stats['subscribers'] == 0
+
+    def test_one_query_per_poll(self, hub):
+        """Тест: подписчики не обращаются к базе"""
+        hub.start()
+        streams = [hub.subscribe() for _ in range(50)]
+        with patch('live.get_db') as get_db:
+            for stream in streams:
+                assert read_event(stream)[0] == 'snapshot'
+            get_db.assert_not_called()
+
+    def test_resume_with_last_event_id(self, hub):
+        """Тест: переподключение с Last-Event-ID продолжает без снимка, с чужим id - снимок"""
+        hub.start()
+        stream = hub.subscribe()
+        read_event(stream)
+        Task.create(1, "Первая", None)
+        _, _, last_id = read_event(stream)
+        stream.close()
+
+        Task.create(2, "Вторая", None)
+        resumed = hub.subscribe(last_event_id=last_id)
+        name, data, _ = read_event(resumed)
+        assert (name, data['task_name']) == ('start', "Вторая")
+
+        assert read_event(hub.subscribe(last_event_id="другой-1"))[0] == 'snapshot'
+
+    def test_slow_subscriber_gets_snapshot(self, sqlite_db):
+        """Тест: отставший дальше истории подписчик получает новый снимок"""
+        User.get_or_create(1)
+        hub = live.ActiveTaskHub(poll_interval=0.05, history_size=2)
+        hub.start()
+        try:
+            stream = hub.subscribe()
+            read_event(stream)
+            start = datetime.utcnow() - timedelta(hours=3)
+            for i in range(3):
+                Task.create(1, f"Задача {i}", None, start_time=start + timedelta(hours=i)).end_task(
+                    start + timedelta(hours=i, minutes=30))
+            while hub.stats['events'] < 6:
+                time.sleep(0.01)
+            assert read_event(stream)[0] == 'snapshot'
+        finally:
+            hub.stop()
+
+    def test_heartbeat(self, hub, monkeypatch):
+        """Тест: без событий отправляется комментарий-пульс"""
+        monkeypatch.setattr(live, 'LIVE_HEARTBEAT_SECONDS', 0.01)
+        hub.start()
+        stream = hub.subscribe()
+        read_event(stream)
+        assert next(stream) == ": heartbeat\n\n"
+
+
+class TestLiveEndpoint:
+    """Тесты доступа к потоку"""
+
+    def test_requires_reports_token(self, sqlite_db, monkeypatch):
+        """Тест: без токена отчетов поток недоступен"""
+        monkeypatch.setenv('REPORTS_TOKEN', 'secret')
+        web_app = Flask(__name__)
+        live.register(web_app)
+        client = web_app.test_client()
+        assert client.get("/live/tasks").status_code == 401
+        assert client.get("/live/tasks?token=wrong").status_code == 401
+        assert client.get("/live/tasks?team=abc&token=secret").status_code == 400
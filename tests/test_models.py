@@ -192,8 +192,9 @@ class TestTask:
         assert task.end_time == end_time
         assert task.is_rest is True
     
+    @patch('models.task_names.resolve_one', return_value=7)
     @patch('models.get_db')
-    def test_create_task_minimal(self, mock_get_db):
+    def test_create_task_minimal(self, mock_get_db, mock_resolve):
         """Тест создания задачи с минимальными параметрами"""
         mock_cursor = MagicMock()
         mock_cursor.fetchone.return_value = {
@@ -218,6 +219,8 @@ class TestTask:
         assert task.user_id == 12345
         assert task.task_name == "Новая задача"
         mock_cursor.execute.assert_called()
+        # Имя хранится в словаре, в задачу пишется его id
+        assert mock_cursor.execute.call_args_list[0][0][1][1] == 7
     
     @patch('models.get_db')
     def test_get_active_task_exists(self, mock_get_db):
@@ -309,7 +312,12 @@ class TestTask:
         
         assert result is True
         assert task.end_time == end_time
-        mock_cursor.execute.assert_called_once()
+        # UPDATE задачи + событие в журнале
+        update_sql = mock_cursor.execute.call_args_list[0][0][0]
+        event_sql, event_params = mock_cursor.execute.call_args_list[1][0]
+        assert "UPDATE tasks SET end_time" in update_sql
+        assert "INSERT INTO task_events" in event_sql
+        assert 'end' in event_params
     
     def test_get_duration_not_ended(self):
         """Тест получения длительности незавершенной задачи"""
@@ -333,8 +341,9 @@ class TestTask:
         # Задача выполнялась 1.5 часа
         assert duration == timedelta(hours=1, minutes=30)
     
+    @patch('models.task_names.resolve_one', return_value=7)
     @patch('models.get_db')
-    def test_update_with_same_time(self, mock_get_db):
+    def test_update_with_same_time(self, mock_get_db, mock_resolve):
         """Тест обновления задачи с тем же временем"""
         mock_cursor = MagicMock()
         mock_conn = MagicMock()
@@ -347,4 +356,8 @@ class TestTask:
         assert result is True
         assert task.task_name == "Новая задача"
         assert task.comment == "Новый комментарий"
-        mock_cursor.execute.assert_called_once()
\ No newline at end of file
+        # UPDATE задачи + события rename и comment одним INSERT
+        assert mock_cursor.execute.call_count == 2
+        event_params = mock_cursor.execute.call_args_list[1][0][1]
+        assert 'rename' in event_params
+        assert 'comment' in event_params
\ No newline at end of file
@@ -0,0 +1,138 @@
+import random
+import pytest
+from datetime import datetime, time, timedelta
+from unittest.mock import MagicMock
+
+import reminders
+from reminders import TimerWheel, ReminderScheduler, next_reminder, next_start_of_day, KIND_IDLE, KIND_REST, KIND_START
+from models import User, Task
+
+# Среда, рабочий день 09:00-18:00 по Москве (UTC+3)
+SETTINGS = {'timezone': 'Europe/Moscow', 'workday_start': time(9, 0), 'workday_end': time(18, 0),
+            'reminders_enabled': True}
+WEDNESDAY_NOON = datetime(2025, 6, 4, 9, 0)
+
+
+class TestTimerWheel:
+    """Тесты иерархического колеса таймеров"""
+
+    def test_fires_at_deadline(self):
+        """Тест: таймер срабатывает в свой тик, перенос заменяет старый"""
+        wheel = TimerWheel(now=1000)
+        wheel.schedule('a', 1010, 'x')
+        wheel.schedule('a', 1020, 'y')
+
+        assert wheel.advance(1019) == []
+        assert wheel.advance(1020) == [('a', 'y')]
+        assert len(wheel) == 0
+
+    def test_cancel(self):
+        """Тест: отмененный таймер не срабатывает"""
+        wheel = TimerWheel(now=0)
+        wheel.schedule(1, 5)
+        assert wheel.cancel(1)
+        assert not wheel.cancel(1)
+        assert wheel.advance(10) == []
+
+    def test_matches_sorted_deadlines_across_levels(self):
+        """Тест: таймеры на всех уровнях срабатывают вовремя и по одному разу"""
+        rng = random.Random(1)
+        wheel = TimerWheel(now=0, slots=8, levels=3)
+        deadlines = {key: rng.randint(1, 2000) for key in range(300)}
+        for key, at in deadlines.items():
+            wheel.schedule(key, at)
+
+        fired = {}
+        for now in range(0, 2008, 7):
+            for key, _ in wheel.advance(now):
+                fired[key] = now
+        assert fired.keys() == deadlines.keys()
+        assert all(deadlines[key] <= now < deadlines[key] + 7 for key, now in fired.items())
+
+
+class TestNextReminder:
+    """Тесты расчета момента напоминания"""
+
+    def test_idle_within_workday(self):
+        """Тест: без задачи напоминание через REMINDER_IDLE_MINUTES"""
+        at, kind = next_reminder(SETTINGS, None, WEDNESDAY_NOON, WEDNESDAY_NOON)
+        assert (at, kind) == (WEDNESDAY_NOON + timedelta(minutes=reminders.REMINDER_IDLE_MINUTES), KIND_IDLE)
+
+    def test_rest_and_work(self):
+        """Тест: отдых напоминает позже, работа не напоминает"""
+        rest = {'start_time': WEDNESDAY_NOON, 'is_rest': True}
+        assert next_reminder(SETTINGS, rest, WEDNESDAY_NOON, WEDNESDAY_NOON)[1] == KIND_REST
+        assert next_reminder(SETTINGS, {'start_time': WEDNESDAY_NOON, 'is_rest': False},
+                             WEDNESDAY_NOON, WEDNESDAY_NOON) is None
+
+    def test_after_workday_waits_for_next_workday(self):
+        """Тест: после конца рабочего дня в пятницу - начало дня в понедельник"""
+        friday_evening = datetime(2025, 6, 6, 17, 0)
+        at, kind = next_reminder(SETTINGS, None, friday_evening, friday_evening)
+
+        assert kind == KIND_START
+        assert at == datetime(2025, 6, 9, 6, 0) + timedelta(minutes=reminders.REMINDER_START_MINUTES)
+        assert next_start_of_day(SETTINGS, at) > at
+
+
+class TestDeliver:
+    """Тесты отправки напоминаний на настоящей SQLite"""
+
+    def test_sent_only_without_running_task(self, sqlite_db, monkeypatch):
+        """Тест: напоминание уходит без активной задачи и пропускается при работе"""
+        monkeypatch.setattr(reminders, 'in_workday', lambda settings, at: True)
+        User.get_or_create(1)
+        send = MagicMock()
+        scheduler = ReminderScheduler(send)
+
+        assert scheduler.deliver(1, KIND_IDLE)
+        Task.create(1, "Код")
+        assert not scheduler.deliver(1, KIND_IDLE)
+        assert send.call_count == 1
+        assert scheduler.stats['skipped'] == 1
+
+    def test_blocked_user_is_disabled(self, sqlite_db, monkeypatch):
+        """Тест: пользователь, заблокировавший бота, больше не получает напоминаний"""
+        monkeypatch.setattr(reminders, 'in_workday', lambda settings, at: True)
+        User.get_or_create(1)
+        error = Exception("Forbidden")
+        error.error_code = 403
+        scheduler = ReminderScheduler(MagicMock(side_effect=error))
+
+        with pytest.raises(Exception):
+            scheduler.deliver(1, KIND_IDLE)
+        assert reminders.load_user_state(1)[0]['reminders_enabled'] is False
+        assert not scheduler.deliver(1, KIND_IDLE)
+
+    def test_load_and_reschedule_on_task(self, sqlite_db):
+        """Тест: при запуске все пользователи в колесе, начатая работа снимает напоминание"""
+        User.get_or_create(1)
+        scheduler = ReminderScheduler(MagicMock())
+        scheduler.load()
+        assert 1 in scheduler._wheel
+
+        Task.create(1, "Код")
+        scheduler._schedule(1, *reminders.load_user_state(1), datetime.utcnow())
+        assert 1 not in scheduler._wheel
+
+
+class TestRate:
+    """Тесты распределения скорости отправки"""
+
+    def test_rate_is_split_between_shards_and_digest(self, monkeypatch):
+        """Тест: скорость делится между шардами, сводки берут свою долю из общего бюджета"""
+        monkeypatch.setattr(reminders, 'REMINDER_RATE_PER_SECOND', 20.0)
+        monkeypatch.setattr(reminders, 'TELEGRAM_RATE_PER_SECOND', 28.0)
+
+        assert reminders.shard_rate(4) == 5.0
+        assert reminders.shard_rate(4, reserved=10.0) * 4 + 10.0 <= 28.0
+        assert reminders.shard_rate(2, reserved=40.0) == reminders.MIN_REMINDER_RATE_PER_SECOND / 2
+
+    def test_text_in_user_locale(self, sqlite_db, monkeypatch):
+        """Тест: напоминание на языке пользователя"""
+        monkeypatch.setattr(reminders, 'in_workday', lambda settings, at: True)
+        User.get_or_create(1).update_locale('en')
+        send = MagicMock()
+
+        assert ReminderScheduler(send).deliver(1, KIND_START)
+        assert send.call_args[0][1].endswith("Turn off reminders: /reminders off")
@@ -0,0 +1,84 @@
+import pytest
+from datetime import datetime, date, timedelta
+from unittest.mock import patch
+
+from models import User, Task
+from report_pages import ReportPageCache, paginate, message_length, TELEGRAM_MESSAGE_LIMIT
+from summary import prepare_day_summary, render_day_summary
+
+
+def busy_day_summary(count):
+    """Сводка дня с большим числом задач"""
+    user = User(100, timezone='UTC')
+    start = datetime(2025, 6, 27, 0, 0)
+    tasks = [Task(index, 100, f"PROJ-{index} Задача", "комментарий к задаче",
+                  start + timedelta(minutes=index), start + timedelta(minutes=index + 1))
+             for index in range(count)]
+    return render_day_summary(prepare_day_summary(user, tasks, date(2025, 6, 27)), user)
+
+
+class TestPaginate:
+    """Тесты разбиения отчета на страницы"""
+
+    def test_short_report_is_one_page(self):
+        """Тест: короткий отчет не разбивается"""
+        assert paginate("📊 *Сводка*\n\n• задача\n") == ["📊 *Сводка*\n\n• задача\n"]
+
+    def test_pages_fit_and_keep_task_blocks(self):
+        """Тест: страницы влезают в сообщение, задача не разрывается между страницами"""
+        text = busy_day_summary(300)
+        pages = paginate(text)
+
+        assert len(pages) > 1
+        assert all(message_length(page) <= TELEGRAM_MESSAGE_LIMIT for page in pages)
+        assert all(not page.startswith("  ") for page in pages[1:])
+        assert "".join(pages).count("💬") == 300
+
+    def test_emoji_count_double(self):
+        """Тест: эмодзи вне BMP занимают в лимите две единицы"""
+        assert message_length("📊") == 2
+        pages = paginate("📊" * 30, limit=20)
+        assert [message_length(page) for page in pages] == [20, 20, 20]
+
+    def test_long_line_is_cut(self):
+        """Тест: строка длиннее страницы режется"""
+        assert paginate("a" * 25, limit=10) == ["a" * 10, "a" * 10, "a" * 5]
+
+
+class TestReportPageCache:
+    """Тесты кэша страниц"""
+
+    def test_get_only_for_owner(self):
+        """Тест: страницы отдаются только владельцу отчета"""
+        cache = ReportPageCache()
+        entry = cache.put(1, 'summary', ('v', 1), ["a", "b"])
+
+        assert cache.get(entry.entry_id, 1).pages == ["a", "b"]
+        assert cache.get(entry.entry_id, 2) is None
+        assert cache.stats['hits'] == 1
+        assert cache.stats['misses'] == 1
+
+    def test_same_version_keeps_entry_id(self):
+        """Тест: тот же отчет той же версии обновляет страницы под прежним id"""
+        cache = ReportPageCache()
+        first = cache.put(1, 'summary', 1, ["a", "b"])
+        second = cache.put(1, 'summary', 1, ["c", "d"])
+        third = cache.put(1, 'summary', 2, ["e", "f"])
+
+        assert second.entry_id == first.entry_id
+        assert cache.get(first.entry_id, 1).pages == ["c", "d"]
+        assert third.entry_id != first.entry_id
+
+    def test_expired_and_evicted(self):
+        """Тест: записи истекают по TTL и вытесняются по количеству"""
+        cache = ReportPageCache(max_entries=2, ttl=60)
+        with patch('report_pages.time_module.monotonic', return_value=1000.0):
+            old = cache.put(1, 'summary', 1, ["a", "b"])
+        with patch('report_pages.time_module.monotonic', return_value=1100.0):
+            assert cache.get(old.entry_id, 1) is None
+            first = cache.put(1, 'summary', 2, ["a", "b"])
+            cache.put(2, 'summary', 1, ["a", "b"])
+            cache.put(3, 'summary', 1, ["a", "b"])
+            assert cache.get(first.entry_id, 1) is None
+            assert cache.stats['entries'] == 2
+            assert cache.stats['evictions'] == 1
@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+from models import User, Task
+from search import search_tasks, _match_condition, _like_pattern
+
+
+@pytest.fixture
+def history(sqlite_db):
+    """Несколько задач пользователя и одна задача другого пользователя"""
+    User.get_or_create(1)
+    User.get_or_create(2)
+    start = datetime(2025, 6, 2, 9, 0)
+    for day in range(5):
+        begin = start + timedelta(days=day)
+        Task.create(1, "PROJ-123 Исправление бага", start_time=begin).end_task(begin + timedelta(hours=1))
+        Task.create(1, "Код-ревью", "ревью PR коллеги", start_time=begin + timedelta(hours=1)).end_task(
+            begin + timedelta(hours=1, minutes=30))
+    Task.create(2, "PROJ-123 Исправление бага", start_time=start).end_task(start + timedelta(hours=8))
+    return start
+
+
+class TestSearchTasks:
+    """Тесты поиска по истории задач"""
+
+    def test_find_by_jira_key_with_totals(self, history):
+        """Тест: поиск по ключу задачи считает общее время только своих задач"""
+        result = search_tasks(1, "PROJ-123")
+
+        assert result['total_count'] == 5
+        assert result['total_duration'] == timedelta(hours=5)
+        assert all(task.user_id == 1 for task in result['tasks'])
+
+    def test_case_insensitive_cyrillic(self, history):
+        """Тест: поиск по кириллице без учета регистра, в том числе по комментарию"""
+        assert search_tasks(1, "код-РЕВЬЮ")['total_count'] == 5
+        assert search_tasks(1, "коллеги")['total_count'] == 5
+
+    def test_keyset_pagination(self, history):
+        """Тест: страницы идут от новых к старым без повторов"""
+        first = search_tasks(1, "PROJ", page_size=2)
+        second = search_tasks(1, "PROJ", page_size=2, after=first['next_cursor'])
+        third = search_tasks(1, "PROJ", page_size=2, after=second['next_cursor'])
+
+        ids = [t.id for t in first['tasks'] + second['tasks'] + third['tasks']]
+        starts = [t.start_time for t in first['tasks'] + second['tasks'] + third['tasks']]
+        assert len(set(ids)) == 5
+        assert starts == sorted(starts, reverse=True)
+        assert third['next_cursor'] is None
+        assert second['total_count'] is None
+
+    def test_like_wildcards_are_literal(self, history):
+        """Тест: символы % и _ в запросе не работают как шаблоны"""
+        assert search_tasks(1, "%")['tasks'] == []
+        assert _like_pattern("50%_a") == "%50\\%\\_a%"
+
+
+class TestMatchCondition:
+    """Тесты условия поиска для разных БД"""
+
+    @patch('search.get_backend')
+    def test_postgres_uses_indexes(self, mock_get_backend):
+        """Тест: на PostgreSQL используется полнотекстовый и триграммный поиск"""
+        mock_get_backend.return_value = MagicMock()
+        mock_get_backend.return_value.name = 'postgres'
+
+        sql, params = _match_condition("ревью")
+
+        assert "search_vector @@ plainto_tsquery" in sql
+        assert "ILIKE" in sql
+        assert params == ["%ревью%", "ревью", "%ревью%"]
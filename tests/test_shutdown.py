@@ -0,0 +1,79 @@
+import threading
+import time
+import pytest
+
+import shutdown
+
+
+@pytest.fixture(autouse=True)
+def clean_hooks(monkeypatch):
+    """Пустой список хуков и счетчик для каждого теста"""
+    monkeypatch.setattr(shutdown, '_hooks', [])
+    monkeypatch.setattr(shutdown, 'in_flight', shutdown.InFlight())
+
+
+class TestInFlight:
+    """Тесты счетчика выполняемых обработчиков"""
+
+    def test_wait_idle(self):
+        """Тест: ожидание заканчивается, когда обработчик завершился"""
+        shutdown.in_flight.begin()
+        threading.Timer(0.05, shutdown.in_flight.end).start()
+
+        assert shutdown.in_flight.wait_idle(2) is True
+        assert shutdown.in_flight.count == 0
+
+    def test_wait_idle_timeout(self):
+        """Тест: по истечении срока возвращается False"""
+        shutdown.in_flight.begin()
+        assert shutdown.in_flight.wait_idle(0.01) is False
+
+
+class TestDrain:
+    """Тесты остановки"""
+
+    def test_hooks_run_in_order_once(self):
+        """Тест: хуки выполняются по порядку, повторная регистрация игнорируется"""
+        calls = []
+        shutdown.register('close', lambda: calls.append('close'), shutdown.ORDER_CLOSE)
+        shutdown.register('flush', lambda: calls.append('flush'), shutdown.ORDER_FLUSH)
+        shutdown.register('flush', lambda: calls.append('again'), shutdown.ORDER_FLUSH)
+
+        timings = shutdown.run_hooks()
+
+        assert calls == ['flush', 'close']
+        assert list(timings) == ['flush', 'close']
+
+    def test_failed_hook_does_not_stop_others(self):
+        """Тест: ошибка одного хука не мешает остальным"""
+        calls = []
+        shutdown.register('broken', lambda: 1 / 0)
+        shutdown.register('close', lambda: calls.append('close'), shutdown.ORDER_CLOSE)
+
+        shutdown.run_hooks()
+
+        assert calls == ['close']
+
+    def test_drain_waits_for_handlers_before_hooks(self):
+        """Тест: хуки запускаются только после завершения обработчиков"""
+        events = []
+        shutdown.register('close', lambda: events.append('close'), shutdown.ORDER_CLOSE)
+
+        def handler():
+            time.sleep(0.05)
+            events.append('handler')
+            shutdown.in_flight.end()
+
+        shutdown.in_flight.begin()
+        threading.Thread(target=handler).start()
+        report = shutdown.drain(timeout=2)
+
+        assert events == ['handler', 'close']
+        assert report['drained'] == 1
+        assert report['abandoned'] == 0
+
+    def test_drain_deadline(self):
+        """Тест: зависший обработчик не задерживает остановку дольше срока"""
+        shutdown.in_flight.begin()
+        report = shutdown.drain(timeout=0.01)
+        assert report['abandoned'] == 1
@@ -0,0 +1,112 @@
+import pytest
+from datetime import datetime, date, timedelta
+from unittest.mock import patch
+
+import task_versions
+from models import User, Task
+from summary import SummaryCache, prepare_day_summary, render_day_summary, get_day_summary
+
+
+def make_tasks(now):
+    """Две закрытые задачи, отдых и текущая задача"""
+    return [
+        Task(1, 100, "Первая", None, now - timedelta(hours=4), now - timedelta(hours=3)),
+        Task(2, 100, "Вторая", "детали", now - timedelta(hours=3), now - timedelta(hours=2)),
+        Task(3, 100, "Отдых", None, now - timedelta(hours=2), now - timedelta(hours=1), is_rest=True),
+        Task(4, 100, "Текущая", None, now - timedelta(hours=1)),
+    ]
+
+
+class TestRenderDaySummary:
+    """Тесты формирования текста сводки"""
+
+    def test_render_contains_totals_and_tasks(self):
+        """Тест: итоги учитывают и закрытые, и текущую задачу"""
+        user = User(100, timezone='UTC')
+        now = datetime.utcnow()
+        summary = prepare_day_summary(user, make_tasks(now), date(2025, 6, 27))
+
+        text = render_day_summary(summary, user)
+
+        assert text.startswith("📊 *Сводка за 27.06.2025*")
+        assert "⏰ *Рабочее время:* 3 ч" in text
+        assert "🏖️ *Время отдыха:* 1 ч" in text
+        assert "💬 детали" in text
+        assert "не завершена" in text
+
+    def test_closed_tasks_are_prerendered(self):
+        """Тест: закрытые задачи сохраняются строками, текущая - объектом"""
+        user = User(100, timezone='UTC')
+        summary = prepare_day_summary(user, make_tasks(datetime.utcnow()), date(2025, 6, 27))
+
+        assert [isinstance(item, str) for item in summary.work_items] == [True, True, False]
+        assert summary.closed_work == timedelta(hours=2)
+
+    def test_task_across_midnight_is_clipped_to_day(self):
+        """Тест: в сводке дня учитывается только часть задачи после полуночи"""
+        user = User(100, timezone='UTC')
+        task = Task(1, 100, "Релиз", None, datetime(2025, 6, 27, 22, 0), datetime(2025, 6, 28, 2, 0))
+        bounds = user.get_day_bounds_utc(datetime(2025, 6, 28))
+
+        summary = prepare_day_summary(user, [task], date(2025, 6, 28), bounds=bounds)
+
+        assert summary.closed_work == timedelta(hours=2)
+        assert "(2 ч за день, всего 4 ч)" in render_day_summary(summary, user)
+
+    def test_empty_day(self):
+        """Тест: день без задач"""
+        user = User(100)
+        assert render_day_summary(prepare_day_summary(user, [], date(2025, 6, 27)), user) is None
+
+
+class TestSummaryCache:
+    """Тесты кэша сводок"""
+
+    def test_hit_and_miss_by_key(self):
+        """Тест: запись отдается только по совпадающему ключу"""
+        cache = SummaryCache()
+        summary = prepare_day_summary(User(100), [], date(2025, 6, 27))
+        cache.put(100, (1, date(2025, 6, 27), 'UTC'), summary)
+
+        assert cache.get(100, (1, date(2025, 6, 27), 'UTC')) is summary
+        assert cache.get(100, (2, date(2025, 6, 27), 'UTC')) is None
+        assert cache.stats['hits'] == 1
+        assert cache.stats['misses'] == 1
+        assert cache.stats['hit_rate'] == 0.5
+
+    def test_lru_eviction_by_memory(self):
+        """Тест: при превышении лимита вытесняется самая старая запись"""
+        user = User(100, timezone='UTC')
+        summary = prepare_day_summary(user, make_tasks(datetime.utcnow()), date(2025, 6, 27))
+        cache = SummaryCache(max_bytes=summary.size * 2)
+
+        cache.put(1, ('k',), summary)
+        cache.put(2, ('k',), summary)
+        cache.get(1, ('k',))
+        cache.put(3, ('k',), summary)
+
+        assert cache.get(2, ('k',)) is None
+        assert cache.get(1, ('k',)) is summary
+        assert cache.stats['evictions'] == 1
+        assert cache.stats['bytes'] <= cache.max_bytes
+
+
+class TestGetDaySummary:
+    """Тесты сводки с кэшированием"""
+
+    @patch('summary.summary_cache', new_callable=SummaryCache)
+    @patch('summary.Task.get_tasks_for_date')
+    def test_repeat_tap_skips_query_until_version_changes(self, mock_get_tasks, mock_cache):
+        """Тест: повторный запрос не обращается к БД, изменение задач сбрасывает кэш"""
+        user = User(424242, timezone='UTC')
+        now = datetime.utcnow()
+        mock_get_tasks.return_value = make_tasks(now)
+
+        first = get_day_summary(user, now)
+        second = get_day_summary(user, now)
+        assert mock_get_tasks.call_count == 1
+        assert first.split("\n")[:3] == second.split("\n")[:3]
+
+        task_versions.bump(user.user_id)
+        get_day_summary(user, now)
+        assert mock_get_tasks.call_count == 2
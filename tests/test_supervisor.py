@@ -0,0 +1,88 @@
+import sys
+import queue
+import signal
+from unittest.mock import MagicMock
+
+import pytest
+
+from supervisor import update_user_id, shard_for, shard_pool_max, run_shard, Supervisor
+
+
+def message_update(update_id, user_id):
+    return {'update_id': update_id, 'message': {'from': {'id': user_id}, 'text': 'задача'}}
+
+
+class TestRouting:
+    """Тесты распределения обновлений по шардам"""
+
+    def test_same_user_same_shard(self):
+        """Тест: все обновления пользователя попадают в один шард"""
+        callback = {'update_id': 7, 'callback_query': {'from': {'id': 42}, 'data': 'find:x'}}
+        assert update_user_id(callback) == 42
+        assert shard_for(message_update(1, 42), 4) == shard_for(callback, 4) == 42 % 4
+
+    def test_update_without_user(self):
+        """Тест: обновления без пользователя распределяются по номеру обновления"""
+        update = {'update_id': 9, 'channel_post': {'text': 'x'}}
+        assert update_user_id(update) is None
+        assert shard_for(update, 4) == 1
+
+    def test_pool_split(self):
+        """Тест: пул соединений делится между шардами, но не меньше двух"""
+        assert shard_pool_max(20, 4) == 5
+        assert shard_pool_max(4, 8) == 2
+
+
+class TestRoute:
+    """Тесты очередей шардов"""
+
+    def test_route_keeps_order_and_offset(self):
+        """Тест: порядок обновлений пользователя сохраняется, смещение сдвигается"""
+        supervisor = Supervisor("token", shards=2, pool_total=4)
+        updates = [message_update(10, 1), message_update(11, 2), message_update(12, 1)]
+
+        supervisor.route(updates)
+
+        shard = supervisor.queues[1]
+        assert [shard.get(timeout=1)['update_id'] for _ in range(2)] == [10, 12]
+        assert supervisor.queues[0].get(timeout=1)['update_id'] == 11
+        assert supervisor._offset == 13
+
+
+class TestShardWorkers:
+    """Тесты фоновых задач шардов"""
+
+    @pytest.fixture
+    def modules(self, monkeypatch):
+        monkeypatch.setattr(signal, 'signal', MagicMock())
+        for key in ('DB_POOL_MAX', 'SHARD_INDEX', 'SHARDS'):
+            monkeypatch.setenv(key, '')
+        fakes = {}
+        for name in ('telebot', 'app', 'reminders', 'digest', 'shutdown', 'teams', 'jira_sync'):
+            fakes[name] = MagicMock()
+            monkeypatch.setitem(sys.modules, name, fakes[name])
+        fakes['teams'].REFRESH_SECONDS = 60
+        return fakes
+
+    def start(self, index):
+        updates = queue.Queue()
+        updates.put(None)
+        run_shard(index, updates, {'DB_POOL_MAX': '2', 'SHARD_INDEX': str(index), 'SHARDS': '2'})
+
+    def test_shard_zero_runs_global_workers(self, modules):
+        """Тест: шард 0 запускает дайджест, синхронизацию с Jira и обновление команд"""
+        self.start(0)
+
+        modules['digest'].get_digest.assert_called_once()
+        modules['jira_sync'].get_jira_sync.assert_called_once()
+        modules['teams'].TeamTotalsRefresher.return_value.start.assert_called_once()
+        modules['reminders'].get_reminders.assert_called_once()
+
+    def test_other_shards_run_reminders_only(self, modules):
+        """Тест: остальные шарды запускают только напоминания"""
+        self.start(1)
+
+        modules['reminders'].get_reminders.assert_called_once()
+        modules['digest'].get_digest.assert_not_called()
+        modules['jira_sync'].get_jira_sync.assert_not_called()
+        modules['teams'].TeamTotalsRefresher.assert_not_called()
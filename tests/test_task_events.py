@@ -0,0 +1,128 @@
+import pytest
+from datetime import datetime, date, timedelta
+from unittest.mock import MagicMock
+
+import task_events
+from task_events import (
+    split_by_local_day, fold_events, record_events, make_event,
+    EVENT_START, EVENT_END, EVENT_RENAME, EVENT_COMMENT, EVENT_AUTO_END
+)
+
+
+def event(event_id, task_id, event_type, occurred_at, **payload):
+    """Строка журнала событий в том виде, в котором ее возвращает БД"""
+    return {
+        'id': event_id,
+        'task_id': task_id,
+        'user_id': 100,
+        'event_type': event_type,
+        'occurred_at': occurred_at,
+        'payload': payload,
+    }
+
+
+class TestSplitByLocalDay:
+    """Тесты разбиения интервала по локальным суткам"""
+
+    def test_interval_within_one_day(self):
+        """Тест интервала внутри одного дня"""
+        pieces = split_by_local_day(datetime(2025, 6, 27, 9, 0), datetime(2025, 6, 27, 11, 30), 'UTC')
+
+        assert pieces == [(date(2025, 6, 27), 2.5 * 3600)]
+
+    def test_interval_crossing_local_midnight(self):
+        """Тест интервала через полночь по Москве (UTC+3)"""
+        # 19:00-23:00 UTC = 22:00-02:00 MSK
+        pieces = split_by_local_day(datetime(2025, 6, 27, 19, 0), datetime(2025, 6, 27, 23, 0),
+                                    'Europe/Moscow')
+
+        assert pieces == [(date(2025, 6, 27), 2 * 3600), (date(2025, 6, 28), 2 * 3600)]
+
+
+class TestFoldEvents:
+    """Тесты восстановления состояния задач из событий"""
+
+    def test_full_lifecycle(self):
+        """Тест: старт, переименование, комментарий и завершение"""
+        start = datetime(2025, 6, 27, 9, 0)
+        state = {}
+
+        fold_events([
+            event(1, 5, EVENT_START, start, task_name="Старая", comment=None,
+                  original_message="Старая", start_time=start.isoformat(), is_rest=False),
+            event(2, 5, EVENT_RENAME, start, task_name="Новая", original_message="Новая"),
+            event(3, 5, EVENT_COMMENT, start, comment="детали"),
+            event(4, 5, EVENT_END, start + timedelta(hours=1),
+                  end_time=(start + timedelta(hours=1)).isoformat()),
+        ], state)
+
+        task = state[5]
+        assert task['task_name'] == "Новая"
+        assert task['comment'] == "детали"
+        assert task['start_time'] == start
+        assert task['end_time'] == start + timedelta(hours=1)
+
+    def test_auto_end_closes_task(self):
+        """Тест: автозавершение закрывает задачу"""
+        start = datetime(2025, 6, 27, 9, 0)
+        state = {}
+
+        fold_events([
+            event(1, 5, EVENT_START, start, task_name="Задача", is_rest=False),
+            event(2, 5, EVENT_AUTO_END, datetime(2025, 6, 27, 15, 0)),
+        ], state)
+
+        assert state[5]['end_time'] == datetime(2025, 6, 27, 15, 0)
+
+    def test_payload_as_json_string(self):
+        """Тест: payload может прийти строкой JSON"""
+        state = {}
+        row = event(1, 5, EVENT_START, datetime(2025, 6, 27, 9, 0))
+        row['payload'] = '{"task_name": "Из строки", "is_rest": true}'
+
+        fold_events([row], state)
+
+        assert state[5]['task_name'] == "Из строки"
+        assert state[5]['is_rest'] is True
+
+    def test_unknown_task_is_skipped(self):
+        """Тест: событие без старта задачи пропускается"""
+        state = {}
+        fold_events([event(1, 99, EVENT_END, datetime(2025, 6, 27, 9, 0))], state)
+
+        assert state == {}
+
+
+class TestProjectionWrites:
+    """Тесты записи событий"""
+
+    def test_record_events_single_insert(self):
+        """Тест: несколько событий пишутся одним INSERT"""
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [{'id': 7}, {'id': 8}]
+        events = [
+            make_event(1, 100, EVENT_RENAME, datetime(2025, 6, 27, 9, 0), task_name="A"),
+            make_event(1, 100, EVENT_COMMENT, datetime(2025, 6, 27, 9, 0), comment="B"),
+        ]
+
+        record_events(cursor, events)
+
+        cursor.execute.assert_called_once()
+        assert [e['id'] for e in events] == [7, 8]
+
+
+class TestSubscribers:
+    """Тесты подписчиков на события"""
+
+    def test_publish_calls_subscribers_and_survives_errors(self, monkeypatch):
+        """Тест: ошибка одного подписчика не мешает остальным"""
+        received = []
+
+        def broken(evt):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(task_events, '_subscribers', [broken, received.append])
+        task_events.publish([{'id': 1}])
+
+        assert received == [{'id': 1}]
+
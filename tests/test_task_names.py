@@ -0,0 +1,81 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import task_names
+from database import get_db
+from models import User, Task
+
+
+class TestTaskNames:
+    """Тесты словаря названий задач на настоящей SQLite"""
+
+    def test_same_name_interned_once(self, sqlite_db):
+        """Тест: одинаковые названия пользователя ссылаются на одну строку словаря"""
+        User.get_or_create(1)
+        User.get_or_create(2)
+        start = datetime(2025, 6, 27, 9, 0)
+        Task.create(1, "Разработка", start_time=start)
+        Task.create(1, "Разработка", start_time=start + timedelta(hours=1))
+        Task.create(2, "Разработка", start_time=start)
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT user_id, name FROM task_names ORDER BY user_id")
+            assert [(r['user_id'], r['name']) for r in cursor.fetchall()] == \
+                [(1, "Разработка"), (2, "Разработка")]
+            cursor.execute("SELECT COUNT(*) AS n FROM tasks WHERE task_name IS NOT NULL")
+            assert cursor.fetchone()['n'] == 0
+
+    def test_resolve_uses_cache(self, sqlite_db):
+        """Тест: повторное разрешение имени не обращается к БД"""
+        first = task_names.resolve_one(1, "Задача")
+
+        with patch('task_names.get_db') as mock_get_db:
+            assert task_names.resolve_one(1, "Задача") == first
+            mock_get_db.assert_not_called()
+
+    def test_lookup_does_not_insert(self, sqlite_db):
+        """Тест: поиск по словарю не добавляет отсутствующие названия"""
+        known = task_names.resolve_one(1, "Задача")
+        task_names.clear_cache()
+
+        assert task_names.lookup([(1, "Задача"), (1, "Новая")]) == {(1, "Задача"): known}
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) AS n FROM task_names")
+            assert cursor.fetchone()['n'] == 1
+
+    def test_totals_grouped_by_name(self, sqlite_db):
+        """Тест: итоги за день группируются по названию в SQL"""
+        User.get_or_create(1)
+        start = datetime(2025, 6, 27, 6, 0)
+        Task.create(1, "A", start_time=start).end_task(start + timedelta(hours=1))
+        Task.create(1, "B", start_time=start + timedelta(hours=1)).end_task(start + timedelta(hours=2))
+        Task.create(1, "A", start_time=start + timedelta(hours=2)).end_task(start + timedelta(hours=2, minutes=30))
+
+        totals = Task.get_totals_for_date(1, datetime(2025, 6, 27, 12, 0))
+
+        assert [(t['task_name'], t['duration']) for t in totals] == [
+            ("A", timedelta(hours=1, minutes=30)),
+            ("B", timedelta(hours=1)),
+        ]
+
+    def test_backfill_moves_inline_names(self, sqlite_db):
+        """Тест: миграция переносит названия старых строк в словарь"""
+        User.get_or_create(1)
+        with get_db() as conn:
+            cursor = conn.cursor()
+            for name in ("Старая", "Старая", "Другая"):
+                cursor.execute("""
+                    INSERT INTO tasks (user_id, task_name, start_time) VALUES (%s, %s, %s)
+                """, (1, name, datetime(2025, 6, 27, 9, 0)))
+
+        assert task_names.backfill(batch_size=2) == 3
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) AS n FROM task_names")
+            assert cursor.fetchone()['n'] == 2
+        tasks = Task.get_tasks_for_date(1, datetime(2025, 6, 27))
+        assert sorted(t.task_name for t in tasks) == ["Другая", "Старая", "Старая"]
@@ -1,6 +1,7 @@
 import pytest
 from task_parser import (
     extract_jira_ticket,
+    jira_fields,
     parse_task_message,
     format_task_for_display,
     get_unique_comments
@@ -47,6 +48,22 @@ class TestExtractJiraTicket:
         assert ticket is None
 
 
+class TestJiraFields:
+    """Тесты ключа тикета и проекта для хранения в задаче"""
+    
+    def test_ticket_from_task_name(self):
+        """Тест извлечения тикета из названия задачи"""
+        assert jira_fields("PROJ-123") == ("PROJ-123", "PROJ")
+    
+    def test_ticket_from_original_message(self):
+        """Тест извлечения тикета из исходного сообщения"""
+        assert jira_fields("Исправление", "https://jira.example.com/browse/DEV-7 - Исправление") == ("DEV-7", "DEV")
+    
+    def test_no_ticket(self):
+        """Тест задачи без тикета"""
+        assert jira_fields("Код-ревью", "Код-ревью") == (None, None)
+
+
 class TestParseTaskMessage:
     """Тесты парсинга сообщений с задачами"""
     
@@ -157,6 +174,11 @@ class TestFormatTaskForDisplay:
         task_name = "Задача с символами: !@#$%^&*()"
         formatted = format_task_for_display(task_name)
         assert task_name in formatted
+    
+    def test_format_jira_task_with_base_url(self):
+        """Тест: ссылка строится на указанный адрес Jira"""
+        formatted = format_task_for_display("PROJ-7", base_url="https://jira.example.org")
+        assert "https://jira.example.org/browse/PROJ-7" in formatted
 
 
 class TestGetUniqueComments:
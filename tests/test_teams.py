@@ -0,0 +1,121 @@
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+import teams
+from models import User, Task
+
+
+@pytest.fixture
+def team(sqlite_db):
+    """Команда из двух участников"""
+    User.get_or_create(1)
+    User.get_or_create(2)
+    team = teams.create_team(1, "Бэкенд", "@alice")
+    teams.join_team(2, team['invite_code'], "@bob")
+    return team
+
+
+def work(user_id, name, start, hours, is_rest=False):
+    task = Task.create(user_id, name, None, start_time=start, is_rest=is_rest)
+    task.end_task(start + timedelta(hours=hours))
+    return task
+
+
+DAY = date(2025, 6, 4)
+START = datetime(2025, 6, 4, 7, 0)
+
+
+class TestMembership:
+    """Тесты создания команды и вступления по коду"""
+
+    def test_create_and_join(self, team):
+        """Тест: владелец и участник видят команду"""
+        assert teams.get_user_team(1)['role'] == teams.ROLE_OWNER
+        assert teams.get_user_team(2) == dict(teams.get_user_team(1), role=teams.ROLE_MEMBER)
+
+    def test_unknown_code(self, team):
+        """Тест: неверный код не добавляет в команду"""
+        User.get_or_create(3)
+        assert teams.join_team(3, "нет-такого") is None
+        assert teams.get_user_team(3) is None
+
+    def test_leave(self, team):
+        """Тест: после выхода участник не попадает в сводку"""
+        assert teams.leave_team(2, team['id'])
+        assert not teams.leave_team(2, team['id'])
+        assert teams.get_user_team(2) is None
+        assert [m['user_id'] for m in teams.team_summary(team['id'], DAY, DAY)['members']] == [1]
+
+
+class TestPeriodBounds:
+    """Тесты границ периода"""
+
+    def test_week_is_monday_to_sunday(self):
+        """Тест: неделя с понедельника по воскресенье"""
+        assert teams.period_bounds(DAY, 'week') == (date(2025, 6, 2), date(2025, 6, 8))
+        assert teams.period_bounds(DAY, 'day') == (DAY, DAY)
+
+
+class TestRefresh:
+    """Тесты обновления агрегата на настоящей SQLite"""
+
+    def test_totals_per_member_and_task(self, team):
+        """Тест: сводка складывает время по участникам и по задачам"""
+        work(1, "Релиз", START, 2)
+        work(2, "Релиз", START, 1)
+        work(2, "Код-ревью", START + timedelta(hours=1), 1)
+        work(2, "Обед", START + timedelta(hours=2), 1, is_rest=True)
+
+        # До обновления агрегат пуст - запрос не читает сырые задачи
+        assert teams.team_summary(team['id'], DAY, DAY)['work'] == timedelta()
+
+        assert teams.refresh() > 0
+        summary = teams.team_summary(team['id'], DAY, DAY)
+
+        assert summary['work'] == timedelta(hours=4)
+        assert summary['rest'] == timedelta(hours=1)
+        assert [(m['user_id'], m['work']) for m in summary['members']] == [
+            (1, timedelta(hours=2)), (2, timedelta(hours=2))]
+        assert summary['tasks'][0] == {'task_name': "Релиз", 'work': timedelta(hours=3), 'members': 2}
+        assert summary['refreshed_at'] is not None
+
+    def test_reending_task_replaces_totals(self, team):
+        """Тест: изменение задачи пересчитывает день, а не добавляет время повторно"""
+        task = work(1, "Релиз", START, 2)
+        teams.refresh()
+
+        task.end_task(START + timedelta(hours=3))
+        teams.refresh()
+        assert teams.team_summary(team['id'], DAY, DAY)['work'] == timedelta(hours=3)
+
+        # Без новых событий обновление ничего не меняет
+        teams.refresh()
+        assert teams.team_summary(team['id'], DAY, DAY)['work'] == timedelta(hours=3)
+
+    def test_week_and_rebuild(self, team):
+        """Тест: недельная сводка и полная перестройка дают то же, что и инкрементальное обновление"""
+        work(1, "Релиз", START, 2)
+        work(1, "Релиз", START - timedelta(days=1), 1)
+        work(1, "Релиз", START + timedelta(days=7), 5)
+        teams.refresh()
+        week = teams.team_summary(team['id'], *teams.period_bounds(DAY, 'week'))
+        assert week['work'] == timedelta(hours=3)
+
+        teams.rebuild()
+        assert teams.team_summary(team['id'], *teams.period_bounds(DAY, 'week')) == dict(
+            week, refreshed_at=teams.team_summary(team['id'], DAY, DAY)['refreshed_at'])
+
+    def test_running_tasks_of_team_members_only(self, team, monkeypatch):
+        """Тест: без новых событий пересчитываются только текущие задачи участников команд"""
+        monkeypatch.setattr(teams, 'REFRESH_OVERLAP_EVENTS', 0)
+        User.get_or_create(3)
+        Task.create(1, "Релиз", None, start_time=datetime.utcnow() - timedelta(hours=1))
+        Task.create(3, "Вне команды", None, start_time=datetime.utcnow() - timedelta(hours=1))
+        teams.refresh()
+
+        refreshed = []
+        original = teams.refresh_days
+        with patch('teams.refresh_days', side_effect=lambda days, now: refreshed.append(days) or original(days, now)):
+            teams.refresh()
+        assert set(refreshed[0]) == {1}
@@ -0,0 +1,142 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+from update_dedup import UpdateDeduplicator, bot_id_from_token
+
+
+def make_db(mock_get_db, returned_ids):
+    """Настройка мока БД, возвращающего заданные update_id из RETURNING"""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [{'update_id': i} for i in returned_ids]
+    mock_conn = MagicMock()
+    mock_conn.cursor.return_value = mock_cursor
+    mock_get_db.return_value.__enter__.return_value = mock_conn
+    return mock_cursor
+
+
+class TestBotIdFromToken:
+    """Тесты извлечения id бота из токена"""
+
+    def test_regular_token(self):
+        """Тест обычного токена"""
+        assert bot_id_from_token("123456789:ABCDEF") == 123456789
+
+    def test_malformed_token(self):
+        """Тест некорректного токена"""
+        assert bot_id_from_token("test_token") == 0
+        assert bot_id_from_token(None) == 0
+
+
+class TestUpdateDeduplicator:
+    """Тесты дедупликации обновлений"""
+
+    @patch('update_dedup.get_db')
+    def test_new_updates_are_claimed(self, mock_get_db):
+        """Тест: новые обновления проходят и записываются в БД"""
+        mock_cursor = make_db(mock_get_db, [1, 2])
+        dedup = UpdateDeduplicator(bot_id=42)
+
+        fresh = dedup.claim_many([1, 2])
+
+        assert fresh == {1, 2}
+        assert dedup.stats['processed'] == 2
+        assert dedup.stats['duplicates_dropped'] == 0
+        mock_cursor.execute.assert_called_once()
+
+    @patch('update_dedup.get_db')
+    def test_duplicate_from_database_dropped(self, mock_get_db):
+        """Тест: обновление, уже обработанное другим процессом, отбрасывается"""
+        make_db(mock_get_db, [2])
+        dedup = UpdateDeduplicator(bot_id=42)
+
+        fresh = dedup.claim_many([1, 2])
+
+        assert fresh == {2}
+        assert dedup.stats['duplicates_dropped'] == 1
+
+    @patch('update_dedup.get_db')
+    def test_duplicate_answered_from_cache(self, mock_get_db):
+        """Тест: повтор отбрасывается из LRU без обращения к БД"""
+        mock_cursor = make_db(mock_get_db, [7])
+        dedup = UpdateDeduplicator(bot_id=42)
+        dedup.claim(7)
+
+        assert dedup.claim(7) is False
+        assert dedup.stats['cache_hits'] == 1
+        mock_cursor.execute.assert_called_once()
+
+    @patch('update_dedup.get_db')
+    def test_lru_is_bounded(self, mock_get_db):
+        """Тест ограничения размера LRU"""
+        make_db(mock_get_db, [1, 2, 3])
+        dedup = UpdateDeduplicator(bot_id=42, cache_size=2)
+
+        dedup.claim_many([1, 2, 3])
+
+        assert list(dedup._recent) == [2, 3]
+
+    @patch('update_dedup.get_db')
+    def test_database_error_fails_open(self, mock_get_db):
+        """Тест: при ошибке БД обновления обрабатываются"""
+        mock_get_db.side_effect = Exception("connection refused")
+        dedup = UpdateDeduplicator(bot_id=42)
+
+        assert dedup.claim_many([5]) == {5}
+        assert dedup.stats['db_errors'] == 1
+
+    @patch('update_dedup.get_db')
+    def test_release_allows_retry(self, mock_get_db):
+        """Тест: освобожденное обновление можно обработать повторно"""
+        make_db(mock_get_db, [9])
+        dedup = UpdateDeduplicator(bot_id=42)
+        dedup.claim(9)
+
+        dedup.release([9])
+
+        assert dedup.claim(9) is True
+
+    @patch('update_dedup.get_db')
+    def test_filter_updates(self, mock_get_db):
+        """Тест фильтрации объектов обновлений"""
+        make_db(mock_get_db, [11])
+        dedup = UpdateDeduplicator(bot_id=42)
+        updates = [SimpleNamespace(update_id=10), SimpleNamespace(update_id=11)]
+
+        fresh = dedup.filter_updates(updates)
+
+        assert [u.update_id for u in fresh] == [11]
+
+
+class TestDedupTeleBot:
+    """Тесты бота с дедупликацией"""
+
+    def test_failed_threaded_handler_releases_update(self, sqlite_db, monkeypatch):
+        """Тест: обновление, обработчик которого упал в пуле потоков, обрабатывается при повторе"""
+        monkeypatch.setenv('BOT_TOKEN', '1:test')
+        import telebot
+        import app
+        import shutdown
+        monkeypatch.setattr(app, 'update_dedup', UpdateDeduplicator(bot_id=1))
+        bot = app.DedupTeleBot('1:test', threaded=True)
+        handled = []
+
+        @bot.message_handler(func=lambda message: True)
+        def handle(message):
+            handled.append(message.text)
+            if len(handled) == 1:
+                raise RuntimeError("handler failed")
+
+        def deliver():
+            update = telebot.types.Update.de_json({'update_id': 5, 'message': {
+                'message_id': 1, 'date': 0, 'text': 'задача',
+                'chat': {'id': 7, 'type': 'private'}, 'from': {'id': 7, 'is_bot': False, 'first_name': 'A'}}})
+            bot.process_new_updates([update])
+            assert shutdown.in_flight.wait_idle(5)
+
+        deliver()
+        deliver()
+        deliver()
+
+        assert handled == ['задача', 'задача']
+        bot.worker_pool.close()
@@ -0,0 +1,164 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+from write_behind import WriteBehindBuffer, shard_wal_path
+
+
+@pytest.fixture
+def mock_cursor():
+    """Мок курсора БД для буфера отложенной записи"""
+    with patch('write_behind.get_db') as mock_get_db, \
+            patch('write_behind.task_names.resolve', side_effect=lambda pairs: {p: 1 for p in pairs}):
+        cursor = MagicMock()
+        conn = MagicMock()
+        conn.cursor.return_value = cursor
+        mock_get_db.return_value.__enter__.return_value = conn
+        yield cursor
+
+
+@pytest.fixture
+def buffer(tmp_path, mock_cursor):
+    """Буфер с длинным интервалом, чтобы сбрасывать его вручную"""
+    buf = WriteBehindBuffer(str(tmp_path / "wb.wal"), flush_interval_ms=60000, fsync=False)
+    buf.start()
+    yield buf
+    buf._stopped.set()
+    buf._wake.set()
+    buf._thread.join()
+
+
+class TestWriteBehindBuffer:
+    """Тесты буфера отложенной записи"""
+
+    def test_enqueue_writes_wal(self, buffer):
+        """Тест: операция сначала пишется в WAL"""
+        buffer.enqueue_start(1, 100, "Задача", None, "Задача", datetime(2025, 6, 27, 9, 0), False)
+
+        with open(buffer.wal_path, encoding='utf-8') as wal:
+            lines = wal.readlines()
+        assert len(lines) == 1
+        assert buffer.has_pending(100)
+
+    def test_flush_coalesces_start_and_end(self, buffer, mock_cursor):
+        """Тест: задача, начатая и завершенная в одной пачке, вставляется закрытой"""
+        start = datetime(2025, 6, 27, 9, 0)
+        buffer.enqueue_start(1, 100, "Задача", None, None, start, False)
+        buffer.enqueue_end(1, 100, start + timedelta(hours=1), start, False)
+
+        assert buffer.flush() == 2
+
+        mock_cursor.execute.assert_called_once()
+        sql, params = mock_cursor.execute.call_args[0]
+        assert "INSERT INTO tasks" in sql
+        assert params[6] == start + timedelta(hours=1)
+        assert not buffer.has_pending(100)
+
+    def test_flush_records_events_for_written_rows(self, buffer, mock_cursor):
+        """Тест: события пишутся только для реально вставленных строк"""
+        mock_cursor.fetchall.side_effect = [
+            [{'id': 1}],  # RETURNING из INSERT tasks
+            [{'id': 10}, {'id': 11}],  # RETURNING из INSERT task_events
+            [{'user_id': 100, 'timezone': 'UTC'}],  # часовые пояса
+        ]
+        start = datetime(2025, 6, 27, 9, 0)
+        buffer.enqueue_start(1, 100, "Задача", None, None, start, False)
+        buffer.enqueue_end(1, 100, start + timedelta(hours=1), start, False)
+        buffer.enqueue_start(2, 100, "Уже записана", None, None, start, False)
+
+        buffer.flush()
+
+        sql, params = mock_cursor.execute.call_args_list[1][0]
+        assert "INSERT INTO task_events" in sql
+        assert params[2] == 'start' and params[7] == 'end'
+        assert len(params) == 10  # два события, задача 2 пропущена
+
+    def test_flush_batches_many_users(self, buffer, mock_cursor):
+        """Тест: события разных пользователей уходят одной транзакцией"""
+        start = datetime(2025, 6, 27, 9, 0)
+        for i in range(50):
+            buffer.enqueue_start(i, 1000 + i, "Утренняя задача", None, None, start, False)
+        buffer.enqueue_end(500, 7, start, start - timedelta(hours=1), False)
+
+        buffer.flush()
+
+        assert mock_cursor.execute.call_count == 2  # один INSERT + один UPDATE
+        assert buffer.stats['flushes'] == 1
+        assert buffer.stats['rows_flushed'] == 51
+
+    def test_flush_truncates_wal(self, buffer):
+        """Тест: после успешного сброса WAL очищается"""
+        buffer.enqueue_end(1, 100, datetime(2025, 6, 27, 10, 0), datetime(2025, 6, 27, 9, 0), False)
+        buffer.flush()
+
+        with open(buffer.wal_path, encoding='utf-8') as wal:
+            assert wal.read() == ""
+
+    def test_failed_flush_keeps_operations(self, buffer, mock_cursor):
+        """Тест: при ошибке БД операции остаются в очереди"""
+        mock_cursor.execute.side_effect = Exception("db down")
+        buffer.enqueue_end(1, 100, datetime(2025, 6, 27, 10, 0), datetime(2025, 6, 27, 9, 0), False)
+
+        assert buffer.flush() == 0
+        assert buffer.has_pending(100)
+        assert buffer.stats['flush_errors'] == 1
+
+    def test_sync_user_flushes_only_own_writes(self, buffer, mock_cursor):
+        """Тест: чтение пользователя без отложенных записей не вызывает сброс"""
+        buffer.enqueue_end(1, 100, datetime(2025, 6, 27, 10, 0), datetime(2025, 6, 27, 9, 0), False)
+
+        buffer.sync_user(200)
+        mock_cursor.execute.assert_not_called()
+
+        buffer.sync_user(100)
+        mock_cursor.execute.assert_called_once()
+
+    def test_recover_replays_wal(self, tmp_path, mock_cursor):
+        """Тест: после падения процесса операции из WAL записываются в БД"""
+        wal_path = str(tmp_path / "crash.wal")
+        crashed = WriteBehindBuffer(wal_path, flush_interval_ms=60000, fsync=False)
+        crashed._wal = open(wal_path, 'a', encoding='utf-8')
+        crashed.enqueue_start(1, 100, "Задача", None, None, datetime(2025, 6, 27, 9, 0), False)
+        crashed._wal.write('{"op": "end", "id"')  # оборванная запись
+        crashed._wal.close()
+
+        recovered = WriteBehindBuffer(wal_path, fsync=False)
+        assert recovered.recover() == 1
+
+        sql = mock_cursor.execute.call_args[0][0]
+        assert "ON CONFLICT (id) DO NOTHING" in sql
+
+
+class TestShardWal:
+    """Тесты WAL при нескольких шардах"""
+
+    def test_shard_wal_path(self):
+        """Тест: у каждого шарда свой файл WAL"""
+        assert shard_wal_path("write_behind.wal", None) == "write_behind.wal"
+        assert shard_wal_path("write_behind.wal", "2") == "write_behind.2.wal"
+
+    def test_shards_do_not_touch_each_others_wal(self, tmp_path, mock_cursor):
+        """Тест: сброс и восстановление одного шарда не теряют и не повторяют записи другого"""
+        base = str(tmp_path / "write_behind.wal")
+        start = datetime(2025, 6, 27, 9, 0)
+        shards = []
+        for index in ('0', '1'):
+            shard = WriteBehindBuffer(shard_wal_path(base, index), flush_interval_ms=60000, fsync=False)
+            shard._wal = open(shard.wal_path, 'a', encoding='utf-8')
+            shards.append(shard)
+        shards[0].enqueue_start(1, 100, "Шард 0", None, None, start, False)
+        shards[1].enqueue_start(2, 101, "Шард 1", None, None, start, False)
+
+        # Шард 0 сбрасывает свою очередь, шард 1 падает, не успев
+        assert shards[0].flush() == 1
+        shards[1]._wal.close()
+        shards[0]._wal.close()
+        with open(shards[1].wal_path, encoding='utf-8') as wal:
+            assert len(wal.readlines()) == 1
+
+        # Перезапуск шарда 1 повторяет только его запись; перезапуск шарда 0 - ничего
+        mock_cursor.execute.reset_mock()
+        assert WriteBehindBuffer(shard_wal_path(base, '1'), fsync=False).recover() == 1
+        params = mock_cursor.execute.call_args_list[0][0][1]
+        assert params[0] == 2
+        assert WriteBehindBuffer(shard_wal_path(base, '0'), fsync=False).recover() == 0
@@ -4,6 +4,8 @@ import re
 from typing import Optional, Tuple
 import logging
 
+from i18n import t
+
 logger = logging.getLogger(__name__)
 
 def parse_time_from_message(message: str) -> Tuple[Optional[time], str]:
@@ -29,7 +31,7 @@ def parse_time_from_message(message: str) -> Tuple[Optional[time], str]:
     
     return None, message
 
-def format_duration(duration: timedelta) -> str:
+def format_duration(duration: timedelta, locale: Optional[str] = None) -> str:
     """Format timedelta to human readable string"""
     total_seconds = int(duration.total_seconds())
     hours = total_seconds // 3600
@@ -37,11 +39,11 @@ def format_duration(duration: timedelta) -> str:
     
     if hours > 0:
         if minutes > 0:
-            return f"{hours} ч {minutes} мин"
+            return t(locale, 'duration_hours_minutes', hours=hours, minutes=minutes)
         else:
-            return f"{hours} ч"
+            return t(locale, 'duration_hours', hours=hours)
     else:
-        return f"{minutes} мин"
+        return t(locale, 'duration_minutes', minutes=minutes)
 
 def get_workday_end_time(user, local_date: datetime) -> datetime:
     """Get workday end time for a specific date in user's timezone"""
@@ -0,0 +1,145 @@
+"""
+Idempotent processing of Telegram updates.
+
+Every update_id is claimed in the processed_updates table before its
+handlers run, so the same update delivered twice (polling restarts,
+retries, redundant ingest processes) is handled only once. A small
+in-memory LRU in front of the table answers repeats without a round trip.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterable, List, Set
+import logging
+
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_RETENTION = timedelta(days=7)
+PRUNE_EVERY = 1000
+
+
+def bot_id_from_token(token: str) -> int:
+    """Numeric bot id is the part of the token before the colon"""
+    prefix = (token or '').split(':', 1)[0]
+    return int(prefix) if prefix.isdigit() else 0
+
+
+class UpdateDeduplicator:
+    def __init__(self, bot_id: int, cache_size: int = DEFAULT_CACHE_SIZE,
+                 retention: timedelta = DEFAULT_RETENTION):
+        self.bot_id = bot_id
+        self.cache_size = cache_size
+        self.retention = retention
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._claims_since_prune = 0
+        self.stats = {
+            'processed': 0,
+            'duplicates_dropped': 0,
+            'cache_hits': 0,
+            'db_errors': 0,
+        }
+
+    def _remember(self, update_id: int):
+        self._recent[update_id] = True
+        self._recent.move_to_end(update_id)
+        while len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+
+    def claim_many(self, update_ids: Iterable[int]) -> Set[int]:
+        """Claim update ids and return the ones that were not processed before"""
+        candidates = []
+        with self._lock:
+            for update_id in update_ids:
+                if update_id in self._recent:
+                    self._recent.move_to_end(update_id)
+                    self.stats['cache_hits'] += 1
+                    self.stats['duplicates_dropped'] += 1
+                elif update_id in candidates:
+                    # Same update twice in one batch
+                    self.stats['duplicates_dropped'] += 1
+                else:
+                    candidates.append(update_id)
+
+        if not candidates:
+            return set()
+
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                placeholders = ", ".join(["(%s, %s)"] * len(candidates))
+                params = []
+                for update_id in candidates:
+                    params.extend((self.bot_id, update_id))
+                cursor.execute(f"""
+                    INSERT INTO processed_updates (bot_id, update_id)
+                    VALUES {placeholders}
+                    ON CONFLICT DO NOTHING
+                    RETURNING update_id
+                """, params)
+                fresh = {row['update_id'] for row in cursor.fetchall()}
+        except Exception as e:
+            # Fail open: losing deduplication is better than losing updates
+            logger.error(f"Error claiming updates, processing without dedup: {e}")
+            self.stats['db_errors'] += 1
+            fresh = set(candidates)
+
+        with self._lock:
+            for update_id in candidates:
+                self._remember(update_id)
+            self.stats['processed'] += len(fresh)
+            self.stats['duplicates_dropped'] += len(candidates) - len(fresh)
+            self._claims_since_prune += len(candidates)
+            should_prune = self._claims_since_prune >= PRUNE_EVERY
+            if should_prune:
+                self._claims_since_prune = 0
+
+        if len(candidates) > len(fresh):
+            logger.info(f"Dropped {len(candidates) - len(fresh)} duplicate update(s)")
+        if should_prune:
+            self.prune()
+        return fresh
+
+    def claim(self, update_id: int) -> bool:
+        """Claim a single update id; False means it is a duplicate"""
+        return update_id in self.claim_many([update_id])
+
+    def release(self, update_ids: Iterable[int]):
+        """Forget claimed updates whose processing failed so a retry can run them"""
+        update_ids = list(update_ids)
+        if not update_ids:
+            return
+        with self._lock:
+            for update_id in update_ids:
+                self._recent.pop(update_id, None)
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                placeholders = ", ".join(["%s"] * len(update_ids))
+                cursor.execute(f"""
+                    DELETE FROM processed_updates
+                    WHERE bot_id = %s AND update_id IN ({placeholders})
+                """, [self.bot_id, *update_ids])
+        except Exception as e:
+            logger.error(f"Error releasing updates {update_ids}: {e}")
+
+    def prune(self):
+        """Delete claims older than the retention window"""
+        cutoff = datetime.utcnow() - self.retention
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    DELETE FROM processed_updates
+                    WHERE bot_id = %s AND processed_at < %s
+                """, (self.bot_id, cutoff))
+        except Exception as e:
+            logger.error(f"Error pruning processed updates: {e}")
+
+    def filter_updates(self, updates: List) -> List:
+        """Return only the updates (objects with update_id) not seen before"""
+        fresh = self.claim_many(update.update_id for update in updates)
+        return [update for update in updates if update.update_id in fresh]
@@ -0,0 +1,335 @@
+"""
+Optional write-behind mode for task start/end events.
+
+When WRITE_BEHIND is enabled, Task.create and Task.end_task append their
+writes to an in-memory queue instead of committing one by one. A background
+thread flushes the queue every few milliseconds as one transaction with a
+multi-row INSERT and a multi-row UPDATE (group commit).
+
+Every queued write is first appended to a local WAL file, so writes that were
+acknowledged but not flushed are replayed on the next start. Reads for a user
+with pending writes flush the queue first (read-your-writes).
+"""
+import os
+import json
+import threading
+import time as time_module
+from collections import deque, Counter
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+import logging
+
+from database import get_db, get_backend
+import task_events
+import task_names
+import jira_sync
+import shutdown
+from task_parser import jira_fields
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND", "").lower() in ("1", "true", "yes")
+FLUSH_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_FLUSH_MS", "5"))
+SHARED_WAL_PATH = os.getenv("WRITE_BEHIND_WAL", "write_behind.wal")
+ID_BLOCK_SIZE = 100
+
+
+def shard_wal_path(path: str, shard_index: Optional[str]) -> str:
+    """'write_behind.wal' -> 'write_behind.2.wal' for shard 2; unchanged outside supervisor.py"""
+    if shard_index is None or shard_index == '':
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{int(shard_index)}{ext}"
+
+
+# Shards checkpoint and recover their WAL on their own, so each needs its own file
+WAL_PATH = shard_wal_path(SHARED_WAL_PATH, os.getenv("SHARD_INDEX"))
+
+_DATETIME_FIELDS = ('start_time', 'end_time')
+
+
+def _encode(op: Dict[str, Any]) -> str:
+    data = dict(op)
+    for field in _DATETIME_FIELDS:
+        if data.get(field) is not None:
+            data[field] = data[field].isoformat()
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _decode(line: str) -> Dict[str, Any]:
+    data = json.loads(line)
+    for field in _DATETIME_FIELDS:
+        if data.get(field) is not None:
+            data[field] = datetime.fromisoformat(data[field])
+    return data
+
+
+class WriteBehindBuffer:
+    def __init__(self, wal_path: str = WAL_PATH, flush_interval_ms: int = FLUSH_INTERVAL_MS,
+                 fsync: bool = True):
+        self.wal_path = wal_path
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.fsync = fsync
+        self._queue: List[Dict[str, Any]] = []
+        self._pending_users = Counter()
+        self._task_ids = deque()
+        self._lock = threading.Lock()
+        self._id_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._wal = None
+        self.stats = {
+            'enqueued': 0,
+            'flushes': 0,
+            'rows_flushed': 0,
+            'flush_errors': 0,
+            'recovered': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    # Lifecycle
+
+    def start(self):
+        """Replay the WAL left by a previous process and start the flusher"""
+        self.recover()
+        self._wal = open(self.wal_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        logger.info(f"Write-behind enabled (flush every {self.flush_interval * 1000:.0f} ms)")
+
+    def stop(self):
+        """Stop the flusher after a final flush"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+        if self._wal:
+            self._wal.close()
+            self._wal = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._queue:
+                self.flush()
+
+    # Write path
+
+    def allocate_task_id(self) -> int:
+        """Take a task id from a block reserved from the tasks sequence"""
+        with self._id_lock:
+            if not self._task_ids:
+                with get_db() as conn:
+                    ids = get_backend().reserve_ids(conn.cursor(), 'tasks', ID_BLOCK_SIZE)
+                    self._task_ids.extend(ids)
+            return self._task_ids.popleft()
+
+    def _append(self, op: Dict[str, Any]):
+        with self._lock:
+            self._wal.write(_encode(op) + "\n")
+            self._wal.flush()
+            if self.fsync:
+                os.fsync(self._wal.fileno())
+            self._queue.append(op)
+            self._pending_users[op['user_id']] += 1
+            self.stats['enqueued'] += 1
+
+    def enqueue_start(self, task_id: int, user_id: int, task_name: str, comment: Optional[str],
+                      original_message: Optional[str], start_time: datetime, is_rest: bool):
+        self._append({
+            'op': 'start', 'id': task_id, 'user_id': user_id, 'task_name': task_name,
+            'comment': comment, 'original_message': original_message,
+            'start_time': start_time, 'is_rest': is_rest,
+        })
+
+    def enqueue_end(self, task_id: int, user_id: int, end_time: datetime,
+                    start_time: datetime, is_rest: bool,
+                    event_type: str = task_events.EVENT_END):
+        self._append({
+            'op': 'end', 'id': task_id, 'user_id': user_id, 'end_time': end_time,
+            'start_time': start_time, 'is_rest': is_rest, 'event_type': event_type,
+        })
+
+    # Read path
+
+    def has_pending(self, user_id: int) -> bool:
+        return self._pending_users.get(user_id, 0) > 0
+
+    def sync_user(self, user_id: int):
+        """Make the user's own queued writes visible before a read"""
+        if self.has_pending(user_id):
+            self.flush()
+
+    # Flushing
+
+    def flush(self) -> int:
+        """Write all queued operations in one transaction; returns rows flushed"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._queue
+                self._queue = []
+            if not batch:
+                return 0
+
+            started = time_module.perf_counter()
+            try:
+                name_ids = self._resolve_names(batch)
+                with get_db() as conn:
+                    events = self._write_batch(conn.cursor(), batch, name_ids)
+            except Exception as e:
+                logger.error(f"Write-behind flush of {len(batch)} operations failed: {e}")
+                with self._lock:
+                    self._queue = batch + self._queue
+                    self.stats['flush_errors'] += 1
+                return 0
+
+            with self._lock:
+                for op in batch:
+                    self._pending_users[op['user_id']] -= 1
+                    if self._pending_users[op['user_id']] <= 0:
+                        del self._pending_users[op['user_id']]
+                self._checkpoint()
+                self.stats['flushes'] += 1
+                self.stats['rows_flushed'] += len(batch)
+                self.stats['last_flush_ms'] = (time_module.perf_counter() - started) * 1000
+            task_events.publish(events)
+            return len(batch)
+
+    @staticmethod
+    def _resolve_names(batch: List[Dict[str, Any]]) -> Dict:
+        """Task name ids for the batch, looked up before the write transaction"""
+        return task_names.resolve((op['user_id'], op['task_name']) for op in batch
+                                  if op['op'] == 'start')
+
+    @staticmethod
+    def _write_batch(cursor, batch: List[Dict[str, Any]], name_ids: Dict) -> List[Dict[str, Any]]:
+        """Write a batch of operations with their task events; returns the events"""
+        # Coalesce: a task started and ended in the same batch is inserted closed
+        starts = {}
+        ends = {}
+        for op in batch:
+            if op['op'] == 'start':
+                starts[op['id']] = dict(op, end_time=None)
+            elif op['id'] in starts:
+                starts[op['id']]['end_time'] = op['end_time']
+            else:
+                ends[op['id']] = op['end_time']
+
+        # Only rows that actually changed get events, so WAL replays are idempotent
+        inserted = set()
+        updated = set()
+        if starts:
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(starts))
+            params = []
+            for op in starts.values():
+                params.extend((op['id'], op['user_id'], name_ids[(op['user_id'], op['task_name'])],
+                               op['comment'], op['original_message'], op['start_time'],
+                               op['end_time'], op['is_rest'],
+                               *jira_fields(op['task_name'], op['original_message'])))
+            cursor.execute(f"""
+                INSERT INTO tasks (id, user_id, task_name_id, comment, original_message,
+                                   start_time, end_time, is_rest, jira_key, jira_project)
+                VALUES {placeholders}
+                ON CONFLICT (id) DO NOTHING
+                RETURNING id
+            """, params)
+            inserted = {row['id'] for row in cursor.fetchall()}
+
+        if ends:
+            placeholders = ", ".join(["(%s, %s)"] * len(ends))
+            params = []
+            for task_id, end_time in ends.items():
+                params.extend((task_id, end_time))
+            cursor.execute(f"""
+                WITH v (id, end_time) AS (VALUES {placeholders})
+                UPDATE tasks SET end_time = v.end_time
+                FROM v
+                WHERE tasks.id = v.id AND tasks.end_time IS DISTINCT FROM v.end_time
+                RETURNING tasks.id
+            """, params)
+            updated = {row['id'] for row in cursor.fetchall()}
+
+        events = []
+        for op in batch:
+            if op['id'] not in inserted and op['id'] not in updated:
+                continue
+            if op['op'] == 'start':
+                events.append(task_events.make_event(
+                    op['id'], op['user_id'], task_events.EVENT_START, op['start_time'],
+                    task_name=op['task_name'], comment=op['comment'],
+                    original_message=op['original_message'], start_time=op['start_time'],
+                    is_rest=op['is_rest']
+                ))
+            else:
+                events.append(task_events.make_event(
+                    op['id'], op['user_id'], op.get('event_type', task_events.EVENT_END),
+                    op['end_time'], end_time=op['end_time']
+                ))
+
+        task_events.record_events(cursor, events)
+        jira_sync.enqueue_worklogs(cursor, {event['task_id'] for event in events
+                                            if event['event_type'] != task_events.EVENT_START})
+        return events
+
+    # WAL
+
+    def _checkpoint(self):
+        """Drop flushed operations from the WAL (caller holds the lock)"""
+        if self._wal is None:
+            return
+        self._wal.seek(0)
+        self._wal.truncate()
+        for op in self._queue:
+            self._wal.write(_encode(op) + "\n")
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+
+    def recover(self) -> int:
+        """Flush operations left in the WAL by a crashed process"""
+        if not os.path.exists(self.wal_path):
+            return 0
+
+        ops = []
+        with open(self.wal_path, encoding='utf-8') as wal:
+            for line in wal:
+                try:
+                    ops.append(_decode(line))
+                except ValueError:
+                    # Torn write at the end of the file
+                    logger.warning("Skipping unreadable write-behind WAL entry")
+        if not ops:
+            return 0
+
+        name_ids = self._resolve_names(ops)
+        with get_db() as conn:
+            events = self._write_batch(conn.cursor(), ops, name_ids)
+        task_events.publish(events)
+        open(self.wal_path, 'w').close()
+        self.stats['recovered'] += len(ops)
+        logger.info(f"Recovered {len(ops)} write-behind operations from {self.wal_path}")
+        return len(ops)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_behind() -> Optional[WriteBehindBuffer]:
+    """Return the process-wide buffer, or None when write-behind is disabled"""
+    global _buffer
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer()
+            _buffer.start()
+            # A WAL written before the bot ran sharded is replayed once, by shard 0
+            if WAL_PATH != SHARED_WAL_PATH and os.getenv("SHARD_INDEX") == '0':
+                WriteBehindBuffer(SHARED_WAL_PATH).recover()
+            shutdown.register('write_behind', _buffer.stop, shutdown.ORDER_FLUSH)
+    return _buffer
@@ -1,11 +1,19 @@
 """
 WSGI entry point for production deployment with gunicorn
+
+Runs the same startup as app.py (database, background workers, bot), with
+the bot polling in a thread next to the web workers' requests. Every
+gunicorn worker runs its own bot, so use a single worker (e.g. with
+threads) or run the bot with supervisor.py and serve only the web app.
+
+    python wsgi.py --startup-profile   # print startup timing and exit
 """
+import startup
 import os
+import sys
 import threading
-import time
 import logging
-from app import app, run_telegram_bot
+import app
 from database import init_database
 
 # Configure logging for production
@@ -15,24 +23,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def initialize_app():
+def initialize_app(start_bot=True):
     """Initialize the application"""
+    startup.mark('imports')
+    
     logger.info("Initializing database...")
-    init_database()
+    with startup.phase('init_database'):
+        init_database()
     logger.info("Database initialized successfully")
     
+    app.start_background_workers()
+    
+    # Gunicorn serves requests as soon as this module is imported
+    app.app_status['web_server_running'] = True
+    app.web_ready.set()
+    startup.mark('ready')
+    if not start_bot:
+        return
+    
     # Start Telegram bot in a separate thread
-    bot_thread = threading.Thread(target=run_telegram_bot, daemon=True)
+    bot_thread = threading.Thread(target=app.run_telegram_bot, daemon=True)
     bot_thread.start()
     logger.info("Telegram bot thread started")
 
-# Initialize when module is imported
-initialize_app()
-
 # WSGI application
-application = app
+application = app.get_web_app()
+
+# Initialize when module is imported; the profile run does not start the bot
+profile = __name__ == "__main__" and '--startup-profile' in sys.argv[1:]
+initialize_app(start_bot=not profile)
+if profile:
+    print(startup.report('wsgi'))
+    sys.exit(0)
 
 if __name__ == "__main__":
     # For local development
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    application.run(host='0.0.0.0', port=port, debug=False)